@@ -4,16 +4,22 @@ from datetime import datetime, timedelta
 import uuid
 import random
 import os
+import multiprocessing
 from flask import send_from_directory
 
 
 import json
 from utils import generate_token, verify_token, token_required, read_data, write_data, paginate_results
+from services.response_cache import response_cache, cached_response
+from services.response_compression import ResponseCompressor
+from services.instrument_gateway import instrument_gateway
+import json_codec
 
 
 
 
 app = Flask(__name__)
+app.json = json_codec.FastJSONProvider(app)
 
 CORS(app)
 
@@ -32,6 +38,9 @@ CORS(app,
      allow_headers=['Content-Type', 'Authorization'],
      supports_credentials=True)
 
+# Compress JSON/text responses for clients that accept gzip/br
+ResponseCompressor(app)
+
 # Add a global OPTIONS handler for preflight requests
 @app.before_request
 def handle_preflight():
@@ -51,6 +60,7 @@ from routes.admin_routes import admin_bp
 from routes.inventory_routes import inventory_bp
 from routes.whatsapp_routes import whatsapp_bp
 from routes.sample_routing_routes import sample_routing_bp
+from routes.routing_manifest_routes import routing_manifest_bp
 from routes.chat_routes import chat_bp
 from routes.file_routes import file_bp
 from routes.notification_routes import notification_bp
@@ -59,6 +69,14 @@ from routes.invoice_routes import invoice_bp
 from routes.tenants import tenants_bp  # assuming your code is in tenants_api.py
 from routes.billing_reports_routes import billing_reports_bp
 from routes.access_management_routes import access_management_bp
+from routes.search_routes import search_bp
+from routes.job_routes import job_bp
+from routes.export_routes import export_bp
+from routes.revenue_routes import revenue_bp
+from routes.analytics_routes import analytics_bp
+from routes.instrument_routes import instrument_bp
+from routes.formula_routes import formula_bp
+from routes.auto_verification_routes import auto_verification_bp
 
 # Load mock data
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
@@ -111,6 +129,7 @@ init_data_file('settings.json', {})
 init_data_file('whatsapp_config.json', [])
 init_data_file('whatsapp_messages.json', [])
 init_data_file('sample_routings.json', [])
+init_data_file('routing_manifests.json', [])
 init_data_file('workflow_instances.json', [])
 init_data_file('routing_messages.json', [])
 init_data_file('routing_files.json', [])
@@ -273,13 +292,12 @@ def switch_tenant_context(tenant_id):
 def read_profiles():
     if not os.path.exists(JSON_FILE):
         return []
-    with open(JSON_FILE, "r") as f:
-        return json.load(f)
+    return json_codec.load_file(JSON_FILE)
 
 
 def write_profiles(profiles):
-    with open(JSON_FILE, "w") as f:
-        json.dump(profiles, f, indent=2)
+    json_codec.dump_file(JSON_FILE, profiles)
+    response_cache.invalidate(os.path.basename(JSON_FILE))
 
 
 
@@ -305,6 +323,7 @@ def add_profile():
 
 # ✅ API to fetch all profiles
 @app.route("/api/profile-master", methods=["GET"])
+@cached_response(os.path.basename(JSON_FILE))
 def get_profiles():
     profiles = read_profiles()
     return jsonify(profiles)
@@ -407,6 +426,7 @@ app.register_blueprint(admin_bp)
 app.register_blueprint(inventory_bp)
 app.register_blueprint(whatsapp_bp)
 app.register_blueprint(sample_routing_bp)
+app.register_blueprint(routing_manifest_bp)
 app.register_blueprint(chat_bp)
 app.register_blueprint(file_bp)
 app.register_blueprint(notification_bp)
@@ -414,6 +434,19 @@ app.register_blueprint(invoice_bp)
 app.register_blueprint(tenants_bp)
 app.register_blueprint(billing_reports_bp)
 app.register_blueprint(access_management_bp)
+app.register_blueprint(search_bp)
+app.register_blueprint(job_bp)
+app.register_blueprint(export_bp)
+app.register_blueprint(revenue_bp)
+app.register_blueprint(analytics_bp)
+app.register_blueprint(instrument_bp)
+app.register_blueprint(formula_bp)
+app.register_blueprint(auto_verification_bp)
+
+# Analyzer listeners configured with INSTRUMENT_LISTENERS (no-op when unset).
+# Not in spawned worker processes (invoice PDF pool), which re-import this module.
+if multiprocessing.parent_process() is None:
+    instrument_gateway.start()
 
 # Start the server
 if __name__ == '__main__':
@@ -0,0 +1,119 @@
+"""
+JSON encoding for the data files and API responses.
+
+Uses orjson or ujson when installed and falls back to the standard library.
+Data files are written compact by default; set ``JSON_STORAGE_FORMAT=pretty``
+to keep the old indented layout, or use ``scripts/export_json.py`` to get
+human-readable copies.
+"""
+
+import json
+import os
+import stat
+import tempfile
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    BACKEND = 'orjson'
+except ImportError:
+    orjson = None
+    try:
+        import ujson
+        BACKEND = 'ujson'
+    except ImportError:
+        ujson = None
+        BACKEND = 'json'
+
+STORAGE_FORMAT = os.environ.get('JSON_STORAGE_FORMAT', 'compact').lower()
+
+
+def dumps(obj, pretty: bool = False, sort_keys: bool = False, default=None) -> bytes:
+    """
+    Serialise to UTF-8 bytes.
+
+    ``default`` is called for objects the encoder cannot handle; when given,
+    datetimes and dataclasses are routed through it too so every backend
+    formats them the same way.
+    """
+    if BACKEND == 'orjson':
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if default is not None:
+            option |= orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        return orjson.dumps(obj, default=default, option=option)
+
+    if BACKEND == 'ujson' and default is None:
+        return ujson.dumps(obj, ensure_ascii=False, indent=2 if pretty else 0,
+                           sort_keys=sort_keys).encode('utf-8')
+
+    if pretty:
+        text = json.dumps(obj, indent=2, ensure_ascii=False, sort_keys=sort_keys, default=default)
+    else:
+        text = json.dumps(obj, separators=(',', ':'), ensure_ascii=False, sort_keys=sort_keys, default=default)
+    return text.encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if BACKEND == 'orjson':
+        return orjson.loads(data)
+    if BACKEND == 'ujson':
+        return ujson.loads(data)
+    return json.loads(data)
+
+
+def load_file(filepath: str):
+    """Read a JSON file"""
+    with open(filepath, 'rb') as f:
+        return loads(f.read())
+
+
+def dump_file(filepath: str, data, pretty: bool = None):
+    """
+    Write a JSON file in the configured storage format.
+
+    The file is written to a temporary file and moved into place, so readers
+    never see a half-written file.
+    """
+    if pretty is None:
+        pretty = STORAGE_FORMAT == 'pretty'
+    payload = dumps(data, pretty=pretty)
+
+    directory = os.path.dirname(os.path.abspath(filepath))
+    try:
+        mode = stat.S_IMODE(os.stat(filepath).st_mode)
+    except OSError:
+        mode = 0o644
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider using the same encoder as the data files"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps(obj, pretty=bool(kwargs.get('indent')),
+                     sort_keys=kwargs.get('sort_keys', self.sort_keys),
+                     default=kwargs.get('default', self.default)).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        body = dumps(obj, pretty=pretty, sort_keys=self.sort_keys, default=self.default)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
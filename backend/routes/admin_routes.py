@@ -19,6 +19,12 @@ except ImportError:
 
 # Import utilities
 from utils import token_required, read_data, write_data, paginate_results, filter_data_by_tenant, check_tenant_access, transform_master_data, require_module_access
+from services.test_search_service import test_search_service
+from services.response_cache import response_cache, cached_response
+from services.background_jobs import job_manager
+from services.excel_import_service import ExcelImportService, CATEGORY_PATTERN
+from services.export_service import export_service, ExportError, XLSX_MIMETYPE
+from services.financial_rollups import billing_rollups
 
 # Import Excel parsing library
 try:
@@ -63,8 +69,8 @@ def safe_float(value, default=0):
     except (ValueError, TypeError):
         return default
 
-def calculate_dashboard_metrics(patients, samples, results, billings, inventory, invoices, user_role):
-    """Calculate comprehensive dashboard metrics"""
+def calculate_dashboard_metrics(patients, samples, results, billings, inventory, invoices, user_role, tenant_ids=None):
+    """Calculate comprehensive dashboard metrics (revenue from the billing rollups of ``tenant_ids``)"""
     today = datetime.now().strftime('%Y-%m-%d')
     current_month = datetime.now().strftime('%Y-%m')
     last_7_days = [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
@@ -84,10 +90,11 @@ def calculate_dashboard_metrics(patients, samples, results, billings, inventory,
     pending_results = len([r for r in results if r.get('status') == 'Pending'])
     completed_results = len([r for r in results if r.get('status') == 'Completed'])
 
-    # Financial Metrics - Use safe_float to handle string/numeric inconsistencies
-    total_revenue = sum(safe_float(b.get('total_amount', 0)) for b in billings)
-    monthly_revenue = sum(safe_float(b.get('total_amount', 0)) for b in billings if b.get('invoice_date', '').startswith(current_month))
-    pending_payments = sum(safe_float(b.get('total_amount', 0)) for b in billings if b.get('payment_status') == 'Pending')
+    # Financial Metrics from the billing rollup tables
+    all_time = billing_rollups.totals(tenant_ids)
+    total_revenue = all_time['net']
+    monthly_revenue = billing_rollups.month(current_month, tenant_ids)['net']
+    pending_payments = all_time['pending']
 
     # Invoice Metrics
     total_invoices = len(invoices)
@@ -100,11 +107,13 @@ def calculate_dashboard_metrics(patients, samples, results, billings, inventory,
     out_of_stock_items = len([i for i in inventory if i.get('quantity', 0) == 0])
 
     # Daily trends for last 7 days
+    daily_revenue = {row['period']: row['net'] for row in
+                     billing_rollups.series('daily', tenant_ids, last_7_days[0], last_7_days[-1])}
     daily_trends = []
     for date in last_7_days:
         day_patients = len([p for p in patients if p.get('created_at', '').startswith(date)])
         day_samples = len([s for s in samples if s.get('created_at', '').startswith(date)])
-        day_revenue = sum(safe_float(b.get('total_amount', 0)) for b in billings if b.get('invoice_date', '').startswith(date))
+        day_revenue = daily_revenue.get(date, 0)
 
         daily_trends.append({
             'date': date,
@@ -142,7 +151,7 @@ def calculate_dashboard_metrics(patients, samples, results, billings, inventory,
         'trends': {
             'daily_trends': daily_trends,
             'monthly_revenue': monthly_revenue,
-            'revenue_growth': calculate_revenue_growth(billings, current_month)
+            'revenue_growth': calculate_revenue_growth(current_month, tenant_ids)
         },
         'recent_activities': {
             'patients': recent_patients,
@@ -150,10 +159,10 @@ def calculate_dashboard_metrics(patients, samples, results, billings, inventory,
             'billings': recent_billings
         },
         'alerts': generate_dashboard_alerts(inventory, billings, samples, results),
-        'ai_insights': generate_ai_insights(patients, samples, results, billings, inventory, user_role)
+        'ai_insights': generate_ai_insights(patients, samples, results, inventory, user_role, tenant_ids)
     }
 
-def calculate_revenue_growth(billings, current_month):
+def calculate_revenue_growth(current_month, tenant_ids=None):
     """Calculate revenue growth compared to previous month"""
     try:
         current_year, current_month_num = current_month.split('-')
@@ -166,8 +175,8 @@ def calculate_revenue_growth(billings, current_month):
 
         prev_month = f"{prev_year}-{prev_month_num:02d}"
 
-        current_revenue = sum(safe_float(b.get('total_amount', 0)) for b in billings if b.get('invoice_date', '').startswith(current_month))
-        prev_revenue = sum(safe_float(b.get('total_amount', 0)) for b in billings if b.get('invoice_date', '').startswith(prev_month))
+        current_revenue = billing_rollups.month(current_month, tenant_ids)['net']
+        prev_revenue = billing_rollups.month(prev_month, tenant_ids)['net']
 
         if prev_revenue > 0:
             growth = ((current_revenue - prev_revenue) / prev_revenue) * 100
@@ -216,7 +225,7 @@ def generate_dashboard_alerts(inventory, billings, samples, results):
 
     return alerts
 
-def generate_ai_insights(patients, samples, results, billings, inventory, user_role):
+def generate_ai_insights(patients, samples, results, inventory, user_role, tenant_ids=None):
     """Generate AI-powered insights and recommendations"""
     insights = []
 
@@ -237,7 +246,7 @@ def generate_ai_insights(patients, samples, results, billings, inventory, user_r
 
     # Revenue insights
     current_month = datetime.now().strftime('%Y-%m')
-    monthly_revenue = sum(safe_float(b.get('total_amount', 0)) for b in billings if b.get('invoice_date', '').startswith(current_month))
+    monthly_revenue = billing_rollups.month(current_month, tenant_ids)['net']
 
     if monthly_revenue > 0:
         insights.append({
@@ -296,6 +305,7 @@ def get_comprehensive_dashboard():
         # Apply role-based filtering
         if user_role in ['admin', 'hub_admin']:
             # Admin and hub_admin see all data
+            tenant_ids = None
             filtered_patients = patients
             filtered_samples = samples
             filtered_results = results
@@ -304,6 +314,7 @@ def get_comprehensive_dashboard():
             filtered_invoices = invoices
         else:
             # Franchise admin and other roles see only their tenant data
+            tenant_ids = [user_tenant_id]
             filtered_patients = filter_data_by_tenant(patients, user)
             filtered_samples = filter_data_by_tenant(samples, user)
             filtered_results = filter_data_by_tenant(results, user)
@@ -314,7 +325,7 @@ def get_comprehensive_dashboard():
         # Calculate dashboard metrics
         dashboard_data = calculate_dashboard_metrics(
             filtered_patients, filtered_samples, filtered_results,
-            filtered_billings, filtered_inventory, filtered_invoices, user_role
+            filtered_billings, filtered_inventory, filtered_invoices, user_role, tenant_ids
         )
 
         return jsonify({
@@ -346,15 +357,10 @@ def get_analytics():
     patients = read_data('patients.json')
     samples = read_data('samples.json')
     results = read_data('results.json')
-    billings = read_data('billings.json')
 
     # Calculate monthly revenue
     current_month = datetime.now().strftime('%Y-%m')
-    monthly_revenue = sum(
-        safe_float(b.get('total_amount', 0))
-        for b in billings
-        if b.get('invoice_date', '').startswith(current_month)
-    )
+    monthly_revenue = billing_rollups.month(current_month)['net']
 
     # Get sample type distribution
     sample_types = read_data('sample_types.json')
@@ -827,9 +833,56 @@ def delete_gst_config(config_id):
 
     return jsonify({'message': 'GST configuration deleted successfully'})
 
+# Files behind the cached master data responses
+MASTER_DATA_FILES = (
+    'doctors.json',
+    'test_categories.json',
+    'test_parameters.json',
+    'departments.json',
+    'payment_methods.json',
+    'containers.json',
+    'instruments.json',
+    'reagents.json',
+    'suppliers.json',
+    'units.json',
+    'test_methods.json',
+    'tests.json',
+    'test_panels.json',
+    'sample_types.json',
+    'patients.json',
+    'profile_master.json',
+    'method_master.json',
+    'antibiotic_master.json',
+    'organism_master.json',
+    'unit_of_measurement.json',
+    'specimen_master.json',
+    'organism_vs_antibiotic.json',
+    'container_master.json',
+    'main_department_master.json',
+    'department_settings.json',
+    'authorization_settings.json',
+    'print_order.json',
+    'test_master.json',
+    'sub_test_master.json',
+    'profile_data.json',
+)
+
+TECHNICAL_MASTER_DATA_FILES = (
+    'result_master.json',
+    'parameter_master.json',
+    'reference_ranges.json',
+    'calculation_formulas.json',
+    'quality_control_rules.json',
+    'instrument_master.json',
+    'reagent_master.json',
+    'calibration_standards.json',
+    'referrer_master.json',
+)
+
 # Master Data API
 @admin_bp.route('/api/admin/master-data', methods=['GET'])
 @token_required
+@cached_response(*MASTER_DATA_FILES)
 def get_master_data():
     # Check if user has admin privileges
     if request.current_user.get('role') not in ['admin', 'hub_admin']:
@@ -1180,6 +1233,7 @@ def create_doctor():
 
     doctors.append(new_doctor)
     write_data('doctors.json', doctors)
+    response_cache.invalidate('doctors.json')
 
     return jsonify(new_doctor), 201
 
@@ -1210,6 +1264,7 @@ def update_doctor(id):
 
     # Save updated doctors
     write_data('doctors.json', doctors)
+    response_cache.invalidate('doctors.json')
 
     return jsonify(doctor)
 
@@ -1229,6 +1284,7 @@ def delete_doctor(id):
     # Delete doctor
     deleted_doctor = doctors.pop(doctor_index)
     write_data('doctors.json', doctors)
+    response_cache.invalidate('doctors.json')
 
     return jsonify({'message': 'Doctor deleted successfully'})
 
@@ -1309,6 +1365,7 @@ def create_test_category():
 
     categories.append(new_category)
     write_data('test_categories.json', categories)
+    response_cache.invalidate('test_categories.json')
 
     return jsonify(new_category), 201
 
@@ -1342,6 +1399,7 @@ def update_test_category(id):
 
     # Save updated categories
     write_data('test_categories.json', categories)
+    response_cache.invalidate('test_categories.json')
 
     return jsonify(category)
 
@@ -1361,6 +1419,7 @@ def delete_test_category(id):
     # Delete category
     deleted_category = categories.pop(category_index)
     write_data('test_categories.json', categories)
+    response_cache.invalidate('test_categories.json')
 
     return jsonify({'message': 'Test category deleted successfully'})
 
@@ -1468,6 +1527,7 @@ def create_test():
 
     tests.append(new_test)
     write_data('tests.json', tests)
+    response_cache.invalidate('tests.json')
 
     return jsonify(new_test), 201
 
@@ -1501,6 +1561,7 @@ def update_test(id):
 
     # Save updated tests
     write_data('tests.json', tests)
+    response_cache.invalidate('tests.json')
 
     return jsonify(test)
 
@@ -1520,6 +1581,7 @@ def delete_test(id):
     # Delete test
     deleted_test = tests.pop(test_index)
     write_data('tests.json', tests)
+    response_cache.invalidate('tests.json')
 
     return jsonify({'message': 'Test deleted successfully'})
 
@@ -1595,6 +1657,7 @@ def create_test_panel():
 
     panels.append(new_panel)
     write_data('test_panels.json', panels)
+    response_cache.invalidate('test_panels.json')
 
     return jsonify(new_panel), 201
 
@@ -1628,6 +1691,7 @@ def update_test_panel(id):
 
     # Save updated panels
     write_data('test_panels.json', panels)
+    response_cache.invalidate('test_panels.json')
 
     return jsonify(panel)
 
@@ -1647,6 +1711,7 @@ def delete_test_panel(id):
     # Delete panel
     deleted_panel = panels.pop(panel_index)
     write_data('test_panels.json', panels)
+    response_cache.invalidate('test_panels.json')
 
     return jsonify({'message': 'Test panel deleted successfully'})
 
@@ -1714,6 +1779,7 @@ def create_container():
 
     containers.append(new_container)
     write_data('containers.json', containers)
+    response_cache.invalidate('containers.json')
 
     return jsonify(new_container), 201
 
@@ -1747,6 +1813,7 @@ def update_container(id):
 
     # Save updated containers
     write_data('containers.json', containers)
+    response_cache.invalidate('containers.json')
 
     return jsonify(container)
 
@@ -1766,6 +1833,7 @@ def delete_container(id):
     # Delete container
     deleted_container = containers.pop(container_index)
     write_data('containers.json', containers)
+    response_cache.invalidate('containers.json')
 
     return jsonify({'message': 'Container deleted successfully'})
 
@@ -2196,6 +2264,7 @@ def create_sample_type():
 
     sample_types.append(new_sample_type)
     write_data('sample_types.json', sample_types)
+    response_cache.invalidate('sample_types.json')
 
     return jsonify(new_sample_type), 201
 
@@ -2263,6 +2332,7 @@ def create_test_parameter():
 
     test_parameters.append(new_parameter)
     write_data('test_parameters.json', test_parameters)
+    response_cache.invalidate('test_parameters.json')
 
     return jsonify(new_parameter), 201
 
@@ -2329,6 +2399,7 @@ def create_department():
 
     departments.append(new_department)
     write_data('departments.json', departments)
+    response_cache.invalidate('departments.json')
 
     return jsonify(new_department), 201
 
@@ -2396,6 +2467,7 @@ def create_payment_method():
 
     payment_methods.append(new_payment_method)
     write_data('payment_methods.json', payment_methods)
+    response_cache.invalidate('payment_methods.json')
 
     return jsonify(new_payment_method), 201
 
@@ -2635,6 +2707,7 @@ def create_test_category_generic(data):
 
     categories.append(new_category)
     write_data('test_categories.json', categories)
+    response_cache.invalidate('test_categories.json')
 
     return jsonify(new_category), 201
 
@@ -2675,6 +2748,7 @@ def create_test_parameter_generic(data):
 
     test_parameters.append(new_parameter)
     write_data('test_parameters.json', test_parameters)
+    response_cache.invalidate('test_parameters.json')
 
     return jsonify(new_parameter), 201
 
@@ -2715,6 +2789,7 @@ def create_sample_type_generic(data):
 
     sample_types.append(new_sample_type)
     write_data('sample_types.json', sample_types)
+    response_cache.invalidate('sample_types.json')
 
     return jsonify(new_sample_type), 201
 
@@ -2754,6 +2829,7 @@ def create_department_generic(data):
 
     departments.append(new_department)
     write_data('departments.json', departments)
+    response_cache.invalidate('departments.json')
 
     return jsonify(new_department), 201
 
@@ -2794,6 +2870,7 @@ def create_payment_method_generic(data):
 
     payment_methods.append(new_payment_method)
     write_data('payment_methods.json', payment_methods)
+    response_cache.invalidate('payment_methods.json')
 
     return jsonify(new_payment_method), 201
 
@@ -2828,6 +2905,7 @@ def create_container_generic(data):
 
     containers.append(new_container)
     write_data('containers.json', containers)
+    response_cache.invalidate('containers.json')
 
     return jsonify(new_container), 201
 
@@ -2862,6 +2940,7 @@ def create_instrument_generic(data):
 
     instruments.append(new_instrument)
     write_data('instruments.json', instruments)
+    response_cache.invalidate('instruments.json')
 
     return jsonify(new_instrument), 201
 
@@ -2895,6 +2974,7 @@ def create_reagent_generic(data):
 
     reagents.append(new_reagent)
     write_data('reagents.json', reagents)
+    response_cache.invalidate('reagents.json')
 
     return jsonify(new_reagent), 201
 
@@ -2928,6 +3008,7 @@ def create_supplier_generic(data):
 
     suppliers.append(new_supplier)
     write_data('suppliers.json', suppliers)
+    response_cache.invalidate('suppliers.json')
 
     return jsonify(new_supplier), 201
 
@@ -2964,6 +3045,7 @@ def create_unit_generic(data):
 
     units.append(new_unit)
     write_data('units.json', units)
+    response_cache.invalidate('units.json')
 
     return jsonify(new_unit), 201
 
@@ -2996,6 +3078,7 @@ def create_test_method_generic(data):
 
     test_methods.append(new_test_method)
     write_data('test_methods.json', test_methods)
+    response_cache.invalidate('test_methods.json')
 
     return jsonify(new_test_method), 201
 
@@ -3019,6 +3102,7 @@ def update_test_category_generic(item_id, data):
 
     category['updated_at'] = datetime.now().isoformat()
     write_data('test_categories.json', categories)
+    response_cache.invalidate('test_categories.json')
     return jsonify(category)
 
 def update_test_parameter_generic(item_id, data):
@@ -3040,6 +3124,7 @@ def update_test_parameter_generic(item_id, data):
 
     parameter['updated_at'] = datetime.now().isoformat()
     write_data('test_parameters.json', test_parameters)
+    response_cache.invalidate('test_parameters.json')
     return jsonify(parameter)
 
 def update_sample_type_generic(item_id, data):
@@ -3061,6 +3146,7 @@ def update_sample_type_generic(item_id, data):
 
     sample_type['updated_at'] = datetime.now().isoformat()
     write_data('sample_types.json', sample_types)
+    response_cache.invalidate('sample_types.json')
     return jsonify(sample_type)
 
 def update_department_generic(item_id, data):
@@ -3082,6 +3168,7 @@ def update_department_generic(item_id, data):
 
     department['updated_at'] = datetime.now().isoformat()
     write_data('departments.json', departments)
+    response_cache.invalidate('departments.json')
     return jsonify(department)
 
 def update_payment_method_generic(item_id, data):
@@ -3103,6 +3190,7 @@ def update_payment_method_generic(item_id, data):
 
     payment_method['updated_at'] = datetime.now().isoformat()
     write_data('payment_methods.json', payment_methods)
+    response_cache.invalidate('payment_methods.json')
     return jsonify(payment_method)
 
 def update_container_generic(item_id, data):
@@ -3121,6 +3209,7 @@ def update_container_generic(item_id, data):
 
     container['updated_at'] = datetime.now().isoformat()
     write_data('containers.json', containers)
+    response_cache.invalidate('containers.json')
     return jsonify(container)
 
 def update_instrument_generic(item_id, data):
@@ -3139,6 +3228,7 @@ def update_instrument_generic(item_id, data):
 
     instrument['updated_at'] = datetime.now().isoformat()
     write_data('instruments.json', instruments)
+    response_cache.invalidate('instruments.json')
     return jsonify(instrument)
 
 def update_reagent_generic(item_id, data):
@@ -3157,6 +3247,7 @@ def update_reagent_generic(item_id, data):
 
     reagent['updated_at'] = datetime.now().isoformat()
     write_data('reagents.json', reagents)
+    response_cache.invalidate('reagents.json')
     return jsonify(reagent)
 
 def update_supplier_generic(item_id, data):
@@ -3175,6 +3266,7 @@ def update_supplier_generic(item_id, data):
 
     supplier['updated_at'] = datetime.now().isoformat()
     write_data('suppliers.json', suppliers)
+    response_cache.invalidate('suppliers.json')
     return jsonify(supplier)
 
 def update_unit_generic(item_id, data):
@@ -3193,6 +3285,7 @@ def update_unit_generic(item_id, data):
 
     unit['updated_at'] = datetime.now().isoformat()
     write_data('units.json', units)
+    response_cache.invalidate('units.json')
     return jsonify(unit)
 
 def update_test_method_generic(item_id, data):
@@ -3211,6 +3304,7 @@ def update_test_method_generic(item_id, data):
 
     test_method['updated_at'] = datetime.now().isoformat()
     write_data('test_methods.json', test_methods)
+    response_cache.invalidate('test_methods.json')
     return jsonify(test_method)
 
 # Generic delete functions
@@ -3223,6 +3317,7 @@ def delete_test_category_generic(item_id):
 
     categories.pop(category_index)
     write_data('test_categories.json', categories)
+    response_cache.invalidate('test_categories.json')
     return jsonify({'message': 'Test category deleted successfully'})
 
 def delete_test_parameter_generic(item_id):
@@ -3234,6 +3329,7 @@ def delete_test_parameter_generic(item_id):
 
     test_parameters.pop(parameter_index)
     write_data('test_parameters.json', test_parameters)
+    response_cache.invalidate('test_parameters.json')
     return jsonify({'message': 'Test parameter deleted successfully'})
 
 def delete_sample_type_generic(item_id):
@@ -3245,6 +3341,7 @@ def delete_sample_type_generic(item_id):
 
     sample_types.pop(sample_type_index)
     write_data('sample_types.json', sample_types)
+    response_cache.invalidate('sample_types.json')
     return jsonify({'message': 'Sample type deleted successfully'})
 
 def delete_department_generic(item_id):
@@ -3256,6 +3353,7 @@ def delete_department_generic(item_id):
 
     departments.pop(department_index)
     write_data('departments.json', departments)
+    response_cache.invalidate('departments.json')
     return jsonify({'message': 'Department deleted successfully'})
 
 def delete_payment_method_generic(item_id):
@@ -3267,6 +3365,7 @@ def delete_payment_method_generic(item_id):
 
     payment_methods.pop(payment_method_index)
     write_data('payment_methods.json', payment_methods)
+    response_cache.invalidate('payment_methods.json')
     return jsonify({'message': 'Payment method deleted successfully'})
 
 def delete_container_generic(item_id):
@@ -3278,6 +3377,7 @@ def delete_container_generic(item_id):
 
     containers.pop(container_index)
     write_data('containers.json', containers)
+    response_cache.invalidate('containers.json')
     return jsonify({'message': 'Container deleted successfully'})
 
 def delete_instrument_generic(item_id):
@@ -3289,6 +3389,7 @@ def delete_instrument_generic(item_id):
 
     instruments.pop(instrument_index)
     write_data('instruments.json', instruments)
+    response_cache.invalidate('instruments.json')
     return jsonify({'message': 'Instrument deleted successfully'})
 
 def delete_reagent_generic(item_id):
@@ -3300,6 +3401,7 @@ def delete_reagent_generic(item_id):
 
     reagents.pop(reagent_index)
     write_data('reagents.json', reagents)
+    response_cache.invalidate('reagents.json')
     return jsonify({'message': 'Reagent deleted successfully'})
 
 def delete_supplier_generic(item_id):
@@ -3311,6 +3413,7 @@ def delete_supplier_generic(item_id):
 
     suppliers.pop(supplier_index)
     write_data('suppliers.json', suppliers)
+    response_cache.invalidate('suppliers.json')
     return jsonify({'message': 'Supplier deleted successfully'})
 
 def delete_unit_generic(item_id):
@@ -3322,6 +3425,7 @@ def delete_unit_generic(item_id):
 
     units.pop(unit_index)
     write_data('units.json', units)
+    response_cache.invalidate('units.json')
     return jsonify({'message': 'Unit deleted successfully'})
 
 def delete_test_method_generic(item_id):
@@ -3333,6 +3437,7 @@ def delete_test_method_generic(item_id):
 
     test_methods.pop(method_index)
     write_data('test_methods.json', test_methods)
+    response_cache.invalidate('test_methods.json')
     return jsonify({'message': 'Test method deleted successfully'})
 
 # Excel Import/Export endpoints
@@ -3486,6 +3591,7 @@ def process_excel_import(file_path, category):
         # Save updated data
         if success_count > 0:
             write_data(filename, existing_data)
+            response_cache.invalidate(filename)
 
         return {
             'success_count': success_count,
@@ -3663,31 +3769,17 @@ def validate_and_convert_row(row, category, row_number):
 
 def generate_excel_export(category):
     """Generate Excel file for export"""
-    try:
-        import pandas as pd
-    except ImportError:
-        raise Exception("pandas library not installed. Please install pandas to use Excel export functionality.")
-
     # Get data
     filename = get_filename_for_category(category)
     data = read_data(filename)
 
-    if not data:
-        # Create empty DataFrame with headers
-        df = pd.DataFrame(columns=get_headers_for_category(category))
-    else:
-        # Convert data to DataFrame
-        df = pd.DataFrame(data)
-
-        # Select only relevant columns
-        headers = get_headers_for_category(category)
-        df = df.reindex(columns=headers, fill_value='')
-
-    # Create Excel file in memory
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name=category, index=False)
+    # Select only relevant columns
+    headers = get_headers_for_category(category)
+    rows = export_service.iter_rows(data or [], headers)
 
+    # Stream rows into a write-only workbook on disk
+    output = tempfile.TemporaryFile()
+    export_service.write_xlsx(output, [(category, headers, rows)])
     output.seek(0)
     return output
 
@@ -3863,6 +3955,7 @@ def update_sample_type(id):
 
     # Save updated sample types
     write_data('sample_types.json', sample_types)
+    response_cache.invalidate('sample_types.json')
 
     return jsonify(sample_type)
 
@@ -3882,14 +3975,53 @@ def delete_sample_type(id):
     # Delete sample type
     deleted_sample_type = sample_types.pop(sample_type_index)
     write_data('sample_types.json', sample_types)
+    response_cache.invalidate('sample_types.json')
 
     return jsonify({'message': 'Sample type deleted successfully'})
 
 # Excel Import/Export Routes for Master Data
+def _start_excel_import(file, category=None):
+    """
+    Save an uploaded workbook and import it in a background job.
+    Returns a (response, status) tuple.
+    """
+    if not file.filename.lower().endswith('.xlsx'):
+        if file.filename.lower().endswith('.xls'):
+            return jsonify({'message': 'Legacy .xls files are not supported. Please save the workbook as .xlsx'}), 400
+        return jsonify({'message': 'Invalid file format. Please upload an Excel file.'}), 400
+
+    if category is not None and not CATEGORY_PATTERN.match(category):
+        return jsonify({'message': 'Invalid category'}), 400
+
+    fd, temp_path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    file.save(temp_path)
+
+    user_id = request.current_user.get('id', 1)
+
+    def run_import(job):
+        try:
+            return ExcelImportService(user_id).import_workbook(temp_path, category, job)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    job = job_manager.submit(
+        'master_data_import', run_import,
+        params={'category': category, 'filename': secure_filename(file.filename)},
+        user_id=user_id, tenant_id=request.current_user.get('tenant_id')
+    )
+    return jsonify({
+        'message': 'Import started',
+        'job_id': job['id'],
+        'status': job['status'],
+        'status_url': f"/api/jobs/{job['id']}"
+    }), 202
+
 @admin_bp.route('/api/admin/master-data/import', methods=['POST'])
 @token_required
 def import_master_data():
-    """Import master data from Excel file"""
+    """Import master data from Excel file (runs as a background job)"""
     # Check if user has admin privileges
     if request.current_user.get('role') not in ['admin', 'hub_admin']:
         return jsonify({'message': 'Unauthorized'}), 403
@@ -3903,69 +4035,12 @@ def import_master_data():
         if file.filename == '':
             return jsonify({'message': 'No file selected'}), 400
 
-        # Check file extension
-        if not file.filename.lower().endswith(('.xlsx', '.xls')):
-            return jsonify({'message': 'Invalid file format. Please upload an Excel file.'}), 400
-
         # Get category from form data
         category = request.form.get('category', '')
         if not category:
             return jsonify({'message': 'Category is required'}), 400
 
-        # Save uploaded file temporarily
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(tempfile.gettempdir(), filename)
-        file.save(temp_path)
-
-        try:
-            # Read Excel file
-            import pandas as pd
-            df = pd.read_excel(temp_path)
-
-            # Convert DataFrame to list of dictionaries
-            records = df.to_dict('records')
-
-            # Process records based on category
-            processed_records = []
-            existing_data = read_data(f'{category}.json')
-
-            # Get next ID
-            next_id = 1
-            if existing_data:
-                next_id = max(item.get('id', 0) for item in existing_data) + 1
-
-            for record in records:
-                # Clean the record (remove NaN values)
-                clean_record = {}
-                for key, value in record.items():
-                    if pd.notna(value):
-                        clean_record[key.lower().replace(' ', '_')] = value
-
-                # Add metadata
-                clean_record['id'] = next_id
-                clean_record['is_active'] = clean_record.get('is_active', True)
-                clean_record['created_at'] = datetime.now().isoformat()
-                clean_record['updated_at'] = datetime.now().isoformat()
-                clean_record['created_by'] = request.current_user.get('id', 1)
-
-                processed_records.append(clean_record)
-                next_id += 1
-
-            # Append to existing data
-            existing_data.extend(processed_records)
-
-            # Save updated data
-            write_data(f'{category}.json', existing_data)
-
-            return jsonify({
-                'message': f'Successfully imported {len(processed_records)} records',
-                'imported_count': len(processed_records)
-            })
-
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+        return _start_excel_import(file, category)
 
     except Exception as e:
         return jsonify({'message': f'Import failed: {str(e)}'}), 500
@@ -3979,27 +4054,27 @@ def export_master_data(category):
         return jsonify({'message': 'Unauthorized'}), 403
 
     try:
+        try:
+            spec = export_service.collection_spec(category)
+        except ExportError:
+            return jsonify({'message': f'Invalid category: {category}'}), 400
+
         # Read data for the category
-        data = read_data(f'{category}.json')
+        data = read_data(spec['file'])
 
         if not data:
             return jsonify({'message': f'No data found for category: {category}'}), 404
 
-        # Create DataFrame
-        import pandas as pd
-        df = pd.DataFrame(data)
-
-        # Create Excel file in memory
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name=category, index=False)
-
+        # Stream rows into a write-only workbook on disk
+        columns = export_service.resolve_columns(spec, data)
+        output = tempfile.TemporaryFile()
+        export_service.write_xlsx(output, [(category, columns, export_service.iter_rows(data, columns))])
         output.seek(0)
 
         # Return file
         return send_file(
             output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            mimetype=XLSX_MIMETYPE,
             as_attachment=True,
             download_name=f'{category}_export.xlsx'
         )
@@ -4027,32 +4102,30 @@ def export_all_master_data():
             'authorizationSettings', 'printOrder'
         ]
 
-        # Create Excel file in memory
-        import pandas as pd
-        output = BytesIO()
-
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        def sheets():
             for category in categories:
                 try:
                     # Convert camelCase to snake_case for file names
                     file_name = ''.join(['_' + c.lower() if c.isupper() else c for c in category]).lstrip('_')
                     data = read_data(f'{file_name}.json')
-
-                    if data:
-                        df = pd.DataFrame(data)
-                        # Limit sheet name to 31 characters (Excel limit)
-                        sheet_name = category[:31]
-                        df.to_excel(writer, sheet_name=sheet_name, index=False)
                 except Exception as e:
                     print(f"Error processing category {category}: {e}")
                     continue
 
+                if data and isinstance(data, list):
+                    columns = export_service.resolve_columns({}, data)
+                    # Sheet names are limited to 31 characters (Excel limit)
+                    yield category[:31], columns, export_service.iter_rows(data, columns)
+
+        # One sheet at a time into a write-only workbook on disk
+        output = tempfile.TemporaryFile()
+        export_service.write_xlsx(output, sheets())
         output.seek(0)
 
         # Return file
         return send_file(
             output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            mimetype=XLSX_MIMETYPE,
             as_attachment=True,
             download_name='master_data_export.xlsx'
         )
@@ -4115,7 +4188,7 @@ def download_template(category):
 @admin_bp.route('/api/admin/master-data/bulk-import', methods=['POST'])
 @token_required
 def bulk_import_master_data():
-    """Bulk import multiple categories from Excel file"""
+    """Bulk import multiple categories from Excel file, one sheet per category (runs as a background job)"""
     # Check if user has admin privileges
     if request.current_user.get('role') not in ['admin', 'hub_admin']:
         return jsonify({'message': 'Unauthorized'}), 403
@@ -4129,85 +4202,7 @@ def bulk_import_master_data():
         if file.filename == '':
             return jsonify({'message': 'No file selected'}), 400
 
-        # Check file extension
-        if not file.filename.lower().endswith(('.xlsx', '.xls')):
-            return jsonify({'message': 'Invalid file format. Please upload an Excel file.'}), 400
-
-        # Save uploaded file temporarily
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(tempfile.gettempdir(), filename)
-        file.save(temp_path)
-
-        try:
-            # Read Excel file with all sheets
-            import pandas as pd
-            excel_file = pd.ExcelFile(temp_path)
-
-            results = {}
-            total_imported = 0
-
-            for sheet_name in excel_file.sheet_names:
-                try:
-                    # Read sheet
-                    df = pd.read_excel(temp_path, sheet_name=sheet_name)
-
-                    if df.empty:
-                        continue
-
-                    # Convert sheet name to file name
-                    category = sheet_name.lower().replace(' ', '_')
-
-                    # Convert DataFrame to list of dictionaries
-                    records = df.to_dict('records')
-
-                    # Process records
-                    processed_records = []
-                    existing_data = read_data(f'{category}.json')
-
-                    # Get next ID
-                    next_id = 1
-                    if existing_data:
-                        next_id = max(item.get('id', 0) for item in existing_data) + 1
-
-                    for record in records:
-                        # Clean the record (remove NaN values)
-                        clean_record = {}
-                        for key, value in record.items():
-                            if pd.notna(value):
-                                clean_record[key.lower().replace(' ', '_')] = value
-
-                        # Add metadata
-                        clean_record['id'] = next_id
-                        clean_record['is_active'] = clean_record.get('is_active', True)
-                        clean_record['created_at'] = datetime.now().isoformat()
-                        clean_record['updated_at'] = datetime.now().isoformat()
-                        clean_record['created_by'] = request.current_user.get('id', 1)
-
-                        processed_records.append(clean_record)
-                        next_id += 1
-
-                    # Append to existing data
-                    existing_data.extend(processed_records)
-
-                    # Save updated data
-                    write_data(f'{category}.json', existing_data)
-
-                    results[sheet_name] = len(processed_records)
-                    total_imported += len(processed_records)
-
-                except Exception as e:
-                    results[sheet_name] = f'Error: {str(e)}'
-
-            return jsonify({
-                'message': f'Bulk import completed. Total records imported: {total_imported}',
-                'results': results,
-                'total_imported': total_imported
-            })
-
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+        return _start_excel_import(file)
 
     except Exception as e:
         return jsonify({'message': f'Bulk import failed: {str(e)}'}), 500
@@ -4215,6 +4210,7 @@ def bulk_import_master_data():
 # Technical Master Data Routes
 @admin_bp.route('/api/admin/technical-master-data', methods=['GET'])
 @token_required
+@cached_response(*TECHNICAL_MASTER_DATA_FILES)
 def get_technical_master_data():
     """Get all technical master data"""
     try:
@@ -4284,6 +4280,7 @@ def get_technical_master_data():
 # Referral Master Data CRUD Operations
 @admin_bp.route('/api/admin/referral-master', methods=['GET'])
 @token_required
+@cached_response('referralPricingMaster.json')
 def get_referral_master():
     """Get all referral master data"""
     try:
@@ -4439,6 +4436,7 @@ def add_referral_master():
 
         # Save to file
         write_data('referralPricingMaster.json', referral_data)
+        response_cache.invalidate('referralPricingMaster.json')
 
         return jsonify({
             'success': True,
@@ -4537,6 +4535,7 @@ def update_referral_master(referral_id):
 
         # Save to file
         write_data('referralPricingMaster.json', referral_data)
+        response_cache.invalidate('referralPricingMaster.json')
 
         return jsonify({
             'success': True,
@@ -4583,6 +4582,7 @@ def delete_referral_master(referral_id):
 
         # Save to file
         write_data('referralPricingMaster.json', referral_data)
+        response_cache.invalidate('referralPricingMaster.json')
 
         return jsonify({
             'success': True,
@@ -4597,6 +4597,25 @@ def delete_referral_master(referral_id):
         }), 500
 
 # Price Scheme Master Import for Lab-to-Lab Pricing
+@admin_bp.route('/api/admin/price-scheme-master/import-file', methods=['POST'])
+@token_required
+def import_price_scheme_file():
+    """Import lab-to-lab pricing from an Excel file (runs as a background job)"""
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    try:
+        if 'file' not in request.files or request.files['file'].filename == '':
+            return jsonify({'success': False, 'message': 'No file uploaded'}), 400
+
+        return _start_excel_import(request.files['file'], 'price_scheme_master')
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error importing price scheme data: {str(e)}'
+        }), 500
+
 @admin_bp.route('/api/admin/price-scheme-master/import', methods=['POST'])
 @token_required
 def import_price_scheme_data():
@@ -4674,6 +4693,7 @@ def import_price_scheme_data():
 
         # Save updated data
         write_data('price_scheme_master.json', existing_data)
+        response_cache.invalidate('price_scheme_master.json')
 
         return jsonify({
             'success': True,
@@ -4869,6 +4889,7 @@ def create_result_master_item(data):
 
     result_master.append(new_item)
     write_data('result_master.json', result_master)
+    response_cache.invalidate('result_master.json')
 
     return jsonify(new_item), 201
 
@@ -4903,6 +4924,7 @@ def create_parameter_master_item(data):
 
     parameter_master.append(new_item)
     write_data('parameter_master.json', parameter_master)
+    response_cache.invalidate('parameter_master.json')
 
     return jsonify(new_item), 201
 
@@ -4937,6 +4959,7 @@ def create_instrument_master_item(data):
 
     instrument_master.append(new_item)
     write_data('instrument_master.json', instrument_master)
+    response_cache.invalidate('instrument_master.json')
 
     return jsonify(new_item), 201
 
@@ -4970,6 +4993,7 @@ def create_reagent_master_item(data):
 
     reagent_master.append(new_item)
     write_data('reagent_master.json', reagent_master)
+    response_cache.invalidate('reagent_master.json')
 
     return jsonify(new_item), 201
 
@@ -4991,6 +5015,7 @@ def update_result_master_item(item_id, data):
 
     item['updated_at'] = datetime.now().isoformat()
     write_data('result_master.json', result_master)
+    response_cache.invalidate('result_master.json')
     return jsonify(item)
 
 def update_parameter_master_item(item_id, data):
@@ -5010,6 +5035,7 @@ def update_parameter_master_item(item_id, data):
 
     item['updated_at'] = datetime.now().isoformat()
     write_data('parameter_master.json', parameter_master)
+    response_cache.invalidate('parameter_master.json')
     return jsonify(item)
 
 def update_instrument_master_item(item_id, data):
@@ -5029,6 +5055,7 @@ def update_instrument_master_item(item_id, data):
 
     item['updated_at'] = datetime.now().isoformat()
     write_data('instrument_master.json', instrument_master)
+    response_cache.invalidate('instrument_master.json')
     return jsonify(item)
 
 def update_reagent_master_item(item_id, data):
@@ -5048,6 +5075,7 @@ def update_reagent_master_item(item_id, data):
 
     item['updated_at'] = datetime.now().isoformat()
     write_data('reagent_master.json', reagent_master)
+    response_cache.invalidate('reagent_master.json')
     return jsonify(item)
 
 # Delete functions
@@ -5061,6 +5089,7 @@ def delete_result_master_item(item_id):
 
     deleted_item = result_master.pop(item_index)
     write_data('result_master.json', result_master)
+    response_cache.invalidate('result_master.json')
     return jsonify({'message': 'Result master item deleted successfully', 'deleted_item': deleted_item})
 
 def delete_parameter_master_item(item_id):
@@ -5073,6 +5102,7 @@ def delete_parameter_master_item(item_id):
 
     deleted_item = parameter_master.pop(item_index)
     write_data('parameter_master.json', parameter_master)
+    response_cache.invalidate('parameter_master.json')
     return jsonify({'message': 'Parameter master item deleted successfully', 'deleted_item': deleted_item})
 
 def delete_instrument_master_item(item_id):
@@ -5085,6 +5115,7 @@ def delete_instrument_master_item(item_id):
 
     deleted_item = instrument_master.pop(item_index)
     write_data('instrument_master.json', instrument_master)
+    response_cache.invalidate('instrument_master.json')
     return jsonify({'message': 'Instrument master item deleted successfully', 'deleted_item': deleted_item})
 
 def delete_reagent_master_item(item_id):
@@ -5097,6 +5128,7 @@ def delete_reagent_master_item(item_id):
 
     deleted_item = reagent_master.pop(item_index)
     write_data('reagent_master.json', reagent_master)
+    response_cache.invalidate('reagent_master.json')
     return jsonify({'message': 'Reagent master item deleted successfully', 'deleted_item': deleted_item})
 
 # Signature Management Routes
@@ -5286,16 +5318,9 @@ def search_excel_data():
         if not query:
             return jsonify({'data': []})
 
-        data = read_data('excel_test_data.json')
-
-        # Search by test name or test code
-        results = []
-        for item in data:
-            test_name = str(item.get('test_name', '')).lower()
-            test_code = str(item.get('test_code', '')).lower()
-
-            if query in test_name or query in test_code:
-                results.append(item)
+        # Ranked name/code matches from the in-memory index
+        result = test_search_service.search(query, ['excel'], limit=None)
+        results = [match['data'] for match in result['items']]
 
         return jsonify({'data': results})
     except Exception as e:
@@ -5309,12 +5334,9 @@ def lookup_test_by_code(test_code):
         # Format test code to 6 digits
         formatted_code = f"{int(test_code):06d}" if test_code.isdigit() else test_code
 
-        data = read_data('excel_test_data.json')
-
-        # Find test by code
-        for item in data:
-            if item.get('test_code') == formatted_code:
-                return jsonify({'data': item, 'found': True})
+        item = test_search_service.lookup_by_code('excel', formatted_code)
+        if item:
+            return jsonify({'data': item, 'found': True})
 
         return jsonify({'data': None, 'found': False})
     except Exception as e:
@@ -5325,13 +5347,10 @@ def lookup_test_by_code(test_code):
 def lookup_test_by_name(test_name):
     """Lookup test data by test name for auto-population"""
     try:
-        data = read_data('excel_test_data.json')
-
         # Find test by name (case insensitive)
-        test_name_lower = test_name.lower()
-        for item in data:
-            if item.get('test_name', '').lower() == test_name_lower:
-                return jsonify({'data': item, 'found': True})
+        item = test_search_service.lookup_by_name('excel', test_name)
+        if item:
+            return jsonify({'data': item, 'found': True})
 
         return jsonify({'data': None, 'found': False})
     except Exception as e:
@@ -5340,6 +5359,7 @@ def lookup_test_by_name(test_name):
 # Enhanced Test Master Routes
 @admin_bp.route('/api/admin/test-master-enhanced', methods=['GET'])
 @token_required
+@cached_response('test_master_enhanced.json')
 def get_enhanced_test_master():
     """Get enhanced test master data"""
     try:
@@ -5372,6 +5392,7 @@ def add_enhanced_test_master():
 
         # Save
         write_data('test_master_enhanced.json', existing_data)
+        response_cache.invalidate('test_master_enhanced.json')
 
         return jsonify({'data': data, 'message': 'Test master entry added successfully'})
     except Exception as e:
@@ -5440,6 +5461,7 @@ def update_enhanced_test_master(item_id):
 
                 # Save the updated data
                 write_data('test_master_enhanced.json', existing_data)
+                response_cache.invalidate('test_master_enhanced.json')
 
                 return jsonify({
                     'data': updated_data,
@@ -5484,6 +5506,7 @@ def update_enhanced_result_master(item_id):
 # Price Scheme Master Routes
 @admin_bp.route('/api/admin/price-scheme-master', methods=['GET'])
 @token_required
+@cached_response('price_scheme_master.json')
 def get_price_scheme_master():
     """Get all price scheme master data"""
     try:
@@ -5548,6 +5571,7 @@ def add_price_scheme_master():
 
         # Save
         write_data('price_scheme_master.json', existing_data)
+        response_cache.invalidate('price_scheme_master.json')
 
         return jsonify({'data': new_entry, 'message': 'Price scheme entry added successfully'})
     except Exception as e:
@@ -5588,6 +5612,7 @@ def update_price_scheme_master(item_id):
 
         # Save
         write_data('price_scheme_master.json', existing_data)
+        response_cache.invalidate('price_scheme_master.json')
 
         return jsonify({'data': item, 'message': 'Price scheme entry updated successfully'})
     except Exception as e:
@@ -5614,6 +5639,7 @@ def delete_price_scheme_master(item_id):
 
         # Save
         write_data('price_scheme_master.json', existing_data)
+        response_cache.invalidate('price_scheme_master.json')
 
         return jsonify({'message': 'Price scheme entry deleted successfully'})
     except Exception as e:
@@ -0,0 +1,106 @@
+"""
+Analytics Routes
+Ad-hoc group-by queries over the columnar billing/report snapshot
+"""
+
+from flask import Blueprint, request, jsonify
+from utils import token_required, get_accessible_tenant_ids
+from services.analytics_snapshot import analytics_snapshot, AnalyticsError
+
+analytics_bp = Blueprint('analytics', __name__)
+
+ANALYTICS_ROLES = ['admin', 'hub_admin', 'franchise_admin']
+MAX_QUERY_LIMIT = 10000
+
+def _list_param(value):
+    """Accept a list or a comma separated string"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(',') if part.strip()]
+    return [str(part) for part in value]
+
+def _query_params():
+    """Query definition from a JSON body (POST) or the query string (GET)"""
+    if request.method == 'POST':
+        return request.get_json(silent=True) or {}
+
+    params = request.args.to_dict()
+    params['filters'] = {
+        key[len('filter.'):]: _list_param(value)
+        for key, value in request.args.items() if key.startswith('filter.')
+    }
+    return params
+
+@analytics_bp.route('/api/analytics/tables', methods=['GET'])
+@token_required
+def get_analytics_tables():
+    """Tables available to /api/analytics/query with their dimensions and measures"""
+    if request.current_user.get('role') not in ANALYTICS_ROLES:
+        return jsonify({'message': 'Unauthorized'}), 403
+    if not analytics_snapshot.available():
+        return jsonify({'message': 'Analytics is unavailable: numpy is not installed'}), 503
+
+    try:
+        return jsonify({'tables': analytics_snapshot.describe()})
+    except Exception as e:
+        return jsonify({'message': f'Error describing analytics tables: {str(e)}'}), 500
+
+@analytics_bp.route('/api/analytics/query', methods=['GET', 'POST'])
+@token_required
+def run_analytics_query():
+    """
+    Sum measures over a snapshot table, optionally grouped.
+
+    Params (JSON body or query string): table, measures, group_by
+    (dimensions and/or day|month), filters ({dim: [values]} or
+    ``filter.<dim>=a,b``), date_from/date_to (YYYY-MM-DD), tenant_id,
+    order_by, descending (default true), limit.
+    """
+    if request.current_user.get('role') not in ANALYTICS_ROLES:
+        return jsonify({'message': 'Unauthorized'}), 403
+    if not analytics_snapshot.available():
+        return jsonify({'message': 'Analytics is unavailable: numpy is not installed'}), 503
+
+    params = _query_params()
+    table = params.get('table', 'billings')
+
+    filters = params.get('filters') or {}
+    if not isinstance(filters, dict):
+        return jsonify({'message': 'filters must be an object of dimension: [values]'}), 400
+    filters = {dim: _list_param(values) for dim, values in filters.items()}
+
+    try:
+        tenant_id = params.get('tenant_id')
+        tenant_id = int(tenant_id) if tenant_id not in (None, '') else None
+        limit = params.get('limit')
+        limit = min(int(limit), MAX_QUERY_LIMIT) if limit not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({'message': 'tenant_id and limit must be integers'}), 400
+
+    descending = params.get('descending', True)
+    if isinstance(descending, str):
+        descending = descending.lower() not in ('false', '0', 'no')
+
+    tenant_ids = get_accessible_tenant_ids(request.current_user, tenant_id)
+
+    try:
+        result = analytics_snapshot.query(
+            table,
+            measures=_list_param(params.get('measures')),
+            group_by=_list_param(params.get('group_by')),
+            filters=filters,
+            date_from=params.get('date_from'),
+            date_to=params.get('date_to'),
+            tenant_ids=tenant_ids,
+            order_by=params.get('order_by'),
+            descending=bool(descending),
+            limit=limit
+        )
+    except AnalyticsError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error running analytics query: {str(e)}'}), 500
+
+    result['table'] = table
+    return jsonify(result)
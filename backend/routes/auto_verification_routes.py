@@ -0,0 +1,120 @@
+"""
+Auto-Verification Routes
+Auto-verification rules, dry-run evaluation, batch release of reports
+passing every rule, and the instrument QC runs the QC rule relies on
+"""
+
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from utils import token_required, read_data, write_data
+from services.auto_verification import RULES_FILE, CompiledRules, auto_verifier
+from services.quality_control import qc_store
+
+auto_verification_bp = Blueprint('auto_verification', __name__)
+
+SEARCH_FIELDS = ['sid', 'patient_name', 'mobile', 'date_from', 'date_to']
+RELEASE_ROLES = ['admin', 'hub_admin', 'franchise_admin']
+
+def _filters(data):
+    """Search filters from a request body, or (None, error)"""
+    filters = data.get('filters') or {}
+    if not isinstance(filters, dict):
+        return None, 'filters must be an object'
+    return {k: v for k, v in filters.items() if k in SEARCH_FIELDS and v not in (None, '')}, None
+
+@auto_verification_bp.route('/api/auto-verification/rules', methods=['GET'])
+@token_required
+def get_rules():
+    return jsonify(read_data(RULES_FILE))
+
+@auto_verification_bp.route('/api/auto-verification/rules/<int:id>', methods=['PUT'])
+@token_required
+def update_rule(id):
+    """Change a rule's parameters or switch it on/off; the rule type is fixed"""
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    rules = read_data(RULES_FILE)
+    rule = next((r for r in rules if r.get('id') == id), None)
+    if rule is None:
+        return jsonify({'message': 'Rule not found'}), 404
+
+    data = request.get_json() or {}
+    updated = dict(rule)
+    updated.update({k: v for k, v in data.items() if k not in ['id', 'rule', 'created_at', 'created_by']})
+    try:
+        CompiledRules([updated])
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    updated['updated_at'] = datetime.now().isoformat()
+    rule.clear()
+    rule.update(updated)
+    write_data(RULES_FILE, rules)
+
+    return jsonify(rule)
+
+@auto_verification_bp.route('/api/auto-verification/evaluate', methods=['POST'])
+@token_required
+def evaluate_reports():
+    """Dry run: which unauthorized reports would be released, and why the others are held"""
+    filters, error = _filters(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'message': error}), 400
+
+    reports = auto_verifier.candidates(filters, request.current_user.get('tenant_id'),
+                                       request.current_user.get('role'))
+    decisions = auto_verifier.evaluate(reports)
+    return jsonify({
+        'checked': len(decisions),
+        'eligible': sum(1 for d in decisions if d['eligible']),
+        'decisions': decisions
+    })
+
+@auto_verification_bp.route('/api/auto-verification/release', methods=['POST'])
+@token_required
+def release_reports():
+    """
+    Approve every unauthorized report matching the filters that passes all
+    rules. Body: filters, notifyPatients (default false), renderPdfs
+    (default true).
+    """
+    if request.current_user.get('role') not in RELEASE_ROLES:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    data = request.get_json(silent=True) or {}
+    filters, error = _filters(data)
+    if error:
+        return jsonify({'message': error}), 400
+
+    summary = auto_verifier.release(filters, request.current_user,
+                                    notify_patients=bool(data.get('notifyPatients', False)),
+                                    render_pdfs=bool(data.get('renderPdfs', True)))
+    if summary is None:
+        return jsonify({'message': 'Failed to save released reports'}), 500
+    return jsonify(summary)
+
+@auto_verification_bp.route('/api/qc/runs', methods=['GET'])
+@token_required
+def get_qc_runs():
+    instrument_id = request.args.get('instrument_id', type=int)
+    runs = qc_store.runs(instrument_id)
+    return jsonify(sorted(runs, key=lambda run: run.get('run_at') or '', reverse=True))
+
+@auto_verification_bp.route('/api/qc/runs', methods=['POST'])
+@token_required
+def record_qc_run():
+    """Record a QC run: instrument_id, test (optional), level, value, target_mean, target_sd, lot_number, run_at"""
+    if request.current_user.get('role') not in ['admin', 'hub_admin', 'lab_tech']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    data = request.get_json() or {}
+    if data.get('instrument_id') is not None and \
+            not any(i.get('id') == data['instrument_id'] for i in read_data('instruments.json')):
+        return jsonify({'message': f"Instrument {data['instrument_id']} not found"}), 400
+    try:
+        run = qc_store.record_run(data, request.current_user.get('id'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify(run), 201
@@ -5,7 +5,7 @@ with franchise-based access control.
 """
 
 from flask import Blueprint, request, jsonify, make_response
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import sys
 import os
@@ -16,9 +16,12 @@ import json
 # Add the parent directory to the path to import services
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from services.billing_reports_service import BillingReportsService
-from services.pdf_report_generator import PDFReportGenerator
-from utils import token_required
+from services.billing_reports_service import BillingReportsService, ReportConflictError, report_etag, parse_revision
+from services.financial_rollups import report_rollups
+from services.report_pdf_cache import report_pdf_cache
+from services.patient_history import patient_history
+from services.report_side_effects import queue_authorization_side_effects
+from utils import token_required, read_data, write_data, get_accessible_tenant_ids
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -27,6 +30,8 @@ logger = logging.getLogger(__name__)
 # Create blueprint
 billing_reports_bp = Blueprint('billing_reports', __name__)
 
+MAX_CUMULATIVE_REPORTS = 6
+
 def safe_float(value, default=0):
     """Safely convert value to float, handling strings and None"""
     try:
@@ -38,7 +43,6 @@ def safe_float(value, default=0):
 
 # Initialize services
 reports_service = BillingReportsService()
-pdf_generator = PDFReportGenerator()
 
 @billing_reports_bp.route('/api/billing-reports/generate/<int:billing_id>', methods=['POST'])
 @token_required
@@ -248,16 +252,18 @@ def get_report_by_sid(sid_number):
                 test["sample_status"] = "Not Received"
             if "sample_received_timestamp" not in test:
                 test["sample_received_timestamp"] = None
-        
+        report.setdefault('revision', 0)
       
    
   
-        return jsonify({
+        response = jsonify({
             'success': True,
             'data': {
                 'data': report
             }
-        }), 200
+        })
+        response.headers['ETag'] = report_etag(report)
+        return response, 200
         
     except Exception as e:
         logger.error(f"Error retrieving report by SID {sid_number}: {str(e)}")
@@ -371,37 +377,26 @@ def get_reports_stats():
             # Hub admin can filter by franchises they have access to
             effective_tenant_id = franchise_id
 
-        # Get all accessible reports
-        all_reports = reports_service.search_reports({}, effective_tenant_id, user_role)
-        
-        # Calculate statistics
-        total_reports = len(all_reports)
-        total_amount = sum(safe_float(r.get('financial_summary', {}).get('total_amount', 0)) for r in all_reports)
-        
-        # Group by status
-        status_counts = {}
-        for report in all_reports:
-            status = report.get('metadata', {}).get('status', 'unknown')
-            status_counts[status] = status_counts.get(status, 0) + 1
-        
-        # Group by franchise
-        franchise_counts = {}
-        for report in all_reports:
-            clinic_name = report.get('clinic_info', {}).get('name', 'Unknown')
-            franchise_counts[clinic_name] = franchise_counts.get(clinic_name, 0) + 1
-        
+        # Statistics come from the report rollup tables
+        tenant_ids = reports_service.get_franchise_access_filter(effective_tenant_id, user_role)
+        totals = report_rollups.totals(tenant_ids)
+
+        total_reports = totals['billings']
+        total_amount = totals['net']
+        status_counts = totals.get('status', {})
+        franchise_counts = totals.get('clinic', {})
+
         # Recent reports (last 7 days)
-        from datetime import datetime, timedelta
         seven_days_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-        recent_reports = [r for r in all_reports if r.get('billing_date', '') >= seven_days_ago]
-        
+        recent_reports_count = report_rollups.totals(tenant_ids, seven_days_ago)['billings']
+
         return jsonify({
             'success': True,
             'data': {
                 'data': {
                     'total_reports': total_reports,
                     'total_amount': total_amount,
-                    'recent_reports_count': len(recent_reports),
+                    'recent_reports_count': recent_reports_count,
                     'status_distribution': status_counts,
                     'franchise_distribution': franchise_counts,
                     'user_access_level': 'all_franchises' if user_role == 'admin' or (user_tenant_id == 1 and user_role in ['admin', 'hub_admin']) else 'own_franchise'
@@ -419,7 +414,10 @@ def get_reports_stats():
 @billing_reports_bp.route('/api/billing-reports/<int:report_id>/pdf', methods=['GET'])
 @token_required
 def generate_report_pdf(report_id):
-    """Generate PDF for billing report"""
+    """
+    Generate PDF for billing report. ``cumulative=N`` adds a cumulative
+    results section with the patient's last N reports (at most 6).
+    """
     try:
         # Get user context
         user_tenant_id = request.current_user.get('tenant_id')
@@ -435,8 +433,15 @@ def generate_report_pdf(report_id):
                 'message': f'Report not found: {report_id}'
             }), 404
 
-        # Generate professional PDF content using PRABAGARAN format
-        pdf_content = pdf_generator.generate_prabagaran_format_pdf(report)
+        cumulative = request.args.get('cumulative', 0, type=int)
+        if cumulative > 0:
+            table = patient_history.cumulative_table(report, min(cumulative, MAX_CUMULATIVE_REPORTS),
+                                                     get_accessible_tenant_ids(request.current_user))
+            if table:
+                report = dict(report, cumulative_results=table)
+
+        # PRABAGARAN format PDF, re-rendered only when the report changed
+        pdf_content = report_pdf_cache.get_or_render(report)
 
         # Create response
         response = make_response(pdf_content)
@@ -466,8 +471,8 @@ def generate_report_pdf_by_sid(sid_number):
                 'message': f'Report not found for SID: {sid_number}'
             }), 404
 
-        # Generate professional PDF content using PRABAGARAN format
-        pdf_content = pdf_generator.generate_prabagaran_format_pdf(report)
+        # PRABAGARAN format PDF, re-rendered only when the report changed
+        pdf_content = report_pdf_cache.get_or_render(report)
 
         # Create response
         response = make_response(pdf_content)
@@ -519,15 +524,37 @@ def update_test_item(sid_number, test_index):
                 'message': 'No update data provided'
             }), 400
 
+        # Optional optimistic concurrency: If-Match carries the report ETag
+        expected_revision = None
+        if request.headers.get('If-Match'):
+            expected_revision = parse_revision(request.headers['If-Match'])
+            if expected_revision is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid If-Match header'
+                }), 400
+
         # Update the test item
-        updated_report = reports_service.update_test_item(sid_number, test_index, update_data, user_tenant_id, user_role)
+        try:
+            updated_report = reports_service.update_test_item(sid_number, test_index, update_data, user_tenant_id,
+                                                              user_role, expected_revision=expected_revision,
+                                                              user_id=request.current_user.get('id'))
+        except ReportConflictError as e:
+            return jsonify({
+                'success': False,
+                'message': 'Report was modified by another user; reload it and try again',
+                'conflicts': e.conflicts
+            }), 412
 
         if updated_report:
-            return jsonify({
+            response = jsonify({
                 'success': True,
                 'data': updated_report['test_items'][test_index],
+                'revision': updated_report['revision'],
                 'message': 'Test item updated successfully'
-            }), 200
+            })
+            response.headers['ETag'] = report_etag(updated_report)
+            return response, 200
         else:
             return jsonify({
                 'success': False,
@@ -541,6 +568,66 @@ def update_test_item(sid_number, test_index):
             'message': 'Internal server error during test item update'
         }), 500
 
+@billing_reports_bp.route('/api/billing-reports/results/batch', methods=['POST'])
+@token_required
+def enter_results_batch():
+    """
+    Enter many test results across reports in a single write.
+
+    Body: {"entries": [{"sid_number", "test_index" | "test_id", "value",
+    "flags", ...}], "revisions": {"<sid>": <revision or ETag>}}; test_id is the
+    test_master_id and must be unique on the report. Every report
+    touched needs the revision it was read at; if any report has changed
+    since, nothing is written and 409 lists the conflicts.
+    """
+    try:
+        user_tenant_id = request.current_user.get('tenant_id')
+        user_role = request.current_user.get('role')
+        user_id = request.current_user.get('id')
+
+        data = request.get_json(silent=True) or {}
+        entries = data.get('entries')
+        revisions = data.get('revisions') or {}
+        if not isinstance(entries, list) or not isinstance(revisions, dict):
+            return jsonify({
+                'success': False,
+                'message': 'entries must be a list and revisions an object of SID: revision'
+            }), 400
+
+        try:
+            summary, errors = reports_service.apply_result_batch(entries, revisions, user_tenant_id, user_role, user_id)
+        except ReportConflictError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e),
+                'conflicts': e.conflicts
+            }), 409
+
+        if errors:
+            return jsonify({
+                'success': False,
+                'message': f'{len(errors)} invalid entries; no results were saved',
+                'errors': errors
+            }), 400
+        if summary is None:
+            return jsonify({
+                'success': False,
+                'message': 'Failed to save results'
+            }), 500
+
+        return jsonify({
+            'success': True,
+            'data': summary,
+            'message': f"{summary['updated']} results saved"
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error entering result batch: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error during result entry'
+        }), 500
+
 @billing_reports_bp.route('/api/billing-reports/<int:report_id>/authorize', methods=['POST'])
 @token_required
 def authorize_report(report_id):
@@ -614,6 +701,109 @@ def authorize_report(report_id):
         }), 500
 
 
+@billing_reports_bp.route('/api/billing-reports/authorize/bulk', methods=['POST'])
+@token_required
+def authorize_reports_bulk():
+    """
+    Approve or reject many reports in one call.
+
+    Body: reportIds (list) and/or filters (sid, patient_name, mobile,
+    date_from, date_to, status; with reportIds, only the listed reports that
+    also match are decided), authorizerName, action (approve|reject),
+    comments (required for reject), notifyPatients (default false),
+    renderPdfs (default true). Reports are saved with a single write; audit
+    events, PDF pre-rendering and WhatsApp notifications run as a background
+    job reported in ``side_effects_job``.
+    """
+    try:
+        user_tenant_id = request.current_user.get('tenant_id')
+        user_role = request.current_user.get('role')
+        user_id = request.current_user.get('id')
+
+        auth_data = request.get_json(silent=True)
+        if not auth_data:
+            return jsonify({
+                'success': False,
+                'message': 'No authorization data provided'
+            }), 400
+
+        if not auth_data.get('authorizerName'):
+            return jsonify({
+                'success': False,
+                'message': 'Authorizer name is required'
+            }), 400
+
+        action = auth_data.get('action', 'approve')
+        if action not in ['approve', 'reject']:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid authorization action'
+            }), 400
+
+        if action == 'reject' and not auth_data.get('comments', '').strip():
+            return jsonify({
+                'success': False,
+                'message': 'Comments are required when rejecting a report'
+            }), 400
+
+        report_ids = auth_data.get('reportIds') or []
+        filters = auth_data.get('filters')
+        if not isinstance(report_ids, list) or (filters is not None and not isinstance(filters, dict)):
+            return jsonify({
+                'success': False,
+                'message': 'reportIds must be a list and filters an object'
+            }), 400
+        filters = {k: v for k, v in (filters or {}).items() if v not in (None, '')} or None
+        if not report_ids and not filters:
+            return jsonify({
+                'success': False,
+                'message': 'Provide reportIds or at least one filter'
+            }), 400
+
+        authorization_data = {
+            'authorizer_name': auth_data.get('authorizerName'),
+            'comments': auth_data.get('comments', ''),
+            'action': action,
+            'authorization_timestamp': auth_data.get('authorizationTimestamp') or datetime.utcnow().isoformat(),
+            'user_id': user_id,
+            'user_role': user_role
+        }
+        updated, skipped = reports_service.authorize_reports(report_ids, filters, user_tenant_id, user_role,
+                                                             authorization_data)
+        if updated is None:
+            return jsonify({
+                'success': False,
+                'message': f'Failed to {action} reports'
+            }), 500
+
+        side_effects_job = None
+        if updated:
+            job = queue_authorization_side_effects(
+                updated, authorization_data, request.current_user,
+                notify_patients=bool(auth_data.get('notifyPatients', False)),
+                render_pdfs=bool(auth_data.get('renderPdfs', True))
+            )
+            side_effects_job = {'job_id': job['id'], 'status_url': f"/api/jobs/{job['id']}"}
+
+        return jsonify({
+            'success': True,
+            'message': f'{len(updated)} reports {action}d',
+            'data': {
+                'updated': [{'id': r.get('id'), 'sid_number': r.get('sid_number'), 'revision': r.get('revision')}
+                            for r in updated],
+                'skipped': skipped,
+                'side_effects_job': side_effects_job
+            }
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error in bulk report authorization: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error during bulk authorization'
+        }), 500
+
+
 @billing_reports_bp.route('/api/billing-reports/sid/<sid_number>', methods=['PUT'])
 @token_required
 def update_billing_report(sid_number):
@@ -668,36 +858,64 @@ def update_sample_status_by_sid(sid_number):
     test_items = data['test_items']
 
     try:
-        with open('data/billing_reports.json', 'r') as f:
-            billing_data = json.load(f)
-
-        # Use .get() to avoid KeyErrors
-        report = next((item for item in billing_data if item.get('sid_number') == sid_number), None)
+        report = reports_service.update_sample_status(
+            sid_number, test_items,
+            request.current_user.get('tenant_id'), request.current_user.get('role')
+        )
         if not report:
             return jsonify({'error': 'SID not found'}), 404
 
-        existing_tests = report.get('test_items', [])
-        existing_tests_dict = {str(item.get('id')): item for item in existing_tests}
+        response = jsonify({'message': 'Sample status updated successfully'})
+        response.headers['ETag'] = report_etag(report)
+        return response, 200
 
-        for update_item in test_items:
-            uid = str(update_item.get('id'))
-            if uid in existing_tests_dict:
-                # Update existing test item
-                existing_item = existing_tests_dict[uid]
-                existing_item['sample_status'] = update_item.get('sample_status', existing_item.get('sample_status'))
-                existing_item['sample_received'] = update_item.get('sample_received', existing_item.get('sample_received'))
-                existing_item['sample_received_timestamp'] = update_item.get('sample_received_timestamp', existing_item.get('sample_received_timestamp'))
-                existing_item['sample_status_updated_at'] = update_item.get('sample_status_updated_at', existing_item.get('sample_status_updated_at'))
-            else:
-                # Add new test item to the list
-                existing_tests.append(update_item)
+    except Exception as e:
+        logger.error(f"Error updating sample status for SID {sid_number}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-        # Save back updated billing data
-        with open('data/billing_reports.json', 'w') as f:
-            json.dump(billing_data, f, indent=2)
+@billing_reports_bp.route('/api/billing-reports/flags/recompute', methods=['POST'])
+@token_required
+def recompute_result_flags():
+    """
+    Re-evaluate H/L/critical flags against the current reference ranges.
 
-        return jsonify({'message': 'Sample status updated successfully'}), 200
+    Body: filters as for bulk authorization (sid, patient_name, mobile,
+    date_from, date_to, status); with none given, today's reports.
+    """
+    try:
+        if request.current_user.get('role') not in ['admin', 'hub_admin']:
+            return jsonify({
+                'success': False,
+                'message': 'Unauthorized'
+            }), 403
+
+        filters = (request.get_json(silent=True) or {}).get('filters') or {}
+        if not isinstance(filters, dict):
+            return jsonify({
+                'success': False,
+                'message': 'filters must be an object'
+            }), 400
+        filters = {k: v for k, v in filters.items() if v not in (None, '')}
+        if not filters:
+            today = datetime.now().strftime('%Y-%m-%d')
+            filters = {'date_from': today, 'date_to': today}
+
+        summary = reports_service.reflag_reports(filters, request.current_user.get('tenant_id'),
+                                                 request.current_user.get('role'))
+        if summary is None:
+            return jsonify({
+                'success': False,
+                'message': 'Failed to save result flags'
+            }), 500
+
+        return jsonify({
+            'success': True,
+            'data': dict(summary, filters=filters)
+        }), 200
 
     except Exception as e:
-        traceback.print_exc()
-        return jsonify({'error': str(e)}), 500
+        logger.error(f"Error recomputing result flags: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error while recomputing result flags'
+        }), 500
@@ -7,6 +7,13 @@ from functools import wraps
 
 # Import utilities
 from utils import token_required, read_data, write_data, paginate_results, filter_data_by_tenant, check_tenant_access
+from services.test_search_service import test_search_service
+from services.response_cache import response_cache, cached_response
+from services.patient_ledger import patient_ledger
+from services.financial_rollups import billing_rollups
+from services.analytics_snapshot import analytics_snapshot
+from services.patient_search_index import patient_search_index
+from services.inventory_ledger import inventory_ledger
 
 # Import centralized SID generator
 try:
@@ -35,6 +42,18 @@ def safe_float(value, default=0):
     except (ValueError, TypeError):
         return default
 
+def billing_written(billing):
+    """Bring the billing indexes up to date after a billing was saved to billings.json"""
+    patient_ledger.record_billing(billing)
+    billing_rollups.record(billing)
+    analytics_snapshot.record_billing(billing)
+
+def billing_deleted(billing_id):
+    """Drop a billing from the billing indexes after it was removed from billings.json"""
+    patient_ledger.remove_billing(billing_id)
+    billing_rollups.remove(billing_id)
+    analytics_snapshot.remove_billing(billing_id)
+
 def generate_franchise_sid(tenant_id):
     """Generate franchise-specific SID using centralized SIDGenerator to prevent duplicates"""
     if SID_GENERATOR_AVAILABLE:
@@ -156,6 +175,7 @@ def delete_billing_report(id):
     # Remove and save
     deleted_item = billing_data.pop(billing_index)
     write_data('billings.json', billing_data)
+    billing_deleted(deleted_item.get('id'))
 
     return jsonify({'success': True, 'message': 'Billing report deleted successfully', 'item': deleted_item}), 200
 
@@ -183,6 +203,7 @@ def update_billing_report(id):
 
     # Save changes back to the file
     write_data('billings.json', billing_data)
+    billing_written(billing_data[billing_index])
 
     return jsonify({
         'success': True,
@@ -507,6 +528,7 @@ def create_billing():
             # Save new patient
             patients.append(new_patient)
             write_data('patients.json', patients)
+            response_cache.invalidate('patients.json')
 
             # Use the newly created patient ID for billing
             patient_id = new_patient_id
@@ -611,6 +633,13 @@ def create_billing():
 
     billings.append(new_billing)
     write_data('billings.json', billings)
+    billing_written(new_billing)
+
+    # Reagents and consumables used by the billed tests, one ledger batch per billing
+    try:
+        inventory_ledger.consume_for_billing(new_billing, user_id=request.current_user.get('id'))
+    except Exception as e:
+        print(f"✗ Failed to record inventory consumption for billing {new_billing['id']}: {str(e)}")
 
     # Automatically generate comprehensive billing report
     if REPORTS_SERVICE_AVAILABLE:
@@ -698,6 +727,7 @@ def update_billing(id):
     billing['updated_at'] = datetime.now().isoformat()
 
     write_data('billings.json', billings)
+    billing_written(billing)
 
     return jsonify({
         "message": "Billing record updated successfully",
@@ -772,6 +802,7 @@ def collect_payment(id):
 
     # Save updated billings
     write_data('billings.json', billings)
+    billing_written(billing)
 
     return jsonify(billing)
 
@@ -914,35 +945,22 @@ def get_due_amounts():
         sid_number = request.args.get('sid_number', '').strip()
         branch_id = request.args.get('branch_id')
 
-        # Load billing data
-        billings = read_data('billings.json')
-        patients = read_data('patients.json')
-
-        # Filter billings with outstanding amounts
+        # Outstanding billings come from the patient ledger's due index
         due_billings = []
 
-        for billing in billings:
-            # Calculate due amount
-            total_amount = float(billing.get('total_amount', 0))
-            paid_amount = float(billing.get('paid_amount', 0))
-            due_amount = total_amount - paid_amount
-
-            # Skip if no due amount
-            if due_amount <= 0:
-                continue
-
+        for entry in patient_ledger.due_entries():
             # Apply filters
-            if patient_id and str(billing.get('patient_id')) != str(patient_id):
+            if patient_id and str(entry.get('patient_id')) != str(patient_id):
                 continue
 
-            if sid_number and billing.get('sid_number', '').lower() != sid_number.lower():
+            if sid_number and (entry.get('sid_number') or '').lower() != sid_number.lower():
                 continue
 
-            if branch_id and str(billing.get('tenant_id')) != str(branch_id):
+            if branch_id and str(entry.get('tenant_id')) != str(branch_id):
                 continue
 
             # Get patient details
-            patient = next((p for p in patients if p.get('id') == billing.get('patient_id')), None)
+            patient = patient_search_index.get(entry.get('patient_id'))
             if not patient:
                 continue
 
@@ -958,18 +976,18 @@ def get_due_amounts():
 
             # Add to results
             due_billings.append({
-                'billing_id': billing.get('id'),
-                'sid_number': billing.get('sid_number'),
-                'patient_id': billing.get('patient_id'),
+                'billing_id': entry['billing_id'],
+                'sid_number': entry.get('sid_number'),
+                'patient_id': entry.get('patient_id'),
                 'patient_name': f"{patient.get('first_name', '')} {patient.get('last_name', '')}".strip(),
                 'patient_mobile': patient.get('phone', ''),
-                'billing_date': billing.get('created_at', ''),
-                'total_amount': total_amount,
-                'paid_amount': paid_amount,
-                'due_amount': due_amount,
-                'payment_status': 'Partial' if paid_amount > 0 else 'Pending',
-                'items': billing.get('items', []),
-                'tenant_id': billing.get('tenant_id')
+                'billing_date': entry.get('billing_date', ''),
+                'total_amount': entry['total_amount'],
+                'paid_amount': entry['paid_amount'],
+                'due_amount': entry['due_amount'],
+                'payment_status': 'Partial' if entry['paid_amount'] > 0 else 'Pending',
+                'items': entry.get('items', []),
+                'tenant_id': entry.get('tenant_id')
             })
 
         # Sort by due amount descending
@@ -1044,6 +1062,7 @@ def process_due_payment():
 
         # Save updated billing data
         write_data('billings.json', billings)
+        billing_written(billing)
 
         return jsonify({
             'message': 'Payment processed successfully',
@@ -1062,34 +1081,12 @@ def process_due_payment():
 def get_payment_history(patient_id):
     """Get complete payment history for a patient"""
     try:
-        billings = read_data('billings.json')
-        patients = read_data('patients.json')
-
         # Get patient details
-        patient = next((p for p in patients if p.get('id') == patient_id), None)
+        patient = patient_search_index.get(patient_id)
         if not patient:
             return jsonify({'message': 'Patient not found'}), 404
 
-        # Get all billings for this patient
-        patient_billings = [b for b in billings if b.get('patient_id') == patient_id]
-
-        payment_history = []
-        for billing in patient_billings:
-            history = billing.get('payment_history', [])
-            for payment in history:
-                payment_history.append({
-                    'billing_id': billing.get('id'),
-                    'sid_number': billing.get('sid_number'),
-                    'payment_date': payment.get('payment_date'),
-                    'amount': payment.get('amount'),
-                    'method': payment.get('method'),
-                    'reference': payment.get('reference'),
-                    'notes': payment.get('notes'),
-                    'remaining_due': payment.get('remaining_due')
-                })
-
-        # Sort by payment date descending
-        payment_history.sort(key=lambda x: x['payment_date'], reverse=True)
+        payment_history = patient_ledger.payment_history(patient_id)
 
         return jsonify({
             'patient_id': patient_id,
@@ -1100,6 +1097,28 @@ def get_payment_history(patient_id):
     except Exception as e:
         return jsonify({'message': f'Error fetching payment history: {str(e)}'}), 500
 
+@billing_bp.route('/api/billing/patient-ledger/<int:patient_id>', methods=['GET'])
+@token_required
+def get_patient_ledger(patient_id):
+    """Get billed/paid/due/refunded totals and billing entries for a patient"""
+    try:
+        patient = patient_search_index.get(patient_id)
+        if not patient:
+            return jsonify({'message': 'Patient not found'}), 404
+
+        if not check_tenant_access(patient.get('tenant_id'), request.current_user):
+            return jsonify({'message': 'Access denied'}), 403
+
+        account = patient_ledger.account(patient_id) or {
+            'patient_id': patient_id, 'billed': 0, 'paid': 0, 'due': 0, 'refunded': 0,
+            'billing_count': 0, 'last_billing_date': '', 'billings': []
+        }
+        account['patient_name'] = f"{patient.get('first_name', '')} {patient.get('last_name', '')}".strip()
+        return jsonify(account)
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching patient ledger: {str(e)}'}), 500
+
 @billing_bp.route('/api/billing/refund', methods=['POST'])
 @token_required
 def process_refund():
@@ -1174,6 +1193,7 @@ def process_refund():
 
         # Save updated billing data
         write_data('billings.json', billings)
+        billing_written(billing)
 
         response_data = {
             'message': 'Refund request created successfully',
@@ -1227,6 +1247,7 @@ def approve_refund(billing_id, refund_id):
 
         # Save updated billing data
         write_data('billings.json', billings)
+        billing_written(billing)
 
         return jsonify({
             'message': 'Refund approved successfully',
@@ -1383,6 +1404,7 @@ def validate_billing():
 
 @billing_bp.route('/api/billing/test-master', methods=['GET'])
 @token_required
+@cached_response('test_master.json')
 def get_test_master():
     """Get test master data for billing test selection"""
     try:
@@ -1426,20 +1448,11 @@ def search_test_master():
         department = request.args.get('department', '').lower()
         limit = request.args.get('limit', 50, type=int)
 
-        test_master = read_data('test_master.json')
+        result = test_search_service.search(query, ['test_master'], department, limit=limit)
 
-        # Filter tests based on search criteria
         filtered_tests = []
-        for test in test_master:
-            test_name = test.get('testName', '').lower()
-            test_dept = test.get('department', '').lower()
-
-            # Apply filters
-            if query and query not in test_name:
-                continue
-            if department and department not in test_dept:
-                continue
-
+        for match in result['items']:
+            test = match['data']
             filtered_tests.append({
                 'id': test.get('id'),
                 'testName': test.get('testName'),
@@ -1454,9 +1467,6 @@ def search_test_master():
                 'cutoffTime': test.get('cutoffTime')
             })
 
-        # Limit results
-        filtered_tests = filtered_tests[:limit]
-
         return jsonify({
             'success': True,
             'data': filtered_tests,
@@ -1589,26 +1599,15 @@ def add_test_to_billing(id):
     # Save billings
     billings[billing_index] = billing
     write_data('billings.json', billings)
+    billing_written(billing)
 
     # Update billing reports
-    billing_reports = read_data('billing_reports.json')
-    report_index = next((i for i, r in enumerate(billing_reports) if r.get('billing_id') == id), None)
-    if report_index is not None:
-        report = billing_reports[report_index]
-        report.setdefault('test_items', [])
-        report.setdefault('financial_summary', {})
-
-        existing_report_ids = [t.get('id', 0) for t in report['test_items']]
-        current_id_base = max(existing_report_ids, default=0) + 1
-
-        for idx, test in enumerate(new_tests):
+    if REPORTS_SERVICE_AVAILABLE:
+        report_items = []
+        for test in new_tests:
             camel_selected_test_data = to_camel_case(test.get('selectedTestData', {}))
             test_master = camel_selected_test_data or {}
-            reference_range_val = test.get('reference_range') or test_master.get('referenceRange', '')
-            result_unit_val = test.get('result_unit') or test_master.get('resultUnit', '')
-
-            report['test_items'].append({
-                "id": current_id_base + idx,
+            report_items.append({
                 "test_name": test.get('name', ''),
                 "amount": test.get('amount', 0),
                 "price": test.get('amount', 0),
@@ -1616,31 +1615,13 @@ def add_test_to_billing(id):
                 "sample_received": False,
                 "sample_received_timestamp": None,
                 "sample_status": "Not Received",
-                "referenceRange": reference_range_val,
-                "resultUnit": result_unit_val,
+                "referenceRange": test.get('reference_range') or test_master.get('referenceRange', ''),
+                "resultUnit": test.get('result_unit') or test_master.get('resultUnit', ''),
                 "test_master_data": camel_selected_test_data
             })
-
-        subtotal_report = sum(item.get('amount', 0) for item in report['test_items'])
-        tax_amount_report = (subtotal_report - discount) * (tax_rate / 100)
-        net_amount_report = subtotal_report - discount + tax_amount_report
-
-        report['financial_summary'].update({
-            "bill_amount": subtotal_report,
-            "subtotal": subtotal_report,
-            "discount_amount": discount,
-            "discount_percent": 0,
-            "gst_rate": tax_rate,
-            "gst_amount": tax_amount_report,
-            "total_amount": net_amount_report,
-            "paid_amount": billing.get('paid_amount', 0),
-            "balance": net_amount_report - billing.get('paid_amount', 0),
-            "other_charges": report['financial_summary'].get('other_charges', 0)
-        })
-
-        report['updated_at'] = datetime.now().isoformat()
-        billing_reports[report_index] = report
-        write_data('billing_reports.json', billing_reports)
+        BillingReportsService().add_billing_tests(
+            id, report_items, discount, tax_rate, safe_float(billing.get('paid_amount', 0))
+        )
 
     return jsonify({
         "data": {
@@ -1713,6 +1694,7 @@ def add_test_to_billing(id):
     # Save billings
     billings[billing_index] = billing
     write_data('billings.json', billings)
+    billing_written(billing)
 
     # Update billing reports
     billing_reports = read_data('billing_reports.json')
@@ -1832,6 +1814,7 @@ def add_test_to_billing(id):
 
     billings[billing_index] = billing
     write_data('billings.json', billings)
+    billing_written(billing)
 
     # Update billing report
     billing_reports = read_data('billing_reports.json')
@@ -1954,6 +1937,7 @@ def add_test_to_billing(id):
 
     billings[billing_index] = billing
     write_data('billings.json', billings)
+    billing_written(billing)
 
     billing_reports = read_data('billing_reports.json')
     report_index = next((i for i, r in enumerate(billing_reports) if r.get('billing_id') == id), None)
@@ -0,0 +1,106 @@
+"""
+Export Routes
+CSV/Excel exports of billings, billing reports and master data
+"""
+
+import os
+import tempfile
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context
+from utils import token_required
+from services.export_service import (
+    export_service, EXPORT_COLLECTIONS, FORMATS, ExportError, parse_date,
+    XLSX_MIMETYPE, CSV_MIMETYPE
+)
+from services.background_jobs import job_manager
+
+export_bp = Blueprint('exports', __name__)
+
+# Exports with more source records than this run as background jobs
+EXPORT_SYNC_ROW_LIMIT = int(os.environ.get('EXPORT_SYNC_ROW_LIMIT', 10000))
+
+@export_bp.route('/api/exports', methods=['GET'])
+@token_required
+def get_export_collections():
+    """List the named export collections available to the user"""
+    role = request.current_user.get('role')
+    return jsonify({
+        'formats': list(FORMATS),
+        'collections': [
+            {'name': name, 'date_field': spec['date_field'], 'columns': spec['columns']}
+            for name, spec in EXPORT_COLLECTIONS.items() if role in spec['roles']
+        ]
+    })
+
+@export_bp.route('/api/exports/<collection>', methods=['GET'])
+@token_required
+def export_collection(collection):
+    """
+    Export a collection.
+
+    Query params: format (csv|xlsx), columns (comma separated, dotted paths
+    allowed), date_from/date_to (YYYY-MM-DD), tenant_id, async=true to force
+    a background job.
+    """
+    current_user = request.current_user
+    try:
+        spec = export_service.collection_spec(collection)
+        if not export_service.can_export(spec, current_user):
+            return jsonify({'message': 'Unauthorized'}), 403
+
+        fmt = request.args.get('format', 'csv').lower()
+        if fmt not in FORMATS:
+            return jsonify({'message': f"Invalid format. Use one of: {', '.join(FORMATS)}"}), 400
+
+        filters = {
+            'tenant_id': request.args.get('tenant_id', type=int),
+            'date_from': parse_date(request.args.get('date_from')),
+            'date_to': parse_date(request.args.get('date_to'))
+        }
+        columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()] or None
+
+        records = export_service.load_records(spec, current_user, filters)
+        columns = export_service.resolve_columns(spec, records, columns)
+        filename = export_service.export_filename(collection, fmt)
+
+        def rows():
+            return export_service.iter_rows(records, columns, spec['date_field'],
+                                            filters['date_from'], filters['date_to'])
+
+        if request.args.get('async') == 'true' or len(records) > EXPORT_SYNC_ROW_LIMIT:
+            def run_export(job):
+                job.progress(0, len(records), f'Exporting {collection}')
+                count = export_service.export_to_file(
+                    job.path(filename), fmt, collection, columns, rows(),
+                    progress=lambda n: job.progress(n, len(records))
+                )
+                job.add_file('export', filename, CSV_MIMETYPE if fmt == 'csv' else XLSX_MIMETYPE)
+                job.progress(count, count)
+                return {'rows': count, 'columns': columns, 'filename': filename}
+
+            job = job_manager.submit(
+                'export', run_export,
+                params=dict(filters, collection=collection, format=fmt),
+                user_id=current_user.get('id'), tenant_id=current_user.get('tenant_id')
+            )
+            return jsonify({
+                'message': 'Export started',
+                'job_id': job['id'],
+                'status': job['status'],
+                'status_url': f"/api/jobs/{job['id']}",
+                'download_url': f"/api/jobs/{job['id']}/files/export"
+            }), 202
+
+        headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+        if fmt == 'csv':
+            return Response(stream_with_context(export_service.csv_chunks(columns, rows())),
+                            mimetype=CSV_MIMETYPE, headers=headers)
+
+        output = tempfile.TemporaryFile()
+        export_service.write_xlsx(output, [(collection, columns, rows())])
+        output.seek(0)
+        return send_file(output, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=filename)
+
+    except ExportError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Export failed: {str(e)}'}), 500
@@ -0,0 +1,191 @@
+"""
+Formula Routes
+Calculated-parameter formulas (calculation_formulas.json), expression
+testing and the bulk recompute job for existing reports
+"""
+
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from utils import token_required, read_data, write_data, DATA_DIR
+from services.background_jobs import job_manager
+from services.billing_reports_service import BillingReportsService
+from services.formula_engine import (
+    FORMULAS_FILE, FormulaEngine, FormulaError, Formula, catalogue_keys, formula_engine
+)
+
+formula_bp = Blueprint('formula', __name__)
+
+FORMULA_FIELDS = ['name', 'target', 'expression', 'inputs', 'decimals', 'description', 'is_active']
+SEARCH_FIELDS = ['sid', 'patient_name', 'mobile', 'date_from', 'date_to', 'status']
+
+def _validate_formula(formula, formulas):
+    """
+    Error message if the formula does not compile, names a test missing from
+    the test catalogues (it could never fire) or breaks the dependency
+    graph, else None
+    """
+    try:
+        compiled = Formula(formula)
+    except FormulaError as e:
+        return str(e)
+    known = catalogue_keys()
+    references = [formula.get('target')] + list((formula.get('inputs') or {}).values())
+    unknown = [str(reference) for reference, key in zip(references, [compiled.target] + list(compiled.inputs.values()))
+               if key not in known]
+    if unknown:
+        return f"Unknown tests: {', '.join(unknown)}"
+    others = [f for f in formulas if f.get('id') != formula.get('id')]
+    _, errors = FormulaEngine.build(others + [formula])
+    for error in errors:
+        if error['id'] == formula.get('id'):
+            return error['message']
+    return None
+
+@formula_bp.route('/api/formulas', methods=['GET'])
+@token_required
+def get_formulas():
+    """Formulas, with the ones currently skipped by the engine and why"""
+    formula_engine.formulas()
+    return jsonify({'formulas': read_data(FORMULAS_FILE), 'errors': formula_engine.errors})
+
+@formula_bp.route('/api/formulas', methods=['POST'])
+@token_required
+def create_formula():
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    data = request.get_json() or {}
+    formulas = read_data(FORMULAS_FILE)
+    new_formula = {field: data[field] for field in FORMULA_FIELDS if field in data}
+    new_formula['id'] = max((f['id'] for f in formulas), default=0) + 1
+    new_formula.setdefault('is_active', True)
+
+    error = _validate_formula(new_formula, formulas)
+    if error:
+        return jsonify({'message': error}), 400
+
+    new_formula.update({
+        'created_at': datetime.now().isoformat(),
+        'updated_at': datetime.now().isoformat(),
+        'created_by': request.current_user.get('id')
+    })
+    formulas.append(new_formula)
+    write_data(FORMULAS_FILE, formulas)
+
+    return jsonify(new_formula), 201
+
+@formula_bp.route('/api/formulas/<int:id>', methods=['PUT'])
+@token_required
+def update_formula(id):
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    formulas = read_data(FORMULAS_FILE)
+    formula = next((f for f in formulas if f.get('id') == id), None)
+    if formula is None:
+        return jsonify({'message': 'Formula not found'}), 404
+
+    data = request.get_json() or {}
+    updated = dict(formula)
+    for field in FORMULA_FIELDS:
+        if field in data:
+            updated[field] = data[field]
+    error = _validate_formula(updated, formulas)
+    if error:
+        return jsonify({'message': error}), 400
+
+    updated['updated_at'] = datetime.now().isoformat()
+    formula.update(updated)
+    write_data(FORMULAS_FILE, formulas)
+
+    return jsonify(formula)
+
+@formula_bp.route('/api/formulas/<int:id>', methods=['DELETE'])
+@token_required
+def delete_formula(id):
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    formulas = read_data(FORMULAS_FILE)
+    remaining = [f for f in formulas if f.get('id') != id]
+    if len(remaining) == len(formulas):
+        return jsonify({'message': 'Formula not found'}), 404
+    write_data(FORMULAS_FILE, remaining)
+
+    return jsonify({'message': 'Formula deleted successfully'})
+
+@formula_bp.route('/api/formulas/evaluate', methods=['POST'])
+@token_required
+def evaluate_formula():
+    """
+    Try an expression without saving it.
+
+    Body: expression, inputs (symbol -> test), values (symbol -> number),
+    optional age/female/male and decimals.
+    """
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    data = request.get_json() or {}
+    draft = {field: data[field] for field in ['expression', 'inputs', 'decimals'] if field in data}
+    draft['target'] = data.get('target') or '__draft__'
+    try:
+        formula = Formula(draft)
+    except FormulaError as e:
+        return jsonify({'message': str(e)}), 400
+
+    values = data.get('values') or {}
+    env = {name: data.get(name) for name in ['age', 'female', 'male']}
+    env.update({symbol: values.get(symbol) for symbol in formula.inputs})
+    if any(v is not None and (isinstance(v, bool) or not isinstance(v, (int, float))) for v in env.values()):
+        return jsonify({'message': 'values, age, female and male must be numbers'}), 400
+
+    try:
+        value = formula.evaluate(env, strict=True)
+    except FormulaError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'value': value, 'result': formula.format(value) if value is not None else None})
+
+@formula_bp.route('/api/formulas/recompute', methods=['POST'])
+@token_required
+def recompute_formulas():
+    """
+    Fill in calculated parameters on existing reports as a background job.
+
+    Body: filters (sid, patient_name, mobile, date_from, date_to, status),
+    overwrite (replace results entered by hand, default false),
+    includeAuthorized (default false).
+    """
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    data = request.get_json(silent=True) or {}
+    filters = data.get('filters') or {}
+    if not isinstance(filters, dict):
+        return jsonify({'message': 'filters must be an object'}), 400
+    filters = {k: v for k, v in filters.items() if k in SEARCH_FIELDS and v not in (None, '')}
+    overwrite = bool(data.get('overwrite', False))
+    include_authorized = bool(data.get('includeAuthorized', False))
+    user = request.current_user
+
+    def run(job):
+        summary = BillingReportsService(DATA_DIR).recompute_formulas(
+            filters, user.get('tenant_id'), user.get('role'), overwrite=overwrite,
+            include_authorized=include_authorized,
+            progress=lambda processed, total: job.progress(processed, total, 'Recomputing calculated parameters')
+        )
+        if summary is None:
+            raise RuntimeError('Failed to save recomputed reports')
+        return summary
+
+    job = job_manager.submit(
+        'formula_recompute', run,
+        params={'filters': filters, 'overwrite': overwrite, 'include_authorized': include_authorized},
+        user_id=user.get('id'), tenant_id=user.get('tenant_id')
+    )
+    return jsonify({
+        'message': 'Recompute started',
+        'job_id': job['id'],
+        'status': job['status'],
+        'status_url': f"/api/jobs/{job['id']}"
+    }), 202
@@ -0,0 +1,132 @@
+"""
+Instrument Routes
+Instrument gateway status and the channel code -> test master mapping
+"""
+
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from utils import token_required, read_data, write_data
+from services.instrument_gateway import instrument_gateway
+
+instrument_bp = Blueprint('instrument', __name__)
+
+CHANNELS_FILE = 'instrument_channels.json'
+
+def _validate_channel(data, channels, channel_id=None):
+    """Return an error message for an invalid mapping, or None"""
+    for field in ['channel_code', 'test_master_id']:
+        if not data.get(field):
+            return f'Missing required field: {field}'
+
+    instrument_id = data.get('instrument_id')
+    if instrument_id is not None and not any(i.get('id') == instrument_id for i in read_data('instruments.json')):
+        return f'Instrument {instrument_id} not found'
+    if not any(t.get('id') == data['test_master_id'] for t in read_data('test_master.json')):
+        return f"Test {data['test_master_id']} not found in test master"
+
+    code = str(data['channel_code']).strip().upper()
+    for channel in channels:
+        if channel.get('id') != channel_id and channel.get('instrument_id') == instrument_id \
+                and str(channel.get('channel_code', '')).strip().upper() == code:
+            return f"Channel {data['channel_code']} is already mapped for this instrument"
+    return None
+
+@instrument_bp.route('/api/instruments/gateway', methods=['GET'])
+@token_required
+def get_gateway_status():
+    """Listeners, buffer, commit statistics and recently rejected results"""
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+    return jsonify(instrument_gateway.status())
+
+@instrument_bp.route('/api/instruments/gateway/flush', methods=['POST'])
+@token_required
+def flush_gateway():
+    """Commit buffered instrument results now"""
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+    if not instrument_gateway.status()['running']:
+        return jsonify({'message': 'Instrument gateway is not running'}), 409
+
+    summary = instrument_gateway.flush()
+    return jsonify({'committed': summary['updated'] if summary else 0, 'summary': summary})
+
+@instrument_bp.route('/api/instruments/channels', methods=['GET'])
+@token_required
+def get_instrument_channels():
+    """Channel mappings, optionally for one instrument"""
+    channels = read_data(CHANNELS_FILE)
+    instrument_id = request.args.get('instrument_id', type=int)
+    if instrument_id is not None:
+        channels = [c for c in channels if c.get('instrument_id') in (instrument_id, None)]
+    return jsonify(channels)
+
+@instrument_bp.route('/api/instruments/channels', methods=['POST'])
+@token_required
+def create_instrument_channel():
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    data = request.get_json() or {}
+    channels = read_data(CHANNELS_FILE)
+    error = _validate_channel(data, channels)
+    if error:
+        return jsonify({'message': error}), 400
+
+    new_channel = {
+        'id': max((c['id'] for c in channels), default=0) + 1,
+        'instrument_id': data.get('instrument_id'),
+        'channel_code': str(data['channel_code']).strip(),
+        'test_master_id': data['test_master_id'],
+        'unit': data.get('unit', ''),
+        'factor': data.get('factor'),
+        'decimals': data.get('decimals'),
+        'is_active': data.get('is_active', True),
+        'created_at': datetime.now().isoformat(),
+        'updated_at': datetime.now().isoformat(),
+        'created_by': request.current_user.get('id')
+    }
+    channels.append(new_channel)
+    write_data(CHANNELS_FILE, channels)
+
+    return jsonify(new_channel), 201
+
+@instrument_bp.route('/api/instruments/channels/<int:id>', methods=['PUT'])
+@token_required
+def update_instrument_channel(id):
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    channels = read_data(CHANNELS_FILE)
+    channel = next((c for c in channels if c.get('id') == id), None)
+    if channel is None:
+        return jsonify({'message': 'Channel mapping not found'}), 404
+
+    data = request.get_json() or {}
+    updated = dict(channel)
+    for field in ['instrument_id', 'channel_code', 'test_master_id', 'unit', 'factor', 'decimals', 'is_active']:
+        if field in data:
+            updated[field] = data[field]
+    error = _validate_channel(updated, channels, channel_id=id)
+    if error:
+        return jsonify({'message': error}), 400
+
+    updated['updated_at'] = datetime.now().isoformat()
+    channel.update(updated)
+    write_data(CHANNELS_FILE, channels)
+
+    return jsonify(channel)
+
+@instrument_bp.route('/api/instruments/channels/<int:id>', methods=['DELETE'])
+@token_required
+def delete_instrument_channel(id):
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    channels = read_data(CHANNELS_FILE)
+    remaining = [c for c in channels if c.get('id') != id]
+    if len(remaining) == len(channels):
+        return jsonify({'message': 'Channel mapping not found'}), 404
+    write_data(CHANNELS_FILE, remaining)
+
+    return jsonify({'message': 'Channel mapping deleted successfully'})
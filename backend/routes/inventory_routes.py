@@ -6,7 +6,8 @@ import os
 from functools import wraps
 
 # Import utilities
-from utils import token_required, read_data, write_data, paginate_results, filter_data_by_tenant, check_tenant_access, require_module_access
+from utils import token_required, read_data, write_data, paginate_results, filter_data_by_tenant, check_tenant_access, require_module_access, get_accessible_tenant_ids
+from services.inventory_ledger import CONSUMPTION_FILE, inventory_ledger
 
 inventory_bp = Blueprint('inventory', __name__)
 
@@ -108,6 +109,7 @@ def create_inventory_item():
 
     inventory.append(new_item)
     write_data('inventory.json', inventory)
+    inventory_ledger.record_item(new_item, user_id=request.current_user.get('id'))
 
     return jsonify(new_item), 201
 
@@ -127,6 +129,8 @@ def update_inventory_item(id):
     if not check_tenant_access(item.get('tenant_id'), request.current_user):
         return jsonify({'message': 'Access denied'}), 403
 
+    previous_quantity = item.get('quantity')
+
     # Update fields
     updatable_fields = ['name', 'category', 'description', 'quantity', 'unit',
                        'reorder_level', 'cost_price', 'selling_price', 'supplier',
@@ -151,6 +155,7 @@ def update_inventory_item(id):
 
     inventory[item_index] = item
     write_data('inventory.json', inventory)
+    inventory_ledger.record_item(item, previous_quantity, user_id=request.current_user.get('id'))
 
     return jsonify(item)
 
@@ -170,6 +175,7 @@ def delete_inventory_item(id):
 
     deleted_item = inventory.pop(item_index)
     write_data('inventory.json', inventory)
+    inventory_ledger.item_removed(id)
 
     return jsonify({'message': 'Inventory item deleted successfully', 'item': deleted_item})
 
@@ -203,29 +209,55 @@ def search_inventory_items():
 @inventory_bp.route('/api/inventory/low-stock', methods=['GET'])
 @token_required
 def get_low_stock_items():
-    inventory = read_data('inventory.json')
+    # Items at or below their reorder level, most urgent first
+    low_stock_items = inventory_ledger.low_stock_items(get_accessible_tenant_ids(request.current_user))
 
-    # Apply tenant-based filtering
-    inventory = filter_data_by_tenant(inventory, request.current_user)
+    return jsonify({
+        'items': low_stock_items,
+        'total_items': len(low_stock_items)
+    })
 
-    # Filter items where quantity <= reorder_level
-    low_stock_items = [
-        item for item in inventory
-        if item.get('quantity', 0) <= item.get('reorder_level', 0)
+@inventory_bp.route('/api/inventory/forecast', methods=['GET'])
+@token_required
+@require_module_access('INVENTORY')
+def get_inventory_forecast():
+    """Days to stockout per franchise from the average daily usage over window_days (default 30)"""
+    window_days = request.args.get('window_days', 30, type=int)
+    if not 1 <= window_days <= 365:
+        return jsonify({'message': 'window_days must be between 1 and 365'}), 400
+
+    forecasts = [
+        {'tenant_id': tenant_id, 'items': items}
+        for tenant_id, items in inventory_ledger.forecast(
+            window_days, tenant_ids=get_accessible_tenant_ids(request.current_user)).items()
     ]
 
     return jsonify({
-        'items': low_stock_items,
-        'total_items': len(low_stock_items)
+        'window_days': window_days,
+        'franchises': sorted(forecasts, key=lambda f: str(f['tenant_id']))
     })
 
 @inventory_bp.route('/api/inventory/<int:item_id>/transactions', methods=['GET'])
 @token_required
 def get_inventory_transactions(item_id):
-    # For now, return empty transactions as this would require a separate transactions table
+    """Ledger entries of an item, newest first, optionally between date_from and date_to (YYYY-MM-DD)"""
+    inventory = read_data('inventory.json')
+    item = next((i for i in inventory if i['id'] == item_id), None)
+
+    if not item:
+        return jsonify({'message': 'Inventory item not found'}), 404
+
+    if not check_tenant_access(item.get('tenant_id'), request.current_user):
+        return jsonify({'message': 'Access denied'}), 403
+
+    transactions = inventory_ledger.transactions(
+        item_id, request.args.get('date_from'), request.args.get('date_to')
+    )
+
     return jsonify({
-        'transactions': [],
-        'total_transactions': 0
+        'transactions': transactions,
+        'total_transactions': len(transactions),
+        'balance': item.get('quantity')
     })
 
 @inventory_bp.route('/api/inventory/<int:item_id>/transactions', methods=['POST'])
@@ -240,44 +272,103 @@ def add_inventory_transaction(item_id):
             return jsonify({'message': f'Missing required field: {field}'}), 400
 
     inventory = read_data('inventory.json')
-    item_index = next((i for i, item in enumerate(inventory) if item['id'] == item_id), None)
+    item = next((i for i in inventory if i['id'] == item_id), None)
 
-    if item_index is None:
+    if item is None:
         return jsonify({'message': 'Inventory item not found'}), 404
 
-    item = inventory[item_index]
-    transaction_type = data['type']  # 'in' or 'out'
-    quantity = int(data['quantity'])
-
-    # Update inventory quantity
-    if transaction_type == 'in':
-        item['quantity'] += quantity
-    elif transaction_type == 'out':
-        if item['quantity'] < quantity:
-            return jsonify({'message': 'Insufficient stock'}), 400
-        item['quantity'] -= quantity
-    else:
+    if not check_tenant_access(item.get('tenant_id'), request.current_user):
+        return jsonify({'message': 'Access denied'}), 403
+
+    # 'in' or 'out'; consumption entries only come from billing
+    if data['type'] not in ['in', 'out']:
         return jsonify({'message': 'Invalid transaction type. Use "in" or "out"'}), 400
 
-    item['updated_at'] = datetime.now().isoformat()
+    entries, error = inventory_ledger.post([{
+        'item_id': item_id,
+        'type': data['type'],
+        'quantity': data['quantity'],
+        'reason': data['reason'],
+        'notes': data.get('notes', '')
+    }], user_id=request.current_user.get('id'))
+    if error:
+        return jsonify({'message': error}), 400
 
-    inventory[item_index] = item
-    write_data('inventory.json', inventory)
+    updated_item = next((i for i in read_data('inventory.json') if i['id'] == item_id), item)
 
-    # Create transaction record (simplified)
-    transaction = {
-        'id': len(inventory) + 1,  # Simple ID generation
-        'item_id': item_id,
-        'type': transaction_type,
+    return jsonify({
+        'message': 'Transaction completed successfully',
+        'transaction': entries[-1],
+        'updated_item': updated_item
+    })
+
+@inventory_bp.route('/api/inventory/consumption', methods=['GET'])
+@token_required
+@require_module_access('INVENTORY')
+def get_consumption_mappings():
+    """Per-test reagent/consumable usage deducted when billings are created"""
+    items = {i['id']: i for i in filter_data_by_tenant(read_data('inventory.json'), request.current_user)}
+    mappings = [m for m in read_data(CONSUMPTION_FILE) if m.get('item_id') in items]
+
+    return jsonify({'mappings': mappings, 'total_mappings': len(mappings)})
+
+@inventory_bp.route('/api/inventory/consumption', methods=['POST'])
+@token_required
+@require_module_access('INVENTORY')
+def create_consumption_mapping():
+    """Body: test (name or test_master_id), item_id, quantity (used per test)"""
+    if request.current_user.get('role') not in ['admin', 'hub_admin', 'franchise_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    data = request.get_json() or {}
+    for field in ['test', 'item_id', 'quantity']:
+        if data.get(field) in (None, ''):
+            return jsonify({'message': f'Missing required field: {field}'}), 400
+
+    item = next((i for i in read_data('inventory.json') if i['id'] == data['item_id']), None)
+    if not item:
+        return jsonify({'message': 'Inventory item not found'}), 404
+    if not check_tenant_access(item.get('tenant_id'), request.current_user):
+        return jsonify({'message': 'Access denied'}), 403
+
+    try:
+        quantity = float(data['quantity'])
+    except (TypeError, ValueError):
+        quantity = 0
+    if quantity <= 0:
+        return jsonify({'message': 'quantity must be a positive number'}), 400
+
+    mappings = read_data(CONSUMPTION_FILE)
+    new_mapping = {
+        'id': max((m['id'] for m in mappings), default=0) + 1,
+        'test': data['test'],
+        'item_id': item['id'],
         'quantity': quantity,
-        'reason': data['reason'],
-        'notes': data.get('notes', ''),
+        'is_active': bool(data.get('is_active', True)),
         'created_at': datetime.now().isoformat(),
         'created_by': request.current_user.get('id')
     }
+    mappings.append(new_mapping)
+    write_data(CONSUMPTION_FILE, mappings)
 
-    return jsonify({
-        'message': 'Transaction completed successfully',
-        'transaction': transaction,
-        'updated_item': item
-    })
+    return jsonify(new_mapping), 201
+
+@inventory_bp.route('/api/inventory/consumption/<int:id>', methods=['DELETE'])
+@token_required
+@require_module_access('INVENTORY')
+def delete_consumption_mapping(id):
+    if request.current_user.get('role') not in ['admin', 'hub_admin', 'franchise_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    mappings = read_data(CONSUMPTION_FILE)
+    mapping = next((m for m in mappings if m.get('id') == id), None)
+    if mapping is None:
+        return jsonify({'message': 'Consumption mapping not found'}), 404
+
+    item = next((i for i in read_data('inventory.json') if i['id'] == mapping.get('item_id')), None)
+    if item and not check_tenant_access(item.get('tenant_id'), request.current_user):
+        return jsonify({'message': 'Access denied'}), 403
+
+    write_data(CONSUMPTION_FILE, [m for m in mappings if m.get('id') != id])
+
+    return jsonify({'message': 'Consumption mapping deleted successfully'})
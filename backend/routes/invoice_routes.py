@@ -1,17 +1,27 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, make_response
 from datetime import datetime, timedelta
 from utils import token_required, read_data, write_data, check_tenant_access
+from services.background_jobs import job_manager
+from services.invoice_pdfs import (
+    invoice_pdf_cache, load_invoice_documents, period_invoices, write_invoice_bundle
+)
 import uuid
 
 invoice_bp = Blueprint('invoice', __name__)
 
-def generate_invoice_number():
-    """Generate a unique invoice number in format INV-YYYYMMDD-XXXX"""
+def generate_invoice_number(invoices=None, offset=0):
+    """
+    Generate a unique invoice number in format INV-YYYYMMDD-XXXX.
+
+    Pass already-loaded ``invoices`` to avoid re-reading the file, and
+    ``offset`` to reserve consecutive numbers for a batch.
+    """
     today = datetime.now()
     date_str = today.strftime('%Y%m%d')
 
     # Get existing invoices to find the next sequence number
-    invoices = read_data('invoices.json')
+    if invoices is None:
+        invoices = read_data('invoices.json')
     today_invoices = [inv for inv in invoices if inv.get('invoice_number', '').startswith(f'INV-{date_str}')]
 
     if today_invoices:
@@ -27,80 +37,94 @@ def generate_invoice_number():
     else:
         next_seq = 1
 
-    return f'INV-{date_str}-{next_seq:04d}'
+    return f'INV-{date_str}-{next_seq + offset:04d}'
 
 def create_automatic_invoice(routing, created_by_user_id):
     """Create an automatic draft invoice when a routing is created"""
+    created = create_automatic_invoices([routing], created_by_user_id)
+    return created[0] if created else None
+
+def create_automatic_invoices(routings, created_by_user_id):
+    """Create automatic draft invoices for several routings with a single invoices.json write"""
     try:
         invoices = read_data('invoices.json')
 
-        # Generate new invoice ID
-        new_id = 1
+        # Generate new invoice IDs
+        next_id = 1
         if invoices:
-            new_id = max(inv['id'] for inv in invoices) + 1
-
-        # Create default line items for sample processing
-        default_line_items = [
-            {
-                'description': 'Sample Processing Fee',
-                'quantity': 1,
-                'unit_price': 500.0,
-                'total': 500.0
-            },
-            {
-                'description': 'Laboratory Analysis',
-                'quantity': 1,
-                'unit_price': 300.0,
-                'total': 300.0
+            next_id = max(inv['id'] for inv in invoices) + 1
+
+        created = []
+        for position, routing in enumerate(routings):
+            # Create default line items for sample processing
+            default_line_items = [
+                {
+                    'description': 'Sample Processing Fee',
+                    'quantity': 1,
+                    'unit_price': 500.0,
+                    'total': 500.0
+                },
+                {
+                    'description': 'Laboratory Analysis',
+                    'quantity': 1,
+                    'unit_price': 300.0,
+                    'total': 300.0
+                }
+            ]
+
+            # Calculate totals
+            subtotal = sum(item['total'] for item in default_line_items)
+            tax_rate = 0.18  # 18% GST
+            tax_amount = subtotal * tax_rate
+            total_amount = subtotal + tax_amount
+
+            # Create new invoice owned by source franchise initially
+            new_invoice = {
+                'id': next_id + position,
+                # Numbers are reserved consecutively from the current day's sequence
+                'invoice_number': generate_invoice_number(invoices, offset=position),
+                'routing_id': routing['id'],
+                'sample_id': routing.get('sample_id'),
+                'from_tenant_id': routing.get('from_tenant_id'),
+                'to_tenant_id': routing.get('to_tenant_id'),
+                'created_by': created_by_user_id,
+                'created_at': datetime.now().isoformat(),
+                'updated_at': datetime.now().isoformat(),
+                'invoice_date': datetime.now().strftime('%Y-%m-%d'),
+                'due_date': (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d'),
+                'status': 'draft',
+                'subtotal': round(subtotal, 2),
+                'tax_rate': tax_rate,
+                'tax_amount': round(tax_amount, 2),
+                'total_amount': round(total_amount, 2),
+                'currency': 'INR',
+                'notes': 'Automatically generated invoice for sample routing',
+                'line_items': default_line_items,
+                'ownership_transferred': False,  # Track if ownership has been transferred
+                'original_owner': routing.get('from_tenant_id')  # Track original owner
             }
-        ]
+            created.append(new_invoice)
 
-        # Calculate totals
-        subtotal = sum(item['total'] for item in default_line_items)
-        tax_rate = 0.18  # 18% GST
-        tax_amount = subtotal * tax_rate
-        total_amount = subtotal + tax_amount
-
-        # Create new invoice owned by source franchise initially
-        new_invoice = {
-            'id': new_id,
-            'invoice_number': generate_invoice_number(),
-            'routing_id': routing['id'],
-            'sample_id': routing.get('sample_id'),
-            'from_tenant_id': routing.get('from_tenant_id'),
-            'to_tenant_id': routing.get('to_tenant_id'),
-            'created_by': created_by_user_id,
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat(),
-            'invoice_date': datetime.now().strftime('%Y-%m-%d'),
-            'due_date': (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d'),
-            'status': 'draft',
-            'subtotal': round(subtotal, 2),
-            'tax_rate': tax_rate,
-            'tax_amount': round(tax_amount, 2),
-            'total_amount': round(total_amount, 2),
-            'currency': 'INR',
-            'notes': 'Automatically generated invoice for sample routing',
-            'line_items': default_line_items,
-            'ownership_transferred': False,  # Track if ownership has been transferred
-            'original_owner': routing.get('from_tenant_id')  # Track original owner
-        }
-
-        invoices.append(new_invoice)
+        invoices.extend(created)
         write_data('invoices.json', invoices)
 
-        return new_invoice
+        return created
     except Exception as e:
-        print(f"Warning: Failed to create automatic invoice for routing {routing['id']}: {e}")
-        return None
+        print(f"Warning: Failed to create automatic invoices for routings {[r.get('id') for r in routings]}: {e}")
+        return []
 
 def transfer_invoice_ownership(routing_id, user_id):
     """Transfer invoice ownership when routing is approved/received"""
+    return transfer_invoice_ownership_batch([routing_id], user_id)
+
+def transfer_invoice_ownership_batch(routing_ids, user_id):
+    """Transfer invoice ownership for several routings with a single invoices.json write"""
     try:
+        routing_ids = set(routing_ids)
         invoices = read_data('invoices.json')
 
-        # Find invoices for this routing
-        routing_invoices = [inv for inv in invoices if inv.get('routing_id') == routing_id]
+        # Find invoices for these routings
+        routing_invoices = [inv for inv in invoices if inv.get('routing_id') in routing_ids]
 
         for invoice in routing_invoices:
             if not invoice.get('ownership_transferred', False):
@@ -119,7 +143,7 @@ def transfer_invoice_ownership(routing_id, user_id):
         write_data('invoices.json', invoices)
         return True
     except Exception as e:
-        print(f"Warning: Failed to transfer invoice ownership for routing {routing_id}: {e}")
+        print(f"Warning: Failed to transfer invoice ownership for routings {sorted(routing_ids)}: {e}")
         return False
 
 @invoice_bp.route('/api/routing/<int:routing_id>/invoices', methods=['GET'])
@@ -452,7 +476,7 @@ def update_invoice_status(invoice_id):
 @invoice_bp.route('/api/invoices/<int:invoice_id>/pdf', methods=['GET'])
 @token_required
 def generate_invoice_pdf(invoice_id):
-    """Generate PDF invoice (placeholder implementation)"""
+    """Invoice PDF, rendered once per invoice content and cached"""
     invoices = read_data('invoices.json')
     invoice = next((inv for inv in invoices if inv['id'] == invoice_id), None)
 
@@ -468,28 +492,71 @@ def generate_invoice_pdf(invoice_id):
         user_tenant_id != invoice.get('to_tenant_id')):
         return jsonify({'message': 'Access denied'}), 403
 
-    # For now, return a simple text response
-    # In a real implementation, you would generate a PDF using libraries like reportlab
-    pdf_content = f"""
-INVOICE: {invoice['invoice_number']}
-Date: {invoice['invoice_date']}
-Due Date: {invoice['due_date']}
-Status: {invoice['status']}
-
-Line Items:
-"""
-    for item in invoice.get('line_items', []):
-        pdf_content += f"- {item['description']}: {item['quantity']} x ₹{item['unit_price']} = ₹{item['total']}\n"
-
-    pdf_content += f"""
-Subtotal: ₹{invoice['subtotal']}
-Tax: ₹{invoice['tax_amount']}
-Total: ₹{invoice['total_amount']}
-"""
-
-    from flask import make_response
+    document = load_invoice_documents([invoice])[0]
+    pdf_content = invoice_pdf_cache.get_or_render(document)
+
     response = make_response(pdf_content)
     response.headers['Content-Type'] = 'application/pdf'
     response.headers['Content-Disposition'] = f'attachment; filename="{invoice["invoice_number"]}.pdf"'
 
     return response
+
+
+@invoice_bp.route('/api/invoices/monthly-run', methods=['POST'])
+@token_required
+def run_monthly_invoices():
+    """
+    Render every inter-franchise invoice of a month (optionally between two
+    franchises) as a background job; the job's file is a zip of the PDFs.
+    """
+    if request.current_user.get('role') not in ['admin', 'hub_admin']:
+        return jsonify({'message': 'Access denied'}), 403
+
+    data = request.get_json() or {}
+    period = str(data.get('period') or '')
+    try:
+        datetime.strptime(period, '%Y-%m')
+    except ValueError:
+        return jsonify({'message': 'period must be in YYYY-MM format'}), 400
+
+    try:
+        from_tenant_id = int(data['from_tenant_id']) if data.get('from_tenant_id') is not None else None
+        to_tenant_id = int(data['to_tenant_id']) if data.get('to_tenant_id') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'message': 'from_tenant_id and to_tenant_id must be integers'}), 400
+
+    invoices = period_invoices(period, from_tenant_id, to_tenant_id)
+    if not invoices:
+        return jsonify({'message': f'No routing invoices found for {period}'}), 404
+
+    filename = f'invoices-{period}.zip'
+
+    def run_invoices(job):
+        job.progress(0, len(invoices), f'Rendering {len(invoices)} invoices for {period}')
+        result = invoice_pdf_cache.render_batch(
+            load_invoice_documents(invoices),
+            progress=lambda done, total: job.progress(done, total)
+        )
+        count = write_invoice_bundle(job.path(filename), invoices, result['paths'])
+        job.add_file('invoices', filename, 'application/zip')
+        return {
+            'period': period,
+            'invoices': count,
+            'rendered': result['rendered'],
+            'cached': result['cached'],
+            'filename': filename
+        }
+
+    job = job_manager.submit(
+        'invoice_pdf_batch', run_invoices,
+        params={'period': period, 'from_tenant_id': from_tenant_id, 'to_tenant_id': to_tenant_id},
+        user_id=request.current_user.get('id'), tenant_id=request.current_user.get('tenant_id')
+    )
+    return jsonify({
+        'message': 'Monthly invoice run started',
+        'job_id': job['id'],
+        'status': job['status'],
+        'invoices': len(invoices),
+        'status_url': f"/api/jobs/{job['id']}",
+        'download_url': f"/api/jobs/{job['id']}/files/invoices"
+    }), 202
@@ -0,0 +1,59 @@
+"""
+Background Job Routes
+Status polling and result downloads for background imports/exports
+"""
+
+import os
+from flask import Blueprint, request, jsonify, send_file
+from utils import token_required
+from services.background_jobs import job_manager
+
+job_bp = Blueprint('jobs', __name__)
+
+def _can_access_job(job, current_user):
+    return current_user.get('role') == 'admin' or job.get('created_by') == current_user.get('id')
+
+def _job_payload(job):
+    """Job record with download URLs for its files"""
+    payload = {k: v for k, v in job.items() if k != 'params'}
+    payload['files'] = {
+        name: f"/api/jobs/{job['id']}/files/{name}" for name in job.get('files', {})
+    }
+    return payload
+
+@job_bp.route('/api/jobs', methods=['GET'])
+@token_required
+def get_jobs():
+    """List the current user's jobs (all jobs for admins)"""
+    user = request.current_user
+    user_id = None if user.get('role') == 'admin' and request.args.get('all') == 'true' else user.get('id')
+    jobs = job_manager.list_jobs(user_id=user_id, job_type=request.args.get('type'))
+    return jsonify({'data': [_job_payload(j) for j in jobs[:request.args.get('limit', 50, type=int)]]})
+
+@job_bp.route('/api/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job(job_id):
+    """Get job status and progress"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    if not _can_access_job(job, request.current_user):
+        return jsonify({'message': 'Access denied'}), 403
+    return jsonify(_job_payload(job))
+
+@job_bp.route('/api/jobs/<job_id>/files/<name>', methods=['GET'])
+@token_required
+def download_job_file(job_id, name):
+    """Download a job output file"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    if not _can_access_job(job, request.current_user):
+        return jsonify({'message': 'Access denied'}), 403
+
+    info = job_manager.file_path(job_id, name)
+    if not info or not os.path.exists(info['path']):
+        return jsonify({'message': 'File not found'}), 404
+
+    return send_file(info['path'], mimetype=info['mimetype'], as_attachment=True,
+                     download_name=info['filename'])
@@ -4,6 +4,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import read_data, write_data
+from services.response_cache import response_cache
 
 
 # Create functions for new master data categories
@@ -34,6 +35,7 @@ def create_patient_generic(data):
 
     patients.append(new_patient)
     write_data('patients.json', patients)
+    response_cache.invalidate('patients.json')
     return jsonify(new_patient), 201
 
 def create_profile_master_generic(data):
@@ -76,6 +78,7 @@ def create_profile_master_generic(data):
 
     profiles.append(new_profile)
     write_data('profile_master.json', profiles)
+    response_cache.invalidate('profile_master.json')
     return jsonify(new_profile), 201
 
 
@@ -102,6 +105,7 @@ def create_method_master_generic(data):
 
     methods.append(new_method)
     write_data('method_master.json', methods)
+    response_cache.invalidate('method_master.json')
     return jsonify(new_method), 201
 
 def create_antibiotic_master_generic(data):
@@ -130,6 +134,7 @@ def create_antibiotic_master_generic(data):
 
     antibiotics.append(new_antibiotic)
     write_data('antibiotic_master.json', antibiotics)
+    response_cache.invalidate('antibiotic_master.json')
     return jsonify(new_antibiotic), 201
 
 def create_organism_master_generic(data):
@@ -156,6 +161,7 @@ def create_organism_master_generic(data):
 
     organisms.append(new_organism)
     write_data('organism_master.json', organisms)
+    response_cache.invalidate('organism_master.json')
     return jsonify(new_organism), 201
 
 def create_unit_of_measurement_generic(data):
@@ -183,6 +189,7 @@ def create_unit_of_measurement_generic(data):
 
     units.append(new_unit)
     write_data('unit_of_measurement.json', units)
+    response_cache.invalidate('unit_of_measurement.json')
     return jsonify(new_unit), 201
 
 def create_specimen_master_generic(data):
@@ -210,6 +217,7 @@ def create_specimen_master_generic(data):
 
     specimens.append(new_specimen)
     write_data('specimen_master.json', specimens)
+    response_cache.invalidate('specimen_master.json')
     return jsonify(new_specimen), 201
 
 def create_organism_vs_antibiotic_generic(data):
@@ -235,6 +243,7 @@ def create_organism_vs_antibiotic_generic(data):
 
     relationships.append(new_relationship)
     write_data('organism_vs_antibiotic.json', relationships)
+    response_cache.invalidate('organism_vs_antibiotic.json')
     return jsonify(new_relationship), 201
 
 def create_container_master_generic(data):
@@ -262,6 +271,7 @@ def create_container_master_generic(data):
 
     containers.append(new_container)
     write_data('container_master.json', containers)
+    response_cache.invalidate('container_master.json')
     return jsonify(new_container), 201
 
 def create_main_department_master_generic(data):
@@ -291,6 +301,7 @@ def create_main_department_master_generic(data):
 
     departments.append(new_department)
     write_data('main_department_master.json', departments)
+    response_cache.invalidate('main_department_master.json')
     return jsonify(new_department), 201
 
 def create_department_settings_generic(data):
@@ -330,6 +341,7 @@ def create_department_settings_generic(data):
 
     settings.append(new_setting)
     write_data('department_settings.json', settings)
+    response_cache.invalidate('department_settings.json')
     return jsonify(new_setting), 201
 
 def create_authorization_settings_generic(data):
@@ -364,6 +376,7 @@ def create_authorization_settings_generic(data):
 
     settings.append(new_setting)
     write_data('authorization_settings.json', settings)
+    response_cache.invalidate('authorization_settings.json')
     return jsonify(new_setting), 201
 
 def create_print_order_generic(data):
@@ -389,6 +402,7 @@ def create_print_order_generic(data):
 
     orders.append(new_order)
     write_data('print_order.json', orders)
+    response_cache.invalidate('print_order.json')
     return jsonify(new_order), 201
 
 # Update functions for new master data categories
@@ -405,6 +419,7 @@ def update_patient_generic(item_id, data):
             patient[key] = value
     patient['updated_at'] = datetime.now().isoformat()
     write_data('patients.json', patients)
+    response_cache.invalidate('patients.json')
     return jsonify(patient)
 
 def update_profile_master_generic(item_id, data):
@@ -419,6 +434,7 @@ def update_profile_master_generic(item_id, data):
             profile[key] = value
     profile['updated_at'] = datetime.now().isoformat()
     write_data('profile_master.json', profiles)
+    response_cache.invalidate('profile_master.json')
     return jsonify(profile)
 
 def update_method_master_generic(item_id, data):
@@ -433,6 +449,7 @@ def update_method_master_generic(item_id, data):
             method[key] = value
     method['updated_at'] = datetime.now().isoformat()
     write_data('method_master.json', methods)
+    response_cache.invalidate('method_master.json')
     return jsonify(method)
 
 def update_antibiotic_master_generic(item_id, data):
@@ -447,6 +464,7 @@ def update_antibiotic_master_generic(item_id, data):
             antibiotic[key] = value
     antibiotic['updated_at'] = datetime.now().isoformat()
     write_data('antibiotic_master.json', antibiotics)
+    response_cache.invalidate('antibiotic_master.json')
     return jsonify(antibiotic)
 
 def update_organism_master_generic(item_id, data):
@@ -461,6 +479,7 @@ def update_organism_master_generic(item_id, data):
             organism[key] = value
     organism['updated_at'] = datetime.now().isoformat()
     write_data('organism_master.json', organisms)
+    response_cache.invalidate('organism_master.json')
     return jsonify(organism)
 
 def update_unit_of_measurement_generic(item_id, data):
@@ -475,6 +494,7 @@ def update_unit_of_measurement_generic(item_id, data):
             unit[key] = value
     unit['updated_at'] = datetime.now().isoformat()
     write_data('unit_of_measurement.json', units)
+    response_cache.invalidate('unit_of_measurement.json')
     return jsonify(unit)
 
 def update_specimen_master_generic(item_id, data):
@@ -489,6 +509,7 @@ def update_specimen_master_generic(item_id, data):
             specimen[key] = value
     specimen['updated_at'] = datetime.now().isoformat()
     write_data('specimen_master.json', specimens)
+    response_cache.invalidate('specimen_master.json')
     return jsonify(specimen)
 
 def update_organism_vs_antibiotic_generic(item_id, data):
@@ -503,6 +524,7 @@ def update_organism_vs_antibiotic_generic(item_id, data):
             relationship[key] = value
     relationship['updated_at'] = datetime.now().isoformat()
     write_data('organism_vs_antibiotic.json', relationships)
+    response_cache.invalidate('organism_vs_antibiotic.json')
     return jsonify(relationship)
 
 def update_container_master_generic(item_id, data):
@@ -517,6 +539,7 @@ def update_container_master_generic(item_id, data):
             container[key] = value
     container['updated_at'] = datetime.now().isoformat()
     write_data('container_master.json', containers)
+    response_cache.invalidate('container_master.json')
     return jsonify(container)
 
 def update_main_department_master_generic(item_id, data):
@@ -531,6 +554,7 @@ def update_main_department_master_generic(item_id, data):
             department[key] = value
     department['updated_at'] = datetime.now().isoformat()
     write_data('main_department_master.json', departments)
+    response_cache.invalidate('main_department_master.json')
     return jsonify(department)
 
 def update_department_settings_generic(item_id, data):
@@ -545,6 +569,7 @@ def update_department_settings_generic(item_id, data):
             setting[key] = value
     setting['updated_at'] = datetime.now().isoformat()
     write_data('department_settings.json', settings)
+    response_cache.invalidate('department_settings.json')
     return jsonify(setting)
 
 def update_authorization_settings_generic(item_id, data):
@@ -559,6 +584,7 @@ def update_authorization_settings_generic(item_id, data):
             setting[key] = value
     setting['updated_at'] = datetime.now().isoformat()
     write_data('authorization_settings.json', settings)
+    response_cache.invalidate('authorization_settings.json')
     return jsonify(setting)
 
 def update_print_order_generic(item_id, data):
@@ -573,6 +599,7 @@ def update_print_order_generic(item_id, data):
             order[key] = value
     order['updated_at'] = datetime.now().isoformat()
     write_data('print_order.json', orders)
+    response_cache.invalidate('print_order.json')
     return jsonify(order)
 
 # Delete functions for new master data categories
@@ -584,6 +611,7 @@ def delete_patient_generic(item_id):
         return jsonify({'message': 'Patient not found'}), 404
     patients.pop(patient_index)
     write_data('patients.json', patients)
+    response_cache.invalidate('patients.json')
     return jsonify({'message': 'Patient deleted successfully'})
 
 def delete_profile_master_generic(item_id):
@@ -593,6 +621,7 @@ def delete_profile_master_generic(item_id):
         return jsonify({'message': 'Profile not found'}), 404
     profiles.pop(profile_index)
     write_data('profile_master.json', profiles)
+    response_cache.invalidate('profile_master.json')
     return jsonify({'message': 'Profile deleted successfully'})
 
 def delete_method_master_generic(item_id):
@@ -602,6 +631,7 @@ def delete_method_master_generic(item_id):
         return jsonify({'message': 'Method not found'}), 404
     methods.pop(method_index)
     write_data('method_master.json', methods)
+    response_cache.invalidate('method_master.json')
     return jsonify({'message': 'Method deleted successfully'})
 
 def delete_antibiotic_master_generic(item_id):
@@ -611,6 +641,7 @@ def delete_antibiotic_master_generic(item_id):
         return jsonify({'message': 'Antibiotic not found'}), 404
     antibiotics.pop(antibiotic_index)
     write_data('antibiotic_master.json', antibiotics)
+    response_cache.invalidate('antibiotic_master.json')
     return jsonify({'message': 'Antibiotic deleted successfully'})
 
 def delete_organism_master_generic(item_id):
@@ -620,6 +651,7 @@ def delete_organism_master_generic(item_id):
         return jsonify({'message': 'Organism not found'}), 404
     organisms.pop(organism_index)
     write_data('organism_master.json', organisms)
+    response_cache.invalidate('organism_master.json')
     return jsonify({'message': 'Organism deleted successfully'})
 
 def delete_unit_of_measurement_generic(item_id):
@@ -629,6 +661,7 @@ def delete_unit_of_measurement_generic(item_id):
         return jsonify({'message': 'Unit not found'}), 404
     units.pop(unit_index)
     write_data('unit_of_measurement.json', units)
+    response_cache.invalidate('unit_of_measurement.json')
     return jsonify({'message': 'Unit deleted successfully'})
 
 def delete_specimen_master_generic(item_id):
@@ -638,6 +671,7 @@ def delete_specimen_master_generic(item_id):
         return jsonify({'message': 'Specimen not found'}), 404
     specimens.pop(specimen_index)
     write_data('specimen_master.json', specimens)
+    response_cache.invalidate('specimen_master.json')
     return jsonify({'message': 'Specimen deleted successfully'})
 
 def delete_organism_vs_antibiotic_generic(item_id):
@@ -647,6 +681,7 @@ def delete_organism_vs_antibiotic_generic(item_id):
         return jsonify({'message': 'Relationship not found'}), 404
     relationships.pop(relationship_index)
     write_data('organism_vs_antibiotic.json', relationships)
+    response_cache.invalidate('organism_vs_antibiotic.json')
     return jsonify({'message': 'Relationship deleted successfully'})
 
 def delete_container_master_generic(item_id):
@@ -656,6 +691,7 @@ def delete_container_master_generic(item_id):
         return jsonify({'message': 'Container not found'}), 404
     containers.pop(container_index)
     write_data('container_master.json', containers)
+    response_cache.invalidate('container_master.json')
     return jsonify({'message': 'Container deleted successfully'})
 
 def delete_main_department_master_generic(item_id):
@@ -665,6 +701,7 @@ def delete_main_department_master_generic(item_id):
         return jsonify({'message': 'Department not found'}), 404
     departments.pop(department_index)
     write_data('main_department_master.json', departments)
+    response_cache.invalidate('main_department_master.json')
     return jsonify({'message': 'Department deleted successfully'})
 
 def delete_department_settings_generic(item_id):
@@ -674,6 +711,7 @@ def delete_department_settings_generic(item_id):
         return jsonify({'message': 'Setting not found'}), 404
     settings.pop(setting_index)
     write_data('department_settings.json', settings)
+    response_cache.invalidate('department_settings.json')
     return jsonify({'message': 'Setting deleted successfully'})
 
 def delete_authorization_settings_generic(item_id):
@@ -683,6 +721,7 @@ def delete_authorization_settings_generic(item_id):
         return jsonify({'message': 'Setting not found'}), 404
     settings.pop(setting_index)
     write_data('authorization_settings.json', settings)
+    response_cache.invalidate('authorization_settings.json')
     return jsonify({'message': 'Setting deleted successfully'})
 
 def delete_print_order_generic(item_id):
@@ -692,6 +731,7 @@ def delete_print_order_generic(item_id):
         return jsonify({'message': 'Order not found'}), 404
     orders.pop(order_index)
     write_data('print_order.json', orders)
+    response_cache.invalidate('print_order.json')
     return jsonify({'message': 'Order deleted successfully'})
 
 # Test Master and Sub Test Master functions
@@ -752,6 +792,7 @@ def create_test_master_generic(data):
 
     test_masters.append(new_test_master)
     write_data('test_master.json', test_masters)
+    response_cache.invalidate('test_master.json')
     return jsonify(new_test_master), 201
 
 def create_sub_test_master_generic(data):
@@ -778,6 +819,7 @@ def create_sub_test_master_generic(data):
 
     sub_test_masters.append(new_sub_test_master)
     write_data('sub_test_master.json', sub_test_masters)
+    response_cache.invalidate('sub_test_master.json')
     return jsonify(new_sub_test_master), 201
 
 def update_test_master_generic(item_id, data):
@@ -792,6 +834,7 @@ def update_test_master_generic(item_id, data):
             test_master[key] = value
     test_master['updated_at'] = datetime.now().isoformat()
     write_data('test_master.json', test_masters)
+    response_cache.invalidate('test_master.json')
     return jsonify(test_master)
 
 def update_sub_test_master_generic(item_id, data):
@@ -806,6 +849,7 @@ def update_sub_test_master_generic(item_id, data):
             sub_test_master[key] = value
     sub_test_master['updated_at'] = datetime.now().isoformat()
     write_data('sub_test_master.json', sub_test_masters)
+    response_cache.invalidate('sub_test_master.json')
     return jsonify(sub_test_master)
 
 def delete_test_master_generic(item_id):
@@ -815,6 +859,7 @@ def delete_test_master_generic(item_id):
         return jsonify({'message': 'Test Master not found'}), 404
     test_masters.pop(test_master_index)
     write_data('test_master.json', test_masters)
+    response_cache.invalidate('test_master.json')
     return jsonify({'message': 'Test Master deleted successfully'})
 
 def delete_sub_test_master_generic(item_id):
@@ -824,6 +869,7 @@ def delete_sub_test_master_generic(item_id):
         return jsonify({'message': 'Sub Test Master not found'}), 404
     sub_test_masters.pop(sub_test_master_index)
     write_data('sub_test_master.json', sub_test_masters)
+    response_cache.invalidate('sub_test_master.json')
     return jsonify({'message': 'Sub Test Master deleted successfully'})
 
 # Test Sub Process Functions
@@ -1036,6 +1082,7 @@ def create_profile_data_generic(data):
         # Add to data
         existing_data.append(new_item)
         write_data('profile_data.json', existing_data)
+        response_cache.invalidate('profile_data.json')
 
         return jsonify(new_item), 201
 
@@ -1065,6 +1112,7 @@ def update_profile_data_generic(item_id, data):
 
         # Save data
         write_data('profile_data.json', existing_data)
+        response_cache.invalidate('profile_data.json')
 
         return jsonify(item)
 
@@ -1084,6 +1132,7 @@ def delete_profile_data_generic(item_id):
         # Remove item
         data.pop(item_index)
         write_data('profile_data.json', data)
+        response_cache.invalidate('profile_data.json')
 
         return jsonify({'message': 'Profile data deleted successfully'})
 
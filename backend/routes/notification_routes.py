@@ -71,7 +71,10 @@ def get_unread_notification_count():
 @notification_bp.route('/api/notifications/cleanup', methods=['POST'])
 @token_required
 def cleanup_old_notifications():
-    """Clean up old notifications (admin only)"""
+    """
+    Force an immediate cleanup of old notifications (admin only).
+    Expired notifications are otherwise compacted automatically in the background.
+    """
     if request.current_user.get('role') != 'admin':
         return jsonify({'message': 'Admin access required'}), 403
     
@@ -6,7 +6,10 @@ import os
 from functools import wraps
 
 # Import utilities
-from utils import token_required, read_data, write_data, paginate_results, filter_data_by_tenant, check_tenant_access
+from utils import token_required, read_data, write_data, paginate_results, filter_data_by_tenant, check_tenant_access, get_accessible_tenant_ids
+from services.patient_search_index import patient_search_index
+from services.patient_history import patient_history
+from services.response_cache import response_cache
 
 patient_bp = Blueprint('patient', __name__)
 
@@ -123,6 +126,8 @@ def create_patient():
 
     patients.append(new_patient)
     write_data('patients.json', patients)
+    response_cache.invalidate('patients.json')
+    patient_search_index.upsert(new_patient)
 
     return jsonify(new_patient), 201
 
@@ -151,6 +156,8 @@ def update_patient(id):
 
     # Save updated patients
     write_data('patients.json', patients)
+    response_cache.invalidate('patients.json')
+    patient_search_index.upsert(patient)
 
     return jsonify(patient)
 
@@ -178,6 +185,8 @@ def delete_patient(id):
     # Delete patient
     deleted_patient = patients.pop(patient_index)
     write_data('patients.json', patients)
+    response_cache.invalidate('patients.json')
+    patient_search_index.remove(deleted_patient['id'])
 
     return jsonify({'message': 'Patient deleted successfully'})
 
@@ -190,89 +199,56 @@ def search_patients():
     if not query:
         return jsonify({'message': 'Search query is required'}), 400
 
-    patients = read_data('patients.json')
-
-    # Apply tenant-based filtering first
-    user_role = request.current_user.get('role')
-    user_tenant_id = request.current_user.get('tenant_id')
-
-    if user_role == 'admin':
-        # Admin can see all patients, but filter by branch if specified
-        if branch_id:
-            patients = [p for p in patients if p.get('tenant_id') == int(branch_id)]
-        # Otherwise, admin sees all patients
-    elif user_role == 'hub_admin':
-        # Hub admin can see all franchise patients and their own hub
-        tenants = read_data('tenants.json')
-        user_tenant = next((t for t in tenants if t.get('id') == user_tenant_id), None)
-        if user_tenant and user_tenant.get('is_hub'):
-            # Get all franchise tenant IDs (non-hub) plus their own hub
-            franchise_tenant_ids = [t.get('id') for t in tenants if not t.get('is_hub')]
-            franchise_tenant_ids.append(user_tenant_id)  # Include hub data
-
-            if branch_id:
-                # Filter by specific branch if accessible
-                if int(branch_id) in franchise_tenant_ids:
-                    patients = [p for p in patients if p.get('tenant_id') == int(branch_id)]
-                else:
-                    patients = []  # Access denied
-            else:
-                # Show all accessible patients
-                patients = [p for p in patients if p.get('tenant_id') in franchise_tenant_ids]
-        else:
-            patients = []
-    elif user_role == 'franchise_admin':
-        # Franchise admin can only see their own franchise patients
-        if branch_id and int(branch_id) != user_tenant_id:
-            patients = []  # Access denied - trying to access other franchise
-        else:
-            patients = [p for p in patients if p.get('tenant_id') == user_tenant_id]
-    else:
-        # All other roles can only see their own tenant data
-        if branch_id and int(branch_id) != user_tenant_id:
-            patients = []  # Access denied
-        else:
-            patients = [p for p in patients if p.get('tenant_id') == user_tenant_id]
-
-    # Search by name, ID, or phone
-    results = []
-    for patient in patients:
-        # Get patient name components
-        first_name = patient.get('first_name', '').lower()
-        last_name = patient.get('last_name', '').lower()
-        full_name = f"{first_name} {last_name}".strip()
-        full_name_reverse = f"{last_name} {first_name}".strip()
-        patient_id = patient.get('patient_id', '').lower()
-        phone = patient.get('phone', '')
-
-        query_lower = query.lower().strip()
-
-        # For multi-word queries, also check if all words are present in the name
-        query_words = query_lower.split()
-        all_words_match = False
-        if len(query_words) > 1:
-            # Check if all query words are present in either first name, last name, or full name
-            name_text = f"{first_name} {last_name}".lower()
-            all_words_match = all(word in name_text for word in query_words)
-
-        # Check if query matches any of the search criteria
-        if (
-            query_lower in first_name or
-            query_lower in last_name or
-            query_lower in full_name or
-            query_lower in full_name_reverse or
-            all_words_match or
-            query_lower in patient_id or
-            query in phone
-        ):
-            results.append(patient)
-
-    # Sort by created_at (newest first)
-    results = sorted(results, key=lambda x: x.get('created_at', ''), reverse=True)
+    try:
+        tenant_ids = get_accessible_tenant_ids(request.current_user, int(branch_id) if branch_id else None)
+    except ValueError:
+        return jsonify({'message': 'branch_id must be an integer'}), 400
 
-    # Paginate results
+    # Search by name, ID, or phone; newest matches first
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('limit', 20, type=int)
-    paginated_data = paginate_results(results, page, per_page)
+    total, items = patient_search_index.search(
+        query, tenant_ids, offset=(page - 1) * per_page, limit=per_page
+    )
+
+    return jsonify({
+        'items': items,
+        'page': page,
+        'per_page': per_page,
+        'total_items': total,
+        'total_pages': (total + per_page - 1) // per_page
+    })
+
+@patient_bp.route('/api/patients/<int:id>/results', methods=['GET'])
+@token_required
+def get_patient_results(id):
+    """
+    Cumulative results: the last ``limit`` results (default 5) of each test
+    for a patient, newest first. ``test`` (repeatable) restricts to test
+    names or test_master_ids; ``authorized_only=true`` skips results of
+    unauthorized reports; ``until`` (YYYY-MM-DD) skips later results. Only
+    results from reports of tenants the user may see are returned.
+    """
+    patient = patient_search_index.get(id)
+    if not patient:
+        return jsonify({'message': 'Patient not found'}), 404
 
-    return jsonify(paginated_data)
+    if not check_tenant_access(patient.get('tenant_id'), request.current_user):
+        return jsonify({'message': 'Access denied'}), 403
+
+    limit = request.args.get('limit', 5, type=int)
+    if not 1 <= limit <= 50:
+        return jsonify({'message': 'limit must be between 1 and 50'}), 400
+    until = request.args.get('until')
+    if until:
+        try:
+            datetime.strptime(until, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'message': 'until must be a YYYY-MM-DD date'}), 400
+
+    tests = patient_history.patient_results(
+        id, tests=request.args.getlist('test') or None, limit=limit,
+        authorized_only=request.args.get('authorized_only', 'false').lower() == 'true',
+        until=until, tenant_ids=get_accessible_tenant_ids(request.current_user)
+    )
+    return jsonify({'patient_id': id, 'limit': limit, 'tests': tests})
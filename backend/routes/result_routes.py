@@ -7,6 +7,7 @@ from functools import wraps
 
 # Import utilities
 from utils import token_required, read_data, write_data, paginate_results, filter_data_by_tenant, check_tenant_access
+from services.result_reports import result_reports
 
 result_bp = Blueprint('result', __name__)
 
@@ -158,6 +159,7 @@ def create_result():
 
     results.append(new_result)
     write_data('results.json', results)
+    result_reports.invalidate()
 
     return jsonify(new_result), 201
 
@@ -184,6 +186,7 @@ def update_result(id):
 
     # Save updated results
     write_data('results.json', results)
+    result_reports.invalidate()
 
     return jsonify(result)
 
@@ -209,6 +212,7 @@ def verify_result(id):
 
     # Save updated results
     write_data('results.json', results)
+    result_reports.invalidate()
 
     return jsonify(result)
 
@@ -287,89 +291,14 @@ def search_results():
 @result_bp.route('/api/results/reports', methods=['GET'])
 @token_required
 def get_reports():
-    # In a real application, reports would be a separate table
-    # For simplicity, we'll generate mock reports based on results
-
-    results = read_data('results.json')
-
-    # Group results by patient and date
-    reports = []
-    report_id = 1
-
-    # Get unique patient IDs from results
-    samples = read_data('samples.json')
-    patient_ids = set()
-
-    for result in results:
-        sample_id = result.get('sample_id')
-        if sample_id:
-            sample = next((s for s in samples if s.get('id') == sample_id), None)
-            if sample and sample.get('patient_id'):
-                patient_ids.add(sample.get('patient_id'))
-
-    # Create a report for each patient
-    patients = read_data('patients.json')
-
-    for patient_id in patient_ids:
-        patient = next((p for p in patients if p.get('id') == patient_id), None)
-        if not patient:
-            continue
-
-        # Get patient's samples
-        patient_samples = [s.get('id') for s in samples if s.get('patient_id') == patient_id]
-
-        # Get results for these samples
-        patient_results = [r for r in results if r.get('sample_id') in patient_samples]
-
-        if not patient_results:
-            continue
-
-        # Group results by date
-        result_dates = set(r.get('result_date', '').split('T')[0] for r in patient_results)
-
-        for date in result_dates:
-            date_results = [r for r in patient_results if r.get('result_date', '').startswith(date)]
-
-            if not date_results:
-                continue
-
-            # Create a report
-            report = {
-                'id': report_id,
-                'report_number': f"RPT{report_id:05d}",
-                'patient': {
-                    'id': patient.get('id'),
-                    'first_name': patient.get('first_name'),
-                    'last_name': patient.get('last_name')
-                },
-                'report_date': date,
-                'test_count': len(date_results),
-                'status': 'Completed',
-                'created_at': datetime.now().isoformat(),
-                'tenant_id': request.current_user.get('tenant_id')
-            }
-
-            reports.append(report)
-            report_id += 1
-
-    # Sort by report date (newest first)
-    reports = sorted(reports, key=lambda x: x.get('report_date', ''), reverse=True)
-
-    # Apply filters
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    search = request.args.get('search', '')
-
-    if start_date:
-        reports = [r for r in reports if r.get('report_date', '') >= start_date]
-
-    if end_date:
-        reports = [r for r in reports if r.get('report_date', '') <= end_date]
-
-    if search:
-        reports = [r for r in reports if
-                  search.lower() in r.get('report_number', '').lower() or
-                  search.lower() in f"{r.get('patient', {}).get('first_name', '')} {r.get('patient', {}).get('last_name', '')}".lower()]
+    reports = result_reports.query(
+        request.current_user,
+        tenant_id=request.args.get('tenant_id', type=int),
+        patient_id=request.args.get('patient_id'),
+        start_date=request.args.get('start_date'),
+        end_date=request.args.get('end_date'),
+        search=request.args.get('search', '')
+    )
 
     # Paginate results
     page = request.args.get('page', 1, type=int)
@@ -0,0 +1,104 @@
+"""
+Revenue Routes
+Daily/monthly revenue rollups and franchise comparisons
+"""
+
+from datetime import date, timedelta
+from flask import Blueprint, request, jsonify
+from utils import token_required, read_data, get_accessible_tenant_ids
+from services.financial_rollups import billing_rollups, report_rollups
+
+revenue_bp = Blueprint('revenue', __name__)
+
+ROLLUP_SOURCES = {'billings': billing_rollups, 'reports': report_rollups}
+
+# Longest date range a rollup series may cover, per period
+MAX_ROLLUP_DAYS = 366
+MAX_ROLLUP_MONTHS = 120
+
+def _date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    return date.fromisoformat(value).isoformat()
+
+@revenue_bp.route('/api/revenue/rollups', methods=['GET'])
+@token_required
+def get_revenue_rollups():
+    """
+    Revenue series per day or month.
+
+    Query params: period (daily|monthly), date_from/date_to (YYYY-MM-DD,
+    default: the last 30 days), tenant_id, group_by=tenant, source
+    (billings|reports). Daily series cover at most 366 days, any series at
+    most 120 months.
+    """
+    try:
+        period = request.args.get('period', 'daily')
+        if period not in ('daily', 'monthly'):
+            return jsonify({'message': 'period must be daily or monthly'}), 400
+
+        rollups = ROLLUP_SOURCES.get(request.args.get('source', 'billings'))
+        if rollups is None:
+            return jsonify({'message': 'source must be billings or reports'}), 400
+
+        try:
+            date_to = _date_arg('date_to') or date.today().isoformat()
+            date_from = _date_arg('date_from') or (date.fromisoformat(date_to) - timedelta(days=29)).isoformat()
+        except ValueError:
+            return jsonify({'message': 'Invalid date, expected YYYY-MM-DD'}), 400
+        if date_from > date_to:
+            return jsonify({'message': 'date_from must not be after date_to'}), 400
+
+        start, end = date.fromisoformat(date_from), date.fromisoformat(date_to)
+        if period == 'daily' and (end - start).days + 1 > MAX_ROLLUP_DAYS:
+            return jsonify({'message': f'Daily rollups are limited to {MAX_ROLLUP_DAYS} days; use period=monthly'}), 400
+        if (end.year - start.year) * 12 + end.month - start.month + 1 > MAX_ROLLUP_MONTHS:
+            return jsonify({'message': f'Rollups are limited to {MAX_ROLLUP_MONTHS} months'}), 400
+
+        tenant_ids = get_accessible_tenant_ids(request.current_user, request.args.get('tenant_id', type=int))
+        by_tenant = request.args.get('group_by') == 'tenant'
+
+        return jsonify({
+            'period': period,
+            'date_from': date_from,
+            'date_to': date_to,
+            'totals': rollups.totals(tenant_ids, date_from, date_to),
+            'data': rollups.series(period, tenant_ids, date_from, date_to, by_tenant=by_tenant)
+        })
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching revenue rollups: {str(e)}'}), 500
+
+@revenue_bp.route('/api/revenue/franchises', methods=['GET'])
+@token_required
+def compare_franchise_revenue():
+    """Compare franchises over the last ``days`` days (default 90)"""
+    if request.current_user.get('role') not in ['admin', 'hub_admin', 'franchise_admin']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    try:
+        days = max(1, min(request.args.get('days', 90, type=int), 3660))
+        date_to = date.today()
+        date_from = date_to - timedelta(days=days - 1)
+
+        tenant_ids = get_accessible_tenant_ids(request.current_user)
+        per_tenant = billing_rollups.by_tenant(tenant_ids, date_from.isoformat(), date_to.isoformat())
+
+        tenants = {t.get('id'): t for t in read_data('tenants.json')}
+        franchises = []
+        for tenant_id, totals in per_tenant.items():
+            tenant = tenants.get(tenant_id, {})
+            franchises.append(dict(totals, tenant_id=tenant_id,
+                                   name=tenant.get('name'), site_code=tenant.get('site_code')))
+        franchises.sort(key=lambda f: f['net'], reverse=True)
+
+        return jsonify({
+            'date_from': date_from.isoformat(),
+            'date_to': date_to.isoformat(),
+            'days': days,
+            'franchises': franchises
+        })
+
+    except Exception as e:
+        return jsonify({'message': f'Error comparing franchise revenue: {str(e)}'}), 500
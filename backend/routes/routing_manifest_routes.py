@@ -0,0 +1,305 @@
+"""
+Routing Manifest Routes - courier batches of sample routings
+A manifest groups the routings travelling together from one facility to another
+so they can be created, approved, dispatched and received in bulk.
+"""
+
+from flask import Blueprint, request, jsonify
+from datetime import datetime
+from utils import read_data, write_data, token_required, paginate_results
+from services.workflow_engine import WorkflowEngine
+from services.notification_service import NotificationService
+from routes.sample_routing_routes import ROUTING_ACTIONS, apply_routing_action_batch
+
+routing_manifest_bp = Blueprint('routing_manifest', __name__)
+
+ROUTING_DEFAULT_FIELDS = ('notes', 'priority', 'expected_delivery_date', 'special_instructions',
+                          'temperature_requirements', 'handling_requirements')
+
+def _can_access_manifest(manifest, current_user):
+    """Source/destination facility users and admins can access a manifest"""
+    if current_user.get('role') == 'admin':
+        return True
+    user_tenant_id = current_user.get('tenant_id')
+    return user_tenant_id in (manifest.get('from_tenant_id'), manifest.get('to_tenant_id'))
+
+def _next_id(items):
+    return max((item['id'] for item in items), default=0) + 1
+
+@routing_manifest_bp.route('/api/samples/routing/manifests', methods=['GET'])
+@token_required
+def get_manifests():
+    """List manifests involving the user's facility"""
+    manifests = [m for m in read_data('routing_manifests.json')
+                 if _can_access_manifest(m, request.current_user)]
+
+    status_filter = request.args.get('status')
+    if status_filter:
+        manifests = [m for m in manifests if m.get('status') == status_filter]
+
+    manifests.sort(key=lambda m: m.get('created_at', ''), reverse=True)
+
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('limit', 20, type=int)
+    return jsonify(paginate_results(manifests, page, per_page))
+
+@routing_manifest_bp.route('/api/samples/routing/manifests/<int:manifest_id>', methods=['GET'])
+@token_required
+def get_manifest(manifest_id):
+    """Get a manifest with its routings"""
+    manifests = read_data('routing_manifests.json')
+    manifest = next((m for m in manifests if m['id'] == manifest_id), None)
+    if not manifest:
+        return jsonify({'message': 'Manifest not found'}), 404
+    if not _can_access_manifest(manifest, request.current_user):
+        return jsonify({'message': 'Access denied'}), 403
+
+    routing_ids = set(manifest.get('routing_ids', []))
+    routings = [r for r in read_data('sample_routings.json') if r['id'] in routing_ids]
+
+    status_counts = {}
+    for routing in routings:
+        status_counts[routing.get('status')] = status_counts.get(routing.get('status'), 0) + 1
+
+    return jsonify(dict(manifest, routings=routings, status_counts=status_counts))
+
+@routing_manifest_bp.route('/api/samples/routing/manifests', methods=['POST'])
+@token_required
+def create_manifest():
+    """
+    Create a manifest, creating routings for its samples in bulk.
+
+    Body:
+        to_tenant_id: destination facility (required)
+        reason: default routing reason
+        samples: list of {sample_id, reason, notes, priority, ...} to create routings for
+        routing_ids: existing pending/approved routings to add to the manifest
+        courier_name, courier_contact, notes, plus routing defaults
+        (priority, expected_delivery_date, special_instructions,
+        temperature_requirements, handling_requirements)
+
+    Everything is validated first; if any sample or routing is invalid nothing
+    is written and the errors are returned.
+    """
+    data = request.get_json() or {}
+    user_id = request.current_user.get('id')
+    user_tenant_id = request.current_user.get('tenant_id')
+
+    sample_entries = data.get('samples', [])
+    existing_ids = data.get('routing_ids', [])
+
+    if 'to_tenant_id' not in data:
+        return jsonify({'message': 'Missing required field: to_tenant_id'}), 400
+    if not sample_entries and not existing_ids:
+        return jsonify({'message': 'samples or routing_ids is required'}), 400
+
+    tenants = read_data('tenants.json')
+    if not any(t['id'] == data['to_tenant_id'] for t in tenants):
+        return jsonify({'message': 'Destination tenant not found'}), 404
+
+    samples_by_id = {s['id']: s for s in read_data('samples.json')}
+    routings = read_data('sample_routings.json')
+    routings_by_id = {r['id']: r for r in routings}
+    manifests = read_data('routing_manifests.json')
+
+    # Validate everything before writing anything
+    errors = []
+    seen_samples = set()
+    for index, entry in enumerate(sample_entries):
+        sample_id = entry.get('sample_id')
+        if sample_id not in samples_by_id:
+            errors.append({'index': index, 'sample_id': sample_id, 'error': 'Sample not found'})
+        elif sample_id in seen_samples:
+            errors.append({'index': index, 'sample_id': sample_id, 'error': 'Duplicate sample in manifest'})
+        elif not (entry.get('reason') or data.get('reason')):
+            errors.append({'index': index, 'sample_id': sample_id, 'error': 'Missing required field: reason'})
+        seen_samples.add(sample_id)
+
+    for routing_id in existing_ids:
+        routing = routings_by_id.get(routing_id)
+        if not routing:
+            errors.append({'routing_id': routing_id, 'error': 'Routing not found'})
+        elif routing.get('from_tenant_id') != user_tenant_id and request.current_user.get('role') != 'admin':
+            errors.append({'routing_id': routing_id, 'error': 'Only source facility can add routing to a manifest'})
+        elif routing.get('to_tenant_id') != data['to_tenant_id']:
+            errors.append({'routing_id': routing_id, 'error': 'Routing has a different destination'})
+        elif routing.get('status') not in ('pending_approval', 'approved'):
+            errors.append({'routing_id': routing_id, 'error': 'Routing already dispatched or closed'})
+        elif routing.get('manifest_id'):
+            errors.append({'routing_id': routing_id, 'error': f"Routing already on manifest {routing['manifest_id']}"})
+
+    if errors:
+        return jsonify({'message': 'Manifest validation failed', 'errors': errors}), 400
+
+    now = datetime.now().isoformat()
+    manifest_id = _next_id(manifests)
+    next_routing_id = _next_id(routings)
+
+    new_routings = []
+    for offset, entry in enumerate(sample_entries):
+        routing_id = next_routing_id + offset
+        defaults = {field: entry.get(field, data.get(field)) for field in ROUTING_DEFAULT_FIELDS}
+        new_routings.append({
+            'id': routing_id,
+            'sample_id': entry['sample_id'],
+            'from_tenant_id': user_tenant_id,
+            'to_tenant_id': data['to_tenant_id'],
+            'reason': entry.get('reason') or data.get('reason'),
+            'notes': defaults['notes'] or '',
+            'priority': defaults['priority'] or 'normal',
+            'tracking_number': f"RT{routing_id:06d}",
+            'status': 'pending_approval',
+            'created_at': now,
+            'updated_at': now,
+            'created_by': user_id,
+            'dispatch_date': None,
+            'expected_delivery_date': defaults['expected_delivery_date'],
+            'actual_delivery_date': None,
+            'received_by': None,
+            'received_at': None,
+            'special_instructions': defaults['special_instructions'] or '',
+            'temperature_requirements': defaults['temperature_requirements'] or 'room_temperature',
+            'handling_requirements': defaults['handling_requirements'] or [],
+            'manifest_id': manifest_id
+        })
+
+    for routing_id in existing_ids:
+        routings_by_id[routing_id]['manifest_id'] = manifest_id
+        routings_by_id[routing_id]['updated_at'] = now
+
+    manifest = {
+        'id': manifest_id,
+        'manifest_number': f"MF{manifest_id:06d}",
+        'from_tenant_id': user_tenant_id,
+        'to_tenant_id': data['to_tenant_id'],
+        'routing_ids': [r['id'] for r in new_routings] + list(existing_ids),
+        'sample_count': len(new_routings) + len(existing_ids),
+        'status': 'open',
+        'courier_name': data.get('courier_name', ''),
+        'courier_contact': data.get('courier_contact', ''),
+        'notes': data.get('notes', ''),
+        'created_at': now,
+        'created_by': user_id,
+        'updated_at': now,
+        'history': [{'action': 'created', 'at': now, 'by': user_id}]
+    }
+
+    # One write per file for the whole courier batch
+    routings.extend(new_routings)
+    write_data('sample_routings.json', routings)
+    manifests.append(manifest)
+    write_data('routing_manifests.json', manifests)
+
+    if new_routings:
+        try:
+            from routes.invoice_routes import create_automatic_invoices
+            create_automatic_invoices(new_routings, user_id)
+        except Exception as e:
+            print(f"Warning: Failed to create automatic invoices for manifest {manifest_id}: {e}")
+
+        try:
+            WorkflowEngine.create_workflow_instances(
+                [r['id'] for r in new_routings],
+                user_id=user_id,
+                initial_stage='pending_approval',
+                notes='Routing created and submitted for approval'
+            )
+        except Exception as e:
+            print(f"Warning: Workflow creation failed for manifest {manifest_id}: {e}")
+
+        try:
+            NotificationService.notify_routings([
+                {
+                    'routing': routing,
+                    'notification_type': 'routing_created',
+                    'data': {
+                        'sample_id': samples_by_id[routing['sample_id']].get('sample_id', 'Unknown'),
+                        'reason': routing['reason']
+                    }
+                }
+                for routing in new_routings
+            ], user_id)
+        except Exception as e:
+            print(f"Warning: Notification failed for manifest {manifest_id}: {e}")
+
+    return jsonify(dict(manifest, routings=new_routings)), 201
+
+# Workflow order of routing statuses, used to tell whether a routing has
+# reached (or moved past) the status an action sets
+_STATUS_ORDER = ['pending_approval'] + [spec['new_status'] for spec in ROUTING_ACTIONS.values()]
+
+def _manifest_status(routing_ids, new_status):
+    """new_status once every routing on the manifest has reached it, else partially_<new_status>"""
+    wanted = set(routing_ids)
+    statuses = [r.get('status') for r in read_data('sample_routings.json') if r.get('id') in wanted]
+    target = _STATUS_ORDER.index(new_status)
+    done = all(status in _STATUS_ORDER and _STATUS_ORDER.index(status) >= target for status in statuses)
+    return new_status if done and len(statuses) == len(wanted) else f'partially_{new_status}'
+
+@routing_manifest_bp.route('/api/samples/routing/manifests/<int:manifest_id>/<action>', methods=['POST'])
+@token_required
+def manifest_action(manifest_id, action):
+    """
+    Approve, dispatch, receive or complete the routings of a manifest in one transaction.
+
+    Body:
+        routing_ids: optional subset of the manifest's routings (default: all)
+        items: optional per-routing overrides, e.g. [{routing_id, condition, notes}]
+        notes, courier_name, courier_contact, condition: shared values
+
+    All selected routings must be valid for the action, otherwise nothing is changed.
+    """
+    if action not in ROUTING_ACTIONS:
+        return jsonify({'message': f'Unsupported manifest action: {action}'}), 400
+
+    manifests = read_data('routing_manifests.json')
+    manifest = next((m for m in manifests if m['id'] == manifest_id), None)
+    if not manifest:
+        return jsonify({'message': 'Manifest not found'}), 404
+    if not _can_access_manifest(manifest, request.current_user):
+        return jsonify({'message': 'Access denied'}), 403
+
+    data = request.get_json() or {}
+    shared = {k: data[k] for k in ('notes', 'courier_name', 'courier_contact', 'condition') if k in data}
+    if action == 'dispatch':
+        shared.setdefault('courier_name', manifest.get('courier_name', ''))
+        shared.setdefault('courier_contact', manifest.get('courier_contact', ''))
+
+    manifest_routing_ids = manifest.get('routing_ids', [])
+    selected = data.get('routing_ids') or manifest_routing_ids
+    outside = [rid for rid in selected if rid not in manifest_routing_ids]
+    if outside:
+        return jsonify({'message': 'Routings are not on this manifest', 'routing_ids': outside}), 400
+
+    overrides = {item.get('routing_id'): item for item in data.get('items', [])}
+    items = [{**shared, **overrides.get(rid, {}), 'routing_id': rid} for rid in selected]
+
+    results, updated = apply_routing_action_batch(
+        action, items, request.current_user, extra_fields={'manifest_id': manifest_id}, atomic=True
+    )
+    if not updated:
+        return jsonify({'message': f'Manifest {action} failed validation', 'results': results}), 400
+
+    now = datetime.now().isoformat()
+    new_status = ROUTING_ACTIONS[action]['new_status']
+    manifest['status'] = _manifest_status(manifest_routing_ids, new_status)
+    manifest['updated_at'] = now
+    manifest.setdefault('history', []).append({
+        'action': action,
+        'at': now,
+        'by': request.current_user.get('id'),
+        'routing_ids': [r['id'] for r in updated]
+    })
+    if action == 'dispatch':
+        manifest['dispatched_at'] = now
+        manifest['courier_name'] = shared.get('courier_name', '')
+        manifest['courier_contact'] = shared.get('courier_contact', '')
+    elif action == 'receive':
+        manifest['received_at'] = now
+    write_data('routing_manifests.json', manifests)
+
+    return jsonify({
+        'message': f'{len(updated)} routings on manifest {manifest["manifest_number"]} updated ({action})',
+        'manifest': manifest,
+        'results': results
+    })
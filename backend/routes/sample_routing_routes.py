@@ -376,7 +376,8 @@ def approve_routing(routing_id):
             old_stage='pending_approval',
             new_stage='approved',
             user_id=request.current_user.get('id'),
-            notes=data.get('notes', '')
+            notes=data.get('notes', ''),
+            routing=routing
         )
     except Exception as e:
         print(f"Warning: Notification failed for routing {routing_id}: {e}")
@@ -442,7 +443,8 @@ def reject_routing(routing_id):
         old_stage='pending_approval',
         new_stage='rejected',
         user_id=request.current_user.get('id'),
-        notes=data.get('reason')
+        notes=data.get('reason'),
+        routing=routing
     )
 
     return jsonify({'message': 'Routing rejected successfully', 'routing': routing})
@@ -508,7 +510,8 @@ def dispatch_routing(routing_id):
             old_stage='approved',
             new_stage='in_transit',
             user_id=request.current_user.get('id'),
-            notes=data.get('notes', '')
+            notes=data.get('notes', ''),
+            routing=routing
         )
     except Exception as e:
         print(f"Warning: Notification failed for routing {routing_id}: {e}")
@@ -576,7 +579,8 @@ def receive_routing(routing_id):
             old_stage='in_transit',
             new_stage='delivered',
             user_id=request.current_user.get('id'),
-            notes=data.get('notes', '')
+            notes=data.get('notes', ''),
+            routing=routing
         )
     except Exception as e:
         print(f"Warning: Notification failed for routing {routing_id}: {e}")
@@ -639,7 +643,8 @@ def complete_routing(routing_id):
             old_stage='delivered',
             new_stage='completed',
             user_id=request.current_user.get('id'),
-            notes=data.get('notes', '')
+            notes=data.get('notes', ''),
+            routing=routing
         )
     except Exception as e:
         print(f"Warning: Notification failed for routing {routing_id}: {e}")
@@ -675,19 +680,230 @@ def get_routing_history(routing_id):
     files = read_data('routing_files.json')
     routing_files = [f for f in files if f.get('routing_id') == routing_id]
 
-    # Get notifications
-    notifications = read_data('notifications.json')
-    routing_notifications = [n for n in notifications if n.get('routing_id') == routing_id]
+    # Get notification count from the notification store index
+    notifications_count = NotificationService.get_routing_notification_count(routing_id)
 
     history = {
         'routing_id': routing_id,
         'workflow_history': workflow_status.get('stage_history', []),
         'messages_count': len(routing_messages),
         'files_count': len(routing_files),
-        'notifications_count': len(routing_notifications),
+        'notifications_count': notifications_count,
         'created_at': routing.get('created_at'),
         'updated_at': routing.get('updated_at'),
         'current_status': routing.get('status')
     }
 
     return jsonify(history)
+
+# Batch routing actions: one read and one write of sample_routings.json, one
+# workflow log append and one notification fan-out per request
+ROUTING_ACTIONS = {
+    'approve': {
+        'facility': 'to_tenant_id',
+        'facility_error': 'Only destination facility can approve routing',
+        'required_status': 'pending_approval',
+        'status_error': 'Routing is not in pending approval state',
+        'new_status': 'approved',
+        'default_notes': 'Routing approved',
+    },
+    'dispatch': {
+        'facility': 'from_tenant_id',
+        'facility_error': 'Only source facility can dispatch sample',
+        'required_status': 'approved',
+        'status_error': 'Routing must be approved before dispatch',
+        'new_status': 'in_transit',
+        'default_notes': 'Sample dispatched',
+    },
+    'receive': {
+        'facility': 'to_tenant_id',
+        'facility_error': 'Only destination facility can receive sample',
+        'required_status': 'in_transit',
+        'status_error': 'Sample must be in transit to be received',
+        'new_status': 'delivered',
+        'default_notes': 'Sample received',
+    },
+    'complete': {
+        'facility': 'to_tenant_id',
+        'facility_error': 'Only destination facility can complete routing',
+        'required_status': 'delivered',
+        'status_error': 'Sample must be delivered to be completed',
+        'new_status': 'completed',
+        'default_notes': 'Routing completed',
+    },
+}
+
+def _apply_action_fields(action, routing, data, user_id, now):
+    """Set the routing fields for an action; returns the workflow metadata"""
+    if action == 'approve':
+        routing['approved_by'] = user_id
+        routing['approved_at'] = now
+        routing['approval_notes'] = data.get('notes', '')
+        return {'approved_by': user_id}
+    if action == 'dispatch':
+        routing['dispatch_date'] = now
+        routing['dispatched_by'] = user_id
+        routing['courier_name'] = data.get('courier_name', '')
+        routing['courier_contact'] = data.get('courier_contact', '')
+        routing['dispatch_notes'] = data.get('notes', '')
+        return {
+            'dispatched_by': user_id,
+            'courier_name': data.get('courier_name', ''),
+            'courier_contact': data.get('courier_contact', '')
+        }
+    if action == 'receive':
+        routing['received_at'] = now
+        routing['received_by'] = user_id
+        routing['actual_delivery_date'] = now
+        routing['condition_on_arrival'] = data.get('condition', 'good')
+        routing['receipt_notes'] = data.get('notes', '')
+        return {'received_by': user_id, 'condition': data.get('condition', 'good')}
+    if action == 'complete':
+        routing['completed_at'] = now
+        routing['completed_by'] = user_id
+        routing['completion_notes'] = data.get('notes', '')
+        return {'completed_by': user_id}
+    return {}
+
+def apply_routing_action_batch(action, items, current_user, extra_fields=None, atomic=False):
+    """
+    Apply an approve/dispatch/receive/complete action to many routings at once.
+
+    Args:
+        action: Key of ROUTING_ACTIONS
+        items: List of dicts with 'routing_id' plus optional per-routing fields
+            (notes, courier_name, courier_contact, condition)
+        current_user: The authenticated user
+        extra_fields: Optional dict merged into every updated routing (e.g. manifest_id)
+        atomic: If True, nothing is written unless every item is valid
+
+    Returns:
+        (results, updated_routings) where results has one entry per item with
+        'routing_id', 'success' and 'error' (on failure)
+    """
+    spec = ROUTING_ACTIONS[action]
+    user_id = current_user.get('id')
+    user_tenant_id = current_user.get('tenant_id')
+    is_admin = current_user.get('role') == 'admin'
+    now = datetime.now().isoformat()
+
+    routings = read_data('sample_routings.json')
+    index_by_id = {r['id']: i for i, r in enumerate(routings)}
+
+    results = []
+    updated = []
+    workflow_items = []
+    notification_changes = []
+    seen = set()
+
+    for item in items:
+        routing_id = item.get('routing_id')
+        result = {'routing_id': routing_id, 'success': False}
+        results.append(result)
+
+        if routing_id in seen:
+            result['error'] = 'Duplicate routing in batch'
+            continue
+        seen.add(routing_id)
+
+        routing_index = index_by_id.get(routing_id)
+        if routing_index is None:
+            result['error'] = 'Routing not found'
+            continue
+
+        routing = routings[routing_index]
+        if routing.get(spec['facility']) != user_tenant_id and not is_admin:
+            result['error'] = spec['facility_error']
+            continue
+        if routing.get('status') != spec['required_status']:
+            result['error'] = spec['status_error']
+            continue
+
+        metadata = _apply_action_fields(action, routing, item, user_id, now)
+        routing['status'] = spec['new_status']
+        routing['updated_at'] = now
+        if extra_fields:
+            routing.update(extra_fields)
+
+        result['success'] = True
+        updated.append(routing)
+        workflow_items.append({
+            'routing_id': routing_id,
+            'target_stage_id': spec['new_status'],
+            'notes': item.get('notes') or spec['default_notes'],
+            'metadata': metadata
+        })
+        notification_changes.append({
+            'routing': routing,
+            'old_stage': spec['required_status'],
+            'new_stage': spec['new_status'],
+            'notes': item.get('notes', '')
+        })
+
+    if atomic and len(updated) != len(results):
+        for result in results:
+            if result['success']:
+                result['success'] = False
+                result['error'] = 'Not applied: batch contains invalid routings'
+        return results, []
+
+    if not updated:
+        return results, updated
+
+    write_data('sample_routings.json', routings)
+
+    if action == 'approve':
+        try:
+            from routes.invoice_routes import transfer_invoice_ownership_batch
+            transfer_invoice_ownership_batch([r['id'] for r in updated], user_id)
+        except Exception as e:
+            print(f"Warning: Failed to transfer invoice ownership for batch approval: {e}")
+
+    try:
+        workflow_results = WorkflowEngine.transition_many(workflow_items, user_id=user_id)
+        failed = [r for r in workflow_results if not r['success']]
+        if failed:
+            print(f"Warning: {len(failed)} workflow transitions failed in {action} batch: {failed[:3]}")
+    except Exception as e:
+        print(f"Warning: Batch workflow transition failed for {action}: {e}")
+
+    try:
+        NotificationService.notify_workflow_changes(notification_changes, user_id)
+    except Exception as e:
+        print(f"Warning: Batch notification failed for {action}: {e}")
+
+    return results, updated
+
+@sample_routing_bp.route('/api/samples/routing/batch/<action>', methods=['POST'])
+@token_required
+def batch_routing_action(action):
+    """
+    Approve, dispatch, receive or complete many routings in one request.
+
+    Body:
+        routing_ids: list of routing IDs (shared fields apply to all), and/or
+        items: list of {routing_id, notes, courier_name, courier_contact, condition}
+        notes, courier_name, courier_contact, condition: shared defaults
+    """
+    if action not in ROUTING_ACTIONS:
+        return jsonify({'message': f'Unsupported batch action: {action}'}), 400
+
+    data = request.get_json() or {}
+    shared = {k: data[k] for k in ('notes', 'courier_name', 'courier_contact', 'condition') if k in data}
+
+    items = [dict(shared, routing_id=routing_id) for routing_id in data.get('routing_ids', [])]
+    items.extend(dict(shared, **item) for item in data.get('items', []))
+
+    if not items:
+        return jsonify({'message': 'routing_ids or items is required'}), 400
+
+    results, updated = apply_routing_action_batch(action, items, request.current_user)
+
+    succeeded = sum(1 for r in results if r['success'])
+    return jsonify({
+        'message': f'{succeeded} of {len(results)} routings updated',
+        'action': action,
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'results': results
+    }), 200 if succeeded else 400
@@ -0,0 +1,47 @@
+"""
+Search Routes
+Unified typeahead search endpoints
+"""
+
+from flask import Blueprint, request, jsonify
+from utils import token_required
+from services.test_search_service import test_search_service, SOURCES
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/api/search/tests', methods=['GET'])
+@token_required
+def search_tests():
+    """
+    Ranked test search across test master, Excel test data and profiles.
+
+    Query params:
+        q: test name or code
+        source: comma separated subset of test_master, excel, profiles (default: all)
+        department: department filter
+        limit, offset: paging (limit capped at 100)
+    """
+    query = request.args.get('q', '')
+    department = request.args.get('department', '')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    sources = [s.strip() for s in request.args.get('source', '').split(',') if s.strip()]
+    unknown = [s for s in sources if s not in SOURCES]
+    if unknown:
+        return jsonify({'success': False, 'message': f"Unknown source: {', '.join(unknown)}"}), 400
+
+    try:
+        result = test_search_service.search(query, sources, department, limit=limit, offset=offset)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Test search failed: {str(e)}'}), 500
+
+    return jsonify({
+        'success': True,
+        'data': result['items'],
+        'total': result['total'],
+        'facets': result['facets'],
+        'query': query,
+        'limit': limit,
+        'offset': offset
+    })
@@ -6,6 +6,7 @@ from flask import Blueprint, jsonify, request
 from datetime import datetime
 from utils import token_required, read_data, write_data, filter_data_by_tenant, check_tenant_access, paginate_results
 from whatsapp_service import WhatsAppService
+from services.whatsapp_queue import delivery_queue
 
 whatsapp_bp = Blueprint('whatsapp', __name__, url_prefix='/api/whatsapp')
 
@@ -105,7 +106,7 @@ def get_messages():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('limit', 20, type=int)
     
-    messages = read_data('whatsapp_messages.json')
+    messages = delivery_queue.list_messages()
     
     # Filter messages based on user access
     filtered_messages = filter_data_by_tenant(messages, request.current_user)
@@ -149,7 +150,7 @@ def send_report():
         data['message']
     )
     
-    # Send message
+    # Queue message
     result = WhatsAppService.send_message(
         user_id=request.current_user['id'],
         tenant_id=user_tenant_id,
@@ -159,10 +160,15 @@ def send_report():
         order_id=data.get('order_id')
     )
     
-    if result['status'] == 'sent':
-        return jsonify({'message': f'Report sent to {data["phone_number"]} via WhatsApp successfully', 'result': result})
-    else:
+    if result['status'] == 'failed':
         return jsonify({'message': f'Failed to send WhatsApp message: {result.get("error_message", "Unknown error")}', 'result': result}), 500
+    
+    # Delivery happens in the background; poll /messages/<id> for the outcome
+    return jsonify({
+        'message': f'Report to {data["phone_number"]} queued for WhatsApp delivery',
+        'message_id': result['id'],
+        'result': result
+    }), 202
 
 @whatsapp_bp.route('/send/invoice', methods=['POST'])
 @token_required
@@ -195,7 +201,7 @@ def send_invoice():
         data['message']
     )
     
-    # Send message
+    # Queue message
     result = WhatsAppService.send_message(
         user_id=request.current_user['id'],
         tenant_id=user_tenant_id,
@@ -205,10 +211,106 @@ def send_invoice():
         billing_id=data.get('billing_id')
     )
     
-    if result['status'] == 'sent':
-        return jsonify({'message': f'Invoice sent to {data["phone_number"]} via WhatsApp successfully', 'result': result})
-    else:
+    if result['status'] == 'failed':
         return jsonify({'message': f'Failed to send WhatsApp message: {result.get("error_message", "Unknown error")}', 'result': result}), 500
+    
+    # Delivery happens in the background; poll /messages/<id> for the outcome
+    return jsonify({
+        'message': f'Invoice to {data["phone_number"]} queued for WhatsApp delivery',
+        'message_id': result['id'],
+        'result': result
+    }), 202
+
+@whatsapp_bp.route('/messages/<int:message_id>', methods=['GET'])
+@token_required
+def get_message_status(message_id):
+    """Get the delivery status of a queued WhatsApp message."""
+    message = WhatsAppService.get_message(message_id)
+    if not message:
+        return jsonify({'message': 'Message not found'}), 404
+    
+    if not check_tenant_access(message.get('tenant_id'), request.current_user):
+        return jsonify({'message': 'You do not have access to this message'}), 403
+    
+    return jsonify(message)
+
+@whatsapp_bp.route('/send/reports/bulk', methods=['POST'])
+@token_required
+def send_reports_bulk():
+    """
+    Queue WhatsApp notifications for all reports of a day (default: today).
+    
+    Body (all optional):
+        date: YYYY-MM-DD billing date to select reports for
+        authorized_only: only include authorized reports (default true)
+        message: message body; defaults to the tenant's report template
+    """
+    data = request.get_json(silent=True) or {}
+    
+    user_tenant_id = request.current_user.get('tenant_id')
+    if not user_tenant_id:
+        return jsonify({'message': 'User must be associated with a tenant'}), 400
+    
+    tenants = read_data('tenants.json')
+    tenant = next((t for t in tenants if t['id'] == user_tenant_id), None)
+    if not tenant:
+        return jsonify({'message': 'Tenant not found'}), 404
+    
+    config = WhatsAppService.get_config(user_tenant_id)
+    if not config or not config.get('is_enabled', False):
+        return jsonify({'message': 'WhatsApp integration is not enabled for this tenant'}), 400
+    
+    report_date = data.get('date') or datetime.now().strftime('%Y-%m-%d')
+    authorized_only = data.get('authorized_only', True)
+    template = data.get('message') or config.get('default_report_template') or \
+        'Your test results from AVINI LABS are ready. Patient: {patient_name}.'
+    
+    reports = [r for r in read_data('billing_reports.json')
+               if r.get('tenant_id') == user_tenant_id and r.get('billing_date') == report_date]
+    if authorized_only:
+        reports = [r for r in reports if r.get('authorized')]
+    
+    outgoing = []
+    skipped = []
+    for report in reports:
+        patient_info = report.get('patient_info') or {}
+        phone_number = patient_info.get('mobile')
+        if not phone_number:
+            skipped.append({'sid_number': report.get('sid_number'), 'reason': 'No patient mobile number'})
+            continue
+        
+        patient_name = patient_info.get('full_name') or \
+            f"{patient_info.get('first_name', '')} {patient_info.get('last_name', '')}".strip()
+        try:
+            body = template.format(patient_name=patient_name, sid_number=report.get('sid_number', ''))
+        except (KeyError, IndexError, ValueError):
+            body = template
+        
+        outgoing.append({
+            'recipient_number': phone_number,
+            'message_content': WhatsAppService.format_message_with_headers(
+                request.current_user, tenant, patient_name, body
+            ),
+            'message_type': 'report',
+            'billing_id': report.get('billing_id')
+        })
+    
+    queued = WhatsAppService.send_bulk(request.current_user['id'], user_tenant_id, outgoing)
+    
+    return jsonify({
+        'message': f'{len(queued)} report messages queued for WhatsApp delivery',
+        'date': report_date,
+        'queued_count': len(queued),
+        'message_ids': [m['id'] for m in queued],
+        'skipped': skipped
+    }), 202
+
+@whatsapp_bp.route('/queue/stats', methods=['GET'])
+@token_required
+def get_queue_stats():
+    """Get WhatsApp delivery queue statistics for the user's tenant (all tenants for admins)."""
+    tenant_id = None if request.current_user.get('role') == 'admin' else request.current_user.get('tenant_id')
+    return jsonify(delivery_queue.stats(tenant_id))
 
 @whatsapp_bp.route('/status', methods=['GET'])
 @token_required
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON persistence on the real data files: the previous stdlib
+``indent=2`` format against the compact format written through json_codec.
+
+Usage:
+    python scripts/benchmark_json.py [billing_reports.json billings.json ...] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_codec
+from utils import DATA_DIR
+
+DEFAULT_FILES = ['billing_reports.json', 'billings.json', 'excel_test_data.json', 'samples.json', 'patients.json']
+
+
+def best_of(repeat, func):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def benchmark_file(name, repeat):
+    path = os.path.join(DATA_DIR, name)
+    if not os.path.exists(path):
+        print(f"{name}: not found, skipped")
+        return
+    with open(path, 'rb') as f:
+        raw = f.read()
+    data = json.loads(raw)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.json')
+        compact_path = os.path.join(tmp, 'compact.json')
+
+        def write_legacy():
+            with open(legacy_path, 'w') as f:
+                json.dump(data, f, indent=2)
+
+        def read_legacy():
+            with open(legacy_path, 'r') as f:
+                json.load(f)
+
+        write_legacy_ms = best_of(repeat, write_legacy)
+        read_legacy_ms = best_of(repeat, read_legacy)
+        write_compact_ms = best_of(repeat, lambda: json_codec.dump_file(compact_path, data, pretty=False))
+        read_compact_ms = best_of(repeat, lambda: json_codec.load_file(compact_path))
+        legacy_size = os.path.getsize(legacy_path)
+        compact_size = os.path.getsize(compact_path)
+
+    print(f"{name}")
+    print(f"  size   {legacy_size:>12,} -> {compact_size:>12,} bytes ({compact_size / legacy_size:.0%})")
+    print(f"  write  {write_legacy_ms:>10.1f} ms -> {write_compact_ms:>10.1f} ms ({write_legacy_ms / write_compact_ms:.1f}x)")
+    print(f"  read   {read_legacy_ms:>10.1f} ms -> {read_compact_ms:>10.1f} ms ({read_legacy_ms / read_compact_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark JSON persistence formats')
+    parser.add_argument('files', nargs='*', default=DEFAULT_FILES)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"JSON backend: {json_codec.BACKEND} (legacy: stdlib json, indent=2)")
+    for name in args.files:
+        benchmark_file(name, args.repeat)
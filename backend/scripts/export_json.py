@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Export data files as pretty-printed JSON for humans, or convert data files
+between the compact and pretty storage formats in place.
+
+Usage:
+    python scripts/export_json.py --out /tmp/readable            # all files
+    python scripts/export_json.py billing_reports.json --out .   # one file
+    python scripts/export_json.py --in-place --format compact    # rewrite data/
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_codec
+from utils import DATA_DIR
+
+
+def resolve_files(names):
+    """Data files to process (relative to the data directory)"""
+    if names:
+        return names
+    return sorted(os.path.relpath(path, DATA_DIR)
+                  for path in glob.glob(os.path.join(DATA_DIR, '**', '*.json'), recursive=True))
+
+
+def export_files(names, out_dir=None, in_place=False, fmt='pretty'):
+    pretty = fmt == 'pretty'
+    for name in resolve_files(names):
+        source = os.path.join(DATA_DIR, name)
+        try:
+            data = json_codec.load_file(source)
+        except Exception as e:
+            print(f"✗ {name}: {e}")
+            continue
+
+        target = source if in_place else os.path.join(out_dir, name)
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        before = os.path.getsize(source)
+        json_codec.dump_file(target, data, pretty=pretty)
+        print(f"✓ {name}: {before:,} -> {os.path.getsize(target):,} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export or convert JSON data files')
+    parser.add_argument('files', nargs='*', help='data files relative to data/ (default: all)')
+    parser.add_argument('--out', help='directory for exported copies')
+    parser.add_argument('--in-place', action='store_true', help='rewrite the data files themselves')
+    parser.add_argument('--format', choices=['pretty', 'compact'], default='pretty')
+    args = parser.parse_args()
+
+    if not args.in_place and not args.out:
+        parser.error('either --out or --in-place is required')
+
+    print(f"JSON backend: {json_codec.BACKEND}")
+    export_files(args.files, args.out, args.in_place, args.format)
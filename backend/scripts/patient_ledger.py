@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Rebuild or check the patient billing ledger (data/patient_ledger.json).
+
+Usage:
+    python scripts/patient_ledger.py check      # compare ledger with billings.json
+    python scripts/patient_ledger.py rebuild    # recompute and save the ledger
+
+``check`` exits with status 1 when the ledger does not match billings.json.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.patient_ledger import patient_ledger
+
+
+def check(verbose=False):
+    if not patient_ledger.load_snapshot(require_current=False):
+        print("✗ No ledger snapshot found; run `python scripts/patient_ledger.py rebuild`")
+        return 1
+
+    report = patient_ledger.verify()
+    print(f"Checked {report['billings_checked']} billings for {report['patients_checked']} patients")
+    if not report['source_in_sync']:
+        print("! billings.json changed after the ledger was last updated")
+    if report['consistent']:
+        print("✓ Ledger matches billings.json")
+        return 0
+
+    print(f"✗ {len(report['mismatches'])} mismatches")
+    for mismatch in report['mismatches'][:None if verbose else 20]:
+        print(f"  {mismatch}")
+    print("Run `python scripts/patient_ledger.py rebuild` to recompute the ledger")
+    return 1
+
+
+def rebuild():
+    patient_ledger.rebuild()
+    patient_ledger.snapshot()
+    report = patient_ledger.verify()
+    print(f"✓ Rebuilt ledger: {report['patients_checked']} patients, {report['billings_checked']} billings")
+    return 0 if report['consistent'] else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['check', 'rebuild'])
+    parser.add_argument('-v', '--verbose', action='store_true', help='list every mismatch')
+    args = parser.parse_args()
+
+    sys.exit(check(args.verbose) if args.command == 'check' else rebuild())
+
+
+if __name__ == '__main__':
+    main()
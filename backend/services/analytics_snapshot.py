@@ -0,0 +1,537 @@
+"""
+Analytics Snapshot
+Columnar (NumPy) snapshot of billings.json and billing_reports.json for
+vectorised filter/group-by queries: revenue by franchise, department, test or
+referrer over arbitrary periods.
+"""
+
+import os
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils import read_data, DATA_DIR
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+TIME_GROUPS = ('day', 'month')
+
+
+class AnalyticsError(Exception):
+    """Raised for invalid analytics queries"""
+
+
+def _amount(value) -> float:
+    try:
+        if value is None or value == '':
+            return 0.0
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _day_number(value) -> Optional[int]:
+    """Days since 1970-01-01 of an ISO date/datetime string"""
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal() - EPOCH_ORDINAL
+    except (TypeError, ValueError):
+        return None
+
+
+def _month_number(day: int) -> int:
+    d = date.fromordinal(day + EPOCH_ORDINAL)
+    return d.year * 12 + d.month - 1
+
+
+def _label(value) -> object:
+    return value if value not in (None, '') else 'Unknown'
+
+
+# ----------------------------------------------------------------------
+# Row extraction: each returns (day, {dim: value}, {measure: float}) rows
+# ----------------------------------------------------------------------
+
+def billing_rows(billing: Dict) -> List[Tuple]:
+    day = _day_number(billing.get('invoice_date') or billing.get('created_at'))
+    if day is None:
+        return []
+    total_amount = _amount(billing.get('total_amount'))
+    paid_amount = _amount(billing.get('paid_amount'))
+    items = billing.get('items') if isinstance(billing.get('items'), list) else []
+    dims = {
+        'tenant': billing.get('tenant_id'),
+        'payment_status': _label(billing.get('payment_status')),
+        'payment_method': _label(billing.get('payment_method')),
+        'created_by': billing.get('created_by')
+    }
+    measures = {
+        'net': total_amount,
+        'gross': _amount(billing.get('subtotal')),
+        'discount': _amount(billing.get('discount_amount', billing.get('discount'))),
+        'gst': _amount(billing.get('tax_amount', billing.get('tax'))),
+        'paid': paid_amount,
+        'due': max(total_amount - paid_amount, 0.0),
+        'tests': float(len(items))
+    }
+    return [(day, dims, measures)]
+
+
+def billing_item_rows(billing: Dict) -> List[Tuple]:
+    day = _day_number(billing.get('invoice_date') or billing.get('created_at'))
+    if day is None:
+        return []
+    rows = []
+    for item in billing.get('items') or []:
+        if not isinstance(item, dict):
+            continue
+        quantity = _amount(item.get('quantity')) or 1.0
+        dims = {
+            'tenant': billing.get('tenant_id'),
+            'test': _label(item.get('test_name') or item.get('testName')),
+            'department': str(_label(item.get('department'))).upper(),
+            'referrer': _label(item.get('referralSource') or billing.get('referrer'))
+        }
+        amount = item.get('amount', item.get('total'))
+        if amount in (None, ''):
+            amount = _amount(item.get('price', item.get('unit_price'))) * quantity
+        rows.append((day, dims, {'amount': _amount(amount), 'quantity': quantity}))
+    return rows
+
+
+def report_rows(report: Dict) -> List[Tuple]:
+    day = _day_number(report.get('billing_date'))
+    if day is None:
+        return []
+    summary = report.get('financial_summary') or {}
+    metadata = report.get('metadata') or {}
+    total_amount = _amount(summary.get('total_amount'))
+    paid_amount = _amount(summary.get('paid_amount'))
+    dims = {
+        'tenant': report.get('tenant_id'),
+        'referrer': _label((report.get('billing_header') or {}).get('referring_doctor')),
+        'status': _label(metadata.get('status')),
+        'payment_status': _label((report.get('billing_header') or {}).get('payment_status'))
+    }
+    measures = {
+        'net': total_amount,
+        'gross': _amount(summary.get('subtotal')),
+        'discount': _amount(summary.get('discount_amount')),
+        'gst': _amount(summary.get('gst_amount')),
+        'paid': paid_amount,
+        'due': max(total_amount - paid_amount, 0.0),
+        'tests': _amount(metadata.get('total_tests'))
+    }
+    return [(day, dims, measures)]
+
+
+def report_item_rows(report: Dict) -> List[Tuple]:
+    day = _day_number(report.get('billing_date'))
+    if day is None:
+        return []
+    referrer = _label((report.get('billing_header') or {}).get('referring_doctor'))
+    rows = []
+    for item in report.get('test_items') or []:
+        if not isinstance(item, dict):
+            continue
+        quantity = _amount(item.get('quantity')) or 1.0
+        dims = {
+            'tenant': report.get('tenant_id'),
+            'test': _label(item.get('test_name')),
+            'department': str(_label(item.get('department'))).upper(),
+            'referrer': referrer
+        }
+        rows.append((day, dims, {'amount': _amount(item.get('amount')), 'quantity': quantity}))
+    return rows
+
+
+class _Categories:
+    """Value <-> integer code mapping of one categorical column"""
+
+    __slots__ = ('codes', 'labels')
+
+    def __init__(self):
+        self.codes: Dict[object, int] = {}
+        self.labels: List[object] = []
+
+    def code(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.labels)
+            self.labels.append(value)
+        return code
+
+
+class ColumnarTable:
+    """
+    Append-only column store.
+
+    ``day``/``month`` are int32 day and month numbers, every dimension is an
+    int32 code column with its ``_Categories``, every measure a float64
+    column. Rows belong to a source record id; replacing or deleting a record
+    clears the ``valid`` flag of its old rows, and the table is rebuilt when
+    too many rows are invalid.
+    """
+
+    def __init__(self, name: str, source: str, extract: Callable, dims: Tuple[str, ...],
+                 measures: Tuple[str, ...]):
+        self.name = name
+        self.source = source
+        self.extract = extract
+        self.dims = dims
+        self.measures = measures
+        self.reset()
+
+    def reset(self):
+        self.size = 0
+        self.invalid = 0
+        self.categories = {dim: _Categories() for dim in self.dims}
+        self.columns: Dict[str, 'np.ndarray'] = {}
+        self.rows_by_record: Dict[object, List[int]] = {}
+        self._allocate(0)
+
+    def _allocate(self, capacity: int):
+        old = self.columns
+        self.columns = {'day': np.zeros(capacity, dtype=np.int32),
+                        'month': np.zeros(capacity, dtype=np.int32),
+                        'valid': np.zeros(capacity, dtype=bool)}
+        for dim in self.dims:
+            self.columns[dim] = np.zeros(capacity, dtype=np.int32)
+        for measure in self.measures:
+            self.columns[measure] = np.zeros(capacity, dtype=np.float64)
+        for key, array in old.items():
+            self.columns[key][:self.size] = array[:self.size]
+
+    def load(self, records: Iterable[Dict]):
+        """Build all columns from the source records in one pass"""
+        self.reset()
+        values = {key: [] for key in ('day', 'month', *self.dims, *self.measures)}
+        for record in records:
+            record_id = record.get('id')
+            if record_id is None:
+                continue
+            rows = self.extract(record)
+            self.rows_by_record[record_id] = list(range(self.size, self.size + len(rows)))
+            for day, dims, measures in rows:
+                values['day'].append(day)
+                values['month'].append(_month_number(day))
+                for dim in self.dims:
+                    values[dim].append(self.categories[dim].code(dims.get(dim)))
+                for measure in self.measures:
+                    values[measure].append(measures.get(measure, 0.0))
+                self.size += 1
+
+        self.columns = {
+            'day': np.array(values['day'], dtype=np.int32),
+            'month': np.array(values['month'], dtype=np.int32),
+            'valid': np.ones(self.size, dtype=bool)
+        }
+        for dim in self.dims:
+            self.columns[dim] = np.array(values[dim], dtype=np.int32)
+        for measure in self.measures:
+            self.columns[measure] = np.array(values[measure], dtype=np.float64)
+
+    def upsert(self, record: Dict):
+        """Replace the rows of one source record"""
+        self.remove(record.get('id'))
+        rows = self.extract(record)
+        if not rows:
+            return
+        needed = self.size + len(rows)
+        capacity = len(self.columns['day'])
+        if needed > capacity:
+            self._allocate(max(needed, capacity * 2, 64))
+
+        indexes = []
+        for day, dims, measures in rows:
+            i = self.size
+            self.columns['day'][i] = day
+            self.columns['month'][i] = _month_number(day)
+            self.columns['valid'][i] = True
+            for dim in self.dims:
+                self.columns[dim][i] = self.categories[dim].code(dims.get(dim))
+            for measure in self.measures:
+                self.columns[measure][i] = measures.get(measure, 0.0)
+            indexes.append(i)
+            self.size += 1
+        self.rows_by_record[record.get('id')] = indexes
+
+    def remove(self, record_id):
+        for i in self.rows_by_record.pop(record_id, []):
+            self.columns['valid'][i] = False
+            self.invalid += 1
+
+    def needs_compaction(self) -> bool:
+        return self.invalid > 1000 and self.invalid > self.size // 4
+
+    def view(self) -> Dict[str, 'np.ndarray']:
+        return {key: array[:self.size] for key, array in self.columns.items()}
+
+
+TABLE_SPECS = {
+    'billings': ('billings.json', billing_rows,
+                 ('tenant', 'payment_status', 'payment_method', 'created_by'),
+                 ('net', 'gross', 'discount', 'gst', 'paid', 'due', 'tests')),
+    'billing_items': ('billings.json', billing_item_rows,
+                      ('tenant', 'test', 'department', 'referrer'),
+                      ('amount', 'quantity')),
+    'reports': ('billing_reports.json', report_rows,
+                ('tenant', 'referrer', 'status', 'payment_status'),
+                ('net', 'gross', 'discount', 'gst', 'paid', 'due', 'tests')),
+    'report_items': ('billing_reports.json', report_item_rows,
+                     ('tenant', 'test', 'department', 'referrer'),
+                     ('amount', 'quantity')),
+}
+
+
+class AnalyticsSnapshot:
+    """
+    Columnar snapshot of the billing data.
+
+    Tables over ``billings.json`` are patched in place when the billing
+    routes call ``record_billing``/``remove_billing``; the report tables and
+    any billings written elsewhere are rebuilt when their file's mtime/size
+    changes, either by the background refresher or on the next query.
+
+    ``query`` filters with boolean masks and groups with ``np.unique`` over
+    the stacked group codes plus ``np.bincount`` for the sums, so a group-by
+    costs a few passes over flat arrays instead of a Python loop over dicts.
+    """
+
+    def __init__(self, refresh_interval: float = 30.0):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._tables: Dict[str, ColumnarTable] = {}
+        self._versions: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._built_at: Dict[str, float] = {}
+        self._worker = None
+
+    @staticmethod
+    def available() -> bool:
+        return NUMPY_AVAILABLE
+
+    # ------------------------------------------------------------------
+    # Building and refreshing
+    # ------------------------------------------------------------------
+
+    def _file_version(self, filename: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(os.path.join(DATA_DIR, filename))
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _ensure_tables(self):
+        if not self._tables:
+            for name, (source, extract, dims, measures) in TABLE_SPECS.items():
+                self._tables[name] = ColumnarTable(name, source, extract, dims, measures)
+
+    def rebuild_source(self, filename: str):
+        """Rebuild every table fed by one data file"""
+        with self._lock:
+            self._ensure_tables()
+            version = self._file_version(filename)
+            try:
+                records = read_data(filename)
+            except Exception as e:
+                print(f"Warning: Failed to load {filename} for analytics: {e}")
+                records = []
+            for table in self._tables.values():
+                if table.source == filename:
+                    table.load(records)
+            self._versions[filename] = version
+            self._built_at[filename] = time.time()
+
+    def refresh(self):
+        """Rebuild sources whose files changed since the last build"""
+        with self._lock:
+            self._ensure_tables()
+            sources = {table.source for table in self._tables.values()}
+            for filename in sources:
+                compact = any(t.needs_compaction() for t in self._tables.values() if t.source == filename)
+                if compact or self._file_version(filename) != self._versions.get(filename, False):
+                    self.rebuild_source(filename)
+            self._start_worker()
+
+    def _start_worker(self):
+        if self._worker is not None or not self.refresh_interval:
+            return
+        self._worker = threading.Thread(target=self._run_worker, name='analytics-snapshot', daemon=True)
+        self._worker.start()
+
+    def _run_worker(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Warning: Analytics snapshot refresh failed: {e}")
+
+    def _billing_tables(self) -> List[ColumnarTable]:
+        return [t for t in self._tables.values() if t.source == 'billings.json']
+
+    def record_billing(self, billing: Dict):
+        """Patch the billing tables after a billing was written"""
+        if not NUMPY_AVAILABLE:
+            return
+        with self._lock:
+            if 'billings.json' not in self._versions:
+                return  # not built yet; the first query builds it
+            for table in self._billing_tables():
+                table.upsert(billing)
+            self._versions['billings.json'] = self._file_version('billings.json')
+
+    def remove_billing(self, billing_id):
+        """Drop a deleted billing from the billing tables"""
+        if not NUMPY_AVAILABLE:
+            return
+        with self._lock:
+            if 'billings.json' not in self._versions:
+                return
+            for table in self._billing_tables():
+                table.remove(billing_id)
+            self._versions['billings.json'] = self._file_version('billings.json')
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+
+    def describe(self) -> Dict:
+        """Tables with their dimensions, measures and row counts"""
+        if not NUMPY_AVAILABLE:
+            raise AnalyticsError('Analytics requires numpy')
+        with self._lock:
+            self.refresh()
+            return {
+                name: {
+                    'source': table.source,
+                    'dimensions': list(table.dims) + list(TIME_GROUPS),
+                    'measures': list(table.measures),
+                    'rows': table.size - table.invalid,
+                    'built_at': self._built_at.get(table.source)
+                }
+                for name, table in self._tables.items()
+            }
+
+    @staticmethod
+    def _codes_for(table: ColumnarTable, dim: str, values: Iterable) -> 'np.ndarray':
+        codes = table.categories[dim].codes
+        wanted = []
+        for value in values:
+            if value in codes:
+                wanted.append(codes[value])
+            elif isinstance(value, str) and value.lstrip('-').isdigit() and int(value) in codes:
+                wanted.append(codes[int(value)])
+        return np.array(wanted, dtype=np.int32)
+
+    @staticmethod
+    def _time_label(group: str, value: int) -> str:
+        if group == 'day':
+            return date.fromordinal(int(value) + EPOCH_ORDINAL).isoformat()
+        return f"{int(value) // 12}-{int(value) % 12 + 1:02d}"
+
+    def query(self, table_name: str, measures: Optional[List[str]] = None,
+              group_by: Optional[List[str]] = None, filters: Optional[Dict[str, List]] = None,
+              date_from: Optional[str] = None, date_to: Optional[str] = None,
+              tenant_ids: Optional[Iterable] = None, order_by: Optional[str] = None,
+              descending: bool = True, limit: Optional[int] = None) -> Dict:
+        """
+        Sum ``measures`` over the rows matching ``filters`` (``{dim: [values]}``),
+        the inclusive date range and ``tenant_ids`` (None means all), grouped
+        by dimensions and/or ``day``/``month``. Returns ``{'rows', 'totals',
+        'groups'}``; every row also has a ``count`` of matching source rows.
+        """
+        if not NUMPY_AVAILABLE:
+            raise AnalyticsError('Analytics requires numpy')
+
+        with self._lock:
+            self.refresh()
+            table = self._tables.get(table_name)
+            if table is None:
+                raise AnalyticsError(f"Unknown table {table_name!r}; use one of: {', '.join(self._tables)}")
+
+            measures = measures or list(table.measures)
+            group_by = group_by or []
+            for measure in measures:
+                if measure not in table.measures:
+                    raise AnalyticsError(f"Unknown measure {measure!r} for {table_name}")
+            for group in group_by:
+                if group not in table.dims and group not in TIME_GROUPS:
+                    raise AnalyticsError(f"Unknown dimension {group!r} for {table_name}")
+            for dim in (filters or {}):
+                if dim not in table.dims:
+                    raise AnalyticsError(f"Unknown filter dimension {dim!r} for {table_name}")
+
+            columns = table.view()
+            mask = columns['valid'].copy()
+            if date_from:
+                start = _day_number(date_from)
+                if start is None:
+                    raise AnalyticsError(f'Invalid date {date_from!r}')
+                mask &= columns['day'] >= start
+            if date_to:
+                end = _day_number(date_to)
+                if end is None:
+                    raise AnalyticsError(f'Invalid date {date_to!r}')
+                mask &= columns['day'] <= end
+            if tenant_ids is not None:
+                mask &= np.isin(columns['tenant'], self._codes_for(table, 'tenant', tenant_ids))
+            for dim, values in (filters or {}).items():
+                mask &= np.isin(columns[dim], self._codes_for(table, dim, values))
+
+            selected = {key: columns[key][mask] for key in (*group_by, *measures)}
+            labels = {dim: list(table.categories[dim].labels) for dim in group_by if dim in table.dims}
+
+        row_count = int(mask.sum())
+        totals = {measure: round(float(selected[measure].sum()), 2) for measure in measures}
+        totals['count'] = row_count
+
+        if not group_by:
+            return {'rows': [], 'totals': totals, 'groups': []}
+
+        stacked = np.stack([selected[group] for group in group_by], axis=1) if row_count else \
+            np.zeros((0, len(group_by)), dtype=np.int32)
+        keys, inverse = np.unique(stacked, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        counts = np.bincount(inverse, minlength=len(keys))
+        sums = {measure: np.bincount(inverse, weights=selected[measure], minlength=len(keys))
+                for measure in measures}
+
+        order = np.arange(len(keys))
+        if order_by:
+            if order_by == 'count':
+                sort_values = counts
+            elif order_by in sums:
+                sort_values = sums[order_by]
+            else:
+                raise AnalyticsError(f"Cannot order by {order_by!r}")
+            order = np.argsort(sort_values, kind='stable')
+            if descending:
+                order = order[::-1]
+        if limit:
+            order = order[:limit]
+
+        rows = []
+        for i in order:
+            row = {}
+            for position, group in enumerate(group_by):
+                code = keys[i][position]
+                row[group] = self._time_label(group, code) if group in TIME_GROUPS else labels[group][code]
+            for measure in measures:
+                row[measure] = round(float(sums[measure][i]), 2)
+            row['count'] = int(counts[i])
+            rows.append(row)
+
+        return {'rows': rows, 'totals': totals, 'groups': len(keys)}
+
+
+analytics_snapshot = AnalyticsSnapshot(
+    refresh_interval=float(os.environ.get('ANALYTICS_REFRESH_SECONDS', 30))
+)
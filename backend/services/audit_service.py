@@ -4,12 +4,13 @@ Comprehensive error handling, logging, and audit trail for all report generation
 with user-friendly error messages and actionable guidance.
 """
 
-import json
 import os
+import uuid
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import logging
 from enum import Enum
+from .audit_sink import get_audit_sink
 
 # Configure logging
 log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
@@ -37,6 +38,7 @@ class AuditEventType(Enum):
     PDF_GENERATION_STARTED = "pdf_generation_started"
     PDF_GENERATION_SUCCESS = "pdf_generation_success"
     PDF_GENERATION_FAILED = "pdf_generation_failed"
+    REPORT_AUTHORIZATION = "report_authorization"
     SEARCH_PERFORMED = "search_performed"
     ACCESS_DENIED = "access_denied"
     DATA_VALIDATION_ERROR = "data_validation_error"
@@ -61,18 +63,24 @@ class AuditService:
         log_dir = os.path.join(os.path.dirname(data_dir), "logs")
         os.makedirs(log_dir, exist_ok=True)
         
-        # Initialize audit files
-        self._init_audit_files()
+        # Initialize append-only audit sinks (shared per data directory)
+        self._init_audit_sinks()
     
-    def _init_audit_files(self):
-        """Initialize audit files if they don't exist"""
+    def _init_audit_sinks(self):
+        """Initialize the JSON-lines audit and error sinks, importing legacy JSON logs once"""
         # Ensure data directory exists
         os.makedirs(self.data_dir, exist_ok=True)
 
-        for file_path in [self.audit_file, self.error_log_file]:
-            if not os.path.exists(file_path):
-                with open(file_path, 'w') as f:
-                    json.dump([], f)
+        self.audit_sink = get_audit_sink(
+            self.data_dir, "audit_trail",
+            index_fields=("event_type", "tenant_id"),
+            legacy_file=self.audit_file
+        )
+        self.error_sink = get_audit_sink(
+            self.data_dir, "error_log",
+            index_fields=("error_type", "severity", "tenant_id", "resolved"),
+            legacy_file=self.error_log_file
+        )
     
     def log_audit_event(self, 
                        event_type: AuditEventType, 
@@ -94,16 +102,8 @@ class AuditService:
                 'user_agent': self._get_user_agent()
             }
             
-            # Read existing audit trail
-            audit_trail = self._read_json_file(self.audit_file)
-            audit_trail.append(audit_entry)
-            
-            # Keep only last 10000 entries to prevent file from growing too large
-            if len(audit_trail) > 10000:
-                audit_trail = audit_trail[-10000:]
-            
-            # Write back to file
-            self._write_json_file(self.audit_file, audit_trail)
+            # Hand off to the background writer; rotation bounds the file size
+            self.audit_sink.append(audit_entry)
             
             # Log to application logger
             log_message = f"Audit: {event_type.value} - User: {user_id} - Tenant: {tenant_id} - Success: {success}"
@@ -140,16 +140,8 @@ class AuditService:
                 'resolution_notes': None
             }
             
-            # Read existing error log
-            error_log = self._read_json_file(self.error_log_file)
-            error_log.append(error_entry)
-            
-            # Keep only last 5000 entries
-            if len(error_log) > 5000:
-                error_log = error_log[-5000:]
-            
-            # Write back to file
-            self._write_json_file(self.error_log_file, error_log)
+            # Hand off to the background writer; rotation bounds the file size
+            self.error_sink.append(error_entry)
             
             # Log to application logger based on severity
             log_message = f"Error: {error_type} - {error_message} - Severity: {severity.value}"
@@ -230,37 +222,29 @@ class AuditService:
                        start_date: Optional[str] = None,
                        end_date: Optional[str] = None,
                        limit: int = 100) -> List[Dict]:
-        """Get filtered audit trail"""
+        """Get filtered audit trail (newest first)"""
         try:
-            audit_trail = self._read_json_file(self.audit_file)
+            # Make sure events queued by this process are visible
+            self.audit_sink.flush()
             
-            # Apply filters
-            filtered_trail = []
-            for entry in audit_trail:
-                # User filter
-                if user_id is not None and entry.get('user_id') != user_id:
-                    continue
-                
-                # Tenant filter
-                if tenant_id is not None and entry.get('tenant_id') != tenant_id:
-                    continue
-                
-                # Event type filter
-                if event_type is not None and entry.get('event_type') != event_type:
-                    continue
-                
-                # Date filters
-                entry_date = entry.get('timestamp', '')[:10]  # YYYY-MM-DD
-                if start_date and entry_date < start_date:
-                    continue
-                if end_date and entry_date > end_date:
-                    continue
-                
-                filtered_trail.append(entry)
+            # Event type and tenant are indexed; user is checked on the fetched entries
+            filters = {}
+            if event_type is not None:
+                filters['event_type'] = event_type
+            if tenant_id is not None:
+                filters['tenant_id'] = tenant_id
             
-            # Sort by timestamp (newest first) and limit
-            filtered_trail.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-            return filtered_trail[:limit]
+            predicate = None
+            if user_id is not None:
+                predicate = lambda entry: entry.get('user_id') == user_id
+            
+            return self.audit_sink.query(
+                filters=filters,
+                start_day=start_date,
+                end_day=end_date,
+                predicate=predicate,
+                limit=limit
+            )
             
         except Exception as e:
             logger.error(f"Failed to get audit trail: {str(e)}")
@@ -269,72 +253,31 @@ class AuditService:
     def get_error_statistics(self, days: int = 7) -> Dict[str, Any]:
         """Get error statistics for the specified number of days"""
         try:
-            error_log = self._read_json_file(self.error_log_file)
+            self.error_sink.flush()
             
-            # Filter by date
+            # Answered entirely from the error index
             cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
-            recent_errors = [e for e in error_log if e.get('timestamp', '') >= cutoff_date]
+            counts = self.error_sink.aggregate(since=cutoff_date)
             
-            # Calculate statistics
-            stats = {
-                'total_errors': len(recent_errors),
-                'by_severity': {},
-                'by_type': {},
-                'by_day': {},
-                'unresolved_count': 0
+            return {
+                'total_errors': counts['total'],
+                'by_severity': {k if k is not None else 'unknown': v for k, v in counts['severity'].items()},
+                'by_type': {k if k is not None else 'unknown': v for k, v in counts['error_type'].items()},
+                'by_day': counts['by_day'],
+                'unresolved_count': sum(v for k, v in counts['resolved'].items() if not k)
             }
             
-            for error in recent_errors:
-                # By severity
-                severity = error.get('severity', 'unknown')
-                stats['by_severity'][severity] = stats['by_severity'].get(severity, 0) + 1
-                
-                # By type
-                error_type = error.get('error_type', 'unknown')
-                stats['by_type'][error_type] = stats['by_type'].get(error_type, 0) + 1
-                
-                # By day
-                error_date = error.get('timestamp', '')[:10]
-                stats['by_day'][error_date] = stats['by_day'].get(error_date, 0) + 1
-                
-                # Unresolved count
-                if not error.get('resolved', False):
-                    stats['unresolved_count'] += 1
-            
-            return stats
-            
         except Exception as e:
             logger.error(f"Failed to get error statistics: {str(e)}")
             return {}
     
-    def _read_json_file(self, file_path: str) -> List[Dict]:
-        """Read JSON file with error handling"""
-        try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return []
-        except Exception as e:
-            logger.error(f"Error reading {file_path}: {str(e)}")
-            return []
-    
-    def _write_json_file(self, file_path: str, data: List[Dict]) -> bool:
-        """Write JSON file with error handling"""
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            return True
-        except Exception as e:
-            logger.error(f"Error writing {file_path}: {str(e)}")
-            return False
-    
     def _generate_audit_id(self) -> str:
         """Generate unique audit ID"""
-        return f"AUD_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        return f"AUD_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{uuid.uuid4().hex[:8]}"
     
     def _generate_error_id(self) -> str:
         """Generate unique error ID"""
-        return f"ERR_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        return f"ERR_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{uuid.uuid4().hex[:8]}"
     
     def _get_client_ip(self) -> str:
         """Get client IP address (placeholder)"""
@@ -0,0 +1,424 @@
+"""
+Audit Sink
+Append-only JSON-lines storage for audit and error events with size/day based
+segment rotation, optional retention, a background flushing queue and an
+in-memory index by day and selected fields.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+# Retention is off unless configured: audit history is kept indefinitely.
+# AUDIT_RETENTION_MAX_ENTRIES keeps at least that many of the newest events and
+# AUDIT_RETENTION_DAYS keeps everything from that many days back.
+AUDIT_RETENTION_MAX_ENTRIES = int(os.environ.get('AUDIT_RETENTION_MAX_ENTRIES', 0)) or None
+AUDIT_RETENTION_DAYS = int(os.environ.get('AUDIT_RETENTION_DAYS', 0)) or None
+
+
+class AuditSink:
+    """
+    Append-only, rotating JSON-lines event log.
+
+    Events are enqueued by request threads and written by a single background
+    thread, so logging never waits on disk I/O. Each stream is stored as numbered
+    segments (``<name>-000001.jsonl`` ...) under ``<data_dir>/audit``; the active
+    segment is rotated when it exceeds ``max_bytes`` or when the day changes.
+    Rotated segments get a sidecar ``.idx.json`` so the index can be reloaded
+    without re-parsing the events.
+
+    Nothing is deleted by default. With ``max_entries`` and/or ``max_age_days``
+    set, whole rotated segments are dropped once they are no longer needed to
+    keep the newest ``max_entries`` events or the events of the last
+    ``max_age_days`` days; the active segment is never dropped.
+
+    The index maps ``(field, value)`` and ``day`` to record ids, where a record
+    is ``(segment, offset, timestamp, indexed values)``. Queries pick the
+    smallest candidate posting list and only read the matching lines from disk.
+    """
+
+    def __init__(self, data_dir: str, name: str, index_fields: Iterable[str],
+                 legacy_file: Optional[str] = None, max_bytes: int = 5 * 1024 * 1024,
+                 max_entries: Optional[int] = None, max_age_days: Optional[int] = None):
+        self.name = name
+        self.index_fields = tuple(index_fields)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.directory = os.path.join(data_dir, "audit")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue()
+
+        # Index state
+        self._records: Dict[int, Tuple[int, int, str, Tuple]] = {}
+        self._by_day: Dict[str, List[int]] = {}
+        self._postings: Dict[Tuple[str, Any], List[int]] = {}
+        self._segment_records: Dict[int, List[int]] = {}
+        self._next_record_id = 0
+
+        # Active segment state (only touched by the writer thread after load)
+        self._segments: List[int] = []
+        self._active_day: Optional[str] = None
+        self._active_size = 0
+
+        self._load()
+        if not self._segments:
+            self._open_segment(1)
+            if legacy_file:
+                self._import_legacy(legacy_file)
+
+        self._worker = threading.Thread(target=self._run_writer, name=f"audit-sink-{name}", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    # ------------------------------------------------------------------
+    # Segment helpers
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{self.name}-{segment:06d}.jsonl")
+
+    def _sidecar_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{self.name}-{segment:06d}.idx.json")
+
+    def _open_segment(self, segment: int):
+        """Make ``segment`` the active segment"""
+        self._segments.append(segment)
+        self._segment_records.setdefault(segment, [])
+        path = self._segment_path(segment)
+        self._active_size = os.path.getsize(path) if os.path.exists(path) else 0
+        self._active_day = None
+
+    @property
+    def _active_segment(self) -> int:
+        return self._segments[-1]
+
+    def _load(self):
+        """Rebuild the index from sidecars (rotated segments) and the active segment"""
+        prefix = f"{self.name}-"
+        segments = sorted(
+            int(filename[len(prefix):-len(".jsonl")])
+            for filename in os.listdir(self.directory)
+            if filename.startswith(prefix) and filename.endswith(".jsonl")
+        )
+        for position, segment in enumerate(segments):
+            is_active = position == len(segments) - 1
+            self._segments.append(segment)
+            self._segment_records[segment] = []
+
+            sidecar = self._sidecar_path(segment)
+            if not is_active and os.path.exists(sidecar):
+                try:
+                    with open(sidecar, 'r', encoding='utf-8') as f:
+                        for offset, timestamp, values in json.load(f):
+                            self._add_record(segment, offset, timestamp, tuple(values))
+                    continue
+                except Exception as e:
+                    logger.warning(f"Audit index sidecar {sidecar} unreadable, rescanning: {e}")
+
+            self._scan_segment(segment)
+
+        if self._segments:
+            path = self._segment_path(self._active_segment)
+            self._active_size = os.path.getsize(path)
+            last = self._segment_records[self._active_segment]
+            self._active_day = self._records[last[-1]][2][:10] if last else None
+
+    def _scan_segment(self, segment: int):
+        """Index a segment by reading every line"""
+        offset = 0
+        with open(self._segment_path(segment), 'rb') as f:
+            for line in f:
+                try:
+                    entry = json_codec.loads(line)
+                    self._add_record(segment, offset, entry.get('timestamp', ''), self._index_values(entry))
+                except ValueError:
+                    logger.warning(f"Skipping corrupt audit line in {self._segment_path(segment)} at {offset}")
+                offset += len(line)
+
+    def _import_legacy(self, legacy_file: str):
+        """One-time import of a legacy JSON array log into the first segment"""
+        try:
+            if not os.path.exists(legacy_file):
+                return
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            if entries:
+                self._write_batch(entries)
+                logger.info(f"Imported {len(entries)} legacy entries from {legacy_file} into audit sink")
+        except Exception as e:
+            logger.error(f"Failed to import legacy audit file {legacy_file}: {e}")
+
+    # ------------------------------------------------------------------
+    # Index helpers
+    # ------------------------------------------------------------------
+
+    def _index_values(self, entry: Dict) -> Tuple:
+        return tuple(entry.get(field) for field in self.index_fields)
+
+    def _add_record(self, segment: int, offset: int, timestamp: str, values: Tuple):
+        with self._lock:
+            record_id = self._next_record_id
+            self._next_record_id += 1
+            self._records[record_id] = (segment, offset, timestamp, values)
+            self._segment_records[segment].append(record_id)
+            self._by_day.setdefault(timestamp[:10], []).append(record_id)
+            for field, value in zip(self.index_fields, values):
+                self._postings.setdefault((field, value), []).append(record_id)
+
+    def _rebuild_postings(self):
+        """Rebuild day/field postings after records were dropped"""
+        self._by_day = {}
+        self._postings = {}
+        for record_id in sorted(self._records):
+            _, _, timestamp, values = self._records[record_id]
+            self._by_day.setdefault(timestamp[:10], []).append(record_id)
+            for field, value in zip(self.index_fields, values):
+                self._postings.setdefault((field, value), []).append(record_id)
+
+    # ------------------------------------------------------------------
+    # Writer
+    # ------------------------------------------------------------------
+
+    def append(self, entry: Dict):
+        """Enqueue an event for the background writer (never blocks on I/O)"""
+        self._queue.put(entry)
+
+    def _run_writer(self):
+        while True:
+            entry = self._queue.get()
+            batch = [entry]
+            # Drain whatever else is waiting so it goes out in one write
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            entries = [e for e in batch if e is not None]
+            try:
+                if entries:
+                    self._write_batch(entries)
+            except Exception as e:
+                logger.error(f"Audit sink {self.name} failed to write {len(entries)} events: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, entries: List[Dict]):
+        """Write entries to the active segment, rotating as needed"""
+        pending = []
+        for entry in entries:
+            timestamp = entry.get('timestamp', '')
+            line = json_codec.dumps(entry) + b'\n'
+
+            day = timestamp[:10]
+            if self._active_size and (self._active_size + len(line) > self.max_bytes or
+                                      (self._active_day and day != self._active_day)):
+                self._flush_lines(pending)
+                pending = []
+                self._rotate()
+
+            pending.append((line, timestamp, self._index_values(entry)))
+            self._active_size += len(line)
+            self._active_day = day
+
+        self._flush_lines(pending)
+
+    def _flush_lines(self, pending: List[Tuple[bytes, str, Tuple]]):
+        if not pending:
+            return
+        segment = self._active_segment
+        with open(self._segment_path(segment), 'ab') as f:
+            offset = f.tell()
+            f.write(b''.join(line for line, _, _ in pending))
+        for line, timestamp, values in pending:
+            self._add_record(segment, offset, timestamp, values)
+            offset += len(line)
+
+    def _rotate(self):
+        """Seal the active segment with a sidecar index and start a new one"""
+        sealed = self._active_segment
+        with self._lock:
+            sidecar_rows = [
+                [self._records[rid][1], self._records[rid][2], list(self._records[rid][3])]
+                for rid in self._segment_records.get(sealed, [])
+            ]
+        with open(self._sidecar_path(sealed), 'w', encoding='utf-8') as f:
+            json.dump(sidecar_rows, f, separators=(',', ':'))
+
+        self._open_segment(sealed + 1)
+        self._apply_retention()
+
+    def _expired(self, segment: int, remaining: int, cutoff: Optional[str]) -> bool:
+        """Whether the oldest segment may be dropped, leaving ``remaining`` events"""
+        if self.max_entries is None and cutoff is None:
+            return False
+        if self.max_entries is not None and remaining < self.max_entries:
+            return False
+        if cutoff is not None:
+            records = self._segment_records.get(segment)
+            if records and self._records[records[-1]][2] >= cutoff:
+                return False
+        return True
+
+    def _apply_retention(self):
+        """Delete the oldest rotated segments that fall outside the retention limits"""
+        cutoff = None
+        if self.max_age_days is not None:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+
+        dropped = False
+        with self._lock:
+            remaining = len(self._records)
+            while len(self._segments) > 1:
+                segment = self._segments[0]
+                remaining -= len(self._segment_records.get(segment, []))
+                if not self._expired(segment, remaining, cutoff):
+                    break
+                self._segments.pop(0)
+                for record_id in self._segment_records.pop(segment, []):
+                    self._records.pop(record_id, None)
+                for path in (self._segment_path(segment), self._sidecar_path(segment)):
+                    if os.path.exists(path):
+                        os.remove(path)
+                dropped = True
+            if dropped:
+                self._rebuild_postings()
+
+    def flush(self):
+        """Block until every queued event has been written"""
+        if self._worker.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Flush pending events and stop the writer"""
+        if self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join(timeout=5)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _candidates(self, filters: Dict[str, Any], start_day: Optional[str],
+                    end_day: Optional[str], since: Optional[str]) -> List[int]:
+        """Record ids (oldest first) matching the indexed filters and date range"""
+        with self._lock:
+            lists = []
+            for field, value in filters.items():
+                lists.append(self._postings.get((field, value), []))
+
+            if start_day or end_day or since:
+                start = start_day or (since[:10] if since else None)
+                days = [d for d in self._by_day
+                        if (not start or d >= start) and (not end_day or d <= end_day)]
+                day_ids = []
+                for day in sorted(days):
+                    day_ids.extend(self._by_day[day])
+                lists.append(sorted(day_ids))
+
+            if not lists:
+                candidates = sorted(self._records)
+            else:
+                candidates = min(lists, key=len)
+
+            positions = {field: self.index_fields.index(field) for field in filters}
+            result = []
+            for record_id in candidates:
+                record = self._records.get(record_id)
+                if record is None:
+                    continue
+                _, _, timestamp, values = record
+                day = timestamp[:10]
+                if start_day and day < start_day:
+                    continue
+                if end_day and day > end_day:
+                    continue
+                if since and timestamp < since:
+                    continue
+                if any(values[positions[field]] != value for field, value in filters.items()):
+                    continue
+                result.append(record_id)
+            return result
+
+    def query(self, filters: Optional[Dict[str, Any]] = None, start_day: Optional[str] = None,
+              end_day: Optional[str] = None, since: Optional[str] = None,
+              predicate: Optional[Callable[[Dict], bool]] = None,
+              limit: Optional[int] = None, newest_first: bool = True) -> List[Dict]:
+        """Fetch events matching indexed filters, reading only the candidate lines"""
+        record_ids = self._candidates(filters or {}, start_day, end_day, since)
+        if newest_first:
+            record_ids.reverse()
+
+        with self._lock:
+            locations = [self._records[rid][:2] for rid in record_ids if rid in self._records]
+
+        results = []
+        handles = {}
+        try:
+            for segment, offset in locations:
+                handle = handles.get(segment)
+                if handle is None:
+                    handle = handles[segment] = open(self._segment_path(segment), 'rb')
+                handle.seek(offset)
+                try:
+                    entry = json_codec.loads(handle.readline())
+                except ValueError:
+                    continue
+                if predicate and not predicate(entry):
+                    continue
+                results.append(entry)
+                if limit is not None and len(results) >= limit:
+                    break
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return results
+
+    def aggregate(self, since: Optional[str] = None, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Count matching events per day and per indexed field, answered from the index alone"""
+        record_ids = self._candidates(filters or {}, None, None, since)
+        counts = {'total': len(record_ids), 'by_day': {}}
+        for field in self.index_fields:
+            counts[field] = {}
+
+        with self._lock:
+            for record_id in record_ids:
+                _, _, timestamp, values = self._records[record_id]
+                day = timestamp[:10]
+                counts['by_day'][day] = counts['by_day'].get(day, 0) + 1
+                for field, value in zip(self.index_fields, values):
+                    counts[field][value] = counts[field].get(value, 0) + 1
+        return counts
+
+
+_sinks: Dict[str, AuditSink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_audit_sink(data_dir: str, name: str, index_fields: Iterable[str],
+                   legacy_file: Optional[str] = None) -> AuditSink:
+    """Get the process-wide sink for a stream, creating it on first use"""
+    key = os.path.join(os.path.abspath(data_dir), name)
+    with _sinks_lock:
+        sink = _sinks.get(key)
+        if sink is None:
+            sink = _sinks[key] = AuditSink(data_dir, name, index_fields, legacy_file=legacy_file,
+                                           max_entries=AUDIT_RETENTION_MAX_ENTRIES,
+                                           max_age_days=AUDIT_RETENTION_DAYS)
+        return sink
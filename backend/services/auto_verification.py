@@ -0,0 +1,314 @@
+"""
+Auto-Verification
+Rule-based release of reports whose results need no pathologist review.
+
+Rules come from ``quality_control_rules.json``; each entry is
+``{id, rule, name, is_active, ...parameters}`` with ``rule`` one of:
+
+- ``reference_range``: every result is within its reference range
+  (results without an interpretable range are held)
+- ``delta_check``: change from the patient's previous result of the same
+  test (services.patient_history) within ``max_percent`` (and
+  ``max_absolute`` if set), looking back ``lookback_days``; ``tests``
+  overrides the limits per test name
+- ``no_critical``: no critical values
+- ``instrument_qc``: instrument results have passing QC within
+  ``validity_hours`` (services.quality_control); manual results pass
+  unless ``require_instrument``
+
+A report is eligible when it is not yet authorized, every test has a
+result and no active rule fails. Results across all candidate reports are
+evaluated together as arrays; eligible reports are approved in one write.
+"""
+
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from utils import read_data, DATA_DIR
+from .billing_reports_service import BillingReportsService
+from .formula_engine import item_keys, test_key
+from .patient_history import patient_history
+from .quality_control import qc_store
+from .reference_ranges import reference_engine, patient_demographics, NUMPY_AVAILABLE
+from .report_side_effects import queue_authorization_side_effects
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RULES_FILE = 'quality_control_rules.json'
+RULE_TYPES = ('reference_range', 'delta_check', 'no_critical', 'instrument_qc')
+AUTO_VERIFIER_NAME = 'Auto-verification'
+
+
+def _file_version(filename: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(os.path.join(DATA_DIR, filename))
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _number(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(str(value).strip().replace(',', ''))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _positive(value, field: str) -> Optional[float]:
+    if value in (None, ''):
+        return None
+    number = _number(value)
+    if number is None or number <= 0:
+        raise ValueError(f"{field} must be a positive number")
+    return number
+
+
+class CompiledRules:
+    """Active rules with their parameters resolved for evaluation"""
+
+    def __init__(self, entries: List[Dict]):
+        self.reference_range = False
+        self.no_critical = False
+        self.delta = None  # (max_percent, max_absolute, lookback_days, {test key: (max_percent, max_absolute)})
+        self.qc = None  # (validity_hours, require_instrument)
+        self.names: Dict[str, str] = {}
+
+        for entry in entries:
+            rule = entry.get('rule')
+            if rule not in RULE_TYPES:
+                raise ValueError(f"Unknown rule type: {rule}")
+            if not entry.get('is_active', True):
+                continue
+            self.names[rule] = entry.get('name') or rule
+            if rule == 'reference_range':
+                self.reference_range = True
+            elif rule == 'no_critical':
+                self.no_critical = True
+            elif rule == 'delta_check':
+                overrides = {}
+                for test, limits in (entry.get('tests') or {}).items():
+                    if not isinstance(limits, dict):
+                        raise ValueError(f"Delta limits for {test} must be an object")
+                    overrides[test_key(test)] = (_positive(limits.get('max_percent'), f"{test} max_percent"),
+                                                 _positive(limits.get('max_absolute'), f"{test} max_absolute"))
+                self.delta = (
+                    _positive(entry.get('max_percent'), 'max_percent'),
+                    _positive(entry.get('max_absolute'), 'max_absolute'),
+                    _positive(entry.get('lookback_days', 180), 'lookback_days'),
+                    overrides
+                )
+            elif rule == 'instrument_qc':
+                self.qc = (_positive(entry.get('validity_hours', 24), 'validity_hours'),
+                           bool(entry.get('require_instrument', False)))
+
+
+class AutoVerifier:
+    """Evaluates the rules on reports and releases the ones that pass"""
+
+    def __init__(self, reports_service: BillingReportsService):
+        self.reports_service = reports_service
+        self._lock = threading.Lock()
+        self._version = False
+        self._rules: Optional[CompiledRules] = None
+
+    def rules(self) -> CompiledRules:
+        with self._lock:
+            version = _file_version(RULES_FILE)
+            if version != self._version or self._rules is None:
+                try:
+                    self._rules = CompiledRules(read_data(RULES_FILE) if version else [])
+                except ValueError as e:
+                    # A broken rule file must never let results through unchecked
+                    logger.error(f"Invalid auto-verification rules, holding all reports: {e}")
+                    self._rules = None
+                self._version = version
+            return self._rules
+
+    def _delta_failures(self, values: List[float], previous: List[Optional[float]],
+                        limits: List[Tuple[Optional[float], Optional[float]]]) -> List[bool]:
+        if NUMPY_AVAILABLE:
+            value = np.array(values, dtype=np.float64)
+            prior = np.array([math.nan if p is None else p for p in previous], dtype=np.float64)
+            max_percent = np.array([math.inf if l[0] is None else l[0] for l in limits], dtype=np.float64)
+            max_absolute = np.array([math.inf if l[1] is None else l[1] for l in limits], dtype=np.float64)
+            change = np.abs(value - prior)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                percent = np.where(prior != 0, change / np.abs(prior) * 100, np.where(change == 0, 0.0, math.inf))
+            failed = ~np.isnan(prior) & ((percent > max_percent) | (change > max_absolute))
+            return failed.tolist()
+
+        failed = []
+        for value, prior, (max_percent, max_absolute) in zip(values, previous, limits):
+            if prior is None:
+                failed.append(False)
+                continue
+            change = abs(value - prior)
+            percent = change / abs(prior) * 100 if prior else (0.0 if change == 0 else math.inf)
+            failed.append((max_percent is not None and percent > max_percent) or
+                          (max_absolute is not None and change > max_absolute))
+        return failed
+
+    def evaluate(self, reports: List[Dict]) -> List[Dict]:
+        """One decision per report: ``{id, sid_number, revision, eligible, failures}``"""
+        rules = self.rules()
+        decisions = [{
+            'id': report.get('id'),
+            'sid_number': report.get('sid_number'),
+            'tenant_id': report.get('tenant_id'),
+            'revision': report.get('revision', 0),
+            'eligible': True,
+            'failures': []
+        } for report in reports]
+
+        def fail(position: int, item: Optional[Dict], rule: str, message: str):
+            decisions[position]['eligible'] = False
+            decisions[position]['failures'].append({
+                'test_name': item.get('test_name') if item else None,
+                'rule': rule,
+                'message': message
+            })
+
+        rows = []  # (report position, report, item)
+        for position, report in enumerate(reports):
+            if rules is None or not rules.names:
+                fail(position, None, 'rules', 'Auto-verification rules are invalid' if rules is None
+                     else 'No auto-verification rules are active')
+                continue
+            if report.get('authorization_status') == 'approved':
+                fail(position, None, 'status', 'Report is already authorized')
+                continue
+            items = report.get('test_items') or []
+            if not items:
+                fail(position, None, 'status', 'Report has no tests')
+            for item in items:
+                if item.get('result') in (None, ''):
+                    fail(position, item, 'pending', 'Result pending')
+                else:
+                    rows.append((position, report, item))
+        if not rows:
+            return decisions
+
+        if rules.reference_range or rules.no_critical:
+            demographics = {id(report): patient_demographics(report.get('patient_info')) for _, report, _ in rows}
+            outcomes = reference_engine.evaluate([(item.get('result'), item) + demographics[id(report)]
+                                                  for _, report, item in rows])
+            for (position, report, item), (flag, is_critical) in zip(rows, outcomes):
+                if rules.no_critical and is_critical:
+                    fail(position, item, 'no_critical', f"Critical value {item.get('result')} ({flag})")
+                elif rules.reference_range and flag:
+                    fail(position, item, 'reference_range', f"Result {item.get('result')} flagged {flag}")
+                elif rules.reference_range and flag is None:
+                    # Result or range the engine cannot interpret: only a pathologist can judge it
+                    fail(position, item, 'reference_range', f"Result {item.get('result')} cannot be checked "
+                                                            f"against reference range '{item.get('reference_range') or ''}'")
+
+        if rules.delta is not None:
+            max_percent, max_absolute, lookback_days, overrides = rules.delta
+            numeric_rows, values, previous, limits = [], [], [], []
+            for position, report, item in rows:
+                value = _number(item.get('result'))
+                key = test_key(item.get('test_name'))
+                if value is None or key is None:
+                    continue
+                numeric_rows.append((position, item))
+                values.append(value)
+                previous.append(patient_history.previous(report, key, lookback_days))
+                limits.append(overrides.get(key, (max_percent, max_absolute)))
+            for (position, item), prior, failed in zip(numeric_rows, previous,
+                                                        self._delta_failures(values, previous, limits)):
+                if failed:
+                    fail(position, item, 'delta_check',
+                         f"Changed from {prior:g} to {item.get('result')} since the previous result")
+
+        if rules.qc is not None:
+            validity_hours, require_instrument = rules.qc
+            checked: Dict[Tuple, Tuple[bool, str]] = {}
+            for position, report, item in rows:
+                source = item.get('result_source')
+                instrument_id = source.get('instrument_id') if isinstance(source, dict) else None
+                if instrument_id is None:
+                    if require_instrument:
+                        fail(position, item, 'instrument_qc', 'Result was not received from an instrument')
+                    continue
+                key = (instrument_id, tuple(item_keys(item)))
+                if key not in checked:
+                    checked[key] = qc_store.check(instrument_id, item, validity_hours=validity_hours)
+                passed, message = checked[key]
+                if not passed:
+                    fail(position, item, 'instrument_qc', message)
+
+        return decisions
+
+    def candidates(self, search_params: Dict, user_tenant_id: int, user_role: str) -> List[Dict]:
+        """Unauthorized reports matching the search, within the user's franchise access"""
+        reports = self.reports_service.read_json_file(self.reports_service.reports_file)
+        franchise_filter = self.reports_service.get_franchise_access_filter(user_tenant_id, user_role)
+        return [
+            report for report in reports
+            if (franchise_filter is None or report.get('tenant_id') in franchise_filter)
+            and report.get('authorization_status') != 'approved'
+            and self.reports_service.matches_search(report, search_params)
+        ]
+
+    def release(self, search_params: Dict, user: Dict, notify_patients: bool = False,
+                render_pdfs: bool = True) -> Optional[Dict]:
+        """
+        Approve every candidate report that passes all rules in one write and
+        queue the usual authorization side effects (audit, PDFs, WhatsApp).
+
+        Returns a summary, or None if saving failed. A report that changes
+        between evaluation and release is skipped (revision check), not
+        released on stale data.
+        """
+        reports = self.candidates(search_params, user.get('tenant_id'), user.get('role'))
+        decisions = self.evaluate(reports)
+        eligible = [d for d in decisions if d['eligible']]
+
+        released = []
+        skipped = []
+        side_effects_job = None
+        if eligible:
+            authorization_data = {
+                'authorizer_name': AUTO_VERIFIER_NAME,
+                'comments': 'Released automatically: all auto-verification rules passed',
+                'action': 'approve',
+                'authorization_timestamp': datetime.utcnow().isoformat(),
+                'user_id': user.get('id'),
+                'user_role': user.get('role'),
+                'auto_verified': True
+            }
+            released, skipped = self.reports_service.authorize_reports(
+                [d['id'] for d in eligible], None, user.get('tenant_id'), user.get('role'), authorization_data,
+                expected_revisions={d['id']: d['revision'] for d in eligible}
+            )
+            if released is None:
+                return None
+            if released:
+                job = queue_authorization_side_effects(released, authorization_data, user,
+                                                       notify_patients=notify_patients, render_pdfs=render_pdfs)
+                side_effects_job = {'job_id': job['id'], 'status_url': f"/api/jobs/{job['id']}"}
+
+        summary = {
+            'checked': len(decisions),
+            'eligible': len(eligible),
+            'released': [{'id': r.get('id'), 'sid_number': r.get('sid_number')} for r in released],
+            'skipped': skipped,
+            'held': [{'id': d['id'], 'sid_number': d['sid_number'], 'failures': d['failures']}
+                     for d in decisions if not d['eligible']],
+            'side_effects_job': side_effects_job
+        }
+        logger.info(f"Auto-verification released {len(released)} of {len(decisions)} reports")
+        return summary
+
+
+auto_verifier = AutoVerifier(BillingReportsService(DATA_DIR))
@@ -0,0 +1,201 @@
+"""
+Background Jobs
+Thread-pool runner for long imports/exports with progress tracking and
+per-job output files that can be downloaded once the job finishes.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+import logging
+
+from utils import read_data, write_data, DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """Handle passed to a running job function"""
+
+    def __init__(self, manager: 'BackgroundJobManager', record: Dict):
+        self._manager = manager
+        self.id = record['id']
+        self.params = record.get('params', {})
+        self.directory = manager.job_dir(self.id)
+
+    def progress(self, processed: int, total: Optional[int] = None, message: Optional[str] = None):
+        """Report progress (kept in memory only)"""
+        fields = {'processed': processed}
+        if total is not None:
+            fields['total'] = total
+        if message:
+            fields['message'] = message
+        self._manager._update(self.id, persist=False, **fields)
+
+    def path(self, filename: str) -> str:
+        """Path of an output file inside the job directory"""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, filename)
+
+    def add_file(self, name: str, filename: str, mimetype: str):
+        """Publish a file from the job directory for download"""
+        self._manager._add_file(self.id, name, filename, mimetype)
+
+
+class BackgroundJobManager:
+    """
+    Runs job functions on a small thread pool.
+
+    Job records (status, progress, result, files) live in memory and are
+    persisted to ``background_jobs.json`` on every status change. Output files
+    are kept under ``data/jobs/<job_id>/`` for ``retention_days``. Jobs that
+    were still running when the server stopped are marked failed on startup.
+    """
+
+    JOBS_FILE = 'background_jobs.json'
+    STATUSES = ('queued', 'running', 'completed', 'failed')
+
+    def __init__(self, workers: int = 2, retention_days: int = 7):
+        self.retention_days = retention_days
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='background-job')
+        self._lock = threading.RLock()
+        self._jobs: Dict[str, Dict] = {}
+        self._loaded = False
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(DATA_DIR, 'jobs', job_id)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                jobs = read_data(self.JOBS_FILE)
+            except Exception:
+                jobs = []
+            for job in jobs:
+                if job.get('status') in ('queued', 'running'):
+                    job['status'] = 'failed'
+                    job['error'] = 'Interrupted by server restart'
+                self._jobs[job['id']] = job
+            self._loaded = True
+            self._purge_expired()
+
+    def _persist(self):
+        jobs = sorted(self._jobs.values(), key=lambda j: j.get('created_at', ''))
+        try:
+            write_data(self.JOBS_FILE, jobs)
+        except Exception as e:
+            logger.error(f"Failed to persist background jobs: {e}")
+
+    def _purge_expired(self):
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.get('status') in ('completed', 'failed') and (job.get('finished_at') or '') < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        if expired:
+            self._persist()
+
+    def _update(self, job_id: str, persist: bool = True, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return
+            job.update(fields)
+            if persist:
+                self._persist()
+
+    def _add_file(self, job_id: str, name: str, filename: str, mimetype: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.setdefault('files', {})[name] = {'filename': filename, 'mimetype': mimetype}
+
+    def submit(self, job_type: str, func: Callable[[Job], Dict], params: Optional[Dict] = None,
+               user_id=None, tenant_id=None) -> Dict:
+        """Queue ``func(job)``; its return value becomes the job result"""
+        self._ensure_loaded()
+        record = {
+            'id': uuid.uuid4().hex,
+            'type': job_type,
+            'status': 'queued',
+            'params': params or {},
+            'created_by': user_id,
+            'tenant_id': tenant_id,
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'processed': 0,
+            'total': None,
+            'message': None,
+            'result': None,
+            'error': None,
+            'files': {}
+        }
+        with self._lock:
+            self._purge_expired()
+            self._jobs[record['id']] = record
+            self._persist()
+            snapshot = dict(record)
+
+        self._executor.submit(self._run, record['id'], func)
+        return snapshot
+
+    def _run(self, job_id: str, func: Callable[[Job], Dict]):
+        with self._lock:
+            record = self._jobs[job_id]
+        self._update(job_id, status='running', started_at=datetime.now().isoformat())
+        started = time.monotonic()
+        try:
+            result = func(Job(self, record))
+            self._update(job_id, status='completed', result=result,
+                         finished_at=datetime.now().isoformat(),
+                         duration_seconds=round(time.monotonic() - started, 3))
+        except Exception as e:
+            logger.exception(f"Background job {job_id} failed")
+            self._update(job_id, status='failed', error=str(e),
+                         finished_at=datetime.now().isoformat(),
+                         duration_seconds=round(time.monotonic() - started, 3))
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        self._ensure_loaded()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self, user_id=None, job_type: Optional[str] = None) -> List[Dict]:
+        """Jobs newest first, optionally for one user and/or type"""
+        self._ensure_loaded()
+        with self._lock:
+            jobs = [dict(j) for j in self._jobs.values()
+                    if (user_id is None or j.get('created_by') == user_id)
+                    and (job_type is None or j.get('type') == job_type)]
+        return sorted(jobs, key=lambda j: j.get('created_at', ''), reverse=True)
+
+    def file_path(self, job_id: str, name: str) -> Optional[Dict]:
+        """Download info ``{'path', 'filename', 'mimetype'}`` for a job file"""
+        job = self.get(job_id)
+        if not job or name not in job.get('files', {}):
+            return None
+        info = job['files'][name]
+        return {
+            'path': os.path.join(self.job_dir(job_id), info['filename']),
+            'filename': info['filename'],
+            'mimetype': info['mimetype']
+        }
+
+
+job_manager = BackgroundJobManager(
+    workers=int(os.environ.get('BACKGROUND_JOB_WORKERS', 2)),
+    retention_days=int(os.environ.get('BACKGROUND_JOB_RETENTION_DAYS', 7))
+)
@@ -4,17 +4,145 @@ Handles comprehensive billing report generation, storage, and retrieval
 with franchise-based access control and SID management.
 """
 
+import contextlib
 import json
 import os
+import functools
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import logging
+import json_codec
 from .audit_service import AuditService, AuditEventType, ErrorSeverity
+from .notification_service import NotificationService
+from .formula_engine import formula_engine
+from .patient_history import patient_history
+from .reference_ranges import reference_engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Serialises read-modify-write cycles on billing_reports.json within the process;
+# _held_file_locks counts nested holders of each cross-process file lock
+_reports_lock = threading.RLock()
+_held_file_locks: Dict[str, int] = {}
+
+# Test item fields a result entry may set; 'value' is accepted as an alias of 'result'
+RESULT_ENTRY_FIELDS = ('result', 'result_unit', 'result_type', 'flags', 'notes', 'interpretation', 'comments',
+                       'result_source')
+MAX_RESULT_BATCH = 500
+
+
+class ReportConflictError(Exception):
+    """Raised when a report changed since the revision the client edited"""
+
+    def __init__(self, conflicts: List[Dict]):
+        super().__init__(f"{len(conflicts)} report(s) were modified by another user")
+        self.conflicts = conflicts
+
+
+def report_etag(report: Dict) -> str:
+    """ETag for a report: its id and revision"""
+    return f'"{report.get("id")}-{report.get("revision", 0)}"'
+
+
+def parse_revision(value) -> Optional[int]:
+    """Revision from an int, a numeric string or an ETag produced by report_etag"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    text = str(value).strip()
+    if text.startswith('W/'):
+        text = text[2:]
+    text = text.strip('"').rsplit('-', 1)[-1]
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+@contextlib.contextmanager
+def _locked_reports(reports_file: str):
+    """
+    Hold the in-process lock and an exclusive flock on ``<reports_file>.lock``,
+    so other server processes and a standalone instrument gateway writing the
+    same file wait as well. The file lock is taken once per outermost holder.
+    """
+    path = os.path.abspath(reports_file) + '.lock'
+    with _reports_lock:
+        handle = None
+        if fcntl is not None and not _held_file_locks.get(path):
+            handle = open(path, 'a')
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        _held_file_locks[path] = _held_file_locks.get(path, 0) + 1
+        try:
+            yield
+        finally:
+            _held_file_locks[path] -= 1
+            if handle is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+                handle.close()
+
+
+def _with_reports_lock(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with _locked_reports(self.reports_file):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _critical_alert(report: Dict, test_item: Dict) -> Dict:
+    """Notification data for a critical result"""
+    patient_info = report.get('patient_info') or {}
+    return {
+        'tenant_id': report.get('tenant_id'),
+        'sid_number': report.get('sid_number'),
+        'report_id': report.get('id'),
+        'patient_name': patient_info.get('full_name') or
+            f"{patient_info.get('first_name', '')} {patient_info.get('last_name', '')}".strip(),
+        'test_name': test_item.get('test_name') or test_item.get('name', ''),
+        'result': test_item.get('result', test_item.get('result_value', '')),
+        'unit': test_item.get('result_unit') or test_item.get('unit') or '',
+        'flag': test_item.get('abnormal_flag') or '',
+        'reference_range': test_item.get('reference_range', '')
+    }
+
+
+def _notify_critical_results(critical: List[Tuple[Dict, Dict]], user_id: Optional[int]):
+    """Raise notifications for newly entered critical values; never fails result entry"""
+    if not critical:
+        return
+    try:
+        NotificationService.notify_critical_results([_critical_alert(r, item) for r, item in critical], user_id)
+    except Exception as e:
+        logger.error(f"Failed to send critical result notifications: {str(e)}")
+
+
+def _touch_report(report: Dict, timestamp: str):
+    """Stamp a modified report and bump its revision"""
+    report['updated_at'] = timestamp
+    report['revision'] = report.get('revision', 0) + 1
+
+
+def _mark_entered(test_item: Dict, fields: Dict):
+    """
+    Record that a result was entered rather than calculated, so formulas
+    recomputed without overwrite leave it alone
+    """
+    if 'result_source' not in fields:
+        test_item['result_source'] = 'manual'
+    test_item.pop('calculation_formula_id', None)
+
+
 class BillingReportsService:
     """Service for managing billing reports with franchise-based access control"""
     
@@ -39,8 +167,7 @@ class BillingReportsService:
         """Read JSON file with error handling"""
         try:
             if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return json_codec.load_file(file_path)
             return []
         except Exception as e:
             logger.error(f"Error reading {file_path}: {str(e)}")
@@ -49,9 +176,8 @@ class BillingReportsService:
     def write_json_file(self, file_path: str, data: List[Dict]) -> bool:
         """Write JSON file with error handling"""
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-                logger.info("File successfully updated at: %s", f)
+            json_codec.dump_file(file_path, data)
+            logger.info("File successfully updated at: %s", file_path)
             return True
         except Exception as e:
             logger.error(f"Error writing {file_path}: {str(e)}")
@@ -1045,6 +1171,7 @@ class BillingReportsService:
     
     
     
+    @_with_reports_lock
     def save_report(self, report: Dict) -> bool:
         """Save report to storage"""
         try:
@@ -1123,6 +1250,40 @@ class BillingReportsService:
             logger.error(f"Error retrieving report by SID {sid_number}: {str(e)}")
             return None
 
+    @staticmethod
+    def matches_search(report: Dict, search_params: Dict) -> bool:
+        """Whether a report matches search params (sid, patient_name, mobile, date_from, date_to, status)"""
+        # SID search (exact or partial)
+        if 'sid' in search_params:
+            if search_params['sid'].upper() not in report.get('sid_number', '').upper():
+                return False
+
+        # Patient name search
+        if 'patient_name' in search_params:
+            patient_name = report.get('patient_info', {}).get('full_name', '').lower()
+            if search_params['patient_name'].lower() not in patient_name:
+                return False
+
+        # Mobile number search
+        if 'mobile' in search_params:
+            if search_params['mobile'] not in report.get('patient_info', {}).get('mobile', ''):
+                return False
+
+        # Date range search
+        report_date = report.get('billing_date', '')
+        if 'date_from' in search_params and report_date < search_params['date_from']:
+            return False
+        if 'date_to' in search_params and report_date > search_params['date_to']:
+            return False
+
+        # Authorization status (pending covers reports never authorized or rejected)
+        if 'status' in search_params:
+            status = report.get('authorization_status') or 'pending'
+            if status != search_params['status']:
+                return False
+
+        return True
+
     def search_reports(self, search_params: Dict, user_tenant_id: int, user_role: str) -> List[Dict]:
         """Search reports with franchise-based filtering"""
         try:
@@ -1140,47 +1301,7 @@ class BillingReportsService:
                 logger.info(f"[BillingReportsService] No franchise filter applied - user has access to all reports")
 
             # Apply search filters
-            filtered_reports = []
-
-            for report in reports:
-                match = True
-
-                # SID search (exact or partial)
-                if 'sid' in search_params:
-                    sid_query = search_params['sid'].upper()
-                    report_sid = report.get('sid_number', '').upper()
-                    if sid_query not in report_sid:
-                        match = False
-
-                # Patient name search
-                if 'patient_name' in search_params and match:
-                    name_query = search_params['patient_name'].lower()
-                    patient_name = report.get('patient_info', {}).get('full_name', '').lower()
-                    if name_query not in patient_name:
-                        match = False
-
-                # Mobile number search
-                if 'mobile' in search_params and match:
-                    mobile_query = search_params['mobile']
-                    patient_mobile = report.get('patient_info', {}).get('mobile', '')
-                    if mobile_query not in patient_mobile:
-                        match = False
-
-                # Date range search
-                if 'date_from' in search_params and match:
-                    date_from = search_params['date_from']
-                    report_date = report.get('billing_date', '')
-                    if report_date < date_from:
-                        match = False
-
-                if 'date_to' in search_params and match:
-                    date_to = search_params['date_to']
-                    report_date = report.get('billing_date', '')
-                    if report_date > date_to:
-                        match = False
-
-                if match:
-                    filtered_reports.append(report)
+            filtered_reports = [report for report in reports if self.matches_search(report, search_params)]
 
             # Sort by billing date (newest first)
             filtered_reports.sort(key=lambda x: x.get('billing_date', ''), reverse=True)
@@ -1239,8 +1360,17 @@ class BillingReportsService:
             logger.error(f"Error retrieving report by SID {sid_number} (public access): {str(e)}")
             return None
 
-    def update_test_item(self, sid_number: str, test_index: int, update_data: Dict, user_tenant_id: int, user_role: str) -> Optional[Dict]:
-        """Update a specific test item in a billing report"""
+    @_with_reports_lock
+    def update_test_item(self, sid_number: str, test_index: int, update_data: Dict, user_tenant_id: int, user_role: str,
+                         expected_revision: Optional[int] = None, user_id: Optional[int] = None) -> Optional[Dict]:
+        """
+        Update a specific test item in a billing report, recompute the
+        calculated parameters depending on it and re-evaluate H/L/critical
+        flags; a new critical result notifies the lab staff.
+
+        Raises ReportConflictError when ``expected_revision`` is given and the
+        report has moved on since.
+        """
         try:
             reports = self.read_json_file(self.reports_file)
             franchise_filter = self.get_franchise_access_filter(user_tenant_id, user_role)
@@ -1264,28 +1394,387 @@ class BillingReportsService:
                 logger.warning(f"Invalid test index {test_index} for SID {sid_number}")
                 return None
 
+            if expected_revision is not None and report.get('revision', 0) != expected_revision:
+                raise ReportConflictError([self._conflict_info(report, expected_revision)])
+
             # Update the test item
             test_item = report['test_items'][test_index]
+            previous_result = test_item.get('result')
             for key, value in update_data.items():
-                if key not in ['id', 'test_master_id']:  # Protect certain fields
+                if key not in ['id', 'test_master_id', 'revision']:  # Protect certain fields
                     test_item[key] = value
 
+            # Calculated parameters that depend on this result, then flags; a result
+            # entered on a calculated item makes it a measured one
+            changed = []
+            if test_item.get('result') != previous_result:
+                _mark_entered(test_item, update_data)
+                changed = [test_item] + formula_engine.recompute(report, [test_item], overwrite=False)
+            critical = reference_engine.flag_items((report, item) for item in changed or [test_item])
+            if not changed:
+                critical = []
+
             # Update metadata
             test_item['updated_at'] = datetime.now().isoformat()
-            report['updated_at'] = datetime.now().isoformat()
+            _touch_report(report, test_item['updated_at'])
 
             # Save the updated reports
             if self.write_json_file(self.reports_file, reports):
                 logger.info(f"Test item {test_index} updated successfully for SID {sid_number}")
+                patient_history.upsert_reports([report], self.reports_file)
+                _notify_critical_results(critical, user_id)
                 return report
             else:
                 logger.error(f"Failed to save updated report for SID {sid_number}")
                 return None
 
+        except ReportConflictError:
+            raise
         except Exception as e:
             logger.error(f"Error updating test item for SID {sid_number}: {str(e)}")
             return None
 
+    @_with_reports_lock
+    def add_billing_tests(self, billing_id: int, test_items: List[Dict], discount: float, tax_rate: float,
+                          paid_amount: float) -> Optional[Dict]:
+        """
+        Append tests added to a billing to its report, numbering them after
+        the existing items, and refresh the report's financial summary.
+        Returns the report, or None if the billing has no report or the
+        file could not be saved.
+        """
+        reports = self.read_json_file(self.reports_file)
+        report = next((r for r in reports if r.get('billing_id') == billing_id), None)
+        if report is None:
+            return None
+
+        report.setdefault('test_items', [])
+        report.setdefault('financial_summary', {})
+        next_id = max((item.get('id', 0) for item in report['test_items']), default=0) + 1
+        for offset, item in enumerate(test_items):
+            report['test_items'].append(dict(item, id=next_id + offset))
+
+        subtotal = sum(item.get('amount', 0) for item in report['test_items'])
+        tax_amount = (subtotal - discount) * (tax_rate / 100)
+        total_amount = subtotal - discount + tax_amount
+        report['financial_summary'].update({
+            "bill_amount": subtotal,
+            "subtotal": subtotal,
+            "discount_amount": discount,
+            "discount_percent": 0,
+            "gst_rate": tax_rate,
+            "gst_amount": tax_amount,
+            "total_amount": total_amount,
+            "paid_amount": paid_amount,
+            "balance": total_amount - paid_amount,
+            "other_charges": report['financial_summary'].get('other_charges', 0)
+        })
+
+        _touch_report(report, datetime.now().isoformat())
+        if not self.write_json_file(self.reports_file, reports):
+            logger.error(f"Failed to save tests added to billing {billing_id}")
+            return None
+        return report
+
+    @_with_reports_lock
+    def update_sample_status(self, sid_number: str, test_items: List[Dict], user_tenant_id: int,
+                             user_role: str) -> Optional[Dict]:
+        """
+        Update the sample status fields of test items (matched by item id);
+        items the report does not have yet are appended. Returns the report,
+        or None if it is not found, not accessible or could not be saved.
+        """
+        reports = self.read_json_file(self.reports_file)
+        franchise_filter = self.get_franchise_access_filter(user_tenant_id, user_role)
+        report = next((r for r in reports if r.get('sid_number') == sid_number and
+                       (franchise_filter is None or r.get('tenant_id') in franchise_filter)), None)
+        if report is None:
+            return None
+
+        existing_tests = report.setdefault('test_items', [])
+        existing_by_id = {str(item.get('id')): item for item in existing_tests}
+        for update_item in test_items:
+            existing_item = existing_by_id.get(str(update_item.get('id')))
+            if existing_item is None:
+                existing_tests.append(update_item)
+                continue
+            for field in ('sample_status', 'sample_received', 'sample_received_timestamp',
+                          'sample_status_updated_at'):
+                existing_item[field] = update_item.get(field, existing_item.get(field))
+
+        _touch_report(report, datetime.now().isoformat())
+        if not self.write_json_file(self.reports_file, reports):
+            logger.error(f"Failed to save sample status for SID {sid_number}")
+            return None
+        return report
+
+    @staticmethod
+    def _conflict_info(report: Dict, expected_revision: Optional[int]) -> Dict:
+        return {
+            'sid_number': report.get('sid_number'),
+            'expected_revision': expected_revision,
+            'current_revision': report.get('revision', 0),
+            'etag': report_etag(report),
+            'updated_at': report.get('updated_at')
+        }
+
+    @staticmethod
+    def _locate_test_item(report: Dict, entry: Dict) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Index of the test item an entry targets: ``test_index`` (position in
+        test_items) or ``test_id``, which is matched against test_master_id
+        only and must identify a single item. With both, the item at
+        test_index must be that test.
+        """
+        test_items = report.get('test_items') or []
+        if entry.get('test_index') is not None:
+            index = entry['test_index']
+            if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < len(test_items):
+                return None, f"Invalid test index: {index}"
+            if entry.get('test_id') is not None and str(test_items[index].get('test_master_id')) != str(entry['test_id']):
+                return None, f"Test item {index} is not test {entry['test_id']}"
+            return index, None
+
+        test_id = str(entry.get('test_id'))
+        matches = [i for i, item in enumerate(test_items) if str(item.get('test_master_id')) == test_id]
+        if not matches:
+            return None, f"Test {test_id} not found in report"
+        if len(matches) > 1:
+            return None, f"Test {test_id} matches {len(matches)} test items; use test_index"
+        return matches[0], None
+
+    @staticmethod
+    def _result_fields(entry: Dict) -> Tuple[Dict, Optional[str]]:
+        """Test item fields set by one entry, or an error message"""
+        fields = {key: entry[key] for key in RESULT_ENTRY_FIELDS if key in entry}
+        if 'value' in entry:
+            fields.setdefault('result', entry['value'])
+        if not fields:
+            return {}, f"No result fields; expected value or one of: {', '.join(RESULT_ENTRY_FIELDS)}"
+
+        result = fields.get('result')
+        if isinstance(result, bool) or result is not None and not isinstance(result, (str, int, float)):
+            return {}, 'result must be a string or a number'
+        flags = fields.get('flags')
+        if flags is not None and not isinstance(flags, str) and \
+                not (isinstance(flags, list) and all(isinstance(flag, str) for flag in flags)):
+            return {}, 'flags must be a string or a list of strings'
+        return fields, None
+
+    @_with_reports_lock
+    def apply_result_batch(self, entries: List[Dict], revisions: Optional[Dict[str, int]], user_tenant_id: int,
+                           user_role: str, user_id: Optional[int] = None) -> Tuple[Optional[Dict], List[Dict]]:
+        """
+        Enter results for many tests across many reports in a single write.
+
+        ``entries`` are ``{sid_number, test_index | test_id, value/result,
+        flags, ...}`` (``test_id`` is a test_master_id); ``revisions`` maps every SID touched to the revision
+        the client last read (None skips the check, for server-side writers
+        such as the instrument gateway). All entries are validated before anything is
+        changed: validation problems are returned as ``(None, errors)`` and a
+        stale revision raises ReportConflictError, in both cases without
+        writing. On success returns ``(summary, [])``, and ``(None, [])`` if
+        the file could not be saved. Calculated parameters that depend on
+        the entered results are recomputed, results are flagged H/L/critical
+        against their reference ranges and new critical values notify the lab.
+        """
+        if not entries:
+            return None, [{'index': None, 'message': 'No entries provided'}]
+        if len(entries) > MAX_RESULT_BATCH:
+            return None, [{'index': None, 'message': f'At most {MAX_RESULT_BATCH} entries per batch'}]
+
+        reports = self.read_json_file(self.reports_file)
+        franchise_filter = self.get_franchise_access_filter(user_tenant_id, user_role)
+        by_sid = {}
+        for report in reports:
+            sid = report.get('sid_number')
+            if sid and sid not in by_sid and (franchise_filter is None or report.get('tenant_id') in franchise_filter):
+                by_sid[sid] = report
+
+        errors = []
+        changes = []
+        targeted = set()
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                errors.append({'index': position, 'message': 'Entry must be an object'})
+                continue
+            sid = entry.get('sid_number')
+            report = by_sid.get(sid)
+            if report is None:
+                errors.append({'index': position, 'sid_number': sid,
+                               'message': f'Report not found for SID: {sid}'})
+                continue
+            if entry.get('test_index') is None and entry.get('test_id') is None:
+                errors.append({'index': position, 'sid_number': sid, 'message': 'test_index or test_id is required'})
+                continue
+
+            test_index, error = self._locate_test_item(report, entry)
+            if error is None and (sid, test_index) in targeted:
+                error = f"Test item {test_index} appears more than once in the batch"
+            fields, field_error = self._result_fields(entry)
+            error = error or field_error
+            if error:
+                errors.append({'index': position, 'sid_number': sid, 'message': error})
+                continue
+
+            targeted.add((sid, test_index))
+            changes.append((report, test_index, fields))
+
+        touched = {report.get('sid_number'): report for report, _, _ in changes}
+        for sid in (touched if revisions is not None else ()):
+            if parse_revision(revisions.get(sid)) is None:
+                errors.append({'index': None, 'sid_number': sid,
+                               'message': 'Missing revision; send the revision or ETag the results were entered against'})
+        if errors:
+            return None, errors
+
+        conflicts = [self._conflict_info(report, parse_revision(revisions[sid]))
+                     for sid, report in touched.items()
+                     if revisions is not None and report.get('revision', 0) != parse_revision(revisions[sid])]
+        if conflicts:
+            raise ReportConflictError(conflicts)
+
+        timestamp = datetime.now().isoformat()
+        changed_results: Dict[str, List[Dict]] = {}
+        for report, test_index, fields in changes:
+            test_item = report['test_items'][test_index]
+            if 'result' in fields and fields['result'] != test_item.get('result'):
+                changed_results.setdefault(report.get('sid_number'), []).append(test_item)
+                _mark_entered(test_item, fields)
+            test_item.update(fields)
+            test_item['updated_at'] = timestamp
+            if user_id is not None:
+                test_item['updated_by'] = user_id
+        for report in touched.values():
+            _touch_report(report, timestamp)
+
+        # Calculated parameters downstream of the changed results
+        evaluated = [(report, report['test_items'][test_index]) for report, test_index, _ in changes]
+        calculated = 0
+        for sid, changed_items in changed_results.items():
+            recomputed = formula_engine.recompute(touched[sid], changed_items, overwrite=False)
+            for test_item in recomputed:
+                test_item['updated_at'] = timestamp
+                changed_items.append(test_item)
+                evaluated.append((touched[sid], test_item))
+            calculated += len(recomputed)
+
+        # H/L/critical flags for the whole batch in one evaluation
+        changed_ids = {id(item) for items in changed_results.values() for item in items}
+        critical = reference_engine.flag_items(evaluated)
+        critical = [(report, item) for report, item in critical if id(item) in changed_ids]
+
+        if not self.write_json_file(self.reports_file, reports):
+            logger.error("Failed to save result batch")
+            return None, []
+
+        logger.info(f"Entered {len(changes)} results across {len(touched)} reports in one write")
+        patient_history.upsert_reports(touched.values(), self.reports_file)
+        _notify_critical_results(critical, user_id)
+        return {
+            'updated': len(changes),
+            'calculated': calculated,
+            'critical': len(critical),
+            'reports': {
+                sid: {'revision': report['revision'], 'etag': report_etag(report), 'updated_at': timestamp}
+                for sid, report in touched.items()
+            }
+        }, []
+
+    @_with_reports_lock
+    def reflag_reports(self, search_params: Dict, user_tenant_id: int, user_role: str) -> Optional[Dict]:
+        """
+        Re-evaluate the H/L/critical flags of every test item with a result
+        in the reports matching ``search_params`` (see matches_search), e.g.
+        after reference ranges change. Saves once, bumping the revision of
+        the reports whose flags changed; does not notify.
+        """
+        reports = self.read_json_file(self.reports_file)
+        franchise_filter = self.get_franchise_access_filter(user_tenant_id, user_role)
+
+        items = []
+        for report in reports:
+            if franchise_filter is not None and report.get('tenant_id') not in franchise_filter:
+                continue
+            if not self.matches_search(report, search_params):
+                continue
+            items.extend((report, item) for item in report.get('test_items') or []
+                         if item.get('result', item.get('result_value')) not in (None, ''))
+
+        before = [(item.get('abnormal_flag'), item.get('is_critical')) for _, item in items]
+        started = time.perf_counter()
+        critical = reference_engine.flag_items(items)
+        elapsed = time.perf_counter() - started
+
+        changed = {id(report): report for (report, item), flags in zip(items, before)
+                   if (item.get('abnormal_flag'), item.get('is_critical')) != flags}
+        timestamp = datetime.now().isoformat()
+        for report in changed.values():
+            _touch_report(report, timestamp)
+
+        if changed and not self.write_json_file(self.reports_file, reports):
+            logger.error("Failed to save re-evaluated result flags")
+            return None
+        patient_history.upsert_reports({id(report): report for report, _ in items}.values(), self.reports_file)
+
+        return {
+            'evaluated': len(items),
+            'abnormal': sum(1 for _, item in items if item.get('abnormal_flag')),
+            'critical': len(critical),
+            'reports': len({id(report) for report, _ in items}),
+            'changed_reports': len(changed),
+            'evaluation_ms': round(elapsed * 1000, 2)
+        }
+
+    @_with_reports_lock
+    def recompute_formulas(self, search_params: Dict, user_tenant_id: int, user_role: str,
+                           overwrite: bool = False, include_authorized: bool = False,
+                           progress: Optional[Callable[[int, int], None]] = None) -> Optional[Dict]:
+        """
+        Fill in calculated parameters on existing reports matching
+        ``search_params``. Results entered by hand are kept unless
+        ``overwrite``; authorized reports are left alone unless
+        ``include_authorized``. Saves once; revisions are bumped on the
+        reports that changed.
+        """
+        reports = self.read_json_file(self.reports_file)
+        franchise_filter = self.get_franchise_access_filter(user_tenant_id, user_role)
+        selected = [
+            report for report in reports
+            if (franchise_filter is None or report.get('tenant_id') in franchise_filter)
+            and self.matches_search(report, search_params)
+            and (include_authorized or report.get('authorization_status') != 'approved')
+        ]
+
+        timestamp = datetime.now().isoformat()
+        updated_reports = []
+        calculated = []
+        for position, report in enumerate(selected, start=1):
+            recomputed = formula_engine.recompute(report, overwrite=overwrite)
+            if recomputed:
+                for test_item in recomputed:
+                    test_item['updated_at'] = timestamp
+                    calculated.append((report, test_item))
+                _touch_report(report, timestamp)
+                updated_reports.append(report)
+            if progress and position % 100 == 0:
+                progress(position, len(selected))
+
+        reference_engine.flag_items(calculated)
+        if updated_reports and not self.write_json_file(self.reports_file, reports):
+            logger.error("Failed to save recomputed calculated parameters")
+            return None
+        patient_history.upsert_reports(updated_reports, self.reports_file)
+
+        logger.info(f"Recomputed {len(calculated)} calculated parameters across {len(updated_reports)} reports")
+        return {
+            'reports_checked': len(selected),
+            'reports_updated': len(updated_reports),
+            'calculated': len(calculated),
+            'sid_numbers': [report.get('sid_number') for report in updated_reports]
+        }
+
+    @_with_reports_lock
     def update_report(self, sid_number: str, update_data: Dict, user_tenant_id: int, user_role: str) -> Optional[Dict]:
         """Update entire billing report"""
         try:
@@ -1308,11 +1797,11 @@ class BillingReportsService:
             # Update the report
             report = reports[report_index]
             for key, value in update_data.items():
-                if key not in ['id', 'sid_number', 'tenant_id', 'created_at']:  # Protect certain fields
+                if key not in ['id', 'sid_number', 'tenant_id', 'created_at', 'revision']:  # Protect certain fields
                     report[key] = value
 
             # Update metadata
-            report['updated_at'] = datetime.now().isoformat()
+            _touch_report(report, datetime.now().isoformat())
 
             # Save the updated reports
             if self.write_json_file(self.reports_file, reports):
@@ -1326,6 +1815,37 @@ class BillingReportsService:
             logger.error(f"Error updating report for SID {sid_number}: {str(e)}")
             return None
 
+    @staticmethod
+    def _authorization_info(authorization_data: Dict) -> Dict:
+        """Report fields set by an approve/reject action"""
+        action = authorization_data.get('action', 'approve')
+        return {
+            'authorized': action == 'approve',
+            'authorization_status': 'approved' if action == 'approve' else 'rejected',
+            'authorization': {
+                'authorizer_name': authorization_data.get('authorizer_name'),
+                'comments': authorization_data.get('comments', ''),
+                'action': action,
+                'timestamp': authorization_data.get('authorization_timestamp'),
+                'user_id': authorization_data.get('user_id'),
+                'user_role': authorization_data.get('user_role'),
+                'auto_verified': bool(authorization_data.get('auto_verified', False))
+            },
+            'updated_at': datetime.now().isoformat()
+        }
+
+    @staticmethod
+    def authorization_audit_details(report: Dict, authorization_data: Dict) -> Dict:
+        return {
+            'resource_type': 'billing_report',
+            'resource_id': str(report.get('id')),
+            'action': authorization_data.get('action', 'approve'),
+            'authorizer_name': authorization_data.get('authorizer_name'),
+            'comments': authorization_data.get('comments', ''),
+            'sid_number': report.get('sid_number')
+        }
+
+    @_with_reports_lock
     def authorize_report(self, report_id: int, user_tenant_id: int, user_role: str, authorization_data: Dict) -> Optional[Dict]:
         """Authorize a billing report with audit trail"""
         try:
@@ -1351,39 +1871,21 @@ class BillingReportsService:
 
             # Update authorization data
             action = authorization_data.get('action', 'approve')
-            authorization_info = {
-                'authorized': action == 'approve',
-                'authorization_status': 'approved' if action == 'approve' else 'rejected',
-                'authorization': {
-                    'authorizer_name': authorization_data.get('authorizer_name'),
-                    'comments': authorization_data.get('comments', ''),
-                    'action': action,
-                    'timestamp': authorization_data.get('authorization_timestamp'),
-                    'user_id': authorization_data.get('user_id'),
-                    'user_role': authorization_data.get('user_role')
-                },
-                'updated_at': datetime.now().isoformat()
-            }
+            authorization_info = self._authorization_info(authorization_data)
 
             # Update the report
             report.update(authorization_info)
+            _touch_report(report, authorization_info['updated_at'])
             reports[report_index] = report
 
             # Save the updated reports
             if self.write_json_file(self.reports_file, reports):
                 # Log audit event
-                self.audit_service.log_event(
+                self.audit_service.log_audit_event(
                     event_type=AuditEventType.REPORT_AUTHORIZATION,
                     user_id=authorization_data.get('user_id'),
                     tenant_id=user_tenant_id,
-                    resource_type='billing_report',
-                    resource_id=str(report_id),
-                    details={
-                        'action': action,
-                        'authorizer_name': authorization_data.get('authorizer_name'),
-                        'comments': authorization_data.get('comments', ''),
-                        'sid_number': report.get('sid_number')
-                    },
+                    details=self.authorization_audit_details(report, authorization_data),
                     success=True
                 )
 
@@ -1397,13 +1899,13 @@ class BillingReportsService:
             logger.error(f"Error authorizing report {report_id}: {str(e)}")
 
             # Log audit event for failure
-            self.audit_service.log_event(
+            self.audit_service.log_audit_event(
                 event_type=AuditEventType.REPORT_AUTHORIZATION,
                 user_id=authorization_data.get('user_id'),
                 tenant_id=user_tenant_id,
-                resource_type='billing_report',
-                resource_id=str(report_id),
                 details={
+                    'resource_type': 'billing_report',
+                    'resource_id': str(report_id),
                     'action': authorization_data.get('action', 'approve'),
                     'error': str(e)
                 },
@@ -1412,4 +1914,70 @@ class BillingReportsService:
 
             return None
 
+    @_with_reports_lock
+    def authorize_reports(self, report_ids: Optional[List[int]], search_params: Optional[Dict], user_tenant_id: int,
+                          user_role: str, authorization_data: Dict,
+                          expected_revisions: Optional[Dict[int, int]] = None) -> Tuple[Optional[List[Dict]], List[Dict]]:
+        """
+        Approve or reject many reports, selected by id and/or search params,
+        with one read and one write of billing_reports.json. Given both, a
+        report must be among the ids and match the search (the ids ticked in
+        a filtered list); ids outside the search are skipped.
+
+        Franchise access is checked in the same pass: other franchises'
+        reports are left out, or skipped as denied (without their details)
+        when requested by id. Reports already in the target state are skipped
+        rather than re-stamped, as are reports whose revision differs from
+        ``expected_revisions`` (report id -> revision the decision was based
+        on). Side effects (audit, PDFs, notifications) are left to the caller.
+        Returns ``(updated, skipped)``; ``updated`` is None if the file could
+        not be saved.
+        """
+        wanted_ids = set(report_ids or [])
+        franchise_filter = self.get_franchise_access_filter(user_tenant_id, user_role)
+        authorization_info = self._authorization_info(authorization_data)
+        target_status = authorization_info['authorization_status']
+
+        reports = self.read_json_file(self.reports_file)
+        updated = []
+        skipped = []
+        seen_ids = set()
+        for report in reports:
+            report_id = report.get('id')
+            if wanted_ids and report_id not in wanted_ids:
+                continue
+            if franchise_filter is not None and report.get('tenant_id') not in franchise_filter:
+                # Other franchises' reports are only mentioned when asked for by id, without their details
+                if wanted_ids:
+                    seen_ids.add(report_id)
+                    skipped.append({'id': report_id, 'reason': 'Access denied'})
+                continue
+            if search_params is not None and not self.matches_search(report, search_params):
+                if wanted_ids:
+                    seen_ids.add(report_id)
+                    skipped.append({'id': report_id, 'sid_number': report.get('sid_number'),
+                                    'reason': 'Does not match filters'})
+                continue
+            seen_ids.add(report_id)
+
+            if report.get('authorization_status') == target_status:
+                skipped.append({'id': report_id, 'sid_number': report.get('sid_number'),
+                                'reason': f'Already {target_status}'})
+            elif expected_revisions is not None and report.get('revision', 0) != expected_revisions.get(report_id):
+                skipped.append({'id': report_id, 'sid_number': report.get('sid_number'),
+                                'reason': 'Report changed since it was checked'})
+            else:
+                report.update(authorization_info)
+                report['authorization'] = dict(authorization_info['authorization'])
+                _touch_report(report, authorization_info['updated_at'])
+                updated.append(report)
+
+        for report_id in sorted(wanted_ids - seen_ids, key=str):
+            skipped.append({'id': report_id, 'reason': 'Report not found'})
+
+        if updated and not self.write_json_file(self.reports_file, reports):
+            logger.error(f"Failed to save bulk {authorization_data.get('action', 'approve')} of {len(updated)} reports")
+            return None, skipped
 
+        logger.info(f"Bulk {target_status} {len(updated)} reports ({len(skipped)} skipped) in one write")
+        return updated, skipped
@@ -0,0 +1,275 @@
+"""
+Excel Import Service
+Streams master-data workbooks row by row with openpyxl (read-only mode),
+validates rows in batches and upserts them into the category JSON files.
+"""
+
+import csv
+import re
+import threading
+from datetime import date, datetime, time as dt_time
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from openpyxl import load_workbook
+
+from utils import read_data, write_data
+from .response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_PATTERN = re.compile(r'^[A-Za-z0-9_]+$')
+
+# One import at a time per category file
+_category_locks: Dict[str, threading.Lock] = {}
+_category_locks_guard = threading.Lock()
+
+
+def _category_lock(category: str) -> threading.Lock:
+    with _category_locks_guard:
+        return _category_locks.setdefault(category, threading.Lock())
+
+
+def _price_percentage(record: Dict):
+    if 'price_percentage' not in record and record.get('default_price'):
+        record['price_percentage'] = round(record['scheme_price'] / record['default_price'] * 100, 2)
+
+
+# Per-category import rules; other categories use DEFAULT_KEY_CANDIDATES
+IMPORT_SPECS = {
+    'price_scheme_master': {
+        'keys': ('scheme_code', 'test_code'),
+        'required': ('test_code', 'test_name', 'default_price', 'scheme_price'),
+        'numeric': ('default_price', 'scheme_price', 'price_percentage'),
+        'text': ('test_code', 'test_name', 'scheme_code'),
+        'defaults': {
+            'dept_code': '@BC',
+            'dept_name': 'LAB',
+            'scheme_code': '@000002',
+            'scheme_name': 'L2L',
+            'test_type': 'T',
+        },
+        'derive': _price_percentage,
+    },
+}
+
+# Upsert key used for a sheet: the first candidate whose columns are all present
+DEFAULT_KEY_CANDIDATES = (('test_code',), ('code',), ('hms_code',), ('test_name',), ('name',))
+
+
+def normalize_header(value) -> Optional[str]:
+    if value is None or str(value).strip() == '':
+        return None
+    return str(value).strip().lower().replace(' ', '_')
+
+
+def _field_alias(name: str) -> str:
+    """Spelling-insensitive form of a field name: test_name, testName and Test Name agree"""
+    return name.replace('_', '').lower()
+
+
+def clean_value(value):
+    """Cell value as stored in JSON (None for empty cells)"""
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+class ExcelImportService:
+    """
+    Streaming workbook importer.
+
+    Rows are read with ``iter_rows(values_only=True)`` and processed in
+    batches of ``batch_size``: each batch is validated, converted and upserted
+    into an in-memory index of the category keyed on its code/name columns,
+    so re-importing a sheet updates records instead of duplicating them. Each
+    category file is written once at the end of its sheet. Row errors are
+    collected and written to a CSV report when running as a background job.
+    """
+
+    def __init__(self, user_id=None, batch_size: int = 500):
+        self.user_id = user_id
+        self.batch_size = batch_size
+
+    @staticmethod
+    def sheet_category(sheet_name: str) -> str:
+        return sheet_name.strip().lower().replace(' ', '_')
+
+    def import_workbook(self, file_path: str, category: Optional[str] = None, job=None) -> Dict:
+        """
+        Import the first sheet into ``category``, or every sheet into the
+        category named after it when ``category`` is None.
+        """
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        errors: List[Dict] = []
+        results = {}
+        try:
+            worksheets = workbook.worksheets[:1] if category else workbook.worksheets
+            total_rows = sum(max((ws.max_row or 1) - 1, 0) for ws in worksheets)
+            processed = 0
+
+            for worksheet in worksheets:
+                target = category or self.sheet_category(worksheet.title)
+                if not CATEGORY_PATTERN.match(target):
+                    errors.append({'sheet': worksheet.title, 'row': None, 'field': None,
+                                   'message': f'Invalid category name: {target}'})
+                    continue
+                with _category_lock(target):
+                    summary, processed = self._import_sheet(worksheet, target, errors, job, processed, total_rows)
+                results[worksheet.title] = summary
+        finally:
+            workbook.close()
+
+        result = {
+            'sheets': results,
+            'inserted': sum(s['inserted'] for s in results.values()),
+            'updated': sum(s['updated'] for s in results.values()),
+            'error_count': len(errors),
+            'errors': errors[:50]
+        }
+        if job is not None and errors:
+            self._write_error_report(job, errors)
+        return result
+
+    def _import_sheet(self, worksheet, category: str, errors: List[Dict], job,
+                      processed: int, total_rows: int) -> Tuple[Dict, int]:
+        spec = IMPORT_SPECS.get(category, {})
+        rows = worksheet.iter_rows(values_only=True)
+        header = [normalize_header(h) for h in next(rows, ())]
+        summary = {'category': category, 'inserted': 0, 'updated': 0, 'rejected': 0, 'rows': 0}
+        if not any(header):
+            return summary, processed
+
+        try:
+            existing = read_data(f'{category}.json')
+        except FileNotFoundError:
+            existing = []
+        if not isinstance(existing, list):
+            errors.append({'sheet': worksheet.title, 'row': None, 'field': None,
+                           'message': f'{category} is not a list-based master and cannot be imported'})
+            return summary, processed
+
+        # Columns take the spelling the stored records use (most masters are camelCase)
+        stored_fields = {}
+        for record in existing:
+            if isinstance(record, dict):
+                for field in record:
+                    stored_fields.setdefault(_field_alias(field), field)
+        header = [stored_fields.get(_field_alias(h), h) if h else None for h in header]
+
+        keys = spec.get('keys') or next(
+            (resolved for resolved in (
+                tuple(stored_fields.get(_field_alias(k), k) for k in candidate) for candidate in DEFAULT_KEY_CANDIDATES
+            ) if all(k in header for k in resolved)), None
+        )
+        index = {}
+        if keys:
+            for record in existing:
+                key = self._key(record, keys)
+                if key is not None:
+                    index[key] = record
+        state = {'next_id': max((r.get('id', 0) for r in existing if isinstance(r.get('id'), int)), default=0) + 1}
+
+        batch = []
+        for row_number, values in enumerate(rows, start=2):
+            if values is None or all(v is None or str(v).strip() == '' for v in values):
+                continue
+            record = {}
+            for field, value in zip(header, values):
+                value = clean_value(value)
+                if field and value is not None:
+                    record[field] = value
+            batch.append((row_number, record))
+
+            if len(batch) >= self.batch_size:
+                self._apply_batch(batch, worksheet.title, spec, keys, index, existing, state, summary, errors)
+                processed += len(batch)
+                batch = []
+                if job is not None:
+                    job.progress(processed, total_rows, f'Importing {worksheet.title}')
+
+        if batch:
+            self._apply_batch(batch, worksheet.title, spec, keys, index, existing, state, summary, errors)
+            processed += len(batch)
+            if job is not None:
+                job.progress(processed, total_rows, f'Importing {worksheet.title}')
+
+        if summary['inserted'] or summary['updated']:
+            write_data(f'{category}.json', existing)
+            response_cache.invalidate(f'{category}.json')
+        return summary, processed
+
+    @staticmethod
+    def _key(record: Dict, keys: Tuple[str, ...]) -> Optional[Tuple]:
+        values = tuple(str(record.get(k, '')).strip().lower() for k in keys)
+        return values if any(values) else None
+
+    def _apply_batch(self, batch, sheet: str, spec: Dict, keys, index: Dict, existing: List[Dict],
+                     state: Dict, summary: Dict, errors: List[Dict]):
+        now = datetime.now().isoformat()
+
+        for row_number, record in batch:
+            summary['rows'] += 1
+            row_errors = self._validate(record, spec)
+            if row_errors:
+                summary['rejected'] += 1
+                errors.extend({'sheet': sheet, 'row': row_number, 'field': field, 'message': message}
+                              for field, message in row_errors)
+                continue
+
+            # Key on the row as it would be stored, so defaulted key columns match stored records
+            new_record = dict(spec.get('defaults', {}))
+            new_record.update(record)
+            key = self._key(new_record, keys) if keys else None
+            current = index.get(key) if key is not None else None
+            if current is not None:
+                current.update(record)
+                current['updated_at'] = now
+                current['updated_by'] = self.user_id
+                summary['updated'] += 1
+                continue
+
+            new_record['id'] = state['next_id']
+            new_record.setdefault('is_active', True)
+            new_record['created_at'] = now
+            new_record['updated_at'] = now
+            new_record['created_by'] = self.user_id
+            state['next_id'] += 1
+            existing.append(new_record)
+            if key is not None:
+                index[key] = new_record
+            summary['inserted'] += 1
+
+    @staticmethod
+    def _validate(record: Dict, spec: Dict) -> List[Tuple[str, str]]:
+        """Validate and convert a row in place; returns (field, message) errors"""
+        problems = []
+        for field in spec.get('required', ()):
+            if record.get(field) in (None, ''):
+                problems.append((field, f'Missing required field {field}'))
+        for field in spec.get('numeric', ()):
+            if field in record:
+                try:
+                    record[field] = float(record[field])
+                except (TypeError, ValueError):
+                    problems.append((field, f'{field} must be a number, got {record[field]!r}'))
+        for field in spec.get('text', ()):
+            if field in record:
+                value = record[field]
+                if isinstance(value, float) and value.is_integer():
+                    value = int(value)
+                record[field] = str(value)
+        if not problems and spec.get('derive'):
+            spec['derive'](record)
+        return problems
+
+    @staticmethod
+    def _write_error_report(job, errors: List[Dict]):
+        with open(job.path('import_errors.csv'), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['sheet', 'row', 'field', 'message'])
+            writer.writeheader()
+            writer.writerows(errors)
+        job.add_file('errors', 'import_errors.csv', 'text/csv')
@@ -0,0 +1,238 @@
+"""
+Export Service
+Streams rows from data collections to CSV or Excel (openpyxl write-only mode)
+with tenant/date filters and column projection.
+"""
+
+import csv
+import io
+import os
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+import logging
+
+from openpyxl import Workbook
+
+from utils import read_data, filter_data_by_tenant, DATA_DIR
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv'
+FORMATS = ('csv', 'xlsx')
+
+MASTER_EXPORT_ROLES = ('admin', 'hub_admin')
+BILLING_EXPORT_ROLES = ('admin', 'hub_admin', 'franchise_admin')
+
+# Master-data collections that may be exported by name. Anything else in the
+# data directory (users, patients, jobs, audit and backup files) is not.
+MASTER_EXPORT_COLLECTIONS = frozenset({
+    'antibiotic_master', 'authorization_settings', 'calculation_formulas',
+    'calibration_standards', 'container_master', 'containers', 'department_settings',
+    'departments', 'doctors', 'instrument_master', 'instruments', 'main_department_master',
+    'method_master', 'organism_master', 'organism_vs_antibiotic', 'parameter_master',
+    'payment_methods', 'print_order', 'profile_data', 'profile_master',
+    'quality_control_rules', 'reagent_master', 'reagents', 'reference_ranges',
+    'referrer_master', 'result_master', 'sample_types', 'specimen_master',
+    'sub_test_master', 'suppliers', 'test_categories', 'test_master', 'test_methods',
+    'test_panels', 'test_parameters', 'tests', 'unit_of_measurement', 'units',
+})
+
+# Collections with their own date field, default columns and access roles.
+# Columns may use dotted paths into nested objects (``patient_info.full_name``).
+EXPORT_COLLECTIONS = {
+    'billings': {
+        'file': 'billings.json',
+        'date_field': 'invoice_date',
+        'tenant_scoped': True,
+        'roles': BILLING_EXPORT_ROLES,
+        'columns': [
+            'id', 'invoice_number', 'sid_number', 'invoice_date', 'due_date', 'patient_id',
+            'tenant_id', 'subtotal', 'discount', 'tax', 'total_amount', 'paid_amount',
+            'balance', 'payment_method', 'payment_status', 'status', 'created_at'
+        ]
+    },
+    'billing_reports': {
+        'file': 'billing_reports.json',
+        'date_field': 'billing_date',
+        'tenant_scoped': True,
+        'roles': BILLING_EXPORT_ROLES,
+        'columns': [
+            'id', 'sid_number', 'billing_header.invoice_number', 'billing_date', 'due_date',
+            'tenant_id', 'clinic_info.site_code', 'patient_info.patient_id',
+            'patient_info.full_name', 'billing_header.referring_doctor',
+            'financial_summary.subtotal', 'financial_summary.discount_amount',
+            'financial_summary.gst_amount', 'financial_summary.total_amount',
+            'financial_summary.paid_amount', 'financial_summary.balance',
+            'billing_header.payment_status', 'billing_header.payment_method',
+            'metadata.total_tests', 'metadata.status'
+        ]
+    },
+}
+
+
+class ExportError(Exception):
+    """Raised for invalid export requests (unknown collection, bad filters)"""
+
+
+def get_value(record: Dict, column: str):
+    """Value of a column, following dotted paths into nested dicts"""
+    value = record
+    for part in column.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def cell_value(value):
+    """Value as written to a CSV/Excel cell"""
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json_codec.dumps(value).decode('utf-8')
+    return value
+
+
+def parse_date(value: Optional[str]) -> Optional[str]:
+    """Validate a YYYY-MM-DD filter value"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ExportError(f'Invalid date {value!r}, expected YYYY-MM-DD')
+
+
+class ExportService:
+    """
+    Row streaming for exports.
+
+    ``iter_rows`` filters records lazily and yields projected row tuples, and
+    the writers consume it one row at a time: CSV is produced as a generator
+    of text chunks and Excel through a write-only workbook saved straight to
+    disk, so the output is never built up in memory.
+    """
+
+    @staticmethod
+    def collection_spec(collection: str) -> Dict:
+        """Spec for a named collection or a list-based master-data file"""
+        if collection in EXPORT_COLLECTIONS:
+            return EXPORT_COLLECTIONS[collection]
+        filename = f'{collection}.json'
+        if (collection not in MASTER_EXPORT_COLLECTIONS
+                or not os.path.exists(os.path.join(DATA_DIR, filename))):
+            raise ExportError(f'Unknown export collection: {collection}')
+        return {
+            'file': filename,
+            'date_field': 'created_at',
+            'tenant_scoped': False,
+            'roles': MASTER_EXPORT_ROLES,
+            'columns': None
+        }
+
+    @staticmethod
+    def can_export(spec: Dict, current_user: Dict) -> bool:
+        return current_user.get('role') in spec['roles']
+
+    def load_records(self, spec: Dict, current_user: Dict, filters: Dict) -> List[Dict]:
+        """Records of a collection visible to the user (not yet date filtered)"""
+        data = read_data(spec['file'])
+        if not isinstance(data, list):
+            raise ExportError(f"{spec['file']} is not a list-based collection")
+        if spec['tenant_scoped']:
+            data = filter_data_by_tenant(data, current_user, filters.get('tenant_id'))
+        elif filters.get('tenant_id'):
+            data = [item for item in data if item.get('tenant_id') == filters['tenant_id']]
+        return data
+
+    @staticmethod
+    def resolve_columns(spec: Dict, records: Sequence[Dict], columns: Optional[List[str]] = None) -> List[str]:
+        """Requested columns, the collection defaults, or the keys seen in the records"""
+        if columns:
+            return columns
+        if spec.get('columns'):
+            return list(spec['columns'])
+        seen = {}
+        for record in records:
+            for key in record:
+                seen.setdefault(key, None)
+        return list(seen)
+
+    @staticmethod
+    def iter_rows(records: Iterable[Dict], columns: List[str], date_field: Optional[str] = None,
+                  date_from: Optional[str] = None, date_to: Optional[str] = None) -> Iterator[tuple]:
+        """Projected rows of the records inside the date range (inclusive)"""
+        for record in records:
+            if date_field and (date_from or date_to):
+                record_date = str(get_value(record, date_field) or '')[:10]
+                if not record_date:
+                    continue
+                if date_from and record_date < date_from:
+                    continue
+                if date_to and record_date > date_to:
+                    continue
+            yield tuple(cell_value(get_value(record, column)) for column in columns)
+
+    @staticmethod
+    def csv_chunks(columns: List[str], rows: Iterable[tuple], rows_per_chunk: int = 500) -> Iterator[str]:
+        """CSV text in chunks of ``rows_per_chunk`` rows, header first"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            if count % rows_per_chunk == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def write_csv(self, path: str, columns: List[str], rows: Iterable[tuple], progress=None) -> int:
+        """Write rows to a CSV file; returns the number of rows written"""
+        count = 0
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+                if progress and count % 1000 == 0:
+                    progress(count)
+        return count
+
+    def write_xlsx(self, path_or_file, sheets: Iterable[tuple], progress=None) -> int:
+        """
+        Write ``(sheet_name, columns, rows)`` sheets to a write-only workbook;
+        returns the total number of rows written.
+        """
+        workbook = Workbook(write_only=True)
+        count = 0
+        for sheet_name, columns, rows in sheets:
+            worksheet = workbook.create_sheet(title=sheet_name[:31])
+            worksheet.append(columns)
+            for row in rows:
+                worksheet.append(row)
+                count += 1
+                if progress and count % 1000 == 0:
+                    progress(count)
+        if not workbook.worksheets:
+            workbook.create_sheet(title='Sheet1')
+        workbook.save(path_or_file)
+        return count
+
+    def export_to_file(self, path: str, fmt: str, sheet_name: str, columns: List[str],
+                       rows: Iterable[tuple], progress=None) -> int:
+        if fmt == 'csv':
+            return self.write_csv(path, columns, rows, progress)
+        return self.write_xlsx(path, [(sheet_name, columns, rows)], progress)
+
+    @staticmethod
+    def export_filename(collection: str, fmt: str) -> str:
+        return f"{collection}_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+
+
+export_service = ExportService()
@@ -0,0 +1,352 @@
+"""
+Financial Rollups
+Revenue rollup tables keyed by (tenant, day) and (tenant, month) over
+billings.json and billing_reports.json, answering date-range and
+per-franchise revenue queries without re-summing every billing.
+"""
+
+import os
+import threading
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils import read_data, DATA_DIR
+
+# Refunds in these states are not counted
+NON_REFUND_STATUSES = ('Rejected', 'Cancelled')
+
+VALUE_FIELDS = ('billings', 'gross', 'discount', 'gst', 'net', 'paid', 'due', 'refunds', 'pending', 'tests')
+
+
+def _amount(value) -> float:
+    try:
+        if value is None or value == '':
+            return 0.0
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _first_present(record: Dict, *fields):
+    for field in fields:
+        if record.get(field) not in (None, ''):
+            return record[field]
+    return None
+
+
+def billing_facts(billing: Dict) -> Optional[Tuple[str, Dict[str, float], Dict[str, Dict[str, int]]]]:
+    """Day key, amounts and category counts of a billing"""
+    day = str(billing.get('invoice_date') or billing.get('created_at') or '')[:10]
+    if len(day) != 10:
+        return None
+    total_amount = _amount(billing.get('total_amount'))
+    paid_amount = _amount(billing.get('paid_amount'))
+    refunds = sum(_amount(r.get('amount')) for r in billing.get('refund_history') or []
+                  if r.get('status') not in NON_REFUND_STATUSES)
+    items = billing.get('items')
+    values = {
+        'billings': 1,
+        'gross': _amount(billing.get('subtotal')),
+        'discount': _amount(_first_present(billing, 'discount_amount', 'discount')),
+        'gst': _amount(_first_present(billing, 'tax_amount', 'tax')),
+        'net': total_amount,
+        'paid': paid_amount,
+        'due': max(total_amount - paid_amount, 0.0),
+        'refunds': refunds,
+        'pending': total_amount if billing.get('payment_status') == 'Pending' else 0.0,
+        'tests': len(items) if isinstance(items, list) else 0
+    }
+    counts = {'payment_status': {str(billing.get('payment_status') or 'unknown'): 1}}
+    return day, values, counts
+
+
+def report_facts(report: Dict) -> Optional[Tuple[str, Dict[str, float], Dict[str, Dict[str, int]]]]:
+    """Day key, amounts and category counts of a billing report"""
+    day = str(report.get('billing_date') or '')[:10]
+    if len(day) != 10:
+        return None
+    summary = report.get('financial_summary') or {}
+    metadata = report.get('metadata') or {}
+    total_amount = _amount(summary.get('total_amount'))
+    paid_amount = _amount(summary.get('paid_amount'))
+    values = {
+        'billings': 1,
+        'gross': _amount(summary.get('subtotal')),
+        'discount': _amount(summary.get('discount_amount')),
+        'gst': _amount(summary.get('gst_amount')),
+        'net': total_amount,
+        'paid': paid_amount,
+        'due': max(total_amount - paid_amount, 0.0),
+        'refunds': 0.0,
+        'pending': 0.0,
+        'tests': int(_amount(metadata.get('total_tests')))
+    }
+    counts = {
+        'status': {str(metadata.get('status', 'unknown')): 1},
+        'clinic': {str((report.get('clinic_info') or {}).get('name', 'Unknown')): 1}
+    }
+    return day, values, counts
+
+
+def _empty_bucket() -> Dict:
+    return {'values': {}, 'counts': {}}
+
+
+def _apply(bucket: Dict, values: Dict[str, float], counts: Dict[str, Dict[str, int]], sign: int):
+    bucket_values = bucket['values']
+    for field, value in values.items():
+        bucket_values[field] = bucket_values.get(field, 0) + sign * value
+    for dimension, keys in counts.items():
+        bucket_counts = bucket['counts'].setdefault(dimension, {})
+        for key, count in keys.items():
+            remaining = bucket_counts.get(key, 0) + sign * count
+            if remaining:
+                bucket_counts[key] = remaining
+            else:
+                bucket_counts.pop(key, None)
+
+
+def _merge(into: Dict, bucket: Dict):
+    _apply(into, bucket['values'], bucket['counts'], 1)
+
+
+def _result(bucket: Dict) -> Dict:
+    values = bucket['values']
+    result = {field: values.get(field, 0) for field in VALUE_FIELDS}
+    for field in ('gross', 'discount', 'gst', 'net', 'paid', 'due', 'refunds', 'pending'):
+        result[field] = round(result[field], 2)
+    result.update(bucket['counts'])
+    return result
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
+
+
+class RollupTable:
+    """
+    Daily and monthly rollups of one data file.
+
+    ``facts(record)`` reduces a record to its day key, summable amounts and
+    category counts. Each record's contribution is remembered by id, so a
+    changed record is applied as (new - old) and a deleted one subtracted.
+    ``record``/``remove`` are called after the owning routes write the file;
+    any other change to the file is detected through its mtime/size and
+    triggers a rebuild.
+
+    Range queries walk the range once, taking whole months from the monthly
+    table and the partial months at either end from the daily table.
+    """
+
+    def __init__(self, filename: str, facts: Callable):
+        self.filename = filename
+        self.facts = facts
+        self._lock = threading.RLock()
+        self._daily: Dict[object, Dict[str, Dict]] = {}
+        self._monthly: Dict[object, Dict[str, Dict]] = {}
+        self._totals: Dict[object, Dict] = {}
+        self._contributions: Dict[object, Tuple] = {}
+        self._file_version: Optional[Tuple[int, int]] = None
+        self._built = False
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def _current_file_version(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(os.path.join(DATA_DIR, self.filename))
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _ensure_fresh(self):
+        if not self._built or self._current_file_version() != self._file_version:
+            self.rebuild()
+
+    def rebuild(self):
+        """Rebuild both tables from the data file"""
+        with self._lock:
+            version = self._current_file_version()
+            try:
+                records = read_data(self.filename)
+            except Exception as e:
+                print(f"Warning: Failed to load {self.filename} for rollups: {e}")
+                records = []
+            self._daily = {}
+            self._monthly = {}
+            self._totals = {}
+            self._contributions = {}
+            for record in records:
+                self._add(record)
+            self._file_version = version
+            self._built = True
+
+    def _change(self, contribution: Tuple, sign: int):
+        tenant_id, day, values, counts = contribution
+        for table, key in ((self._daily, day), (self._monthly, day[:7])):
+            buckets = table.setdefault(tenant_id, {})
+            bucket = buckets.setdefault(key, _empty_bucket())
+            _apply(bucket, values, counts, sign)
+            if not bucket['values'].get('billings'):
+                del buckets[key]
+        _apply(self._totals.setdefault(tenant_id, _empty_bucket()), values, counts, sign)
+
+    def _add(self, record: Dict):
+        facts = self.facts(record)
+        if facts is None or record.get('id') is None:
+            return
+        day, values, counts = facts
+        contribution = (record.get('tenant_id'), day, values, counts)
+        self._contributions[record['id']] = contribution
+        self._change(contribution, 1)
+
+    def _discard(self, record_id):
+        contribution = self._contributions.pop(record_id, None)
+        if contribution is not None:
+            self._change(contribution, -1)
+
+    def record(self, record: Dict):
+        """Apply a created or changed record after it was written"""
+        with self._lock:
+            if not self._built:
+                self.rebuild()
+                return
+            self._discard(record.get('id'))
+            self._add(record)
+            self._file_version = self._current_file_version()
+
+    def remove(self, record_id):
+        """Drop a record after it was deleted"""
+        with self._lock:
+            if not self._built:
+                self.rebuild()
+                return
+            self._discard(record_id)
+            self._file_version = self._current_file_version()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _tenants(self, tenant_ids: Optional[Iterable]) -> List:
+        if tenant_ids is None:
+            return list(self._totals)
+        return [t for t in tenant_ids if t in self._totals]
+
+    def _last_day(self, tenants: List) -> Optional[str]:
+        days = [max(self._daily[t]) for t in tenants if self._daily.get(t)]
+        return max(days) if days else None
+
+    def _first_day(self, tenants: List) -> Optional[str]:
+        days = [min(self._daily[t]) for t in tenants if self._daily.get(t)]
+        return min(days) if days else None
+
+    def _range_bucket(self, tenant_id, start: date, end: date) -> Dict:
+        daily = self._daily.get(tenant_id, {})
+        monthly = self._monthly.get(tenant_id, {})
+        bucket = _empty_bucket()
+        day = start
+        while day <= end:
+            month_end = _next_month(day) - timedelta(days=1)
+            if day.day == 1 and month_end <= end:
+                month = monthly.get(day.isoformat()[:7])
+                if month:
+                    _merge(bucket, month)
+                day = month_end + timedelta(days=1)
+                continue
+            entry = daily.get(day.isoformat())
+            if entry:
+                _merge(bucket, entry)
+            day += timedelta(days=1)
+        return bucket
+
+    def _resolve_range(self, tenants: List, start: Optional[str], end: Optional[str]) -> Optional[Tuple[date, date]]:
+        start = start or self._first_day(tenants)
+        end = end or self._last_day(tenants)
+        if not start or not end:
+            return None
+        return date.fromisoformat(start[:10]), date.fromisoformat(end[:10])
+
+    def totals(self, tenant_ids: Optional[Iterable] = None, start: Optional[str] = None,
+               end: Optional[str] = None) -> Dict:
+        """Summed rollup over tenants for an inclusive day range (all time when omitted)"""
+        with self._lock:
+            self._ensure_fresh()
+            tenants = self._tenants(tenant_ids)
+            bucket = _empty_bucket()
+            if start is None and end is None:
+                for tenant_id in tenants:
+                    _merge(bucket, self._totals[tenant_id])
+                return _result(bucket)
+            day_range = self._resolve_range(tenants, start, end)
+            if day_range:
+                for tenant_id in tenants:
+                    _merge(bucket, self._range_bucket(tenant_id, *day_range))
+            return _result(bucket)
+
+    def month(self, month: str, tenant_ids: Optional[Iterable] = None) -> Dict:
+        """Summed rollup over tenants for one ``YYYY-MM`` month"""
+        with self._lock:
+            self._ensure_fresh()
+            bucket = _empty_bucket()
+            for tenant_id in self._tenants(tenant_ids):
+                entry = self._monthly.get(tenant_id, {}).get(month)
+                if entry:
+                    _merge(bucket, entry)
+            return _result(bucket)
+
+    def by_tenant(self, tenant_ids: Optional[Iterable] = None, start: Optional[str] = None,
+                  end: Optional[str] = None) -> Dict:
+        """Rollup per tenant for an inclusive day range (all time when omitted)"""
+        with self._lock:
+            self._ensure_fresh()
+            tenants = self._tenants(tenant_ids)
+            if start is None and end is None:
+                return {t: _result(self._totals[t]) for t in tenants}
+            day_range = self._resolve_range(tenants, start, end)
+            if not day_range:
+                return {}
+            return {t: _result(self._range_bucket(t, *day_range)) for t in tenants}
+
+    def series(self, period: str, tenant_ids: Optional[Iterable] = None, start: Optional[str] = None,
+               end: Optional[str] = None, by_tenant: bool = False) -> List[Dict]:
+        """
+        One row per day (``period='daily'``) or month (``'monthly'``) in the
+        inclusive range, summed over tenants unless ``by_tenant``.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            tenants = self._tenants(tenant_ids)
+            day_range = self._resolve_range(tenants, start, end)
+            if not day_range:
+                return []
+            first, last = day_range
+
+            if period == 'monthly':
+                table, keys, key = self._monthly, [], date(first.year, first.month, 1)
+                while key <= last:
+                    keys.append(key.isoformat()[:7])
+                    key = _next_month(key)
+            else:
+                table, keys = self._daily, [(first + timedelta(days=i)).isoformat()
+                                            for i in range((last - first).days + 1)]
+
+            rows = []
+            for key in keys:
+                if by_tenant:
+                    for tenant_id in tenants:
+                        bucket = table.get(tenant_id, {}).get(key)
+                        rows.append(dict(_result(bucket or _empty_bucket()), period=key, tenant_id=tenant_id))
+                else:
+                    bucket = _empty_bucket()
+                    for tenant_id in tenants:
+                        entry = table.get(tenant_id, {}).get(key)
+                        if entry:
+                            _merge(bucket, entry)
+                    rows.append(dict(_result(bucket), period=key))
+            return rows
+
+
+billing_rollups = RollupTable('billings.json', billing_facts)
+report_rollups = RollupTable('billing_reports.json', report_facts)
@@ -0,0 +1,474 @@
+"""
+Formula Engine
+Calculated parameters (LDL by Friedewald, eGFR, A/G ratio, indirect
+bilirubin, absolute counts, ...) defined in ``calculation_formulas.json``.
+
+Entries: ``{id, name, target, expression, inputs, decimals, is_active}``.
+``target`` and the values of ``inputs`` name a test either by test name
+(matched case-insensitively against the report's test items) or by
+test_master_id; ``inputs`` maps the symbols used in ``expression`` to
+those tests. Expressions are arithmetic (``+ - * / ^ %``), comparisons,
+``and``/``or``/``not``, ``if(cond, a, b)``, ``min max abs round sqrt log
+log10 exp pow``, ``null``, and the patient's ``age`` (years), ``female``
+and ``male`` (1/0). They are parsed once with ``ast`` and compiled to
+closures, never ``eval``-ed; a missing input or an undefined operation
+(division by zero, ``null``) gives no value.
+
+Formulas whose target feeds another formula form a dependency graph
+(LDL -> LDL/HDL ratio, Globulin -> A/G ratio). For each set of tests on a
+report the applicable formulas are ordered once and cached, and a changed
+result recomputes only the formulas downstream of it.
+"""
+
+import ast
+import math
+import os
+import re
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+import logging
+
+from utils import read_data, DATA_DIR
+from .reference_ranges import patient_demographics, DAYS_PER_YEAR
+
+logger = logging.getLogger(__name__)
+
+FORMULAS_FILE = 'calculation_formulas.json'
+
+# Names an expression may use besides its input symbols
+PATIENT_NAMES = ('age', 'female', 'male')
+CONSTANTS = {'null': None, 'none': None, 'pi': math.pi, 'e': math.e}
+
+MAX_DECIMALS = 6
+
+TestKey = Tuple[str, object]  # ('name', 'cholesterol, ldl') or ('id', 253)
+
+
+class FormulaError(Exception):
+    """Invalid formula: bad syntax, unknown names or a dependency cycle"""
+
+
+def _file_version(filename: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(os.path.join(DATA_DIR, filename))
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def test_key(reference) -> Optional[TestKey]:
+    """Normalised key for a test reference (test name or test_master_id)"""
+    if isinstance(reference, bool) or reference is None:
+        return None
+    if isinstance(reference, int):
+        return ('id', reference)
+    text = re.sub(r'\s+', ' ', str(reference)).strip().lower().rstrip('.')
+    if not text:
+        return None
+    return ('id', int(text)) if text.isdigit() else ('name', text)
+
+
+def item_keys(test_item: Dict) -> List[TestKey]:
+    keys = [test_key(test_item.get('test_name'))]
+    if test_item.get('test_master_id') is not None:
+        keys.append(test_key(test_item['test_master_id']))
+    return [key for key in keys if key is not None]
+
+
+def catalogue_keys() -> Set[TestKey]:
+    """Keys of every test in the test catalogues (test_master and test_master_enhanced)"""
+    keys: Set[TestKey] = set()
+    for filename in ('test_master.json', 'test_master_enhanced.json'):
+        if not os.path.exists(os.path.join(DATA_DIR, filename)):
+            continue
+        for test in read_data(filename):
+            for reference in (test.get('id'), test.get('testName') or test.get('test_name')):
+                key = test_key(reference)
+                if key is not None:
+                    keys.add(key)
+    return keys
+
+
+def _number(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    try:
+        number = float(str(value).strip().replace(',', ''))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+# --- expression compiler ----------------------------------------------------
+
+def _power(a, b):
+    # Floats, so an oversized result raises OverflowError instead of building a huge integer
+    return float(a) ** float(b)
+
+def _round(value, ndigits=0):
+    # Constants are compiled as floats, so round(x, 2) arrives here as round(x, 2.0)
+    return round(value, int(ndigits))
+
+_BINARY = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b,
+    ast.Mod: lambda a, b: a % b,
+    ast.Pow: _power,
+}
+_COMPARE = {
+    ast.Lt: lambda a, b: a < b,
+    ast.LtE: lambda a, b: a <= b,
+    ast.Gt: lambda a, b: a > b,
+    ast.GtE: lambda a, b: a >= b,
+    ast.Eq: lambda a, b: a == b,
+    ast.NotEq: lambda a, b: a != b,
+}
+_FUNCTIONS = {
+    'min': min,
+    'max': max,
+    'abs': abs,
+    'round': _round,
+    'sqrt': math.sqrt,
+    'log': math.log,
+    'log10': math.log10,
+    'exp': math.exp,
+    'pow': _power,
+}
+
+Env = Dict[str, Optional[float]]
+Compiled = Callable[[Env], Optional[float]]
+
+
+def _compile_node(node: ast.AST, names: Set[str]) -> Compiled:
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body, names)
+
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise FormulaError(f"Unsupported constant: {node.value!r}")
+        value = float(node.value)
+        return lambda env: value
+
+    if isinstance(node, ast.Name):
+        if node.id in CONSTANTS:
+            value = CONSTANTS[node.id]
+            return lambda env: value
+        names.add(node.id)
+        symbol = node.id
+
+        def name(env):
+            value = env.get(symbol)
+            return None if value is None else float(value)
+        return name
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+        operation = _BINARY[type(node.op)]
+        left, right = _compile_node(node.left, names), _compile_node(node.right, names)
+
+        def binary(env):
+            a, b = left(env), right(env)
+            return None if a is None or b is None else operation(a, b)
+        return binary
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile_node(node.operand, names)
+        if isinstance(node.op, ast.USub):
+            return lambda env: None if operand(env) is None else -operand(env)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        if isinstance(node.op, ast.Not):
+            return lambda env: None if operand(env) is None else float(not operand(env))
+
+    if isinstance(node, ast.Compare):
+        operands = [_compile_node(node.left, names)] + [_compile_node(c, names) for c in node.comparators]
+        operations = []
+        for op in node.ops:
+            if type(op) not in _COMPARE:
+                raise FormulaError(f"Unsupported comparison: {type(op).__name__}")
+            operations.append(_COMPARE[type(op)])
+
+        def compare(env):
+            values = [operand(env) for operand in operands]
+            if any(value is None for value in values):
+                return None
+            return float(all(op(values[i], values[i + 1]) for i, op in enumerate(operations)))
+        return compare
+
+    if isinstance(node, ast.BoolOp):
+        operands = [_compile_node(value, names) for value in node.values]
+        is_and = isinstance(node.op, ast.And)
+
+        def boolean(env):
+            for operand in operands:
+                value = operand(env)
+                if value is None:
+                    return None
+                if bool(value) != is_and:
+                    return float(not is_and)
+            return float(is_and)
+        return boolean
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        function = node.func.id.lower()
+        arguments = [_compile_node(arg, names) for arg in node.args]
+        if function == 'iif':
+            if len(arguments) != 3:
+                raise FormulaError('if() takes exactly 3 arguments: if(condition, then, else)')
+            condition, then, otherwise = arguments
+
+            def conditional(env):
+                value = condition(env)
+                if value is None:
+                    return None
+                return then(env) if value else otherwise(env)
+            return conditional
+        if function in _FUNCTIONS and arguments:
+            implementation = _FUNCTIONS[function]
+
+            def call(env):
+                values = [argument(env) for argument in arguments]
+                return None if any(value is None for value in values) else implementation(*values)
+            return call
+        raise FormulaError(f"Unknown function: {node.func.id}()")
+
+    raise FormulaError(f"Unsupported expression element: {type(node).__name__}")
+
+
+def compile_expression(expression: str) -> Tuple[Compiled, Set[str]]:
+    """
+    Compile an expression to a closure over an environment of symbol
+    values; returns the closure and the symbols it references.
+    """
+    if not isinstance(expression, str) or not expression.strip():
+        raise FormulaError('Expression is required')
+    # "if" is a Python keyword, so rename the function; "^" is a power, as written in lab formulas
+    source = re.sub(r'\bif\s*\(', 'iif(', expression.strip()).replace('^', '**')
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError as e:
+        raise FormulaError(f"Invalid expression: {e.msg}")
+
+    names: Set[str] = set()
+    compiled = _compile_node(tree, names)
+
+    def evaluate(env: Env, strict: bool = False) -> Optional[float]:
+        try:
+            value = compiled(env)
+        except OverflowError:
+            if strict:
+                raise FormulaError('Result is too large')
+            return None
+        except (ZeroDivisionError, ValueError, TypeError):
+            return None
+        if value is None or isinstance(value, complex) or not math.isfinite(value):
+            return None
+        return float(value)
+
+    return evaluate, names
+
+
+class Formula:
+    """One compiled calculation_formulas.json entry"""
+
+    def __init__(self, entry: Dict):
+        self.id = entry.get('id')
+        self.name = entry.get('name') or str(entry.get('target', ''))
+        self.target = test_key(entry.get('target'))
+        if self.target is None:
+            raise FormulaError('target test is required')
+
+        inputs = entry.get('inputs') or {}
+        if not isinstance(inputs, dict):
+            raise FormulaError('inputs must map expression symbols to tests')
+        self.inputs: Dict[str, TestKey] = {}
+        for symbol, reference in inputs.items():
+            if not str(symbol).isidentifier() or symbol in PATIENT_NAMES or symbol in CONSTANTS:
+                raise FormulaError(f"Invalid input symbol: {symbol}")
+            key = test_key(reference)
+            if key is None:
+                raise FormulaError(f"Input {symbol} does not name a test")
+            self.inputs[symbol] = key
+
+        self.expression = entry.get('expression', '')
+        self.evaluate, names = compile_expression(self.expression)
+        unknown = sorted(n for n in names if n not in self.inputs and n not in PATIENT_NAMES)
+        if unknown:
+            raise FormulaError(f"Undefined symbols: {', '.join(unknown)}")
+        if self.target in self.inputs.values():
+            raise FormulaError('A formula cannot use its own target as an input')
+
+        decimals = entry.get('decimals')
+        valid = isinstance(decimals, int) and not isinstance(decimals, bool) and 0 <= decimals <= MAX_DECIMALS
+        self.decimals = decimals if valid else 2
+
+    def format(self, value: float) -> str:
+        return f"{value:.{self.decimals}f}"
+
+
+class FormulaEngine:
+    """
+    Loads the formulas (reloaded when the file changes), orders them by
+    dependency and recomputes calculated test items on reports.
+    """
+
+    def __init__(self, filename: str = FORMULAS_FILE):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._version = False
+        self._formulas: List[Formula] = []  # dependency order
+        self._by_target: Dict[TestKey, Formula] = {}
+        self._dependents: Dict[TestKey, List[Formula]] = {}
+        self._plans: Dict[FrozenSet[TestKey], List[Formula]] = {}
+        self.errors: List[Dict] = []
+
+    @staticmethod
+    def build(entries: Iterable[Dict]) -> Tuple[List[Formula], List[Dict]]:
+        """Compile active entries and order them by dependency; returns (formulas, errors)"""
+        errors = []
+        by_target: Dict[TestKey, Formula] = {}
+        for entry in entries:
+            if not entry.get('is_active', True):
+                continue
+            try:
+                formula = Formula(entry)
+            except FormulaError as e:
+                errors.append({'id': entry.get('id'), 'name': entry.get('name'), 'message': str(e)})
+                continue
+            if formula.target in by_target:
+                errors.append({'id': formula.id, 'name': formula.name,
+                               'message': f"Target already calculated by formula {by_target[formula.target].id}"})
+                continue
+            by_target[formula.target] = formula
+
+        # Kahn's algorithm; formulas left over are on a cycle
+        pending = {f.target: {k for k in f.inputs.values() if k in by_target} for f in by_target.values()}
+        ordered = []
+        ready = [target for target, needs in pending.items() if not needs]
+        while ready:
+            target = ready.pop()
+            ordered.append(by_target[target])
+            del pending[target]
+            for other, needs in pending.items():
+                if target in needs:
+                    needs.discard(target)
+                    if not needs and other not in ready:
+                        ready.append(other)
+        for target in pending:
+            formula = by_target[target]
+            errors.append({'id': formula.id, 'name': formula.name, 'message': 'Formula is part of a dependency cycle'})
+        return ordered, errors
+
+    def _refresh(self):
+        version = _file_version(self.filename)
+        if version == self._version:
+            return
+        formulas, errors = self.build(read_data(self.filename) if version else [])
+        for error in errors:
+            logger.warning(f"Skipping formula {error['id']} ({error['name']}): {error['message']}")
+
+        dependents: Dict[TestKey, List[Formula]] = {}
+        for formula in formulas:
+            for key in set(formula.inputs.values()):
+                dependents.setdefault(key, []).append(formula)
+        self._formulas = formulas
+        self._by_target = {f.target: f for f in formulas}
+        self._dependents = dependents
+        self._plans = {}
+        self.errors = errors
+        self._version = version
+
+    def formulas(self) -> List[Formula]:
+        with self._lock:
+            self._refresh()
+            return list(self._formulas)
+
+    def _plan(self, keys: FrozenSet[TestKey]) -> List[Formula]:
+        """Formulas whose target is on a report with these tests, in dependency order"""
+        plan = self._plans.get(keys)
+        if plan is None:
+            plan = [f for f in self._formulas if f.target in keys]
+            if len(self._plans) > 5000:
+                self._plans.clear()
+            self._plans[keys] = plan
+        return plan
+
+    def _downstream(self, changed: Set[TestKey]) -> Set[int]:
+        """ids of the formulas affected, directly or transitively, by changed tests"""
+        affected = set()
+        queue = list(changed)
+        while queue:
+            for formula in self._dependents.get(queue.pop(), ()):
+                if id(formula) not in affected:
+                    affected.add(id(formula))
+                    queue.append(formula.target)
+        return affected
+
+    def recompute(self, report: Dict, changed_items: Optional[List[Dict]] = None,
+                  overwrite: bool = True) -> List[Dict]:
+        """
+        Recompute the calculated test items of a report in place and return
+        the items whose result changed.
+
+        With ``changed_items`` only formulas downstream of those items run;
+        without, every applicable formula does. ``overwrite=False`` leaves
+        results that were entered by hand alone.
+        """
+        test_items = report.get('test_items') or []
+        if not test_items:
+            return []
+
+        items_by_key: Dict[TestKey, Dict] = {}
+        for item in test_items:
+            for key in item_keys(item):
+                items_by_key.setdefault(key, item)
+
+        with self._lock:
+            self._refresh()
+            plan = self._plan(frozenset(items_by_key))
+            if not plan:
+                return []
+            if changed_items is not None:
+                affected = self._downstream({key for item in changed_items for key in item_keys(item)})
+                plan = [f for f in plan if id(f) in affected]
+
+        sex, age_days = patient_demographics(report.get('patient_info'))
+        patient = {
+            'age': age_days / DAYS_PER_YEAR if age_days is not None else None,
+            'female': None if sex is None else float(sex == 'F'),
+            'male': None if sex is None else float(sex == 'M'),
+        }
+
+        updated = []
+        for formula in plan:
+            target_item = items_by_key[formula.target]
+            calculated_before = target_item.get('result_source') == 'calculated'
+            if not overwrite and not calculated_before and target_item.get('result') not in (None, ''):
+                continue
+
+            env = dict(patient)
+            for symbol, key in formula.inputs.items():
+                item = items_by_key.get(key)
+                env[symbol] = _number(item.get('result')) if item is not None else None
+            value = formula.evaluate(env)
+
+            if value is None:
+                # Inputs missing or out of the formula's domain: drop a stale calculated value
+                if calculated_before and target_item.get('result') not in (None, ''):
+                    target_item['result'] = None
+                    updated.append(target_item)
+                continue
+
+            result = formula.format(value)
+            if target_item.get('result') != result or not calculated_before:
+                target_item['result'] = result
+                target_item['result_source'] = 'calculated'
+                target_item['calculation_formula_id'] = formula.id
+                updated.append(target_item)
+        return updated
+
+
+formula_engine = FormulaEngine()
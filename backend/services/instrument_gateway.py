@@ -0,0 +1,530 @@
+"""
+Instrument Gateway
+asyncio TCP listeners for analyzer interfaces (ASTM E1381/E1394 and HL7 v2
+ORU^R01 over MLLP) that match incoming results to billing reports by SID and
+commit them in batches.
+
+Listeners are configured with ``INSTRUMENT_LISTENERS``, a comma separated
+list of ``protocol:port[:instrument_id]`` (e.g. ``astm:5101:1,hl7:5102:2``),
+bound to ``INSTRUMENT_GATEWAY_HOST`` (default 127.0.0.1). Instrument channel
+codes are mapped to test master ids in ``instrument_channels.json``.
+
+The API server starts the configured listeners on import. With several
+server processes, leave INSTRUMENT_LISTENERS unset there and run the gateway
+once, standalone, against the same data directory (report writes take a file
+lock next to billing_reports.json, so the processes do not overwrite each
+other's changes):
+    python -m services.instrument_gateway --listen astm:5101:1 --listen hl7:5102:2
+
+and feed it with ``python -m services.instrument_simulator``.
+"""
+
+import argparse
+import asyncio
+import atexit
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from utils import read_data, DATA_DIR
+from .billing_reports_service import BillingReportsService
+from .instrument_protocols import (
+    ASTMReceiver, MLLPReceiver, ProtocolError, hl7_ack, mllp_wrap, parse_astm_message, parse_hl7_message
+)
+
+logger = logging.getLogger(__name__)
+
+PROTOCOLS = ('astm', 'hl7')
+
+
+def _file_version(filename: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(os.path.join(DATA_DIR, filename))
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def parse_listeners(spec: str) -> List[Dict]:
+    """``astm:5101:1,hl7:5102`` -> [{'protocol', 'port', 'instrument_id'}]"""
+    listeners = []
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        parts = item.split(':')
+        if len(parts) not in (2, 3) or parts[0].lower() not in PROTOCOLS:
+            raise ValueError(f"Invalid listener {item!r}; expected protocol:port[:instrument_id]")
+        listeners.append({
+            'protocol': parts[0].lower(),
+            'port': int(parts[1]),
+            'instrument_id': int(parts[2]) if len(parts) == 3 and parts[2] else None
+        })
+    return listeners
+
+
+class ChannelMap:
+    """
+    Instrument channel code -> test master id, from ``instrument_channels.json``.
+
+    Entries: ``{instrument_id, channel_code, test_master_id, unit, factor,
+    decimals, is_active}``; an entry without ``instrument_id`` applies to every
+    instrument. ``factor``/``decimals`` convert numeric values to the report
+    unit (e.g. 10^3/uL -> cells/cumm). Reloaded when the file changes.
+    """
+
+    FILENAME = 'instrument_channels.json'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = False
+        self._channels: Dict[Tuple[Optional[int], str], Dict] = {}
+
+    def _refresh(self):
+        version = _file_version(self.FILENAME)
+        if version == self._version:
+            return
+        channels = {}
+        for entry in read_data(self.FILENAME):
+            if entry.get('is_active', True) and entry.get('channel_code') and entry.get('test_master_id'):
+                key = (entry.get('instrument_id'), str(entry['channel_code']).strip().upper())
+                channels[key] = entry
+        self._channels = channels
+        self._version = version
+
+    def lookup(self, instrument_id: Optional[int], code: str) -> Optional[Dict]:
+        with self._lock:
+            self._refresh()
+            code = (code or '').strip().upper()
+            return self._channels.get((instrument_id, code)) or self._channels.get((None, code))
+
+    def entries(self) -> List[Dict]:
+        with self._lock:
+            self._refresh()
+            return list(self._channels.values())
+
+
+class OrderIndex:
+    """
+    SID -> ordered tests, built from ``billing_reports.json`` and rebuilt
+    when the file changes, so matching a result costs a dict lookup instead
+    of a scan over every report. Each test master id maps to the positions
+    of its test items (with whether each already has a result), so a result
+    targets one concrete item even when a test is ordered more than once.
+    """
+
+    FILENAME = 'billing_reports.json'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = False
+        self._orders: Dict[str, Dict] = {}
+
+    def _refresh(self):
+        version = _file_version(self.FILENAME)
+        if version == self._version:
+            return
+        orders = {}
+        for report in read_data(self.FILENAME):
+            sid = report.get('sid_number')
+            if not sid or sid in orders:
+                continue
+            tests: Dict[object, List[Tuple[int, bool]]] = {}
+            for index, item in enumerate(report.get('test_items') or []):
+                tests.setdefault(item.get('test_master_id'), []).append(
+                    (index, item.get('result') not in (None, ''))
+                )
+            orders[sid] = {
+                'report_id': report.get('id'),
+                'tenant_id': report.get('tenant_id'),
+                'authorized': report.get('authorization_status') == 'approved',
+                'tests': tests
+            }
+        self._orders = orders
+        self._version = version
+
+    def get(self, sid: str) -> Optional[Dict]:
+        with self._lock:
+            self._refresh()
+            return self._orders.get(str(sid).strip())
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._orders)
+
+
+class InstrumentGateway:
+    """
+    Receives analyzer results and writes them to billing reports.
+
+    The listeners run on an asyncio loop in a background thread. Each result
+    is checked against the channel map and the SID index, then buffered;
+    the buffer is committed with one ``apply_result_batch`` call (one read
+    and one write of billing_reports.json) once it holds ``batch_size``
+    results or ``flush_interval`` seconds after the first buffered result.
+    Matching and commits run in an executor so file I/O never blocks the
+    sockets.
+    """
+
+    RECENT_REJECTIONS = 100
+
+    def __init__(self, host: str = '127.0.0.1', listeners: Optional[List[Dict]] = None,
+                 batch_size: int = 200, flush_interval: float = 2.0):
+        self.host = host
+        self.listeners = listeners or []
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.channels = ChannelMap()
+        self.orders = OrderIndex()
+        self.reports_service = BillingReportsService(DATA_DIR)
+
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._stopping = None
+        self._servers = []
+        self._buffer: List[Dict] = []
+        self._flush_requested = None
+        self._commit_lock = None
+
+        self.stats = Counter()
+        self.rejections = deque(maxlen=self.RECENT_REJECTIONS)
+        self.last_commit = None
+        self.error = None
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self, timeout: float = 5.0) -> bool:
+        """Start the listeners in a background thread (idempotent)"""
+        if self._thread is not None:
+            return True
+        if not self.listeners:
+            logger.info("No instrument listeners configured")
+            return False
+        self._thread = threading.Thread(target=self._run, name='instrument-gateway', daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout)
+        atexit.register(self.stop)
+        return self._ready.is_set() and self.error is None
+
+    def stop(self, timeout: float = 10.0):
+        """Close the listeners and commit whatever is still buffered"""
+        if self._loop is None or self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._request_stop(), self._loop)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def flush(self, timeout: float = 30.0) -> Optional[Dict]:
+        """Commit the buffer now (from any thread); returns the commit summary"""
+        if self._loop is None or self._thread is None:
+            return None
+        return asyncio.run_coroutine_threadsafe(self._flush(), self._loop).result(timeout)
+
+    def _run(self):
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Instrument gateway stopped: {e}")
+        finally:
+            self._ready.set()
+
+    async def _request_stop(self):
+        self._stopping.set()
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._flush_requested = asyncio.Event()
+        self._commit_lock = asyncio.Lock()
+
+        for listener in self.listeners:
+            handler = self._handle_astm if listener['protocol'] == 'astm' else self._handle_hl7
+            server = await asyncio.start_server(
+                lambda reader, writer, listener=listener, handler=handler: handler(listener, reader, writer),
+                self.host, listener['port'])
+            listener['bound_port'] = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+            logger.info(f"Listening for {listener['protocol'].upper()} on {self.host}:{listener['bound_port']}")
+        self._ready.set()
+
+        flusher = asyncio.create_task(self._run_flusher())
+        await self._stopping.wait()
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        flusher.cancel()
+        await self._flush()
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+
+    async def _handle_astm(self, listener: Dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info('peername')
+        receiver = ASTMReceiver()
+        self.stats['connections'] += 1
+        try:
+            while not reader.at_eof():
+                data = await reader.read(4096)
+                if not data:
+                    break
+                replies, messages = receiver.feed(data)
+                if replies:
+                    writer.write(replies)
+                    await writer.drain()
+                for records in messages:
+                    self.stats['messages'] += 1
+                    try:
+                        _, results = parse_astm_message(records)
+                    except ProtocolError as e:
+                        self.stats['malformed_messages'] += 1
+                        logger.warning(f"Malformed ASTM message from {peer}: {e}")
+                        continue
+                    await self._accept(listener, results)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"ASTM connection from {peer} dropped: {e}")
+        finally:
+            writer.close()
+
+    async def _handle_hl7(self, listener: Dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info('peername')
+        receiver = MLLPReceiver()
+        self.stats['connections'] += 1
+        try:
+            while not reader.at_eof():
+                data = await reader.read(4096)
+                if not data:
+                    break
+                for message in receiver.feed(data):
+                    self.stats['messages'] += 1
+                    try:
+                        header, results = parse_hl7_message(message)
+                    except ProtocolError as e:
+                        self.stats['malformed_messages'] += 1
+                        logger.warning(f"Malformed HL7 message from {peer}: {e}")
+                        header = {'control_id': '', 'encoding': '^~\\&'}
+                        writer.write(mllp_wrap(hl7_ack(header, 'AR', str(e))))
+                        continue
+                    accepted = await self._accept(listener, results)
+                    code = 'AA' if accepted == len(results) else 'AE'
+                    text = '' if code == 'AA' else f'{len(results) - accepted} of {len(results)} results not matched'
+                    writer.write(mllp_wrap(hl7_ack(header, code, text)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"HL7 connection from {peer} dropped: {e}")
+        finally:
+            writer.close()
+
+    # ------------------------------------------------------------------
+    # Matching and buffering
+    # ------------------------------------------------------------------
+
+    def _reject(self, result: Dict, instrument_id: Optional[int], reason: str):
+        self.stats['rejected'] += 1
+        self.rejections.append({
+            'instrument_id': instrument_id, 'sid': result.get('sid'), 'code': result.get('code'),
+            'value': result.get('value'), 'reason': reason, 'at': datetime.now().isoformat()
+        })
+
+    @staticmethod
+    def _convert(value: str, channel: Dict) -> str:
+        factor, decimals = channel.get('factor'), channel.get('decimals')
+        if factor is None and decimals is None:
+            return value
+        try:
+            number = float(value) * float(factor if factor is not None else 1)
+        except (TypeError, ValueError):
+            return value  # qualitative result ("Positive", "<0.1")
+        if decimals is not None:
+            return f"{number:.{int(decimals)}f}"
+        return f"{number:g}"
+
+    def resolve(self, instrument_id: Optional[int], result: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+        """Result entry for ``apply_result_batch``, or the reason it cannot be used"""
+        if not result.get('sid'):
+            return None, 'No specimen ID'
+        if result.get('value') in (None, ''):
+            return None, 'Empty result value'
+        channel = self.channels.lookup(instrument_id, result.get('code'))
+        if channel is None:
+            return None, f"Channel {result.get('code')!r} is not mapped"
+        order = self.orders.get(result['sid'])
+        if order is None:
+            return None, f"No report for SID {result['sid']}"
+        if order['authorized']:
+            return None, 'Report is already authorized'
+        items = order['tests'].get(channel['test_master_id'])
+        if not items:
+            return None, f"Test {channel['test_master_id']} was not ordered for SID {result['sid']}"
+        # A test ordered more than once: fill the first item still without a result
+        test_index = next((index for index, has_result in items if not has_result), items[0][0])
+
+        entry = {
+            'sid_number': result['sid'],
+            'test_index': test_index,
+            'test_id': channel['test_master_id'],
+            'value': self._convert(result['value'], channel),
+            'flags': result.get('flags') or [],
+            'result_source': {
+                'instrument_id': instrument_id,
+                'channel_code': result.get('code'),
+                'protocol': result.get('protocol'),
+                'status': result.get('status'),
+                'observed_at': result.get('observed_at')
+            }
+        }
+        unit = channel.get('unit') or result.get('units')
+        if unit:
+            entry['result_unit'] = unit
+        return entry, None
+
+    async def _accept(self, listener: Dict, results: List[Dict]) -> int:
+        """Buffer the usable results of one message; returns how many were accepted"""
+        # Matching re-reads billing_reports.json after every commit, so it runs off the loop
+        entries = await self._loop.run_in_executor(None, self._resolve_all, listener.get('instrument_id'), results)
+        self._buffer.extend(entries)
+        if len(self._buffer) >= self.batch_size and self._flush_requested is not None:
+            self._flush_requested.set()
+        return len(entries)
+
+    def _resolve_all(self, instrument_id: Optional[int], results: List[Dict]) -> List[Dict]:
+        entries = []
+        for result in results:
+            self.stats['received'] += 1
+            entry, reason = self.resolve(instrument_id, result)
+            if entry is None:
+                self._reject(result, instrument_id, reason)
+                continue
+            entries.append(entry)
+        return entries
+
+    async def _run_flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            if self._buffer:
+                await self._flush()
+
+    async def _flush(self) -> Optional[Dict]:
+        async with self._commit_lock:
+            if not self._buffer:
+                return None
+            batch, self._buffer = self._buffer, []
+            summary, unsaved = await self._loop.run_in_executor(None, self._commit, batch)
+            if unsaved:
+                # The write failed; keep the results for the next flush
+                self._buffer[:0] = unsaved
+            return summary
+
+    # ------------------------------------------------------------------
+    # Committing
+    # ------------------------------------------------------------------
+
+    def _commit(self, batch: List[Dict]) -> Tuple[Optional[Dict], List[Dict]]:
+        """Write one batch; returns the summary and any entries that could not be saved"""
+        # A re-run of the same sample overrides the earlier value
+        latest = {}
+        for entry in batch:
+            latest[(entry['sid_number'], entry['test_index'])] = entry
+        entries = list(latest.values())
+        self.stats['superseded'] += len(batch) - len(entries)
+
+        started = time.monotonic()
+        summary, errors = self.reports_service.apply_result_batch(entries, None, None, 'admin')
+        if errors:
+            # Reports changed since they were indexed: drop the offending entries and retry once
+            failed = {error['index'] for error in errors if error.get('index') is not None}
+            for error in errors:
+                if error.get('index') is not None:
+                    entry = entries[error['index']]
+                    self._reject({'sid': entry['sid_number'], 'code': entry['result_source']['channel_code'],
+                                  'value': entry['value']}, entry['result_source']['instrument_id'], error['message'])
+            entries = [entry for position, entry in enumerate(entries) if position not in failed]
+            summary, errors = self.reports_service.apply_result_batch(entries, None, None, 'admin') \
+                if entries and failed else (None, errors)
+
+        if summary is None:
+            if entries and not errors:
+                self.stats['failed_commits'] += 1
+                return None, entries
+            return None, []
+
+        self.stats['committed'] += summary['updated']
+        self.stats['batches'] += 1
+        self.last_commit = {
+            'at': datetime.now().isoformat(),
+            'results': summary['updated'],
+            'reports': len(summary['reports']),
+            'seconds': round(time.monotonic() - started, 3)
+        }
+        return summary, []
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+
+    def status(self) -> Dict:
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'host': self.host,
+            'listeners': [dict(listener) for listener in self.listeners],
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+            'buffered': len(self._buffer),
+            'indexed_reports': len(self.orders),
+            'mapped_channels': len(self.channels.entries()),
+            'stats': dict(self.stats),
+            'last_commit': self.last_commit,
+            'error': self.error,
+            'recent_rejections': list(self.rejections)
+        }
+
+
+def _configured_listeners() -> List[Dict]:
+    try:
+        return parse_listeners(os.environ.get('INSTRUMENT_LISTENERS', ''))
+    except ValueError as e:
+        print(f"Warning: Ignoring INSTRUMENT_LISTENERS: {e}")
+        return []
+
+
+instrument_gateway = InstrumentGateway(
+    host=os.environ.get('INSTRUMENT_GATEWAY_HOST', '127.0.0.1'),
+    listeners=_configured_listeners(),
+    batch_size=int(os.environ.get('INSTRUMENT_BATCH_SIZE', 200)),
+    flush_interval=float(os.environ.get('INSTRUMENT_FLUSH_SECONDS', 2.0))
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the instrument gateway without the API server')
+    parser.add_argument('--host', default=instrument_gateway.host)
+    parser.add_argument('--listen', action='append', default=[],
+                        help='protocol:port[:instrument_id], e.g. astm:5101:1 (repeatable)')
+    parser.add_argument('--batch-size', type=int, default=instrument_gateway.batch_size)
+    parser.add_argument('--flush-interval', type=float, default=instrument_gateway.flush_interval)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    listeners = parse_listeners(','.join(args.listen)) or instrument_gateway.listeners
+    gateway = InstrumentGateway(args.host, listeners, args.batch_size, args.flush_interval)
+    if not gateway.start():
+        raise SystemExit('No listeners started; pass --listen or set INSTRUMENT_LISTENERS')
+    try:
+        while gateway._thread is not None and gateway._thread.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        gateway.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""
+Instrument Protocols
+Framing and parsing for analyzer interfaces: ASTM E1381 (low-level link)
+with E1394 records, and HL7 v2 ORU^R01 over MLLP.
+
+Everything here works on bytes/strings only; the gateway owns the sockets.
+Parsed results are plain dicts:
+
+    {'sid', 'code', 'value', 'units', 'reference_range', 'flags',
+     'status', 'observed_at', 'protocol'}
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# ASTM E1381 control characters
+ENQ, ACK, NAK, EOT = b'\x05', b'\x06', b'\x15', b'\x04'
+STX, ETX, ETB = 0x02, 0x03, 0x17
+CR, LF = b'\r', b'\n'
+ASTM_MAX_FRAME_TEXT = 240
+
+# HL7 minimal lower layer protocol
+MLLP_START, MLLP_END = b'\x0b', b'\x1c\r'
+
+
+class ProtocolError(Exception):
+    """Malformed message that cannot be interpreted"""
+
+
+# ---------------------------------------------------------------------------
+# ASTM E1381 link layer
+# ---------------------------------------------------------------------------
+
+def astm_checksum(body: bytes) -> bytes:
+    """Two uppercase hex digits: sum of frame number, text and ETX/ETB mod 256"""
+    return b'%02X' % (sum(body) & 0xFF)
+
+
+def astm_frames(records: List[str], max_text: int = ASTM_MAX_FRAME_TEXT) -> List[bytes]:
+    """
+    Encode records as ASTM frames. Each record ends with CR and closes its
+    frame with ETX; records longer than ``max_text`` continue over ETB frames.
+    """
+    frames = []
+    number = 1
+    for record in records:
+        text = (record + '\r').encode('latin-1')
+        chunks = [text[i:i + max_text] for i in range(0, len(text), max_text)]
+        for position, chunk in enumerate(chunks):
+            terminator = ETX if position == len(chunks) - 1 else ETB
+            body = str(number).encode() + chunk + bytes([terminator])
+            frames.append(bytes([STX]) + body + astm_checksum(body) + CR + LF)
+            number = (number + 1) % 8
+    return frames
+
+
+class ASTMReceiver:
+    """
+    Receiving side of the E1381 link, fed with raw socket bytes.
+
+    ``feed`` returns the bytes to send back (ACK/NAK per ENQ and frame) and
+    the complete messages received, one list of record strings per
+    ENQ...EOT transmission.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._text = bytearray()
+        self._in_transfer = False
+        self._expected_frame = 1
+
+    def feed(self, data: bytes) -> Tuple[bytes, List[List[str]]]:
+        self._buffer.extend(data)
+        replies = bytearray()
+        messages = []
+
+        while self._buffer:
+            first = self._buffer[0]
+            if first == ENQ[0]:
+                del self._buffer[0]
+                self._in_transfer = True
+                self._expected_frame = 1
+                self._text.clear()
+                replies.extend(ACK)
+            elif first == EOT[0]:
+                del self._buffer[0]
+                if self._in_transfer and self._text:
+                    text = self._text.decode('latin-1')
+                    messages.append([record for record in text.split('\r') if record.strip()])
+                self._in_transfer = False
+                self._text.clear()
+            elif first == STX:
+                end = self._buffer.find(LF)
+                if end == -1:
+                    break  # wait for the rest of the frame
+                frame = bytes(self._buffer[:end + 1])
+                del self._buffer[:end + 1]
+                replies.extend(self._accept_frame(frame))
+            else:
+                del self._buffer[0]  # line noise between frames
+
+        return bytes(replies), messages
+
+    def _accept_frame(self, frame: bytes) -> bytes:
+        # STX FN text ETX|ETB C1 C2 CR LF
+        if not self._in_transfer or len(frame) < 7:
+            return NAK
+        terminator_at = len(frame) - 5
+        if frame[terminator_at] not in (ETX, ETB):
+            return NAK
+        body = frame[1:terminator_at + 1]
+        if astm_checksum(body) != frame[terminator_at + 1:terminator_at + 3].upper():
+            return NAK
+
+        number = body[0] - ord('0')
+        if number == (self._expected_frame - 1) % 8:
+            return ACK  # retransmission of a frame we already have
+        if number != self._expected_frame:
+            return NAK
+        self._text.extend(body[1:-1])
+        self._expected_frame = (self._expected_frame + 1) % 8
+        return ACK
+
+
+# ---------------------------------------------------------------------------
+# ASTM E1394 records
+# ---------------------------------------------------------------------------
+
+def _component(value: str, separator: str) -> str:
+    """First non-empty component of a field"""
+    return next((part for part in value.split(separator) if part), '')
+
+
+def _astm_test_code(universal_test_id: str, component: str) -> str:
+    """Instrument test code from ^^^CODE^... (falls back to any non-empty component)"""
+    parts = universal_test_id.split(component)
+    if len(parts) > 3 and parts[3]:
+        return parts[3]
+    return _component(universal_test_id, component)
+
+
+def _timestamp(value: str) -> Optional[str]:
+    """YYYYMMDD[HHMM[SS]] -> ISO 8601"""
+    digits = ''.join(ch for ch in value if ch.isdigit())
+    for length, pattern in ((14, '%Y%m%d%H%M%S'), (12, '%Y%m%d%H%M'), (8, '%Y%m%d')):
+        if len(digits) >= length:
+            try:
+                return datetime.strptime(digits[:length], pattern).isoformat()
+            except ValueError:
+                return None
+    return None
+
+
+def _flags(value: str, repeat: str) -> List[str]:
+    return [flag for flag in value.split(repeat) if flag and flag != 'N']
+
+
+def parse_astm_message(records: List[str]) -> Tuple[Dict, List[Dict]]:
+    """
+    Results from one E1394 message (H ... L). The header's delimiter
+    definition is honoured; specimen IDs come from the order record.
+    """
+    if not records or not records[0].lstrip('0123456789').startswith('H'):
+        raise ProtocolError('ASTM message does not start with a header record')
+
+    header_record = records[0].lstrip('0123456789')
+    field = header_record[1]
+    repeat, component = header_record[2], header_record[3]
+    header_fields = header_record.split(field)
+    header = {
+        'sender': _component(header_fields[4], component) if len(header_fields) > 4 else '',
+        'timestamp': _timestamp(header_fields[13]) if len(header_fields) > 13 else None
+    }
+
+    results = []
+    sid = None
+    for record in records[1:]:
+        record = record.lstrip('0123456789')  # some analyzers echo the frame number
+        fields = record.split(field)
+        kind = fields[0][:1]
+        if kind == 'O':
+            sid = _component(fields[2], component) if len(fields) > 2 and fields[2] else \
+                (_component(fields[3], component) if len(fields) > 3 else None)
+        elif kind == 'R':
+            fields += [''] * (13 - len(fields))
+            results.append({
+                'protocol': 'astm',
+                'sid': sid,
+                'code': _astm_test_code(fields[2], component),
+                'value': fields[3].split(component)[0],
+                'units': fields[4],
+                'reference_range': fields[5],
+                'flags': _flags(fields[6], repeat),
+                'status': fields[8],
+                'observed_at': _timestamp(fields[12]) or header['timestamp']
+            })
+        elif kind == 'L':
+            sid = None
+    return header, results
+
+
+# ---------------------------------------------------------------------------
+# HL7 v2 over MLLP
+# ---------------------------------------------------------------------------
+
+def mllp_wrap(message: str) -> bytes:
+    return MLLP_START + message.encode('utf-8') + MLLP_END
+
+
+class MLLPReceiver:
+    """Splits a byte stream into HL7 messages framed by VT ... FS CR"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[str]:
+        self._buffer.extend(data)
+        messages = []
+        while True:
+            start = self._buffer.find(MLLP_START)
+            if start == -1:
+                self._buffer.clear()
+                break
+            end = self._buffer.find(MLLP_END, start)
+            if end == -1:
+                del self._buffer[:start]
+                break
+            messages.append(self._buffer[start + 1:end].decode('utf-8', errors='replace'))
+            del self._buffer[:end + len(MLLP_END)]
+        return messages
+
+
+def _segments(message: str) -> List[str]:
+    return [segment for segment in message.replace('\n', '\r').split('\r') if segment.strip()]
+
+
+def parse_hl7_message(message: str) -> Tuple[Dict, List[Dict]]:
+    """
+    Header and results of an ORU^R01 message. The specimen ID is OBR-3
+    (filler order number), falling back to OBR-2 (placer order number).
+    """
+    segments = _segments(message)
+    if not segments or not segments[0].startswith('MSH'):
+        raise ProtocolError('HL7 message does not start with MSH')
+
+    msh = segments[0]
+    field = msh[3]
+    component, repeat = msh[4], msh[5]
+    msh_fields = msh.split(field)
+    msh_fields += [''] * (12 - len(msh_fields))
+    # MSH-1 is the field separator itself, so MSH-n is msh_fields[n - 1]
+    header = {
+        'sending_application': msh_fields[2],
+        'sending_facility': msh_fields[3],
+        'receiving_application': msh_fields[4],
+        'receiving_facility': msh_fields[5],
+        'timestamp': _timestamp(msh_fields[6]),
+        'message_type': msh_fields[8],
+        'control_id': msh_fields[9],
+        'processing_id': msh_fields[10] or 'P',
+        'version': msh_fields[11] or '2.5',
+        'encoding': msh_fields[1]
+    }
+    message_type = header['message_type'].split(component)
+    if message_type[:2] != ['ORU', 'R01']:
+        raise ProtocolError(f"Unsupported HL7 message type {header['message_type']!r}")
+
+    results = []
+    sid = None
+    for segment in segments[1:]:
+        fields = segment.split(field)
+        if fields[0] == 'OBR':
+            fields += [''] * (8 - len(fields))
+            sid = _component(fields[3], component) or _component(fields[2], component) or None
+        elif fields[0] == 'OBX':
+            fields += [''] * (15 - len(fields))
+            results.append({
+                'protocol': 'hl7',
+                'sid': sid,
+                'code': fields[3].split(component)[0],
+                'value': fields[5].split(component)[0],
+                'units': fields[6].split(component)[0],
+                'reference_range': fields[7],
+                'flags': _flags(fields[8], repeat),
+                'status': fields[11],
+                'observed_at': _timestamp(fields[14]) or header['timestamp']
+            })
+    return header, results
+
+
+def hl7_ack(header: Dict, code: str = 'AA', text: str = '') -> str:
+    """ACK for a received message; ``code`` is AA, AE or AR"""
+    encoding = header.get('encoding') or '^~\\&'
+    control_id = header.get('control_id', '')
+    now = datetime.now().strftime('%Y%m%d%H%M%S')
+    msh = '|'.join([
+        'MSH', encoding,
+        header.get('receiving_application', ''), header.get('receiving_facility', ''),
+        header.get('sending_application', ''), header.get('sending_facility', ''),
+        now, '', 'ACK^R01', f'ACK{control_id}', header.get('processing_id', 'P'), header.get('version', '2.5')
+    ])
+    return f"{msh}\rMSA|{code}|{control_id}|{text}"
@@ -0,0 +1,118 @@
+"""
+Instrument Simulator
+Sends analyzer results to the instrument gateway the way an ASTM or HL7
+analyzer would, so the interface can be exercised without hardware.
+
+Run standalone:
+    python -m services.instrument_simulator --protocol astm --port 5101 \\
+        --sid TNJ004 --result CHOL=182 --result HDL=48:L
+    python -m services.instrument_simulator --protocol hl7 --port 5102 \\
+        --sid SKZ010 --result RBC=4.62 --repeat 200
+
+``--result`` is ``CODE=VALUE[:FLAG]``; ``--repeat`` resends the samples to
+load-test batching.
+"""
+
+import argparse
+import socket
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from .instrument_protocols import ACK, ENQ, EOT, astm_frames, mllp_wrap, MLLPReceiver
+
+
+def astm_records(samples: List[Tuple[str, List[Dict]]], sender: str = 'SIMULATOR') -> List[str]:
+    """E1394 records for (sid, [{code, value, units, flags}]) samples"""
+    now = datetime.now().strftime('%Y%m%d%H%M%S')
+    records = [f"H|\\^&|||{sender}^1.0|||||||P|1|{now}"]
+    for patient_seq, (sid, results) in enumerate(samples, start=1):
+        records.append(f"P|{patient_seq}")
+        tests = '\\'.join('^^^' + result['code'] for result in results)
+        records.append(f"O|1|{sid}||{tests}|R||||||N||||||||||||||F")
+        for seq, result in enumerate(results, start=1):
+            records.append(f"R|{seq}|^^^{result['code']}|{result['value']}|{result.get('units', '')}||"
+                           f"{result.get('flag') or 'N'}||F||||{now}")
+    records.append("L|1|N")
+    return records
+
+
+def hl7_message(sid: str, results: List[Dict], control_id: str, sender: str = 'SIMULATOR') -> str:
+    """ORU^R01 for one sample"""
+    now = datetime.now().strftime('%Y%m%d%H%M%S')
+    segments = [
+        f"MSH|^~\\&|{sender}|LAB|AVINI|LAB|{now}||ORU^R01|{control_id}|P|2.5",
+        f"PID|1||{sid}",
+        f"OBR|1|{sid}|{sid}|PANEL",
+    ]
+    for seq, result in enumerate(results, start=1):
+        segments.append(f"OBX|{seq}|NM|{result['code']}^{result['code']}|1|{result['value']}|"
+                        f"{result.get('units', '')}||{result.get('flag', '')}|||F|||{now}")
+    return '\r'.join(segments)
+
+
+def send_astm(host: str, port: int, samples: List[Tuple[str, List[Dict]]], timeout: float = 5.0) -> int:
+    """One ENQ ... EOT transmission; returns the number of frames the gateway acknowledged"""
+    frames = astm_frames(astm_records(samples))
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(ENQ)
+        if sock.recv(1) != ACK:
+            raise RuntimeError('Gateway did not acknowledge ENQ')
+        acknowledged = 0
+        for frame in frames:
+            sock.sendall(frame)
+            if sock.recv(1) != ACK:
+                raise RuntimeError(f'Gateway rejected frame {acknowledged + 1}')
+            acknowledged += 1
+        sock.sendall(EOT)
+    return acknowledged
+
+
+def send_hl7(host: str, port: int, samples: List[Tuple[str, List[Dict]]], timeout: float = 5.0) -> List[str]:
+    """One ORU^R01 per sample over a single connection; returns the MSA acknowledgement codes"""
+    codes = []
+    receiver = MLLPReceiver()
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        for position, (sid, results) in enumerate(samples, start=1):
+            sock.sendall(mllp_wrap(hl7_message(sid, results, f"SIM{int(time.time())}{position}")))
+            acks = []
+            while not acks:
+                data = sock.recv(4096)
+                if not data:
+                    raise RuntimeError('Gateway closed the connection')
+                acks = receiver.feed(data)
+            msa = next((segment for segment in acks[0].split('\r') if segment.startswith('MSA')), 'MSA|??')
+            codes.append(msa.split('|')[1])
+    return codes
+
+
+def _parse_result(value: str) -> Dict:
+    code, _, rest = value.partition('=')
+    number, _, flag = rest.partition(':')
+    return {'code': code, 'value': number, 'flag': flag}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send simulated analyzer results to the instrument gateway')
+    parser.add_argument('--protocol', choices=['astm', 'hl7'], default='astm')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--sid', action='append', required=True, help='specimen ID (repeatable)')
+    parser.add_argument('--result', action='append', required=True, help='CODE=VALUE[:FLAG] (repeatable)')
+    parser.add_argument('--repeat', type=int, default=1, help='send every sample this many times')
+    args = parser.parse_args()
+
+    results = [_parse_result(value) for value in args.result]
+    samples = [(sid, results) for sid in args.sid] * args.repeat
+    started = time.monotonic()
+    if args.protocol == 'astm':
+        frames = send_astm(args.host, args.port, samples)
+        print(f"Sent {len(samples)} samples in {frames} ASTM frames")
+    else:
+        codes = send_hl7(args.host, args.port, samples)
+        print(f"Sent {len(samples)} HL7 messages: {', '.join(sorted(set(codes)))}")
+    print(f"Took {time.monotonic() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,469 @@
+"""
+Inventory Ledger
+Append-only record of stock movements (``inventory_ledger.jsonl``) with a
+running balance per item, reagent/consumable consumption driven by the
+tests on new billings, a low-stock priority queue and days-to-stockout
+forecasts per franchise.
+
+``inventory.json`` keeps each item's current ``quantity``; every change made
+through the ledger is appended as an entry ``{id, item_id, tenant_id, type,
+quantity, change, balance, reason, reference, created_at, created_by}``
+before the new quantity is written, so an item's entries replay to its
+quantity. Quantities changed outside the ledger (e.g. older scripts) are
+reconciled with an ``adjustment`` entry the next time the item moves.
+
+Consumption mappings (``inventory_consumption.json``) are ``{id, test,
+item_id, quantity, is_active}``: ``test`` is a test name or test_master_id
+and each test billed uses ``quantity`` of the item. Only items of the
+billing's own tenant are deducted.
+"""
+
+import bisect
+import heapq
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+import json_codec
+from utils import read_data, write_data, DATA_DIR
+from .formula_engine import test_key, item_keys
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_FILE = 'inventory.json'
+LEDGER_FILE = 'inventory_ledger.jsonl'
+CONSUMPTION_FILE = 'inventory_consumption.json'
+
+# Sign of each movement type; opening/adjustment entries carry their own sign
+MOVEMENT_SIGNS = {'in': 1, 'out': -1, 'consumption': -1}
+USAGE_TYPES = ('out', 'consumption')
+
+
+def _file_version(filename: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(os.path.join(DATA_DIR, filename))
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _number(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _quantity(value: float):
+    """Stock quantity as stored: whole numbers stay ints, fractions (kits per test) keep 4 decimals"""
+    value = round(value, 4)
+    return int(value) if value == int(value) else value
+
+
+def _stockout_date(as_of: datetime, days_left: Optional[float]) -> Optional[str]:
+    """Date ``days_left`` days after ``as_of``; None when unknown or beyond the calendar (tiny usage)"""
+    if days_left is None:
+        return None
+    try:
+        return (as_of + timedelta(days=days_left)).strftime('%Y-%m-%d')
+    except OverflowError:
+        return None
+
+
+class LowStockQueue:
+    """
+    Items at or below their reorder level, most urgent first: ordered by
+    quantity as a fraction of the reorder level, kept sorted per tenant so
+    updates are a bisect and listing needs no scan of the inventory.
+    """
+
+    def __init__(self):
+        self._queues: Dict[object, List[Tuple[float, int]]] = {}
+        self._keys: Dict[int, Tuple[object, Tuple[float, int]]] = {}
+
+    @staticmethod
+    def _key(item: Dict) -> Optional[Tuple[float, int]]:
+        quantity = _number(item.get('quantity')) or 0.0
+        reorder_level = _number(item.get('reorder_level')) or 0.0
+        if quantity > reorder_level:
+            return None
+        urgency = quantity / reorder_level if reorder_level > 0 else min(quantity, 0.0)
+        return (urgency, item['id'])
+
+    def update(self, item: Dict):
+        self.remove(item['id'])
+        key = self._key(item)
+        if key is not None:
+            tenant = item.get('tenant_id')
+            bisect.insort(self._queues.setdefault(tenant, []), key)
+            self._keys[item['id']] = (tenant, key)
+
+    def remove(self, item_id):
+        previous = self._keys.pop(item_id, None)
+        if previous is None:
+            return
+        tenant, key = previous
+        queue = self._queues.get(tenant, [])
+        position = bisect.bisect_left(queue, key)
+        if position < len(queue) and queue[position] == key:
+            queue.pop(position)
+
+    def ordered(self, tenant_ids: Optional[Iterable] = None) -> List[int]:
+        """Item ids, most urgent first, for the given tenants (None means all)"""
+        queues = self._queues.values() if tenant_ids is None else \
+            [self._queues[t] for t in tenant_ids if t in self._queues]
+        return [item_id for _, item_id in heapq.merge(*queues)]
+
+
+class InventoryLedger:
+    """
+    In memory the ledger is indexed by item (entries in time order, with
+    their timestamps for date-range bisects), by item and day for usage,
+    and by billing reference so a billing is never consumed twice. Other
+    processes' appends are picked up by reading the file from the last
+    known offset; inventory.json changes made elsewhere rebuild the item
+    cache and the low-stock queue.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._offset = 0
+        self._entries_by_item: Dict[int, List[Dict]] = {}
+        self._times_by_item: Dict[int, List[str]] = {}
+        self._usage: Dict[int, Dict[str, float]] = {}
+        self._references = set()
+        self._next_id = 1
+        self._items: Dict[int, Dict] = {}
+        self._inventory_version = False
+        self._low_stock = LowStockQueue()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(DATA_DIR, LEDGER_FILE)
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _index(self, entry: Dict):
+        item_id = entry.get('item_id')
+        self._entries_by_item.setdefault(item_id, []).append(entry)
+        self._times_by_item.setdefault(item_id, []).append(entry.get('created_at') or '')
+        if entry.get('type') in USAGE_TYPES:
+            usage = self._usage.setdefault(item_id, {})
+            day = (entry.get('created_at') or '')[:10]
+            usage[day] = usage.get(day, 0.0) + abs(_number(entry.get('change')) or 0.0)
+        if entry.get('reference'):
+            self._references.add((entry['reference'], item_id))
+        self._next_id = max(self._next_id, (entry.get('id') or 0) + 1)
+
+    def _catch_up(self):
+        """Index entries appended since the last read (by this or another process)"""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size == self._offset:
+            return
+        if size < self._offset:
+            # Ledger replaced (restore from backup): start over
+            self._offset = 0
+            self._entries_by_item, self._times_by_item, self._usage = {}, {}, {}
+            self._references = set()
+            self._next_id = 1
+        with open(self.path, 'rb') as handle:
+            handle.seek(self._offset)
+            for line in handle:
+                if not line.endswith(b'\n'):
+                    break  # partially written line; read it next time
+                self._offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    self._index(json_codec.loads(line))
+                except ValueError as e:
+                    logger.error(f"Skipping unreadable inventory ledger line: {e}")
+
+    def _refresh_items(self):
+        version = _file_version(INVENTORY_FILE)
+        if version == self._inventory_version:
+            return
+        self._items = {item['id']: item for item in (read_data(INVENTORY_FILE) if version else [])
+                       if item.get('id') is not None}
+        self._low_stock = LowStockQueue()
+        for item in self._items.values():
+            self._low_stock.update(item)
+        self._inventory_version = version
+
+    def _ensure_fresh(self):
+        self._catch_up()
+        self._refresh_items()
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def _append(self, entries: List[Dict]):
+        lines = b''.join(json_codec.dumps(entry) + b'\n' for entry in entries)
+        with open(self.path, 'ab') as handle:
+            handle.write(lines)
+            handle.flush()
+            os.fsync(handle.fileno())
+        # Index our own lines, plus anything another process appended first
+        self._catch_up()
+
+    def _entry(self, item: Dict, entry_type: str, change: float, balance: float, reason: str,
+               timestamp: str, user_id=None, reference: Optional[str] = None, notes: str = '') -> Dict:
+        entry = {
+            'id': self._next_id,
+            'item_id': item['id'],
+            'tenant_id': item.get('tenant_id'),
+            'type': entry_type,
+            'quantity': _quantity(abs(change)),
+            'change': _quantity(change),
+            'balance': _quantity(balance),
+            'reason': reason,
+            'notes': notes,
+            'reference': reference,
+            'created_at': timestamp,
+            'created_by': user_id
+        }
+        self._next_id += 1
+        return entry
+
+    def _reconcile(self, item: Dict, quantity: float, timestamp: str, user_id=None) -> Optional[Dict]:
+        """Opening/adjustment entry when the item's ledger balance differs from its quantity"""
+        history = self._entries_by_item.get(item['id'])
+        if not history:
+            return self._entry(item, 'opening', quantity, quantity, 'Opening balance', timestamp, user_id)
+        balance = _number(history[-1].get('balance')) or 0.0
+        if abs(balance - quantity) > 1e-9:
+            return self._entry(item, 'adjustment', quantity - balance, quantity,
+                               'Reconciled with inventory quantity', timestamp, user_id)
+        return None
+
+    def post(self, movements: List[Dict], user_id=None, reference: Optional[str] = None,
+             allow_negative: bool = False) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Apply stock movements ``{item_id, type ('in' | 'out' |
+        'consumption'), quantity, reason, notes}`` in one ledger append and
+        one inventory.json write. Nothing is applied if any movement is
+        invalid or, unless ``allow_negative``, would take an item below
+        zero. Returns ``(entries, None)`` or ``([], error)``.
+        """
+        with self._lock:
+            self._catch_up()
+            inventory = read_data(INVENTORY_FILE)
+            by_id = {item.get('id'): item for item in inventory}
+
+            planned = []
+            totals: Dict[int, float] = {}
+            for movement in movements:
+                item = by_id.get(movement.get('item_id'))
+                if item is None:
+                    return [], f"Inventory item {movement.get('item_id')} not found"
+                sign = MOVEMENT_SIGNS.get(movement.get('type'))
+                if sign is None:
+                    return [], 'Invalid transaction type. Use "in" or "out"'
+                quantity = _number(movement.get('quantity'))
+                if quantity is None or quantity <= 0:
+                    return [], 'quantity must be a positive number'
+                planned.append((item, movement, sign * quantity))
+                totals[item['id']] = totals.get(item['id'], 0.0) + sign * quantity
+            if not planned:
+                return [], None
+            if not allow_negative:
+                for item_id, change in totals.items():
+                    if (_number(by_id[item_id].get('quantity')) or 0.0) + change < 0:
+                        return [], 'Insufficient stock'
+
+            timestamp = datetime.now().isoformat()
+            entries = []
+            reconciled = set()
+            for item, movement, change in planned:
+                quantity = _number(item.get('quantity')) or 0.0
+                if item['id'] not in reconciled:
+                    reconciled.add(item['id'])
+                    opening = self._reconcile(item, quantity, timestamp, user_id)
+                    if opening:
+                        entries.append(opening)
+                quantity += change
+                item['quantity'] = _quantity(quantity)
+                item['updated_at'] = timestamp
+                entries.append(self._entry(item, movement['type'], change, quantity,
+                                           movement.get('reason') or '', timestamp, user_id,
+                                           reference, movement.get('notes') or ''))
+
+            self._append(entries)
+            write_data(INVENTORY_FILE, inventory)
+            self._items_written(by_id[item_id] for item_id in totals)
+            return entries, None
+
+    def _items_written(self, items: Iterable[Dict]):
+        """Keep the item cache and low-stock queue current after this process wrote inventory.json"""
+        if self._inventory_version is False:
+            self._refresh_items()
+            return
+        for item in items:
+            self._items[item['id']] = item
+            self._low_stock.update(item)
+        self._inventory_version = _file_version(INVENTORY_FILE)
+
+    def record_item(self, item: Dict, previous_quantity=None, user_id=None):
+        """
+        Ledger entries for an item the inventory routes just wrote: the
+        opening balance of a new item, or an adjustment when its quantity
+        was edited from ``previous_quantity``.
+        """
+        with self._lock:
+            self._catch_up()
+            timestamp = item.get('updated_at') or datetime.now().isoformat()
+            quantity = _number(item.get('quantity')) or 0.0
+            previous = quantity if previous_quantity is None else (_number(previous_quantity) or 0.0)
+            entries = [entry for entry in [self._reconcile(item, previous, timestamp, user_id)] if entry]
+            if abs(quantity - previous) > 1e-9:
+                entries.append(self._entry(item, 'adjustment', quantity - previous, quantity,
+                                           'Quantity edited', timestamp, user_id))
+            if entries:
+                self._append(entries)
+            self._items_written([item])
+
+    def item_removed(self, item_id):
+        with self._lock:
+            self._items.pop(item_id, None)
+            self._low_stock.remove(item_id)
+            self._inventory_version = _file_version(INVENTORY_FILE)
+
+    # ------------------------------------------------------------------
+    # Consumption
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def consumption_map() -> Dict[tuple, List[Dict]]:
+        """Active consumption mappings by test key"""
+        if _file_version(CONSUMPTION_FILE) is None:
+            return {}
+        mappings: Dict[tuple, List[Dict]] = {}
+        for mapping in read_data(CONSUMPTION_FILE):
+            key = test_key(mapping.get('test'))
+            if key is not None and mapping.get('is_active', True):
+                mappings.setdefault(key, []).append(mapping)
+        return mappings
+
+    def consume_for_billing(self, billing: Dict, user_id=None) -> List[Dict]:
+        """
+        Deduct the reagents and consumables used by a new billing's tests
+        from its tenant's stock, as one batch referenced ``billing:<id>``.
+        Stock may go negative (the shortfall shows up as low stock); a
+        billing is only ever consumed once.
+        """
+        mappings = self.consumption_map()
+        if not mappings:
+            return []
+        reference = f"billing:{billing.get('id')}"
+
+        with self._lock:
+            self._ensure_fresh()
+            usage: Dict[int, float] = {}
+            for billing_item in billing.get('items') or []:
+                count = _number(billing_item.get('quantity')) or 1
+                seen = set()
+                for key in item_keys(billing_item):
+                    for mapping in mappings.get(key, []):
+                        item = self._items.get(mapping.get('item_id'))
+                        per_test = _number(mapping.get('quantity'))
+                        if id(mapping) in seen or item is None or not per_test or per_test <= 0 \
+                                or str(item.get('tenant_id')) != str(billing.get('tenant_id')):
+                            continue
+                        seen.add(id(mapping))
+                        usage[item['id']] = usage.get(item['id'], 0.0) + per_test * count
+            usage = {item_id: quantity for item_id, quantity in usage.items()
+                     if (reference, item_id) not in self._references}
+            if not usage:
+                return []
+            entries, error = self.post([
+                {'item_id': item_id, 'type': 'consumption', 'quantity': quantity,
+                 'reason': f"Tests on invoice {billing.get('invoice_number') or billing.get('id')}"}
+                for item_id, quantity in usage.items()
+            ], user_id=user_id, reference=reference, allow_negative=True)
+        if error:
+            logger.error(f"Inventory consumption for billing {billing.get('id')} failed: {error}")
+        return entries
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def transactions(self, item_id, date_from: Optional[str] = None,
+                     date_to: Optional[str] = None) -> List[Dict]:
+        """An item's ledger entries between two dates (inclusive), newest first"""
+        with self._lock:
+            self._catch_up()
+            entries = self._entries_by_item.get(item_id, [])
+            times = self._times_by_item.get(item_id, [])
+            start = bisect.bisect_left(times, date_from) if date_from else 0
+            end = bisect.bisect_right(times, date_to + '\uffff') if date_to else len(entries)
+            return [dict(entry) for entry in reversed(entries[start:end])]
+
+    def low_stock_items(self, tenant_ids: Optional[Iterable] = None) -> List[Dict]:
+        """Items at or below their reorder level of the given tenants (None means all), most urgent first"""
+        with self._lock:
+            self._refresh_items()
+            return [dict(self._items[item_id]) for item_id in self._low_stock.ordered(tenant_ids)]
+
+    def forecast(self, window_days: int = 30, as_of: Optional[datetime] = None,
+                 tenant_ids: Optional[Iterable] = None) -> Dict[object, List[Dict]]:
+        """
+        Days to stockout per tenant: each item's average daily usage ('out'
+        and consumption entries) over the last ``window_days`` (or since its
+        first ledger entry, if more recent) against its current quantity.
+        Items are ordered soonest stockout first; unused items last. Only the
+        given tenants are forecast (None means all).
+        """
+        as_of = as_of or datetime.now()
+        days = [(as_of - timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(window_days)]
+        tenant_ids = None if tenant_ids is None else set(tenant_ids)
+        with self._lock:
+            self._ensure_fresh()
+            forecasts: Dict[object, List[Dict]] = {}
+            for item_id, item in self._items.items():
+                if tenant_ids is not None and item.get('tenant_id') not in tenant_ids:
+                    continue
+                usage = self._usage.get(item_id, {})
+                used = sum(usage.get(day, 0.0) for day in days)
+                times = self._times_by_item.get(item_id)
+                observed = window_days
+                if times:
+                    try:
+                        first = datetime.fromisoformat(times[0][:10])
+                        observed = max(1, min(window_days, (as_of - first).days + 1))
+                    except ValueError:
+                        pass
+                daily = used / observed
+                quantity = _number(item.get('quantity')) or 0.0
+                days_left = None
+                if daily > 0:
+                    days_left = max(0.0, quantity / daily)
+                forecasts.setdefault(item.get('tenant_id'), []).append({
+                    'item_id': item_id,
+                    'name': item.get('name'),
+                    'sku': item.get('sku'),
+                    'unit': item.get('unit'),
+                    'quantity': item.get('quantity'),
+                    'reorder_level': item.get('reorder_level'),
+                    'daily_usage': round(daily, 4),
+                    'days_to_stockout': round(days_left, 1) if days_left is not None else None,
+                    'stockout_date': _stockout_date(as_of, days_left)
+                })
+        for items in forecasts.values():
+            items.sort(key=lambda f: (f['days_to_stockout'] is None, f['days_to_stockout'] or 0, f['item_id']))
+        return forecasts
+
+
+inventory_ledger = InventoryLedger()
@@ -0,0 +1,159 @@
+"""
+Invoice PDF Generator
+Inter-franchise invoices for sample routings, rendered with the same
+ReportLab setup and shared styles (services.pdf_assets) as the billing
+report PDFs.
+"""
+
+from datetime import datetime
+from io import BytesIO
+from typing import Dict, List
+from xml.sax.saxutils import escape
+import logging
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+from . import pdf_assets
+
+logger = logging.getLogger(__name__)
+
+CLINIC_NAME = 'AVINI LABS'
+
+
+def _amount(value) -> float:
+    try:
+        if value is None or value == '':
+            return 0.0
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _date(value) -> str:
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').strftime('%d/%m/%Y')
+    except ValueError:
+        return str(value or '-')
+
+
+class InvoicePDFGenerator:
+    """
+    Renders an invoice document built by services.invoice_pdfs.invoice_document:
+    ``{invoice, from_tenant, to_tenant, routing}``.
+    """
+
+    def __init__(self):
+        self.normal = pdf_assets.sample_styles()['Normal']
+        self.title_style = pdf_assets.paragraph_style('invoice_title', 'Heading1', alignment=1, fontSize=16)
+        self.heading_style = pdf_assets.paragraph_style('invoice_heading', 'Heading3', fontSize=10, spaceAfter=2)
+        self.small_style = pdf_assets.paragraph_style('invoice_small', 'Normal', fontSize=8, leading=10)
+
+    def generate_invoice_pdf(self, document: Dict) -> bytes:
+        invoice = document['invoice']
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=36, leftMargin=36, topMargin=36, bottomMargin=36,
+                                title=f"Invoice {invoice.get('invoice_number', '')}")
+        story = []
+        story.extend(self._header(invoice))
+        story.extend(self._parties(document))
+        story.extend(self._line_items(invoice))
+        story.extend(self._totals(invoice))
+        story.extend(self._footer(invoice, document.get('routing') or {}))
+        doc.build(story)
+        return buffer.getvalue()
+
+    def _money(self, invoice: Dict, value) -> str:
+        return f"{invoice.get('currency') or 'INR'} {_amount(value):,.2f}"
+
+    def _header(self, invoice: Dict) -> List:
+        details = [
+            ('Invoice No.', invoice.get('invoice_number', '-')),
+            ('Invoice Date', _date(invoice.get('invoice_date'))),
+            ('Due Date', _date(invoice.get('due_date'))),
+            ('Status', str(invoice.get('status') or '-').upper()),
+        ]
+        right = [Paragraph(f"<b>{label} :</b> {value}", self.normal) for label, value in details]
+        left = [Paragraph(f"<b>{CLINIC_NAME}</b>", self.heading_style),
+                Paragraph('Inter-franchise sample processing', self.small_style)]
+        header = Table([[left, right]], colWidths=[270, 270])
+        header.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ]))
+        return [header, Spacer(1, 10), Paragraph('TAX INVOICE', self.title_style), Spacer(1, 10)]
+
+    def _party(self, title: str, tenant: Dict) -> List:
+        lines = [Paragraph(title, self.heading_style),
+                 Paragraph(f"<b>{escape(str(tenant.get('name') or '-'))}</b>", self.normal)]
+        for field in ('address', 'contact_phone', 'email', 'license_number'):
+            if tenant.get(field):
+                lines.append(Paragraph(escape(str(tenant[field])), self.small_style))
+        return lines
+
+    def _parties(self, document: Dict) -> List:
+        parties = Table([[self._party('BILLED BY', document.get('to_tenant') or {}),
+                          self._party('BILLED TO', document.get('from_tenant') or {})]], colWidths=[270, 270])
+        parties.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BOX', (0, 0), (0, 0), 0.5, colors.grey),
+            ('BOX', (1, 0), (1, 0), 0.5, colors.grey),
+            ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ]))
+        return [parties, Spacer(1, 12)]
+
+    def _line_items(self, invoice: Dict) -> List:
+        rows = [[Paragraph(f"<b>{c}</b>", self.normal) for c in ('#', 'DESCRIPTION', 'QTY', 'UNIT PRICE', 'AMOUNT')]]
+        for position, item in enumerate(invoice.get('line_items') or [], start=1):
+            rows.append([
+                str(position),
+                Paragraph(escape(str(item.get('description') or '')), self.normal),
+                str(item.get('quantity', '')),
+                self._money(invoice, item.get('unit_price')),
+                self._money(invoice, item.get('total'))
+            ])
+        table = Table(rows, colWidths=[25, 245, 40, 110, 120], repeatRows=1)
+        table.setStyle(TableStyle([
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ]))
+        return [table, Spacer(1, 8)]
+
+    def _totals(self, invoice: Dict) -> List:
+        tax_rate = _amount(invoice.get('tax_rate'))
+        rows = [
+            ['Subtotal', self._money(invoice, invoice.get('subtotal'))],
+            [f"GST ({tax_rate * 100:g}%)", self._money(invoice, invoice.get('tax_amount'))],
+            ['Total', self._money(invoice, invoice.get('total_amount'))],
+        ]
+        totals = Table(rows, colWidths=[120, 120], hAlign='RIGHT')
+        totals.setStyle(TableStyle([
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, -2), 'Helvetica'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('LINEABOVE', (0, -1), (-1, -1), 0.75, colors.black),
+        ]))
+        return [totals, Spacer(1, 16)]
+
+    def _footer(self, invoice: Dict, routing: Dict) -> List:
+        story = []
+        reference = [f"Routing #{invoice.get('routing_id')}"] if invoice.get('routing_id') else []
+        if routing.get('tracking_number'):
+            reference.append(f"Tracking {escape(str(routing['tracking_number']))}")
+        if invoice.get('sample_id'):
+            reference.append(f"Sample #{invoice['sample_id']}")
+        if reference:
+            story.append(Paragraph(' | '.join(reference), self.small_style))
+            story.append(Spacer(1, 6))
+        if invoice.get('notes'):
+            notes = escape(str(invoice['notes'])).replace('\n', '<br/>')
+            story.append(Paragraph(f"<b>Notes :</b> {notes}", self.small_style))
+            story.append(Spacer(1, 6))
+        story.append(Paragraph('This is a computer generated invoice.', self.small_style))
+        return story
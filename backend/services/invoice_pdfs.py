@@ -0,0 +1,152 @@
+"""
+Invoice PDFs
+Content-hash cached invoice PDFs (``data/invoice_pdfs``) and the monthly
+inter-franchise invoice run, which renders every routing invoice of a
+period in a process pool.
+
+What is rendered (and hashed) is the invoice document: the invoice with
+the two franchises' letterhead details and the routing's tracking number,
+so editing an invoice or a franchise's address renders a fresh PDF.
+"""
+
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+import logging
+
+from utils import read_data, DATA_DIR
+from .report_pdf_cache import PdfCache
+
+logger = logging.getLogger(__name__)
+
+TENANT_FIELDS = ('id', 'name', 'address', 'contact_phone', 'email', 'license_number')
+MAX_RENDER_WORKERS = 4
+
+# Per worker process: generator built on the first invoice it renders
+_worker_generator = None
+
+
+def invoice_document(invoice: Dict, tenants_by_id: Dict, routings_by_id: Optional[Dict] = None) -> Dict:
+    """Everything an invoice PDF shows, and so everything its cache key covers"""
+    def party(tenant_id) -> Dict:
+        tenant = tenants_by_id.get(tenant_id) or {}
+        return {field: tenant.get(field) for field in TENANT_FIELDS}
+
+    routing = (routings_by_id or {}).get(invoice.get('routing_id')) or {}
+    return {
+        'invoice': invoice,
+        'from_tenant': party(invoice.get('from_tenant_id')),
+        'to_tenant': party(invoice.get('to_tenant_id')),
+        'routing': {'tracking_number': routing.get('tracking_number')}
+    }
+
+
+def load_invoice_documents(invoices: List[Dict]) -> List[Dict]:
+    tenants_by_id = {t.get('id'): t for t in read_data('tenants.json')}
+    routings_by_id = {r.get('id'): r for r in read_data('sample_routings.json')}
+    return [invoice_document(invoice, tenants_by_id, routings_by_id) for invoice in invoices]
+
+
+def _render_in_worker(document: Dict) -> bytes:
+    """Process pool entry point"""
+    global _worker_generator
+    if _worker_generator is None:
+        from .invoice_pdf_generator import InvoicePDFGenerator
+        _worker_generator = InvoicePDFGenerator()
+    return _worker_generator.generate_invoice_pdf(document)
+
+
+class InvoicePdfCache(PdfCache):
+    """Invoice PDFs, named by invoice number"""
+
+    def __init__(self, cache_dir: str):
+        super().__init__(cache_dir)
+        self._generator = None
+
+    def _prefix(self, document: Dict) -> str:
+        invoice = document['invoice']
+        number = re.sub(r'[^A-Za-z0-9_-]', '_', str(invoice.get('invoice_number') or 'invoice'))
+        return f"{number}-{invoice.get('id')}-"
+
+    def _render_pdf(self, document: Dict) -> bytes:
+        # Imported lazily: reportlab is heavy and only needed once something renders
+        if self._generator is None:
+            from .invoice_pdf_generator import InvoicePDFGenerator
+            self._generator = InvoicePDFGenerator()
+        return self._generator.generate_invoice_pdf(document)
+
+    def render_batch(self, documents: List[Dict], workers: Optional[int] = None,
+                     progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        Make sure every document has a cached PDF, rendering the missing
+        ones in a process pool (in this process if a pool cannot be
+        started). Returns the cache path per invoice id and render counts.
+        """
+        paths = {}
+        pending = []
+        for document in documents:
+            path = self.path(document)
+            if os.path.exists(path):
+                paths[document['invoice']['id']] = path
+            else:
+                pending.append(document)
+        cached = len(paths)
+        total = len(documents)
+        if progress:
+            progress(cached, total)
+
+        def stored(document: Dict, path: str):
+            paths[document['invoice']['id']] = path
+            if progress and len(paths) % 10 == 0:
+                progress(len(paths), total)
+
+        workers = workers or min(MAX_RENDER_WORKERS, os.cpu_count() or 1, len(pending))
+        if len(pending) > 1 and workers > 1:
+            try:
+                # Spawned, not forked: runs start from background job threads, and a
+                # forked child could inherit locks other threads held at the time
+                with ProcessPoolExecutor(max_workers=workers,
+                                         mp_context=multiprocessing.get_context('spawn')) as pool:
+                    chunksize = max(1, len(pending) // (workers * 4))
+                    for document, pdf_content in zip(pending, pool.map(_render_in_worker, pending, chunksize=chunksize)):
+                        stored(document, self.store(document, pdf_content))
+            except (OSError, RuntimeError) as e:
+                # Pool unavailable (no semaphores here) or a worker died: finish in-process
+                logger.warning(f"Invoice process pool failed, rendering in-process: {e}")
+        for document in pending:
+            if document['invoice']['id'] not in paths:
+                self.render(document)
+                stored(document, self.path(document))
+
+        if progress:
+            progress(total, total)
+        return {'paths': paths, 'rendered': total - cached, 'cached': cached}
+
+
+invoice_pdf_cache = InvoicePdfCache(os.path.join(DATA_DIR, 'invoice_pdfs'))
+
+
+def period_invoices(period: str, from_tenant_id=None, to_tenant_id=None) -> List[Dict]:
+    """Routing invoices dated in ``period`` (YYYY-MM), optionally between two franchises"""
+    return [
+        invoice for invoice in read_data('invoices.json')
+        if invoice.get('routing_id') is not None
+        and str(invoice.get('invoice_date') or '').startswith(f"{period}-")
+        and (from_tenant_id is None or invoice.get('from_tenant_id') == from_tenant_id)
+        and (to_tenant_id is None or invoice.get('to_tenant_id') == to_tenant_id)
+    ]
+
+
+def write_invoice_bundle(path: str, invoices: List[Dict], paths: Dict) -> int:
+    """Zip the rendered PDFs of a run, one file per invoice number"""
+    count = 0
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as bundle:
+        for invoice in invoices:
+            pdf_path = paths.get(invoice['id'])
+            if pdf_path and os.path.exists(pdf_path):
+                bundle.write(pdf_path, arcname=f"{invoice.get('invoice_number') or invoice['id']}.pdf")
+                count += 1
+    return count
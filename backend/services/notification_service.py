@@ -5,7 +5,8 @@ Handles real-time notifications and alerts for routing events
 
 from datetime import datetime
 from typing import Dict, List, Optional, Any
-from utils import read_data, write_data
+from utils import read_data
+from .notification_store import notification_store
 import uuid
 
 class NotificationService:
@@ -68,13 +69,21 @@ class NotificationService:
             'title': 'Sample Routing Cancelled',
             'template': 'Sample routing for {sample_id} has been cancelled',
             'priority': 'high'
+        },
+        'critical_result': {
+            'title': 'Critical Result',
+            'template': 'Critical value for {patient_name} (SID {sid_number}): {test_name} {result} {unit} [{flag}]',
+            'priority': 'high'
         }
     }
     
+    # Roles alerted to critical results of their tenant; admin/hub_admin are alerted for every tenant
+    CRITICAL_RESULT_ROLES = ['admin', 'hub_admin', 'franchise_admin', 'lab_tech', 'doctor']
+    
     @staticmethod
-    def create_notification(notification_type: str, recipient_id: int, routing_id: int,
-                          data: Dict = None, sender_id: int = None) -> Dict:
-        """Create a new notification"""
+    def _build_notification(notification_type: str, recipient_id: int, routing_id: int,
+                            data: Dict = None, sender_id: int = None) -> Dict:
+        """Build a notification record without persisting it"""
         if notification_type not in NotificationService.NOTIFICATION_TYPES:
             raise ValueError(f"Unknown notification type: {notification_type}")
         
@@ -85,7 +94,7 @@ class NotificationService:
         title = notification_config['title']
         message = notification_config['template'].format(**data)
         
-        notification = {
+        return {
             'id': str(uuid.uuid4()),
             'type': notification_type,
             'title': title,
@@ -99,124 +108,98 @@ class NotificationService:
             'read_at': None,
             'data': data
         }
-        
-        # Save notification
-        notifications = read_data('notifications.json')
-        notifications.append(notification)
-        write_data('notifications.json', notifications)
-        
-        return notification
+    
+    @staticmethod
+    def create_notification(notification_type: str, recipient_id: int, routing_id: int,
+                          data: Dict = None, sender_id: int = None) -> Dict:
+        """Create a new notification"""
+        notification = NotificationService._build_notification(
+            notification_type, recipient_id, routing_id, data, sender_id
+        )
+        return notification_store.add(notification)
+    
+    @staticmethod
+    def create_notifications(notification_type: str, recipient_ids: List[int], routing_id: int,
+                             data: Dict = None, sender_id: int = None) -> List[Dict]:
+        """Create the same notification for many recipients in a single store write"""
+        notifications = [
+            NotificationService._build_notification(
+                notification_type, recipient_id, routing_id, data, sender_id
+            )
+            for recipient_id in recipient_ids
+        ]
+        return notification_store.add_many(notifications)
     
     @staticmethod
     def get_user_notifications(user_id: int, unread_only: bool = False,
                              limit: int = 50) -> List[Dict]:
-        """Get notifications for a specific user"""
-        notifications = read_data('notifications.json')
-        
-        # Filter by user
-        user_notifications = [n for n in notifications if n['recipient_id'] == user_id]
-        
-        # Filter by read status if requested
-        if unread_only:
-            user_notifications = [n for n in user_notifications if not n['is_read']]
-        
-        # Sort by creation date (newest first)
-        user_notifications.sort(key=lambda x: x['created_at'], reverse=True)
-        
-        # Apply limit
-        return user_notifications[:limit]
+        """Get notifications for a specific user (newest first)"""
+        return notification_store.list_for_user(user_id, unread_only=unread_only, limit=limit)
     
     @staticmethod
     def mark_notification_as_read(notification_id: str, user_id: int) -> bool:
         """Mark a notification as read"""
-        notifications = read_data('notifications.json')
-        
-        for i, notification in enumerate(notifications):
-            if (notification['id'] == notification_id and 
-                notification['recipient_id'] == user_id):
-                notifications[i]['is_read'] = True
-                notifications[i]['read_at'] = datetime.now().isoformat()
-                write_data('notifications.json', notifications)
-                return True
-        
-        return False
+        return notification_store.mark_read(notification_id, user_id)
     
     @staticmethod
     def mark_all_notifications_as_read(user_id: int) -> int:
         """Mark all notifications as read for a user"""
-        notifications = read_data('notifications.json')
-        count = 0
-        
-        for i, notification in enumerate(notifications):
-            if (notification['recipient_id'] == user_id and not notification['is_read']):
-                notifications[i]['is_read'] = True
-                notifications[i]['read_at'] = datetime.now().isoformat()
-                count += 1
-        
-        if count > 0:
-            write_data('notifications.json', notifications)
-        
-        return count
+        return notification_store.mark_all_read(user_id)
     
     @staticmethod
     def get_unread_count(user_id: int) -> int:
         """Get count of unread notifications for a user"""
-        notifications = read_data('notifications.json')
-        return len([n for n in notifications 
-                   if n['recipient_id'] == user_id and not n['is_read']])
+        return notification_store.unread_count(user_id)
     
     @staticmethod
-    def notify_routing_participants(routing_id: int, notification_type: str,
-                                  data: Dict = None, exclude_user_id: int = None):
-        """Send notification to all participants in a routing"""
-        # Get routing data
-        routings = read_data('sample_routings.json')
-        routing = next((r for r in routings if r['id'] == routing_id), None)
-        
-        if not routing:
-            return
-        
-        # Get participant user IDs
-        participants = []
-        
-        # Add source tenant users
-        if routing.get('from_tenant_id'):
-            users = read_data('users.json')
-            source_users = [u for u in users if u.get('tenant_id') == routing['from_tenant_id']]
-            participants.extend([u['id'] for u in source_users])
+    def get_routing_notification_count(routing_id: int) -> int:
+        """Get count of notifications sent for a routing"""
+        return notification_store.count_for_routing(routing_id)
+    
+    @staticmethod
+    def _routing_participants(routing: Dict, users: List[Dict], exclude_user_id: int = None) -> List[int]:
+        """User IDs of the source and destination tenants of a routing"""
+        participant_tenants = {routing.get('from_tenant_id'), routing.get('to_tenant_id')}
+        participant_tenants.discard(None)
         
-        # Add destination tenant users
-        if routing.get('to_tenant_id'):
-            users = read_data('users.json')
-            dest_users = [u for u in users if u.get('tenant_id') == routing['to_tenant_id']]
-            participants.extend([u['id'] for u in dest_users])
+        participants = {u['id'] for u in users if u.get('tenant_id') in participant_tenants}
         
-        # Remove duplicates and excluded user
-        participants = list(set(participants))
+        # Remove excluded user
         if exclude_user_id:
-            participants = [p for p in participants if p != exclude_user_id]
+            participants.discard(exclude_user_id)
         
-        # Send notifications to all participants
-        for participant_id in participants:
-            NotificationService.create_notification(
-                notification_type=notification_type,
-                recipient_id=participant_id,
-                routing_id=routing_id,
-                data=data,
-                sender_id=exclude_user_id
-            )
+        return sorted(participants)
     
     @staticmethod
-    def notify_workflow_change(routing_id: int, old_stage: str, new_stage: str,
-                             user_id: int, notes: str = ''):
-        """Send notification when workflow stage changes"""
-        # Get routing data for context
-        routings = read_data('sample_routings.json')
-        routing = next((r for r in routings if r['id'] == routing_id), None)
+    def notify_routing_participants(routing_id: int, notification_type: str,
+                                  data: Dict = None, exclude_user_id: int = None,
+                                  routing: Dict = None):
+        """Send notification to all participants in a routing"""
+        # Get routing data unless the caller already has it
+        if routing is None:
+            routings = read_data('sample_routings.json')
+            routing = next((r for r in routings if r['id'] == routing_id), None)
         
         if not routing:
             return
         
+        participants = NotificationService._routing_participants(
+            routing, read_data('users.json'), exclude_user_id
+        )
+        
+        # Fan out to all participants in a single store write
+        NotificationService.create_notifications(
+            notification_type=notification_type,
+            recipient_ids=participants,
+            routing_id=routing_id,
+            data=data,
+            sender_id=exclude_user_id
+        )
+    
+    @staticmethod
+    def _workflow_change_notification(routing: Dict, old_stage: str, new_stage: str,
+                                      notes: str = '') -> tuple:
+        """Notification type and template data for a workflow stage change"""
         # Determine notification type based on stage change
         notification_type = 'routing_created'  # default
         
@@ -242,30 +225,104 @@ class NotificationService:
             'reason': notes  # For rejection notifications
         }
         
+        return notification_type, data
+    
+    @staticmethod
+    def notify_workflow_change(routing_id: int, old_stage: str, new_stage: str,
+                             user_id: int, notes: str = '', routing: Dict = None):
+        """Send notification when workflow stage changes"""
+        # Get routing data for context unless the caller already has it
+        if routing is None:
+            routings = read_data('sample_routings.json')
+            routing = next((r for r in routings if r['id'] == routing_id), None)
+        
+        if not routing:
+            return
+        
+        notification_type, data = NotificationService._workflow_change_notification(
+            routing, old_stage, new_stage, notes
+        )
+        
         # Send notification to all participants except the user who made the change
         NotificationService.notify_routing_participants(
             routing_id=routing_id,
             notification_type=notification_type,
             data=data,
-            exclude_user_id=user_id
+            exclude_user_id=user_id,
+            routing=routing
         )
     
     @staticmethod
-    def cleanup_old_notifications(days_old: int = 30):
-        """Clean up notifications older than specified days"""
-        from datetime import datetime, timedelta
+    def notify_routings(entries: List[Dict], user_id: int) -> int:
+        """
+        Notify the participants of many routings in a single pass.
         
-        notifications = read_data('notifications.json')
-        cutoff_date = datetime.now() - timedelta(days=days_old)
+        Each entry has ``routing`` (the routing record), ``notification_type``
+        and ``data``. Users are read once and all notifications are added to
+        the store in one batch. Returns the number of notifications created.
+        """
+        if not entries:
+            return 0
         
-        # Keep notifications newer than cutoff date
-        filtered_notifications = [
-            n for n in notifications 
-            if datetime.fromisoformat(n['created_at']) > cutoff_date
-        ]
+        users = read_data('users.json')
+        notifications = []
+        for entry in entries:
+            routing = entry['routing']
+            for recipient_id in NotificationService._routing_participants(routing, users, user_id):
+                notifications.append(NotificationService._build_notification(
+                    entry['notification_type'], recipient_id, routing['id'], entry.get('data'), user_id
+                ))
+        
+        notification_store.add_many(notifications)
+        return len(notifications)
+    
+    @staticmethod
+    def notify_workflow_changes(changes: List[Dict], user_id: int) -> int:
+        """
+        Send workflow change notifications for many routings in a single pass.
         
-        if len(filtered_notifications) < len(notifications):
-            write_data('notifications.json', filtered_notifications)
-            return len(notifications) - len(filtered_notifications)
+        Each change has ``routing`` (the routing record), ``old_stage``,
+        ``new_stage`` and optional ``notes``.
+        """
+        entries = []
+        for change in changes:
+            notification_type, data = NotificationService._workflow_change_notification(
+                change['routing'], change['old_stage'], change['new_stage'], change.get('notes', '')
+            )
+            entries.append({'routing': change['routing'], 'notification_type': notification_type, 'data': data})
+        
+        return NotificationService.notify_routings(entries, user_id)
+    
+    @staticmethod
+    def notify_critical_results(alerts: List[Dict], sender_id: int = None) -> int:
+        """
+        Alert lab staff to critical values in a single store write.
+        
+        Each alert carries the report's ``tenant_id`` plus the template data
+        (sid_number, patient_name, test_name, result, unit, flag). Returns
+        the number of notifications created.
+        """
+        if not alerts:
+            return 0
         
-        return 0
+        users = [u for u in read_data('users.json')
+                 if u.get('is_active', True) and u.get('role') in NotificationService.CRITICAL_RESULT_ROLES]
+        notifications = []
+        for alert in alerts:
+            for user in users:
+                if user.get('role') in ['admin', 'hub_admin'] or str(user.get('tenant_id')) == str(alert.get('tenant_id')):
+                    notifications.append(NotificationService._build_notification(
+                        'critical_result', user['id'], None, alert, sender_id
+                    ))
+        
+        notification_store.add_many(notifications)
+        return len(notifications)
+    
+    @staticmethod
+    def cleanup_old_notifications(days_old: int = 30):
+        """
+        Clean up notifications older than specified days.
+        The notification store compacts expired entries automatically; this
+        forces an immediate pass with a custom age.
+        """
+        return notification_store.compact(days_old)
@@ -0,0 +1,246 @@
+"""
+Notification Store for Sample Routing System
+Keeps notifications partitioned by recipient with in-memory indexes,
+write-behind persistence and automatic TTL compaction
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Iterable
+from utils import read_data, write_data, DATA_DIR
+
+
+class NotificationStore:
+    """
+    Recipient-partitioned notification store.
+
+    Each recipient's notifications live in ``data/notifications/user_<id>.json``
+    and are kept in memory as a list ordered by ``created_at`` (oldest first),
+    together with an unread counter per recipient. Mutations only mark the
+    affected partitions dirty; a background worker flushes dirty partitions
+    and periodically drops notifications older than the configured TTL.
+    """
+
+    PARTITION_DIR = 'notifications'
+    LEGACY_FILE = 'notifications.json'
+
+    def __init__(self, ttl_days: int = 30, flush_interval: float = 1.0,
+                 compaction_interval: float = 3600.0):
+        self.ttl_days = ttl_days
+        self.flush_interval = flush_interval
+        self.compaction_interval = compaction_interval
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._by_user: Dict[object, List[Dict]] = {}
+        self._by_id: Dict[str, Dict] = {}
+        self._unread: Counter = Counter()
+        self._by_routing: Counter = Counter()
+        self._dirty = set()
+
+        self._worker = None
+        self._stop = threading.Event()
+        self._last_compaction = 0.0
+
+    # ------------------------------------------------------------------
+    # Loading and persistence
+    # ------------------------------------------------------------------
+
+    def _partition_file(self, recipient_id) -> str:
+        return os.path.join(self.PARTITION_DIR, f"user_{recipient_id}.json")
+
+    def _ensure_loaded(self):
+        """Load partitions (migrating the legacy single file once) on first use"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+
+            partition_path = os.path.join(DATA_DIR, self.PARTITION_DIR)
+            if os.path.isdir(partition_path):
+                for filename in os.listdir(partition_path):
+                    if filename.startswith('user_') and filename.endswith('.json'):
+                        try:
+                            for notification in read_data(os.path.join(self.PARTITION_DIR, filename)):
+                                self._index(notification)
+                        except Exception as e:
+                            print(f"Warning: Failed to load notification partition {filename}: {e}")
+            else:
+                # First run: split the legacy notifications.json into partitions
+                os.makedirs(partition_path, exist_ok=True)
+                try:
+                    legacy = read_data(self.LEGACY_FILE)
+                except Exception:
+                    legacy = []
+                for notification in legacy:
+                    self._index(notification)
+                self._dirty.update(self._by_user.keys())
+
+            self._loaded = True
+            self._start_worker()
+
+    def _index(self, notification: Dict):
+        """Add a notification to the in-memory indexes"""
+        recipient_id = notification.get('recipient_id')
+        user_list = self._by_user.setdefault(recipient_id, [])
+        out_of_order = bool(user_list) and user_list[-1].get('created_at', '') > notification.get('created_at', '')
+        user_list.append(notification)
+        if out_of_order:
+            user_list.sort(key=lambda n: n.get('created_at', ''))
+        self._by_id[notification['id']] = notification
+        if not notification.get('is_read'):
+            self._unread[recipient_id] += 1
+        if notification.get('routing_id') is not None:
+            self._by_routing[notification['routing_id']] += 1
+
+    def _unindex(self, notification: Dict):
+        """Remove a notification from the id, unread and routing indexes"""
+        self._by_id.pop(notification['id'], None)
+        if not notification.get('is_read'):
+            self._unread[notification.get('recipient_id')] -= 1
+        if notification.get('routing_id') is not None:
+            self._by_routing[notification['routing_id']] -= 1
+
+    def flush(self):
+        """Write every dirty partition to disk"""
+        with self._lock:
+            dirty = list(self._dirty)
+            self._dirty.clear()
+            snapshots = {rid: list(self._by_user.get(rid, [])) for rid in dirty}
+
+        for recipient_id, notifications in snapshots.items():
+            try:
+                write_data(self._partition_file(recipient_id), notifications)
+            except Exception as e:
+                print(f"Warning: Failed to flush notifications for recipient {recipient_id}: {e}")
+                with self._lock:
+                    self._dirty.add(recipient_id)
+
+    def _start_worker(self):
+        """Start the background flush/compaction thread"""
+        if self._worker is not None:
+            return
+        self._last_compaction = 0.0
+        self._worker = threading.Thread(target=self._run_worker, name='notification-store', daemon=True)
+        self._worker.start()
+        atexit.register(self.flush)
+
+    def _run_worker(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                if time.monotonic() - self._last_compaction >= self.compaction_interval:
+                    self._last_compaction = time.monotonic()
+                    removed = self.compact()
+                    if removed:
+                        print(f"Notification store compaction removed {removed} notifications")
+                self.flush()
+            except Exception as e:
+                print(f"Warning: Notification store worker error: {e}")
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def add(self, notification: Dict) -> Dict:
+        """Add a single notification"""
+        return self.add_many([notification])[0]
+
+    def add_many(self, notifications: Iterable[Dict]) -> List[Dict]:
+        """Add notifications in one pass, marking each touched partition dirty once"""
+        self._ensure_loaded()
+        notifications = list(notifications)
+        with self._lock:
+            for notification in notifications:
+                self._index(notification)
+                self._dirty.add(notification.get('recipient_id'))
+        return notifications
+
+    def mark_read(self, notification_id: str, user_id) -> bool:
+        """Mark a single notification as read for its recipient"""
+        self._ensure_loaded()
+        with self._lock:
+            notification = self._by_id.get(notification_id)
+            if not notification or notification.get('recipient_id') != user_id:
+                return False
+            if not notification.get('is_read'):
+                notification['is_read'] = True
+                notification['read_at'] = datetime.now().isoformat()
+                self._unread[user_id] -= 1
+                self._dirty.add(user_id)
+            return True
+
+    def mark_all_read(self, user_id) -> int:
+        """Mark every unread notification of a recipient as read"""
+        self._ensure_loaded()
+        with self._lock:
+            if self._unread[user_id] <= 0:
+                return 0
+            read_at = datetime.now().isoformat()
+            count = 0
+            for notification in self._by_user.get(user_id, []):
+                if not notification.get('is_read'):
+                    notification['is_read'] = True
+                    notification['read_at'] = read_at
+                    count += 1
+            self._unread[user_id] = 0
+            if count:
+                self._dirty.add(user_id)
+            return count
+
+    def compact(self, days_old: Optional[int] = None) -> int:
+        """Drop notifications older than ``days_old`` (defaults to the store TTL)"""
+        self._ensure_loaded()
+        days_old = self.ttl_days if days_old is None else days_old
+        cutoff = (datetime.now() - timedelta(days=days_old)).isoformat()
+        removed = 0
+
+        with self._lock:
+            for recipient_id, user_list in self._by_user.items():
+                # Lists are time-ordered, so expired entries form a prefix
+                keep_from = 0
+                while keep_from < len(user_list) and user_list[keep_from].get('created_at', '') <= cutoff:
+                    self._unindex(user_list[keep_from])
+                    keep_from += 1
+                if keep_from:
+                    del user_list[:keep_from]
+                    removed += keep_from
+                    self._dirty.add(recipient_id)
+
+        return removed
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def list_for_user(self, user_id, unread_only: bool = False, limit: int = 50) -> List[Dict]:
+        """Get a recipient's notifications, newest first"""
+        self._ensure_loaded()
+        results = []
+        with self._lock:
+            for notification in reversed(self._by_user.get(user_id, [])):
+                if unread_only and notification.get('is_read'):
+                    continue
+                results.append(dict(notification))
+                if len(results) >= limit:
+                    break
+        return results
+
+    def unread_count(self, user_id) -> int:
+        """Get the unread counter of a recipient"""
+        self._ensure_loaded()
+        return max(self._unread.get(user_id, 0), 0)
+
+    def count_for_routing(self, routing_id) -> int:
+        """Get the number of stored notifications for a routing"""
+        self._ensure_loaded()
+        return self._by_routing.get(routing_id, 0)
+
+
+notification_store = NotificationStore(
+    ttl_days=int(os.environ.get('NOTIFICATION_TTL_DAYS', 30))
+)
@@ -0,0 +1,328 @@
+"""
+Patient Result History
+Per patient and test time series of results taken from the test items of
+``billing_reports.json``, for delta checks, cumulative reports and
+previous-result lookups without scanning every report.
+
+Series are keyed by the patient record id (``report['patient_id']``) and
+the normalised test name (services.formula_engine.test_key); a
+test_master_id finds the series of every test name it was billed under.
+Entries are ordered by billing date, then report id.
+
+Result entry keeps the index current through ``upsert_reports`` after
+writing; writes to billing_reports.json from anywhere else are picked up by
+comparing the file's mtime/size before each lookup and rebuilding.
+"""
+
+import bisect
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils import read_data, DATA_DIR
+from .formula_engine import test_key
+
+SeriesKey = Tuple[str, tuple]
+
+
+def _number(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(str(value).strip().replace(',', ''))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _patient(report: Dict) -> Optional[str]:
+    patient_id = report.get('patient_id')
+    return str(patient_id) if patient_id not in (None, '') else None
+
+
+def _report_date(report: Dict) -> str:
+    return str(report.get('billing_date') or '')[:10]
+
+
+def _date_label(date: str) -> str:
+    try:
+        return datetime.strptime(date, '%Y-%m-%d').strftime('%d/%m/%Y')
+    except ValueError:
+        return date or '-'
+
+
+class PatientResultHistory:
+    """(patient, test) -> results in date order, with incremental updates per report"""
+
+    FILENAME = 'billing_reports.json'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._series: Dict[SeriesKey, List[Dict]] = {}
+        self._orders: Dict[SeriesKey, List[tuple]] = {}  # sort key of each series entry, for bisect
+        self._report_keys: Dict[object, Set[SeriesKey]] = {}
+        self._aliases: Dict[tuple, Set[tuple]] = {}
+        self._file_version: Optional[Tuple[int, int]] = None
+        self._built = False
+
+    # ------------------------------------------------------------------
+    # Building and maintenance
+    # ------------------------------------------------------------------
+
+    @property
+    def path(self) -> str:
+        return os.path.join(DATA_DIR, self.FILENAME)
+
+    def _current_file_version(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _ensure_fresh(self):
+        if not self._built or self._current_file_version() != self._file_version:
+            self.rebuild()
+
+    def rebuild(self):
+        """Rebuild every series from billing_reports.json"""
+        with self._lock:
+            version = self._current_file_version()
+            self._series = {}
+            self._orders = {}
+            self._report_keys = {}
+            self._aliases = {}
+            for report in (read_data(self.FILENAME) if version else []):
+                self._add(report)
+            self._file_version = version
+            self._built = True
+
+    @staticmethod
+    def _entries(report: Dict) -> Iterable[Tuple[SeriesKey, tuple, Dict]]:
+        patient = _patient(report)
+        if patient is None:
+            return
+        date = _report_date(report)
+        authorized = report.get('authorization_status') == 'approved'
+        for position, item in enumerate(report.get('test_items') or []):
+            result = item.get('result', item.get('result_value'))
+            key = test_key(item.get('test_name'))
+            if result in (None, '') or key is None:
+                continue
+            yield (patient, key), (date, report.get('id') or 0, position), {
+                'report_id': report.get('id'),
+                'sid_number': report.get('sid_number'),
+                'tenant_id': report.get('tenant_id'),
+                'date': date,
+                'test_name': item.get('test_name'),
+                'test_master_id': item.get('test_master_id'),
+                'result': result,
+                'value': _number(result),
+                'unit': item.get('result_unit') or (item.get('test_master_data') or {}).get('unit') or '',
+                'reference_range': item.get('reference_range') or '',
+                'abnormal_flag': item.get('abnormal_flag'),
+                'is_critical': bool(item.get('is_critical')),
+                'authorized': authorized
+            }
+
+    def _add(self, report: Dict):
+        keys = set()
+        for series_key, order, entry in self._entries(report):
+            orders = self._orders.setdefault(series_key, [])
+            position = bisect.bisect_right(orders, order)
+            orders.insert(position, order)
+            self._series.setdefault(series_key, []).insert(position, entry)
+            keys.add(series_key)
+            if entry['test_master_id'] is not None:
+                alias = test_key(entry['test_master_id'])
+                if alias is not None:
+                    self._aliases.setdefault(alias, set()).add(series_key[1])
+        if keys:
+            self._report_keys[report.get('id')] = keys
+
+    def _discard(self, report_id):
+        for series_key in self._report_keys.pop(report_id, ()):
+            kept = [i for i, entry in enumerate(self._series.get(series_key, []))
+                    if entry['report_id'] != report_id]
+            if kept:
+                self._series[series_key] = [self._series[series_key][i] for i in kept]
+                self._orders[series_key] = [self._orders[series_key][i] for i in kept]
+            else:
+                self._series.pop(series_key, None)
+                self._orders.pop(series_key, None)
+
+    def upsert_reports(self, reports: Iterable[Dict], source_path: Optional[str] = None):
+        """
+        Re-index reports after they were written. ``source_path`` is the
+        file they were written to; writes to another file (a service built
+        on a different data directory) are ignored.
+        """
+        if source_path is not None and os.path.abspath(source_path) != os.path.abspath(self.path):
+            return
+        reports = list(reports)
+        if not reports:
+            return
+        with self._lock:
+            if not self._built:
+                self.rebuild()
+                return
+            for report in reports:
+                self._discard(report.get('id'))
+                self._add(report)
+            self._file_version = self._current_file_version()
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def _test_keys(self, test) -> List[tuple]:
+        key = test_key(test)
+        if key is None:
+            return []
+        if key[0] == 'id':
+            return sorted(self._aliases.get(key, ()))
+        return [key]
+
+    def previous(self, report: Dict, key: tuple, lookback_days: Optional[float] = None) -> Optional[float]:
+        """
+        Most recent numeric result of the test (a test_key) from another of
+        the patient's reports up to this report's date, if within
+        ``lookback_days`` of it.
+        """
+        patient = _patient(report)
+        if patient is None:
+            return None
+        report_date = _report_date(report)
+        earliest = ''
+        if lookback_days and report_date:
+            try:
+                earliest = (datetime.strptime(report_date, '%Y-%m-%d') -
+                            timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+            except ValueError:
+                earliest = ''
+        with self._lock:
+            self._ensure_fresh()
+            series = self._series.get((patient, key), [])
+            end = bisect.bisect_right(self._orders.get((patient, key), []), (report_date, math.inf))
+            for entry in reversed(series[:end]):
+                if entry['report_id'] == report.get('id') or entry['value'] is None:
+                    continue
+                return entry['value'] if entry['date'] >= earliest else None
+        return None
+
+    def patient_results(self, patient_id, tests: Optional[List] = None, limit: int = 5,
+                        authorized_only: bool = False, until: Optional[str] = None,
+                        tenant_ids: Optional[List] = None) -> List[Dict]:
+        """
+        The last ``limit`` results per test for a patient, newest first.
+
+        ``tests`` restricts to test names / test_master_ids; ``until`` (a
+        YYYY-MM-DD date) leaves out later results; ``tenant_ids`` (None for
+        all) keeps only results of reports of those tenants.
+        """
+        patient = str(patient_id)
+        with self._lock:
+            self._ensure_fresh()
+            if tests:
+                keys = []
+                for test in tests:
+                    keys.extend(k for k in self._test_keys(test) if k not in keys)
+            else:
+                keys = sorted(key for p, key in self._series if p == patient)
+
+            history = []
+            for key in keys:
+                series = self._series.get((patient, key))
+                if not series:
+                    continue
+                end = len(series) if until is None else \
+                    bisect.bisect_right(self._orders[(patient, key)], (until, math.inf))
+                results = []
+                for entry in reversed(series[:end]):
+                    if authorized_only and not entry['authorized']:
+                        continue
+                    if tenant_ids is not None and entry['tenant_id'] not in tenant_ids:
+                        continue
+                    results.append(dict(entry))
+                    if len(results) >= limit:
+                        break
+                if results:
+                    latest = results[0]
+                    history.append({
+                        'test_name': latest['test_name'],
+                        'unit': latest['unit'],
+                        'reference_range': latest['reference_range'],
+                        'results': results
+                    })
+        return history
+
+    def cumulative_table(self, report: Dict, limit: int = 5,
+                         tenant_ids: Optional[List] = None) -> Optional[Dict]:
+        """
+        Cumulative view of a report's tests for its PDF: the patient's last
+        ``limit`` reports up to this one that share any of its tests, as
+        columns oldest to newest. None when there is no earlier result.
+        ``tenant_ids`` (None for all) keeps only earlier reports of those tenants.
+        """
+        patient = _patient(report)
+        if patient is None:
+            return None
+        order = (_report_date(report), report.get('id') or 0)
+        names = []
+        for item in report.get('test_items') or []:
+            key = test_key(item.get('test_name'))
+            if key is not None and key not in [k for k, _ in names]:
+                names.append((key, item))
+
+        with self._lock:
+            self._ensure_fresh()
+            series = {}
+            for key, _ in names:
+                end = bisect.bisect_right(self._orders.get((patient, key), []), order + (math.inf,))
+                series[key] = [entry for entry in self._series.get((patient, key), [])[:end]
+                               if tenant_ids is None or entry['tenant_id'] in tenant_ids]
+
+        # This report's own column comes from the report as given, which may
+        # be newer than the index (e.g. rendered straight after an edit)
+        current = {key: dict(item, result=item.get('result', item.get('result_value')))
+                   for key, item in names}
+        columns: Dict[tuple, Dict] = {order: {'date': order[0], 'sid_number': report.get('sid_number')}}
+        for entries in series.values():
+            for entry in entries:
+                if entry['report_id'] != report.get('id'):
+                    columns.setdefault((entry['date'], entry['report_id'] or 0), entry)
+        if len(columns) < 2:
+            return None
+        selected = sorted(columns)[-limit:]
+
+        rows = []
+        for key, item in names:
+            by_report = {(e['date'], e['report_id'] or 0): e for e in series[key]}
+            by_report[order] = current[key]
+            values = []
+            for column in selected:
+                entry = by_report.get(column)
+                if entry is None or entry.get('result') in (None, ''):
+                    values.append('')
+                elif entry.get('abnormal_flag'):
+                    values.append(f"{entry['result']} {entry['abnormal_flag']}")
+                else:
+                    values.append(str(entry['result']))
+            if any(values[:-1]):
+                rows.append({
+                    'test_name': item.get('test_name'),
+                    'unit': item.get('result_unit') or '',
+                    'values': values
+                })
+        if not rows:
+            return None
+        return {
+            'columns': [{'date': _date_label(columns[c]['date']), 'sid_number': columns[c]['sid_number']}
+                        for c in selected],
+            'rows': rows
+        }
+
+
+patient_history = PatientResultHistory()
@@ -0,0 +1,405 @@
+"""
+Patient Ledger
+Billings indexed by patient with running billed/paid/due/refunded totals,
+kept in step with billings.json and snapshotted to patient_ledger.json.
+"""
+
+import atexit
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from utils import read_data, write_data, DATA_DIR
+
+TOTAL_FIELDS = ('billed', 'paid', 'due', 'refunded')
+
+# Refunds in these states do not count towards the refunded total
+NON_REFUND_STATUSES = ('Rejected', 'Cancelled')
+
+
+def _amount(value) -> float:
+    try:
+        if value is None or value == '':
+            return 0.0
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _money(value: float) -> float:
+    return round(value, 2)
+
+
+def ledger_entry(billing: Dict) -> Dict:
+    """Ledger view of one billing record"""
+    total_amount = _amount(billing.get('total_amount'))
+    paid_amount = _amount(billing.get('paid_amount'))
+    due_amount = _money(total_amount - paid_amount)
+    refunds = [
+        {
+            'refund_id': r.get('refund_id'),
+            'amount': _amount(r.get('amount')),
+            'status': r.get('status'),
+            'requested_at': r.get('requested_at')
+        }
+        for r in billing.get('refund_history') or []
+    ]
+    entry = {
+        'billing_id': billing.get('id'),
+        'patient_id': billing.get('patient_id'),
+        'tenant_id': billing.get('tenant_id'),
+        'sid_number': billing.get('sid_number'),
+        'invoice_number': billing.get('invoice_number'),
+        'billing_date': billing.get('created_at', ''),
+        'total_amount': total_amount,
+        'paid_amount': paid_amount,
+        'due_amount': due_amount,
+        'refunded_amount': _money(sum(r['amount'] for r in refunds if r['status'] not in NON_REFUND_STATUSES)),
+        'payment_status': billing.get('payment_status'),
+        'payments': [
+            {
+                'payment_date': p.get('payment_date'),
+                'amount': p.get('amount'),
+                'method': p.get('method'),
+                'reference': p.get('reference'),
+                'notes': p.get('notes'),
+                'remaining_due': p.get('remaining_due')
+            }
+            for p in billing.get('payment_history') or []
+        ],
+        'refunds': refunds
+    }
+    # Items are only needed for the outstanding-dues listing
+    if due_amount > 0:
+        entry['items'] = billing.get('items', [])
+    return entry
+
+
+def _new_account(patient_id) -> Dict:
+    account = {'patient_id': patient_id, 'billing_count': 0, 'last_billing_date': '', 'billings': {}}
+    for field in TOTAL_FIELDS:
+        account[field] = 0.0
+    return account
+
+
+def _entry_totals(entry: Dict) -> Dict[str, float]:
+    return {
+        'billed': entry['total_amount'],
+        'paid': entry['paid_amount'],
+        'due': max(entry['due_amount'], 0.0),
+        'refunded': entry['refunded_amount']
+    }
+
+
+class PatientLedger:
+    """
+    Per-patient billing ledger.
+
+    Each patient account holds one entry per billing (amounts, payments and
+    refunds) and running ``billed``/``paid``/``due``/``refunded`` totals that
+    are adjusted by the difference between the old and new entry whenever a
+    billing is created, paid, refunded, edited or deleted. Billings with an
+    outstanding balance are also indexed by id, so the dues listing only
+    touches billings that are actually due.
+
+    The billing routes call ``record_billing``/``remove_billing`` after
+    writing ``billings.json``; writes from anywhere else (migrations, scripts)
+    are detected through the file's mtime/size and trigger a rebuild. The
+    ledger is snapshotted to ``patient_ledger.json`` by a background thread
+    together with the ``billings.json`` version it reflects, so a restart only
+    rebuilds when billings changed meanwhile. ``verify`` compares the ledger
+    against a fresh computation from ``billings.json``.
+    """
+
+    FILENAME = 'patient_ledger.json'
+    SOURCE_FILE = 'billings.json'
+
+    def __init__(self, snapshot_interval: float = 2.0):
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._accounts: Dict[object, Dict] = {}
+        self._owner: Dict[object, object] = {}  # billing_id -> patient_id
+        self._due: Dict[object, object] = {}  # billing_id -> patient_id, balance outstanding
+        self._source_version: Optional[List[int]] = None
+        self._dirty = False
+        self._worker = None
+
+    # ------------------------------------------------------------------
+    # Loading, rebuilding and snapshots
+    # ------------------------------------------------------------------
+
+    def _current_source_version(self) -> Optional[List[int]]:
+        try:
+            stat = os.stat(os.path.join(DATA_DIR, self.SOURCE_FILE))
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def load_snapshot(self, require_current: bool = True) -> bool:
+        """
+        Load patient_ledger.json. With ``require_current`` the snapshot is only
+        used if billings.json has not changed since it was written.
+        """
+        try:
+            snapshot = read_data(self.FILENAME)
+        except Exception:
+            return False
+        if not isinstance(snapshot, dict):
+            return False
+        if require_current and snapshot.get('source_version') != self._current_source_version():
+            return False
+
+        with self._lock:
+            self._accounts = {}
+            for account in snapshot.get('accounts', []):
+                account['billings'] = {entry['billing_id']: entry for entry in account.get('billings', [])}
+                self._accounts[account['patient_id']] = account
+            self._index_accounts()
+            self._source_version = snapshot.get('source_version')
+            self._loaded = True
+        return True
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if not self.load_snapshot():
+                self.rebuild()
+            self._loaded = True
+            self._start_worker()
+
+    def _ensure_fresh(self):
+        self._ensure_loaded()
+        if self._current_source_version() != self._source_version:
+            self.rebuild()
+
+    @staticmethod
+    def compute_accounts(billings: Iterable[Dict]) -> Dict[object, Dict]:
+        """Patient accounts computed from scratch"""
+        accounts: Dict[object, Dict] = {}
+        for billing in billings:
+            if billing.get('id') is None:
+                continue
+            entry = ledger_entry(billing)
+            account = accounts.get(entry['patient_id'])
+            if account is None:
+                account = accounts[entry['patient_id']] = _new_account(entry['patient_id'])
+            PatientLedger._add_to_account(account, entry)
+        return accounts
+
+    def rebuild(self, billings: Optional[List[Dict]] = None):
+        """Rebuild the whole ledger from billings.json"""
+        with self._lock:
+            version = self._current_source_version()
+            if billings is None:
+                try:
+                    billings = read_data(self.SOURCE_FILE)
+                except Exception as e:
+                    print(f"Warning: Failed to load billings for patient ledger: {e}")
+                    billings = []
+            self._accounts = self.compute_accounts(billings)
+            self._index_accounts()
+            self._source_version = version
+            self._dirty = True
+
+    def _index_accounts(self):
+        self._owner = {}
+        self._due = {}
+        for account in self._accounts.values():
+            for billing_id, entry in account['billings'].items():
+                self._owner[billing_id] = account['patient_id']
+                if entry['due_amount'] > 0:
+                    self._due[billing_id] = account['patient_id']
+
+    def snapshot(self):
+        """Write the ledger to patient_ledger.json"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            accounts = [
+                dict(account, billings=list(account['billings'].values()))
+                for account in self._accounts.values()
+            ]
+            payload = {
+                'source_version': self._source_version,
+                'written_at': datetime.now().isoformat(),
+                'accounts': accounts
+            }
+            try:
+                write_data(self.FILENAME, payload)
+            except Exception as e:
+                print(f"Warning: Failed to snapshot patient ledger: {e}")
+                self._dirty = True
+
+    def _start_worker(self):
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run_worker, name='patient-ledger', daemon=True)
+        self._worker.start()
+        atexit.register(self.snapshot)
+
+    def _run_worker(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            self.snapshot()
+
+    # ------------------------------------------------------------------
+    # Running totals
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _add_to_account(account: Dict, entry: Dict, sign: int = 1):
+        for field, value in _entry_totals(entry).items():
+            account[field] = _money(account[field] + sign * value)
+        account['billing_count'] += sign
+        if sign > 0:
+            account['billings'][entry['billing_id']] = entry
+            if entry['billing_date'] > account['last_billing_date']:
+                account['last_billing_date'] = entry['billing_date']
+        else:
+            account['billings'].pop(entry['billing_id'], None)
+
+    def _discard(self, billing_id):
+        patient_id = self._owner.pop(billing_id, None)
+        self._due.pop(billing_id, None)
+        account = self._accounts.get(patient_id)
+        if account is None or billing_id not in account['billings']:
+            return
+        self._add_to_account(account, account['billings'][billing_id], sign=-1)
+        if not account['billings']:
+            del self._accounts[patient_id]
+
+    def record_billing(self, billing: Dict):
+        """
+        Apply a created or changed billing (new payment, refund, edit) after
+        it was written to billings.json, adjusting the patient's totals by
+        the difference to its previous ledger entry.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            entry = ledger_entry(billing)
+            self._discard(entry['billing_id'])
+
+            account = self._accounts.get(entry['patient_id'])
+            if account is None:
+                account = self._accounts[entry['patient_id']] = _new_account(entry['patient_id'])
+            self._add_to_account(account, entry)
+            self._owner[entry['billing_id']] = entry['patient_id']
+
+            if entry['due_amount'] > 0:
+                self._due[entry['billing_id']] = entry['patient_id']
+            else:
+                self._due.pop(entry['billing_id'], None)
+
+            self._source_version = self._current_source_version()
+            self._dirty = True
+
+    def remove_billing(self, billing_id):
+        """Drop a billing after it was deleted from billings.json"""
+        self._ensure_loaded()
+        with self._lock:
+            self._discard(billing_id)
+            self._source_version = self._current_source_version()
+            self._dirty = True
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _summary(account: Dict) -> Dict:
+        return {k: v for k, v in account.items() if k != 'billings'}
+
+    def account(self, patient_id) -> Optional[Dict]:
+        """Totals and billing entries of a patient (newest billing first)"""
+        with self._lock:
+            self._ensure_fresh()
+            account = self._accounts.get(patient_id)
+            if account is None:
+                return None
+            summary = self._summary(account)
+            summary['billings'] = sorted(account['billings'].values(),
+                                         key=lambda e: e['billing_date'] or '', reverse=True)
+            return summary
+
+    def due_entries(self) -> List[Dict]:
+        """Entries of all billings with an outstanding balance"""
+        with self._lock:
+            self._ensure_fresh()
+            return [self._accounts[patient_id]['billings'][billing_id]
+                    for billing_id, patient_id in self._due.items()]
+
+    def payment_history(self, patient_id) -> List[Dict]:
+        """Payments of a patient across billings, newest first"""
+        with self._lock:
+            self._ensure_fresh()
+            account = self._accounts.get(patient_id)
+            if account is None:
+                return []
+            history = [
+                dict(payment, billing_id=entry['billing_id'], sid_number=entry['sid_number'])
+                for entry in account['billings'].values()
+                for payment in entry['payments']
+            ]
+        history.sort(key=lambda p: p.get('payment_date') or '', reverse=True)
+        return history
+
+    # ------------------------------------------------------------------
+    # Consistency
+    # ------------------------------------------------------------------
+
+    def verify(self, billings: Optional[List[Dict]] = None, tolerance: float = 0.01) -> Dict:
+        """
+        Compare the ledger with accounts computed from billings.json.
+
+        Does not rebuild first, so it reports drift in the incrementally
+        maintained totals as well as billings written behind its back.
+        """
+        self._ensure_loaded()
+        if billings is None:
+            billings = read_data(self.SOURCE_FILE)
+        expected = self.compute_accounts(billings)
+
+        mismatches = []
+        with self._lock:
+            for patient_id in set(expected) | set(self._accounts):
+                actual = self._accounts.get(patient_id)
+                wanted = expected.get(patient_id)
+                if actual is None or wanted is None:
+                    mismatches.append({'patient_id': patient_id,
+                                       'problem': 'missing from ledger' if actual is None else 'not in billings'})
+                    continue
+                for field in TOTAL_FIELDS:
+                    if abs(actual[field] - wanted[field]) > tolerance:
+                        mismatches.append({'patient_id': patient_id, 'field': field,
+                                           'ledger': actual[field], 'billings': wanted[field]})
+                if set(actual['billings']) != set(wanted['billings']):
+                    mismatches.append({'patient_id': patient_id, 'field': 'billings',
+                                       'ledger': sorted(actual['billings'], key=str),
+                                       'billings': sorted(wanted['billings'], key=str)})
+
+            due_expected = {e['billing_id'] for a in expected.values()
+                            for e in a['billings'].values() if e['due_amount'] > 0}
+            if due_expected != set(self._due):
+                mismatches.append({'field': 'due_index',
+                                   'missing': sorted(due_expected - set(self._due), key=str),
+                                   'extra': sorted(set(self._due) - due_expected, key=str)})
+
+            in_sync = self._source_version == self._current_source_version()
+
+        return {
+            'consistent': not mismatches,
+            'source_in_sync': in_sync,
+            'patients_checked': len(expected),
+            'billings_checked': len(billings),
+            'mismatches': mismatches
+        }
+
+
+patient_ledger = PatientLedger()
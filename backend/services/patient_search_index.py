@@ -0,0 +1,341 @@
+"""
+Patient Search Index
+In-memory token/trigram index over patient names and IDs with a phone-number
+digit trie, partitioned by tenant, for fast front-desk patient lookup.
+"""
+
+import bisect
+import heapq
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils import read_data, DATA_DIR
+
+NON_DIGITS = re.compile(r'\D+')
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _DigitTrie:
+    """Phone-number prefix trie; every node keeps the ids of the numbers below it"""
+
+    __slots__ = ('children', 'ids')
+
+    def __init__(self):
+        self.children: Dict[str, '_DigitTrie'] = {}
+        self.ids: Set[int] = set()
+
+    def add(self, digits: str, patient_id: int):
+        node = self
+        for digit in digits:
+            node = node.children.setdefault(digit, _DigitTrie())
+            node.ids.add(patient_id)
+
+    def remove(self, digits: str, patient_id: int):
+        node = self
+        for digit in digits:
+            node = node.children.get(digit)
+            if node is None:
+                return
+            node.ids.discard(patient_id)
+
+    def prefix(self, digits: str) -> Set[int]:
+        node = self
+        for digit in digits:
+            node = node.children.get(digit)
+            if node is None:
+                return set()
+        return node.ids
+
+
+class _TenantPartition:
+    """Postings for the patients of one tenant"""
+
+    def __init__(self):
+        self.ids: Set[int] = set()
+        self.trigrams: Dict[str, Set[int]] = {}
+        self.tokens: Dict[str, Set[int]] = {}
+        self.phones = _DigitTrie()
+        self._sorted_tokens: Optional[List[str]] = None
+
+    def add_token(self, token: str, patient_id: int):
+        postings = self.tokens.get(token)
+        if postings is None:
+            postings = self.tokens[token] = set()
+            self._sorted_tokens = None
+        postings.add(patient_id)
+
+    def discard_token(self, token: str, patient_id: int):
+        postings = self.tokens.get(token)
+        if postings is not None:
+            postings.discard(patient_id)
+            if not postings:
+                del self.tokens[token]
+                self._sorted_tokens = None
+
+    def token_prefix(self, prefix: str) -> Set[int]:
+        """Ids of patients with a name token starting with ``prefix``"""
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self.tokens)
+        ids: Set[int] = set()
+        index = bisect.bisect_left(self._sorted_tokens, prefix)
+        while index < len(self._sorted_tokens) and self._sorted_tokens[index].startswith(prefix):
+            ids |= self.tokens[self._sorted_tokens[index]]
+            index += 1
+        return ids
+
+
+class PatientSearchIndex:
+    """
+    Search index over ``patients.json``.
+
+    Each patient is reduced once to a search document (lower-cased first, last,
+    full and reversed names, patient_id, phone digits). Per tenant the index
+    keeps trigram postings over the name forms, patient_id and phone, word-token
+    postings, and a digit trie over the phone number (both the full number and
+    its last ten digits, so ``98765`` finds ``+91 98765 43210``).
+
+    A query is turned into a small candidate set from the postings and the
+    candidates are checked against the same matching rules the patient search
+    has always used. Queries shorter than three characters match word prefixes
+    rather than arbitrary substrings.
+
+    The patient routes keep the index current through ``upsert``/``remove``;
+    writes to ``patients.json`` from anywhere else are picked up by comparing
+    the file's mtime/size before each search and rebuilding.
+    """
+
+    FILENAME = 'patients.json'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._patients: Dict[int, Dict] = {}
+        self._docs: Dict[int, Dict] = {}
+        self._partitions: Dict[object, _TenantPartition] = {}
+        self._file_version: Optional[Tuple[float, int]] = None
+
+    # ------------------------------------------------------------------
+    # Building and maintenance
+    # ------------------------------------------------------------------
+
+    def _current_file_version(self) -> Optional[Tuple[float, int]]:
+        try:
+            stat = os.stat(os.path.join(DATA_DIR, self.FILENAME))
+        except OSError:
+            return None
+        return (stat.st_mtime, stat.st_size)
+
+    def _ensure_fresh(self):
+        version = self._current_file_version()
+        if version != self._file_version:
+            self.rebuild()
+
+    def rebuild(self):
+        """Rebuild the whole index from patients.json"""
+        with self._lock:
+            version = self._current_file_version()
+            try:
+                patients = read_data(self.FILENAME)
+            except Exception as e:
+                print(f"Warning: Failed to load patients for search index: {e}")
+                patients = []
+
+            self._patients = {}
+            self._docs = {}
+            self._partitions = {}
+            for patient in patients:
+                self._add(patient)
+            self._file_version = version
+
+    @staticmethod
+    def _make_doc(patient: Dict) -> Dict:
+        first_name = str(patient.get('first_name') or '').lower()
+        last_name = str(patient.get('last_name') or '').lower()
+        phone = str(patient.get('phone') or '')
+        return {
+            'first_name': first_name,
+            'last_name': last_name,
+            'full_name': f"{first_name} {last_name}".strip(),
+            'full_name_reverse': f"{last_name} {first_name}".strip(),
+            'patient_id': str(patient.get('patient_id') or '').lower(),
+            'phone': phone,
+            'phone_digits': NON_DIGITS.sub('', phone),
+            'tenant_id': patient.get('tenant_id'),
+            'created_at': patient.get('created_at') or ''
+        }
+
+    @staticmethod
+    def _doc_terms(doc: Dict) -> Tuple[Set[str], Set[str]]:
+        grams = set()
+        for field in ('full_name', 'full_name_reverse', 'patient_id', 'phone'):
+            grams |= _trigrams(doc[field])
+        tokens = set(doc['full_name'].split())
+        if doc['patient_id']:
+            tokens.add(doc['patient_id'])
+        return grams, tokens
+
+    @staticmethod
+    def _phone_keys(doc: Dict) -> Set[str]:
+        digits = doc['phone_digits']
+        return {key for key in (digits, digits[-10:]) if key}
+
+    def _add(self, patient: Dict):
+        patient_id = patient['id']
+        doc = self._make_doc(patient)
+        self._patients[patient_id] = patient
+        self._docs[patient_id] = doc
+
+        partition = self._partitions.setdefault(doc['tenant_id'], _TenantPartition())
+        partition.ids.add(patient_id)
+        grams, tokens = self._doc_terms(doc)
+        for gram in grams:
+            partition.trigrams.setdefault(gram, set()).add(patient_id)
+        for token in tokens:
+            partition.add_token(token, patient_id)
+        for key in self._phone_keys(doc):
+            partition.phones.add(key, patient_id)
+
+    def _discard(self, patient_id: int):
+        doc = self._docs.pop(patient_id, None)
+        self._patients.pop(patient_id, None)
+        if doc is None:
+            return
+
+        partition = self._partitions.get(doc['tenant_id'])
+        if partition is None:
+            return
+        partition.ids.discard(patient_id)
+        grams, tokens = self._doc_terms(doc)
+        for gram in grams:
+            postings = partition.trigrams.get(gram)
+            if postings is not None:
+                postings.discard(patient_id)
+                if not postings:
+                    del partition.trigrams[gram]
+        for token in tokens:
+            partition.discard_token(token, patient_id)
+        for key in self._phone_keys(doc):
+            partition.phones.remove(key, patient_id)
+
+    def upsert(self, patient: Dict):
+        """Add or re-index a patient after it was written to patients.json"""
+        with self._lock:
+            if self._file_version is None:
+                self.rebuild()
+                return
+            self._discard(patient['id'])
+            self._add(dict(patient))
+            self._file_version = self._current_file_version()
+
+    def remove(self, patient_id: int):
+        """Drop a patient after it was deleted from patients.json"""
+        with self._lock:
+            if self._file_version is None:
+                self.rebuild()
+                return
+            self._discard(patient_id)
+            self._file_version = self._current_file_version()
+
+    def get(self, patient_id) -> Optional[Dict]:
+        """Patient record by internal id"""
+        with self._lock:
+            self._ensure_fresh()
+            return self._patients.get(patient_id)
+
+    # ------------------------------------------------------------------
+    # Searching
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _phone_query(query: str) -> str:
+        """Digits of a query that looks like a phone number, else ''"""
+        compact = re.sub(r'[\s\-+()]', '', query)
+        return compact if compact.isdigit() else ''
+
+    @staticmethod
+    def _matches(doc: Dict, query: str, query_lower: str, query_words: List[str], phone_query: str) -> bool:
+        if phone_query and (doc['phone_digits'].startswith(phone_query) or
+                            doc['phone_digits'][-10:].startswith(phone_query)):
+            return True
+        if len(query_words) > 1:
+            name_text = f"{doc['first_name']} {doc['last_name']}"
+            if all(word in name_text for word in query_words):
+                return True
+        return (
+            query_lower in doc['full_name'] or
+            query_lower in doc['full_name_reverse'] or
+            query_lower in doc['patient_id'] or
+            query in doc['phone']
+        )
+
+    def _term_candidates(self, partition: _TenantPartition, term: str) -> Set[int]:
+        """Patients whose names/patient_id could contain ``term``"""
+        if len(term) < 3:
+            return partition.token_prefix(term)
+        result: Optional[Set[int]] = None
+        for gram in sorted(_trigrams(term), key=lambda g: len(partition.trigrams.get(g, ()))):
+            postings = partition.trigrams.get(gram)
+            if not postings:
+                return set()
+            result = set(postings) if result is None else result & postings
+            if not result:
+                break
+        return result or set()
+
+    def _candidates(self, partition: _TenantPartition, query_lower: str,
+                    query_words: List[str], phone_query: str) -> Set[int]:
+        candidates = self._term_candidates(partition, query_lower)
+
+        if len(query_words) > 1:
+            all_words: Optional[Set[int]] = None
+            for word in query_words:
+                word_ids = self._term_candidates(partition, word)
+                all_words = word_ids if all_words is None else all_words & word_ids
+                if not all_words:
+                    break
+            candidates |= all_words or set()
+
+        if phone_query:
+            candidates |= partition.phones.prefix(phone_query)
+
+        return candidates
+
+    def search(self, query: str, tenant_ids: Optional[Iterable] = None,
+               offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict]]:
+        """
+        Find patients matching ``query`` by name, patient_id or phone.
+
+        ``tenant_ids`` restricts the search to those tenant partitions (None
+        means all tenants). Returns ``(total, items)`` where items are the
+        newest matches from ``offset`` to ``offset + limit``.
+        """
+        query = query.strip()
+        query_lower = query.lower()
+        query_words = query_lower.split()
+        phone_query = self._phone_query(query)
+        if not query:
+            return 0, []
+
+        with self._lock:
+            self._ensure_fresh()
+
+            if tenant_ids is None:
+                partitions = list(self._partitions.values())
+            else:
+                partitions = [self._partitions[t] for t in tenant_ids if t in self._partitions]
+
+            matched = []
+            for partition in partitions:
+                for patient_id in self._candidates(partition, query_lower, query_words, phone_query):
+                    if self._matches(self._docs[patient_id], query, query_lower, query_words, phone_query):
+                        matched.append(patient_id)
+
+            top = heapq.nlargest(offset + limit, matched, key=lambda pid: (self._docs[pid]['created_at'], pid))
+            return len(matched), [dict(self._patients[pid]) for pid in top[offset:offset + limit]]
+
+
+patient_search_index = PatientSearchIndex()
@@ -0,0 +1,78 @@
+"""
+PDF Assets
+ReportLab styles and images shared by the PDF generators. Stylesheets and
+paragraph styles are built once per process instead of on every render, and
+image files are read once and re-read only when they change on disk.
+"""
+
+import os
+import threading
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+import logging
+
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle, StyleSheet1
+from reportlab.platypus import Image
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_PATH = os.path.join('public', 'signature.jpeg')
+
+_lock = threading.Lock()
+_sample_styles: Optional[StyleSheet1] = None
+_paragraph_styles: Dict[Tuple, ParagraphStyle] = {}
+_images: Dict[str, Tuple[Tuple[int, int], bytes]] = {}
+
+
+def sample_styles() -> StyleSheet1:
+    """ReportLab's sample stylesheet, shared; treat it as read-only"""
+    global _sample_styles
+    if _sample_styles is None:
+        with _lock:
+            if _sample_styles is None:
+                _sample_styles = getSampleStyleSheet()
+    return _sample_styles
+
+
+def paragraph_style(name: str, parent: str = 'Normal', **attributes) -> ParagraphStyle:
+    """Named style derived from a sample style, built on first use"""
+    key = (name, parent, tuple(sorted(attributes.items())))
+    style = _paragraph_styles.get(key)
+    if style is None:
+        with _lock:
+            style = _paragraph_styles.get(key)
+            if style is None:
+                style = _paragraph_styles[key] = ParagraphStyle(name, parent=sample_styles()[parent], **attributes)
+    return style
+
+
+def image_bytes(path: str) -> Optional[bytes]:
+    """Contents of an image file, cached until the file changes"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _images.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with open(path, 'rb') as f:
+        content = f.read()
+    with _lock:
+        _images[path] = (version, content)
+    return content
+
+
+def image(path: str, width: float, height: float) -> Optional[Image]:
+    """New Image flowable (one per document) from a cached image file"""
+    content = image_bytes(path)
+    if content is None:
+        return None
+    return Image(BytesIO(content), width=width, height=height)
+
+
+def signature_image(width: float, height: float) -> Optional[Image]:
+    signature = image(SIGNATURE_PATH, width, height)
+    if signature is None:
+        logger.warning(f"Signature image not found at: {SIGNATURE_PATH}")
+    return signature
@@ -21,6 +21,8 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
 from reportlab.graphics.shapes import Drawing, Rect, String
 from reportlab.graphics import renderPDF
 
+from . import pdf_assets
+
 # Barcode generation
 try:
     from barcode import Code128
@@ -531,7 +533,7 @@ class PDFReportGenerator:
             ]
 
             # Add result information if available
-            result_value = test.get('result_value', 'Pending')
+            result_value = self._result_text(test)
             reference_range = test_master_data.get('referenceRange', test.get('reference_range', 'N/A'))
             unit = test_master_data.get('unit', test.get('result_unit', ''))
 
@@ -2066,7 +2068,8 @@ class PDFReportGenerator:
                     'Report Date & Time': report_date
                 }
             },
-            'sections': self._transform_tests_to_sections(test_items),
+            'sections': self._transform_tests_to_sections(test_items) +
+                        self._cumulative_sections(report_data.get('cumulative_results')),
             'notes': self._generate_prabagaran_notes(test_items),
             'signatures': ['Dr. S.Asokkumar, PhD., Verified By', 'Jothi Lakshmi, Lab Technician']
         }
@@ -2086,6 +2089,15 @@ class PDFReportGenerator:
         except:
             return datetime.now().strftime('%d/%m/%Y %H:%M:%S')
 
+    @staticmethod
+    def _result_text(test: dict) -> str:
+        """Result with its H/L/critical flag, e.g. '182 H'"""
+        result = test.get('result_value', test.get('result'))
+        if result in (None, ''):
+            return 'Pending'
+        flag = test.get('abnormal_flag')
+        return f"{result} {flag}" if flag else str(result)
+
     def _transform_tests_to_sections(self, test_items: list) -> list:
         """Transform test items to PRABAGARAN sections format"""
         sections = []
@@ -2102,7 +2114,7 @@ class PDFReportGenerator:
             # Transform test data to PRABAGARAN format
             test_row = {
                 'INVESTIGATION / METHOD': test.get('test_name', 'N/A'),
-                'RESULT': test.get('result_value', 'Pending'),
+                'RESULT': self._result_text(test),
                 'UNITS': test_master_data.get('unit', test.get('result_unit', '')),
                 'BIOLOGICAL REFERENCE INTERVAL': test_master_data.get('referenceRange', test.get('reference_range', ''))
             }
@@ -2120,6 +2132,26 @@ class PDFReportGenerator:
 
         return sections
 
+    def _cumulative_sections(self, cumulative: Optional[Dict]) -> list:
+        """Cumulative results section (see PatientResultHistory.cumulative_table), one column per report"""
+        if not cumulative or not cumulative.get('rows'):
+            return []
+
+        report_columns = [f"{column['date']}<br/>{column['sid_number'] or ''}" for column in cumulative['columns']]
+        rows = []
+        for row in cumulative['rows']:
+            table_row = {'INVESTIGATION': row['test_name'], 'UNITS': row['unit']}
+            table_row.update(zip(report_columns, row['values']))
+            rows.append(table_row)
+
+        value_width = 300 / len(report_columns)
+        return [{
+            'name': 'CUMULATIVE RESULTS',
+            'columns': ['INVESTIGATION', 'UNITS'] + report_columns,
+            'rows': rows,
+            'colWidths': [130, 50] + [value_width] * len(report_columns)
+        }]
+
     def _generate_prabagaran_notes(self, test_items: list) -> list:
         """Generate clinical notes for PRABAGARAN format"""
         notes = []
@@ -2140,29 +2172,18 @@ class PDFReportGenerator:
         return notes
 
     def _load_signature_image(self) -> Optional[Image]:
-        """Load signature image from public folder"""
+        """Signature image from the public folder (file contents cached in pdf_assets)"""
         try:
-            # Get the path to the signature image in the public folder
-            # Assuming the backend is running from the root directory
-            signature_path = os.path.join('public', 'signature.jpeg')
-
-            if os.path.exists(signature_path):
-                # Create ReportLab Image with appropriate size
-                signature_img = Image(signature_path, width=2*inch, height=0.75*inch)
-                return signature_img
-            else:
-                logger.warning(f"Signature image not found at: {signature_path}")
-                return None
+            return pdf_assets.signature_image(2*inch, 0.75*inch)
         except Exception as e:
             logger.error(f"Error loading signature image: {str(e)}")
             return None
 
     def _generate_prabagaran_lab_report(self, data: Dict, story: list):
         """Generate lab report using the ChatGPT PRABAGARAN structure"""
-        styles = getSampleStyleSheet()
-        normal = styles['Normal']
-        header_style = ParagraphStyle('header', parent=styles['Heading2'], alignment=1, fontSize=14)
-        subheader_style = ParagraphStyle('subheader', parent=styles['Heading3'], fontSize=10)
+        normal = pdf_assets.sample_styles()['Normal']
+        header_style = pdf_assets.paragraph_style('header', 'Heading2', alignment=1, fontSize=14)
+        subheader_style = pdf_assets.paragraph_style('subheader', 'Heading3', fontSize=10)
 
         # Header block
         header_data = []
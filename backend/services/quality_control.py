@@ -0,0 +1,189 @@
+"""
+Quality Control
+Internal QC runs per instrument (``qc_runs.json``) judged with Westgard
+rules, and the "QC passed" check auto-verification applies to results from
+an instrument.
+
+A run is ``{instrument_id, test, level, value, target_mean, target_sd}``;
+``test`` is a test name or test_master_id (resolved to its test_master
+name, so both spellings cover the same results), or empty for a run that
+covers the whole instrument. Rules: 1-2s warns; 1-3s, 2-2s (this and the previous
+run of the level beyond 2 SD on the same side) and R-4s (levels of the same
+run more than 4 SD apart) reject.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from utils import read_data, write_data, DATA_DIR
+from .formula_engine import item_keys, test_key
+
+logger = logging.getLogger(__name__)
+
+QC_RUNS_FILE = 'qc_runs.json'
+TEST_MASTER_FILE = 'test_master.json'
+
+
+def _file_version(filename: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(os.path.join(DATA_DIR, filename))
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _parse_time(value) -> Optional[datetime]:
+    """Naive local time; timestamps with an offset are converted"""
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except (TypeError, ValueError):
+        return None
+    return parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo is not None else parsed
+
+
+def westgard(z: float, previous_z: Optional[float], other_levels_z: List[float]) -> Tuple[str, List[str]]:
+    """(status, violated rules) for a QC value ``z`` SDs from its target"""
+    violations = []
+    if abs(z) > 3:
+        violations.append('1-3s')
+    if previous_z is not None and abs(z) > 2 and abs(previous_z) > 2 and (z > 0) == (previous_z > 0):
+        violations.append('2-2s')
+    if any(abs(z - other) > 4 for other in other_levels_z):
+        violations.append('R-4s')
+    if violations:
+        return 'fail', violations
+    if abs(z) > 2:
+        return 'warning', ['1-2s']
+    return 'pass', []
+
+
+class QualityControlStore:
+    """QC runs with their Westgard status, indexed by instrument for lookups during verification"""
+
+    def __init__(self, filename: str = QC_RUNS_FILE):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._version = False
+        self._by_instrument: Dict[object, List[Dict]] = {}
+        self._test_names: Dict[int, tuple] = {}
+
+    def _refresh(self):
+        version = (_file_version(self.filename), _file_version(TEST_MASTER_FILE))
+        if version == self._version:
+            return
+        self._test_names = {
+            test.get('id'): test_key(test.get('testName'))
+            for test in (read_data(TEST_MASTER_FILE) if version[1] else [])
+            if test_key(test.get('testName')) is not None
+        }
+        by_instrument: Dict[object, List[Dict]] = {}
+        for run in (read_data(self.filename) if version[0] else []):
+            by_instrument.setdefault(str(run.get('instrument_id')), []).append(run)
+        for runs in by_instrument.values():
+            runs.sort(key=lambda run: run.get('run_at') or '')
+        self._by_instrument = by_instrument
+        self._version = version
+
+    def record_run(self, data: Dict, user_id: Optional[int] = None) -> Dict:
+        """Judge and store one QC run; raises ValueError on invalid input"""
+        try:
+            value = float(data['value'])
+            mean = float(data['target_mean'])
+            sd = float(data['target_sd'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('value, target_mean and target_sd must be numbers')
+        if sd <= 0:
+            raise ValueError('target_sd must be positive')
+        if data.get('instrument_id') is None:
+            raise ValueError('instrument_id is required')
+
+        run_time = _parse_time(data.get('run_at') or datetime.now().isoformat())
+        if run_time is None:
+            raise ValueError('run_at must be an ISO timestamp')
+        run_at = run_time.isoformat()
+        level = str(data.get('level') or '1')
+        z = (value - mean) / sd
+
+        with self._lock:
+            self._refresh()
+            key = self._canonical(test_key(data.get('test')))
+            runs = read_data(self.filename)
+            series = [r for r in runs if str(r.get('instrument_id')) == str(data['instrument_id'])
+                      and self._canonical(test_key(r.get('test'))) == key and (r.get('run_at') or '') <= run_at]
+            same_level = [r for r in series if str(r.get('level')) == level]
+            previous = max(same_level, key=lambda r: r.get('run_at') or '') if same_level else None
+            # Other levels of the same run: measured within the hour
+            other_levels = [r['z_score'] for r in series if str(r.get('level')) != level and
+                            abs((_parse_time(r.get('run_at')) - run_time).total_seconds()) <= 3600]
+            status, violations = westgard(z, previous['z_score'] if previous else None, other_levels)
+
+            run = {
+                'id': max((r.get('id', 0) for r in runs), default=0) + 1,
+                'instrument_id': data['instrument_id'],
+                'test': data.get('test'),
+                'level': level,
+                'value': value,
+                'target_mean': mean,
+                'target_sd': sd,
+                'z_score': round(z, 3),
+                'status': status,
+                'violations': violations,
+                'lot_number': data.get('lot_number', ''),
+                'run_at': run_at,
+                'created_at': datetime.now().isoformat(),
+                'created_by': user_id
+            }
+            runs.append(run)
+            write_data(self.filename, runs)
+        return run
+
+    def _canonical(self, key):
+        """A test_master_id key as its test name key, so ids and names compare equal"""
+        if key is not None and key[0] == 'id':
+            return self._test_names.get(key[1], key)
+        return key
+
+    def runs(self, instrument_id=None) -> List[Dict]:
+        with self._lock:
+            self._refresh()
+            if instrument_id is not None:
+                return list(self._by_instrument.get(str(instrument_id), []))
+            return [run for runs in self._by_instrument.values() for run in runs]
+
+    def check(self, instrument_id, test, at: Optional[datetime] = None,
+              validity_hours: float = 24) -> Tuple[bool, str]:
+        """
+        Whether QC covering ``test`` on ``instrument_id`` passed within
+        ``validity_hours`` before ``at``: the latest run of every level in
+        the window must not have failed. ``test`` is a test name or
+        test_master_id, or a report test item (matched on both).
+        """
+        at = at or datetime.now()
+        since = at - timedelta(hours=validity_hours)
+        with self._lock:
+            self._refresh()
+            references = item_keys(test) if isinstance(test, dict) else [test_key(test)]
+            keys = {self._canonical(key) for key in references if key is not None}
+            runs = self._by_instrument.get(str(instrument_id), [])
+        latest: Dict[str, Dict] = {}
+        for run in runs:
+            run_at = _parse_time(run.get('run_at'))
+            if run_at is None or not since <= run_at <= at:
+                continue
+            run_key = test_key(run.get('test'))
+            if run_key is not None and self._canonical(run_key) not in keys:
+                continue
+            latest[str(run.get('level'))] = run
+        if not latest:
+            return False, f"No QC run for instrument {instrument_id} in the last {validity_hours:g}h"
+        failed = [run for run in latest.values() if run.get('status') == 'fail']
+        if failed:
+            return False, f"QC failed on instrument {instrument_id} (level {failed[0]['level']}: " \
+                          f"{', '.join(failed[0].get('violations') or [])})"
+        return True, ''
+
+
+qc_store = QualityControlStore()
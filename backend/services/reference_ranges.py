@@ -0,0 +1,415 @@
+"""
+Reference Ranges
+Compiles free-text reference ranges ("13 - 39", "MALES : 0.7-3.6 FEMALES :
+0.3-3.5", "Upto 46", "Therapeutic Range : 4 - 12 Toxic Level : >15",
+"NEGATIVE") into bands once, and evaluates results against them in batches
+to set H/L/critical flags on report test items.
+
+Text that cannot be interpreted safely (interpretive cut-offs such as
+"Negative : <1 Positive : >=1" without a normal band, several unlabeled
+values, ...) compiles to an empty range and never produces a flag.
+"""
+
+import math
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+    NUMPY_AVAILABLE = False
+
+DAYS_PER_YEAR = 365.25
+ADULT_DAYS = 18 * DAYS_PER_YEAR
+
+_NUM = r'(\d+(?:\.\d+)?|\.\d+)'
+_AGE_UNIT = r'(?:years?|yrs?|months?|weeks?|wks?|days?)\b'
+_TOKEN = re.compile(
+    # Ages belong to band labels ("20-49 years", ">10 Years", "Upto 1 Year")
+    r'(?P<age>(?:(?:<=|>=|<|>|upto|up to|above|below|over|under)\s*)?(?:\d+(?:\.\d+)?\s*(?:-|to)\s*)?'
+    r'\d+(?:\.\d+)?\s*' + _AGE_UNIT + r')'
+    r'|(?P<range>' + _NUM + r'\s*(?:-|–|to)\s*' + _NUM + r')'
+    r'|(?P<upper>(?:<=|=<|≤|<|less\s*than|below|upto|up to|not more than)\s*' + _NUM + r')'
+    r'|(?P<lower>(?:>=|=>|≥|>|more\s*than|greater\s*than|above|over)\s*' + _NUM + r')',
+    re.IGNORECASE
+)
+_NUMBERS = re.compile(_NUM)
+_MALE = re.compile(r'\b(?:males?|men|m)\b', re.IGNORECASE)
+_FEMALE = re.compile(r'\b(?:females?|women|f)\b', re.IGNORECASE)
+
+_NORMAL_LABEL = re.compile(r'\b(?:normal|negative|non\s*reactive|non\s*immune|not detected|desirable|optimal|'
+                           r'therapeutic|sufficien\w*|acceptable|reference)\b', re.IGNORECASE)
+_CRITICAL_LABEL = re.compile(r'\b(?:toxic|critical|panic)', re.IGNORECASE)
+_INTERPRETIVE_LABEL = re.compile(r'\b(?:positive|reactive|deficien\w*|insufficien\w*|borderline|equivocal|high|low|'
+                                 r'abnormal|gr[ae]y zone|risk|immune|indeterminate|diabet\w*|near)\b', re.IGNORECASE)
+
+# Qualitative results that mean "nothing found"
+NEGATIVE_RESULTS = {'negative', 'not present', 'not detected', 'non reactive', 'nonreactive', 'absent', 'nil',
+                    'not seen', 'normal', 'none seen'}
+POSITIVE_RESULTS = {'positive', 'present', 'detected', 'reactive', 'seen'}
+
+AGE_KEYWORDS = (
+    (re.compile(r'\b(?:cord|new\s*born|newborns?|neonates?|neonatal)\b', re.IGNORECASE), (0.0, 28.0)),
+    (re.compile(r'\binfants?\b', re.IGNORECASE), (0.0, DAYS_PER_YEAR)),
+    (re.compile(r'\b(?:children|child|paediatric|pediatric|kids)\b', re.IGNORECASE), (0.0, ADULT_DAYS)),
+    (re.compile(r'\badolescen', re.IGNORECASE), (12 * DAYS_PER_YEAR, ADULT_DAYS)),
+    (re.compile(r'\badults?\b', re.IGNORECASE), (ADULT_DAYS, math.inf)),
+)
+
+
+@dataclass
+class Band:
+    """One numeric interval of a reference range, optionally for a sex/age group"""
+    low: float = -math.inf
+    high: float = math.inf
+    low_inclusive: bool = True
+    high_inclusive: bool = True
+    sex: Optional[str] = None
+    age_days: Optional[Tuple[float, float]] = None
+    role: str = 'plain'  # plain | normal | critical | interpretive | other
+    label: str = ''
+
+    def contains_age(self, age_days: Optional[float]) -> bool:
+        if self.age_days is None:
+            return True
+        if age_days is None:
+            return False
+        return self.age_days[0] <= age_days <= self.age_days[1]
+
+
+@dataclass
+class CompiledRange:
+    """Bands parsed from one reference range definition"""
+    text: str
+    bands: List[Band] = field(default_factory=list)
+    normal_text: Optional[str] = None
+    critical_low: Optional[float] = None
+    critical_high: Optional[float] = None
+
+    @property
+    def numeric(self) -> bool:
+        return bool(self.bands)
+
+    def select(self, sex: Optional[str], age_days: Optional[float]) -> Optional[Band]:
+        """Normal band for a patient; None when no band applies unambiguously"""
+        roles = {b.role for b in self.bands}
+        if 'normal' in roles:
+            candidates = [b for b in self.bands if b.role == 'normal']
+        elif 'interpretive' in roles:
+            return None  # only cut-offs between interpretations, nothing is "normal"
+        else:
+            candidates = [b for b in self.bands if b.role in ('plain', 'other')]
+        candidates = [b for b in candidates
+                      if (b.sex is None or b.sex == sex) and b.contains_age(age_days)]
+        if not candidates:
+            return None
+
+        best = max((b.sex is not None) + (b.age_days is not None) for b in candidates)
+        candidates = [b for b in candidates if (b.sex is not None) + (b.age_days is not None) == best]
+        if len(candidates) == 1:
+            return candidates[0]
+
+        # Several bands apply (cycle phases, AM/PM, ...): flag only outside all of them
+        low = min(candidates, key=lambda b: b.low)
+        high = max(candidates, key=lambda b: b.high)
+        return Band(low.low, high.high, low.low_inclusive, high.high_inclusive, sex, None, 'normal', 'combined')
+
+    def critical_limits(self, sex: Optional[str], age_days: Optional[float]) -> Tuple[float, float]:
+        critical_low = self.critical_low if self.critical_low is not None else -math.inf
+        critical_high = self.critical_high if self.critical_high is not None else math.inf
+        for band in self.bands:
+            if band.role != 'critical' or not ((band.sex is None or band.sex == sex) and band.contains_age(age_days)):
+                continue
+            if band.high == math.inf and self.critical_high is None:
+                critical_high = min(critical_high, band.low)
+            elif band.low == -math.inf and self.critical_low is None:
+                critical_low = max(critical_low, band.high)
+        return critical_low, critical_high
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    text = str(value).strip().replace(',', '')
+    try:
+        number = float(text)
+        return number if math.isfinite(number) else None
+    except ValueError:
+        pass
+    match = re.match(r'^(?:<=|>=|<|>)?\s*(-?\d+(?:\.\d+)?|-?\.\d+)$', text)
+    return float(match.group(1)) if match else None
+
+
+def _age_days(text: str) -> Optional[Tuple[float, float]]:
+    """Age interval in days from a label such as '20-49 years', '>10 Years', 'Adult'"""
+    match = _TOKEN.search(text)
+    if match and match.group('age'):
+        age = match.group('age').lower()
+        unit = re.search(_AGE_UNIT, age, re.IGNORECASE).group(0)
+        scale = {'y': DAYS_PER_YEAR, 'm': DAYS_PER_YEAR / 12, 'w': 7.0, 'd': 1.0}[unit[0]]
+        numbers = [float(n) * scale for n in _NUMBERS.findall(age)]
+        if re.match(r'(?:>=|>|above|over)', age):
+            return (numbers[0], math.inf)
+        if re.match(r'(?:<=|<|upto|up to|below|under)', age):
+            return (0.0, numbers[0])
+        if len(numbers) == 2:
+            # "1 - 5 Years" covers up to the end of the 5th year
+            return (numbers[0], numbers[1] + scale - 1)
+        return (numbers[0], numbers[0] + scale - 1)
+
+    day = re.search(r'\bday\s*(\d+)\b', text, re.IGNORECASE)
+    if day:
+        return (float(day.group(1)), float(day.group(1)))
+    for pattern, interval in AGE_KEYWORDS:
+        if pattern.search(text):
+            return interval
+    return None
+
+
+def _sex(text: str) -> Optional[str]:
+    male, female = _MALE.search(text), _FEMALE.search(text)
+    if male and not female:
+        return 'M'
+    if female and not male:
+        return 'F'
+    return None
+
+
+def _role(label: str) -> str:
+    lowered = label.lower()
+    if _CRITICAL_LABEL.search(lowered):
+        return 'critical'
+    # "Non Reactive" is normal even though "Reactive" is interpretive
+    if _INTERPRETIVE_LABEL.search(_NORMAL_LABEL.sub(' ', lowered)):
+        return 'interpretive'
+    if _NORMAL_LABEL.search(lowered):
+        return 'normal'
+    # What is left once sex and age words are removed decides whether the label is just a partition
+    rest = _TOKEN.sub(' ', lowered)
+    rest = re.sub(r'\b(?:males?|females?|men|women|m|f|adults?|children|child|infants?|cord|new\s*born|newborns?|'
+                  r'neonates?|adolescents?|paediatric|pediatric|day|and|blood|age|gender|dependent)\b', ' ', rest)
+    return 'plain' if not re.sub(r'[^a-z]', '', rest) else 'other'
+
+
+def _band(kind: str, token: str) -> Band:
+    numbers = [float(n) for n in _NUMBERS.findall(token)]
+    if kind == 'range':
+        return Band(low=min(numbers), high=max(numbers))
+    lowered = token.lower()
+    if kind == 'upper':
+        inclusive = not (lowered.startswith('<') and not lowered.startswith('<=')) and 'less than' not in lowered \
+            and 'below' not in lowered
+        return Band(high=numbers[0], high_inclusive=inclusive)
+    inclusive = lowered.startswith('>=') or lowered.startswith('=>') or lowered.startswith('≥')
+    return Band(low=numbers[0], low_inclusive=inclusive)
+
+
+def compile_range(text: Optional[str], critical_low=None, critical_high=None) -> CompiledRange:
+    """Parse a reference range string (plus explicit critical limits) into bands"""
+    normalized = re.sub(r'\s+', ' ', str(text or '')).strip()
+    compiled = CompiledRange(text=normalized, critical_low=_to_float(critical_low),
+                             critical_high=_to_float(critical_high))
+    if not normalized:
+        return compiled
+
+    values = [m for m in _TOKEN.finditer(normalized) if not m.group('age')]
+    if not values:
+        lowered = normalized.lower().strip(' .')
+        normal = next((phrase for phrase in sorted(NEGATIVE_RESULTS, key=len, reverse=True)
+                       if lowered.startswith(phrase)), None)
+        compiled.normal_text = normal
+        return compiled
+
+    has_labels = ':' in normalized
+    if len(values) > 1 and not has_labels:
+        return compiled  # "<1.0 Negative >1.0 Positive": cannot tell which value is normal
+
+    # "label : value" is the usual layout; "value : label" when the first value is followed by a colon
+    reversed_layout = normalized[values[0].end():].lstrip().startswith(':')
+    bands = []
+    current_sex = None
+    for position, match in enumerate(values):
+        if reversed_layout:
+            end = values[position + 1].start() if position + 1 < len(values) else len(normalized)
+            label = normalized[match.end():end].strip(' :-')
+        else:
+            start = values[position - 1].end() if position else 0
+            label = normalized[start:match.start()].strip(' :-')
+
+        band = _band(match.lastgroup, match.group(0))
+        band.label = label
+        band.role = _role(label) if label else 'plain'
+        band.age_days = _age_days(label) if label else None
+        sex = _sex(label) if label else None
+        # A sex heading ("FEMALE Follicular Phase") carries over to the bands after it, "10-12yrs (F)" does not
+        if sex and not re.search(r'\(\s*(?:m|f)\s*\)', label, re.IGNORECASE):
+            current_sex = sex
+        band.sex = sex or current_sex
+        bands.append(band)
+
+    compiled.bands = bands
+    return compiled
+
+
+def patient_demographics(patient_info: Optional[Dict], on: Optional[date] = None) -> Tuple[Optional[str], Optional[float]]:
+    """(sex 'M'/'F', age in days) from a report's patient_info"""
+    patient_info = patient_info or {}
+    gender = str(patient_info.get('gender') or '').strip().lower()
+    sex = 'M' if gender in ('male', 'm') else 'F' if gender in ('female', 'f') else None
+
+    on = on or date.today()
+    age_days = None
+    dob = patient_info.get('date_of_birth')
+    if dob:
+        try:
+            age_days = float((on - datetime.strptime(str(dob)[:10], '%Y-%m-%d').date()).days)
+        except ValueError:
+            age_days = None
+    if age_days is None:
+        years = _to_float(patient_info.get('age'))
+        age_days = years * DAYS_PER_YEAR if years is not None else None
+    return sex, age_days
+
+
+class ReferenceRangeEngine:
+    """
+    Evaluates test results against compiled reference ranges.
+
+    Definitions are compiled once per version, i.e. per distinct
+    (test_master_id, reference text, critical limits), so editing a range
+    in the master data compiles a new entry while unchanged tests hit the
+    cache. ``evaluate`` resolves each result to its band in Python and does
+    the comparisons for the whole batch as array operations.
+    """
+
+    MAX_CACHE = 20000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compiled: Dict[Tuple, CompiledRange] = {}
+
+    def compiled_for(self, definition: Dict) -> CompiledRange:
+        """Compiled range for a test item or test master entry"""
+        key = (
+            definition.get('test_master_id', definition.get('id')),
+            definition.get('reference_range', definition.get('referenceRange')),
+            definition.get('critical_low'),
+            definition.get('critical_high')
+        )
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+        with self._lock:
+            if len(self._compiled) >= self.MAX_CACHE:
+                self._compiled.clear()
+            compiled = self._compiled[key] = compile_range(key[1], key[2], key[3])
+            return compiled
+
+    @staticmethod
+    def _qualitative_flag(result: str, compiled: CompiledRange) -> Optional[str]:
+        value = re.sub(r'\s+', ' ', result.strip().lower()).strip(' .')
+        if not value or compiled.normal_text is None:
+            return None
+        if value in NEGATIVE_RESULTS:
+            return ''
+        if value in POSITIVE_RESULTS or value.split(' ')[0] in POSITIVE_RESULTS:
+            return 'A'
+        return None
+
+    def evaluate(self, entries: List[Tuple[object, Dict, Optional[str], Optional[float]]]) -> List[Tuple[Optional[str], bool]]:
+        """
+        Flags for ``(result, definition, sex, age_days)`` entries, as
+        ``(flag, is_critical)`` with flag '', 'L', 'H', 'LL', 'HH', 'A' or
+        None (result or range not interpretable).
+        """
+        outcomes: List[Tuple[Optional[str], bool]] = [(None, False)] * len(entries)
+        numeric_rows = []
+        limits = {}  # (compiled range, sex, age) -> band limits, shared by a patient's tests
+        for position, (result, definition, sex, age_days) in enumerate(entries):
+            if result is None or str(result).strip() == '':
+                continue
+            compiled = self.compiled_for(definition)
+            value = _to_float(result)
+            if value is None:
+                flag = self._qualitative_flag(str(result), compiled)
+                outcomes[position] = (flag, False)
+                continue
+            key = (id(compiled), sex, age_days)
+            if key not in limits:
+                band = compiled.select(sex, age_days)
+                critical_low, critical_high = compiled.critical_limits(sex, age_days)
+                if band is None and critical_low == -math.inf and critical_high == math.inf:
+                    limits[key] = None
+                else:
+                    band = band or Band()
+                    limits[key] = (band.low, band.high, band.low_inclusive, band.high_inclusive,
+                                   critical_low, critical_high)
+            if limits[key] is not None:
+                numeric_rows.append((position, value) + limits[key])
+
+        if not numeric_rows:
+            return outcomes
+
+        if NUMPY_AVAILABLE:
+            columns = list(zip(*numeric_rows))
+            positions = columns[0]
+            value, low, high = (np.array(columns[i], dtype=np.float64) for i in (1, 2, 3))
+            low_inclusive, high_inclusive = (np.array(columns[i], dtype=bool) for i in (4, 5))
+            critical_low, critical_high = (np.array(columns[i], dtype=np.float64) for i in (6, 7))
+
+            below = (value < low) | (~low_inclusive & (value == low))
+            above = (value > high) | (~high_inclusive & (value == high))
+            critical_below = value < critical_low
+            critical_above = value > critical_high
+            flags = np.select([critical_below, critical_above, below, above], ['LL', 'HH', 'L', 'H'], default='')
+            critical = critical_below | critical_above
+            for position, flag, is_critical in zip(positions, flags.tolist(), critical.tolist()):
+                outcomes[position] = (flag, is_critical)
+            return outcomes
+
+        for position, value, low, high, low_inclusive, high_inclusive, critical_low, critical_high in numeric_rows:
+            if value < critical_low:
+                outcomes[position] = ('LL', True)
+            elif value > critical_high:
+                outcomes[position] = ('HH', True)
+            elif value < low or (not low_inclusive and value == low):
+                outcomes[position] = ('L', False)
+            elif value > high or (not high_inclusive and value == high):
+                outcomes[position] = ('H', False)
+            else:
+                outcomes[position] = ('', False)
+        return outcomes
+
+    def flag_items(self, items: Iterable[Tuple[Dict, Dict]]) -> List[Tuple[Dict, Dict]]:
+        """
+        Set ``abnormal_flag``/``is_critical`` on ``(report, test_item)``
+        pairs in one batch; returns the pairs that are critical.
+        """
+        items = list(items)
+        demographics = {}
+        entries = []
+        for report, item in items:
+            key = id(report)
+            if key not in demographics:
+                demographics[key] = patient_demographics(report.get('patient_info'))
+            sex, age_days = demographics[key]
+            result = item.get('result_value', item.get('result'))
+            entries.append((result, item, sex, age_days))
+
+        critical = []
+        for (report, item), (flag, is_critical) in zip(items, self.evaluate(entries)):
+            item['abnormal_flag'] = flag or None
+            item['is_critical'] = is_critical
+            if is_critical:
+                critical.append((report, item))
+        return critical
+
+
+reference_engine = ReferenceRangeEngine()
@@ -0,0 +1,110 @@
+"""
+Report PDF Cache
+Rendered PDFs kept on disk, keyed by a hash of the document content so any
+change (results, authorization, patient details) renders a fresh PDF.
+``PdfCache`` is shared by the billing report and invoice PDFs.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, Optional
+import logging
+
+from utils import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class PdfCache:
+    """
+    Rendered PDFs on disk named ``<prefix><content hash>.pdf``, where the
+    prefix identifies the document (so older versions can be dropped) and
+    the hash covers everything that was rendered. ``get_or_render`` serves a
+    cached PDF when the document has not changed since it was rendered;
+    ``render`` always renders and replaces older versions. Subclasses
+    provide ``_prefix`` and ``_render_pdf``.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+
+    def _prefix(self, document: Dict) -> str:
+        raise NotImplementedError
+
+    def _render_pdf(self, document: Dict) -> bytes:
+        raise NotImplementedError
+
+    @staticmethod
+    def fingerprint(document: Dict) -> str:
+        content = json.dumps(document, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha1(content).hexdigest()[:16]
+
+    def path(self, document: Dict) -> str:
+        return os.path.join(self.cache_dir, f"{self._prefix(document)}{self.fingerprint(document)}.pdf")
+
+    def get(self, document: Dict) -> Optional[bytes]:
+        try:
+            with open(self.path(document), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, document: Dict, pdf_content: bytes) -> str:
+        """Save a PDF rendered elsewhere (e.g. a worker process), dropping older versions"""
+        path = self.path(document)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(pdf_content)
+        os.replace(temp_path, path)
+
+        prefix = self._prefix(document)
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name.endswith('.pdf') and os.path.join(self.cache_dir, name) != path:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError as e:
+                    logger.warning(f"Could not remove stale PDF {name}: {e}")
+        return path
+
+    def render(self, document: Dict) -> bytes:
+        """Render the document and store it, dropping PDFs of earlier versions"""
+        with self._lock:
+            pdf_content = self._render_pdf(document)
+        self.store(document, pdf_content)
+        return pdf_content
+
+    def get_or_render(self, document: Dict) -> bytes:
+        cached = self.get(document)
+        if cached is not None:
+            return cached
+        return self.render(document)
+
+
+class ReportPdfCache(PdfCache):
+    """Billing report PDFs (PRABAGARAN format)"""
+
+    def __init__(self, cache_dir: str):
+        super().__init__(cache_dir)
+        self._generator = None
+
+    def _pdf_generator(self):
+        # Imported lazily: reportlab is heavy and only needed once something renders
+        if self._generator is None:
+            from .pdf_report_generator import PDFReportGenerator
+            self._generator = PDFReportGenerator()
+        return self._generator
+
+    def _prefix(self, report: Dict) -> str:
+        sid = re.sub(r'[^A-Za-z0-9_-]', '_', str(report.get('sid_number') or 'report'))
+        return f"{sid}-{report.get('id')}-"
+
+    def _render_pdf(self, report: Dict) -> bytes:
+        return self._pdf_generator().generate_prabagaran_format_pdf(report)
+
+
+report_pdf_cache = ReportPdfCache(os.path.join(DATA_DIR, 'report_pdfs'))
@@ -0,0 +1,134 @@
+"""
+Report Side Effects
+Work that follows report authorization but need not hold up the request:
+audit events, PDF pre-rendering and patient WhatsApp notifications. It runs
+as a background job (see services.background_jobs), so its outcome can be
+followed at /api/jobs/<id>.
+"""
+
+import copy
+from typing import Dict, List
+import logging
+
+from utils import read_data, DATA_DIR
+from whatsapp_service import WhatsAppService
+from .audit_service import AuditService, AuditEventType
+from .background_jobs import job_manager, Job
+from .billing_reports_service import BillingReportsService
+from .report_pdf_cache import report_pdf_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_TEMPLATE = 'Your test results from AVINI LABS are ready. Patient: {patient_name}.'
+
+
+def _patient_name(report: Dict) -> str:
+    patient_info = report.get('patient_info') or {}
+    return patient_info.get('full_name') or \
+        f"{patient_info.get('first_name', '')} {patient_info.get('last_name', '')}".strip()
+
+
+def _queue_notifications(reports: List[Dict], user: Dict) -> Dict:
+    """Queue one WhatsApp message per report for tenants with WhatsApp enabled"""
+    tenants = {t.get('id'): t for t in read_data('tenants.json')}
+    by_tenant: Dict[int, List[Dict]] = {}
+    for report in reports:
+        by_tenant.setdefault(report.get('tenant_id'), []).append(report)
+
+    queued = 0
+    skipped = []
+    for tenant_id, tenant_reports in by_tenant.items():
+        config = WhatsAppService.get_config(tenant_id)
+        if not config or not config.get('is_enabled', False) or tenant_id not in tenants:
+            skipped.extend({'sid_number': r.get('sid_number'), 'reason': 'WhatsApp not enabled for tenant'}
+                           for r in tenant_reports)
+            continue
+
+        template = config.get('default_report_template') or DEFAULT_REPORT_TEMPLATE
+        outgoing = []
+        for report in tenant_reports:
+            phone_number = (report.get('patient_info') or {}).get('mobile')
+            if not phone_number:
+                skipped.append({'sid_number': report.get('sid_number'), 'reason': 'No patient mobile number'})
+                continue
+            patient_name = _patient_name(report)
+            try:
+                body = template.format(patient_name=patient_name, sid_number=report.get('sid_number', ''))
+            except (KeyError, IndexError, ValueError):
+                body = template
+            outgoing.append({
+                'recipient_number': phone_number,
+                'message_content': WhatsAppService.format_message_with_headers(
+                    user, tenants[tenant_id], patient_name, body
+                ),
+                'message_type': 'report',
+                'billing_id': report.get('billing_id')
+            })
+        if outgoing:
+            queued += len(WhatsAppService.send_bulk(user.get('id'), tenant_id, outgoing))
+
+    return {'queued': queued, 'skipped': skipped}
+
+
+def queue_authorization_side_effects(reports: List[Dict], authorization_data: Dict, user: Dict,
+                                     notify_patients: bool = False, render_pdfs: bool = True) -> Dict:
+    """
+    Submit the follow-up work for authorized/rejected reports as one
+    background job and return the job record. PDFs and notifications only
+    apply to approvals.
+    """
+    reports = copy.deepcopy(reports)
+    action = authorization_data.get('action', 'approve')
+    approved = action == 'approve'
+
+    def run(job: Job) -> Dict:
+        audit_service = AuditService(DATA_DIR)
+        total = len(reports) * (2 if approved and render_pdfs else 1)
+        processed = 0
+
+        for report in reports:
+            audit_service.log_audit_event(
+                event_type=AuditEventType.REPORT_AUTHORIZATION,
+                user_id=user.get('id'),
+                tenant_id=report.get('tenant_id'),
+                details=dict(BillingReportsService.authorization_audit_details(report, authorization_data), bulk=True),
+                success=True
+            )
+            processed += 1
+        job.progress(processed, total, 'Audit events logged')
+
+        rendered = 0
+        pdf_failures = []
+        if approved and render_pdfs:
+            for report in reports:
+                try:
+                    report_pdf_cache.render(report)
+                    rendered += 1
+                except Exception as e:
+                    logger.error(f"Failed to pre-render PDF for SID {report.get('sid_number')}: {e}")
+                    pdf_failures.append({'sid_number': report.get('sid_number'), 'error': str(e)})
+                processed += 1
+                if processed % 10 == 0:
+                    job.progress(processed, total, 'Rendering PDFs')
+
+        notifications = {'queued': 0, 'skipped': []}
+        if approved and notify_patients:
+            notifications = _queue_notifications(reports, user)
+
+        job.progress(total, total, 'Done')
+        return {
+            'audited': len(reports),
+            'pdfs_rendered': rendered,
+            'pdf_failures': pdf_failures,
+            'notifications_queued': notifications['queued'],
+            'notifications_skipped': notifications['skipped']
+        }
+
+    return job_manager.submit(
+        'report_authorization',
+        run,
+        params={'action': action, 'reports': len(reports), 'notify_patients': notify_patients,
+                'render_pdfs': render_pdfs and approved},
+        user_id=user.get('id'),
+        tenant_id=user.get('tenant_id')
+    )
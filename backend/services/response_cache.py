@@ -0,0 +1,139 @@
+"""
+Response Cache
+Caches serialised (and pre-gzipped) GET responses keyed by the version of the
+data files they are built from, with strong ETags and conditional GET support.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import request, make_response, Response
+
+from utils import DATA_DIR
+
+
+class CachedResponse:
+    """A serialised 200 response plus its gzip encoding and their ETags"""
+
+    __slots__ = ('version', 'body', 'gzip_body', 'etag', 'gzip_etag', 'mimetype')
+
+    def __init__(self, version: Tuple, body: bytes, mimetype: str, min_gzip_size: int):
+        self.version = version
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.gzip_body = gzip.compress(body, compresslevel=6) if len(body) >= min_gzip_size else None
+        # A strong ETag names one byte representation, so the gzip body gets its own
+        self.gzip_etag = f"{self.etag}-gz"
+
+    def to_response(self) -> Response:
+        use_gzip = self.gzip_body is not None and 'gzip' in request.accept_encodings
+        etag = self.gzip_etag if use_gzip else self.etag
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        elif use_gzip:
+            response = Response(self.gzip_body, mimetype=self.mimetype)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(self.body, mimetype=self.mimetype)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of GET responses.
+
+    An entry is valid for one *version* of its data files: the mtime/size of
+    each file plus a generation counter that write handlers bump through
+    ``invalidate`` (so writes landing within the same mtime tick are seen).
+    """
+
+    def __init__(self, max_entries: int = 128, min_gzip_size: int = 1024):
+        self.max_entries = max_entries
+        self.min_gzip_size = min_gzip_size
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple, CachedResponse]' = OrderedDict()
+        self._generations: Dict[str, int] = {}
+
+    def version(self, filenames: Iterable[str]) -> Tuple:
+        """Current version of a set of data files"""
+        version = []
+        for filename in filenames:
+            try:
+                stat = os.stat(os.path.join(DATA_DIR, filename))
+                file_version = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                file_version = None
+            version.append((filename, file_version, self._generations.get(filename, 0)))
+        return tuple(version)
+
+    def invalidate(self, *filenames: str):
+        """Mark data files as changed; call after writing them"""
+        with self._lock:
+            for filename in filenames:
+                self._generations[filename] = self._generations.get(filename, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key: Tuple, version: Tuple) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def store(self, key: Tuple, version: Tuple, body: bytes, mimetype: str) -> CachedResponse:
+        entry = CachedResponse(version, body, mimetype, self.min_gzip_size)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(*filenames: str, vary_on_role: bool = True):
+    """
+    Cache a GET view's successful JSON response until one of ``filenames``
+    (paths relative to the data directory) changes.
+
+    Place it below ``token_required``. The cache key includes the view
+    arguments and query string, and by default the user's role, so views that
+    check roles themselves never serve a cached body to a role they would
+    reject (only 200 responses are cached).
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            current_user = getattr(request, 'current_user', None) or {}
+            key = (
+                f.__module__, f.__name__,
+                tuple(sorted(kwargs.items())),
+                request.query_string,
+                current_user.get('role') if vary_on_role else None
+            )
+            version = response_cache.version(filenames)
+
+            entry = response_cache.get(key, version)
+            if entry is None:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or not response.is_json or response.direct_passthrough:
+                    return response
+                entry = response_cache.store(key, version, response.get_data(), response.mimetype)
+            return entry.to_response()
+        return wrapper
+    return decorator
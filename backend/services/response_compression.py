@@ -0,0 +1,197 @@
+"""
+Response Compression
+Negotiated gzip/brotli compression of text and JSON responses, with a size
+threshold, streaming compression for large bodies and a cache of compressed
+bodies for responses that carry a strong ETag.
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+from flask import request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/css',
+    'text/csv',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+    'text/xml',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ResponseCompressor:
+    """
+    Flask extension compressing responses after the view has run.
+
+    - only ``COMPRESSIBLE_MIMETYPES``, never file downloads
+      (``direct_passthrough``), already-encoded bodies or 204/206/304 responses
+    - bodies smaller than ``min_size`` are sent as is
+    - ``br`` is preferred when the ``brotli`` package is installed and the
+      client accepts it, otherwise ``gzip``
+    - bodies of ``stream_threshold`` bytes or more, and streamed responses, are
+      compressed chunk by chunk while being sent, so the first bytes go out
+      without waiting for the whole body to be compressed
+    - compressed bodies of responses with a strong ETag are kept in a small
+      LRU cache keyed by (ETag, encoding), and the ETag sent with a
+      compressed body is marked weak
+    """
+
+    def __init__(self, app=None, min_size: int = 1024, stream_threshold: int = 256 * 1024,
+                 gzip_level: int = 6, brotli_quality: int = 5, cache_entries: int = 64):
+        self.min_size = min_size
+        self.stream_threshold = stream_threshold
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_entries = cache_entries
+        self._cache: 'OrderedDict[tuple, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.compress_response)
+
+    # ------------------------------------------------------------------
+    # Negotiation
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def choose_encoding() -> Optional[str]:
+        accept = request.accept_encodings
+        if BROTLI_AVAILABLE and accept['br'] > 0:
+            return 'br'
+        if accept['gzip'] > 0:
+            return 'gzip'
+        return None
+
+    def _should_compress(self, response) -> bool:
+        if request.method == 'HEAD':
+            return False
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        return response.mimetype in COMPRESSIBLE_MIMETYPES
+
+    # ------------------------------------------------------------------
+    # Compression
+    # ------------------------------------------------------------------
+
+    def _compressor(self, encoding: str):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.finish
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        process, finish = self._compressor(encoding)
+        return process(body) + finish()
+
+    def _stream(self, chunks: Iterable[bytes], encoding: str, cache_key: Optional[tuple] = None,
+                close=None) -> Iterator[bytes]:
+        process, finish = self._compressor(encoding)
+        collected = [] if cache_key else None
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = process(chunk)
+                if data:
+                    if collected is not None:
+                        collected.append(data)
+                    yield data
+            data = finish()
+            if collected is not None:
+                collected.append(data)
+                self._cache_put(cache_key, b''.join(collected))
+            yield data
+        finally:
+            if close is not None:
+                close()
+
+    @staticmethod
+    def _split(body: bytes) -> Iterator[bytes]:
+        for start in range(0, len(body), CHUNK_SIZE):
+            yield body[start:start + CHUNK_SIZE]
+
+    def _cache_get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+            return body
+
+    def _cache_put(self, key: tuple, body: bytes):
+        with self._lock:
+            self._cache[key] = body
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def compress_response(self, response):
+        if not self._should_compress(response):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoding,
+                                             close=getattr(response.response, 'close', None))
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = encoding
+            self._weaken_etag(response)
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        cache_key = (etag, encoding) if etag and not weak else None
+        cached = self._cache_get(cache_key) if cache_key else None
+
+        if cached is not None:
+            response.set_data(cached)
+        elif len(body) >= self.stream_threshold:
+            response.response = self._stream(self._split(body), encoding, cache_key)
+            response.headers.pop('Content-Length', None)
+        else:
+            compressed = self.compress(body, encoding)
+            if cache_key:
+                self._cache_put(cache_key, compressed)
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        self._weaken_etag(response)
+        return response
+
+    @staticmethod
+    def _weaken_etag(response):
+        """
+        A strong ETag names one byte representation, and the compressed body
+        is a different one: keep the tag's value (report revisions are read
+        back from it) but mark it weak.
+        """
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
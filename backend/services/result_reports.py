@@ -0,0 +1,158 @@
+"""
+Result Reports
+Patient reports derived from ``results.json``: one report per tenant, patient
+and result date, built in a single pass over the results with hash lookups
+into samples and patients, partitioned by tenant and cached until the
+underlying files change.
+"""
+
+import bisect
+import heapq
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils import read_data, DATA_DIR, get_accessible_tenant_ids
+
+
+class _TenantReports:
+    """Reports of one tenant in ascending (report_date, id) order"""
+
+    __slots__ = ('reports', 'dates', 'search_text')
+
+    def __init__(self, reports: List[Dict]):
+        self.reports = sorted(reports, key=lambda r: (r['report_date'], r['id']))
+        self.dates = [r['report_date'] for r in self.reports]
+        self.search_text = [
+            f"{r['report_number']} {r['patient'].get('first_name') or ''} {r['patient'].get('last_name') or ''}".lower()
+            for r in self.reports
+        ]
+
+    def between(self, start_date: Optional[str], end_date: Optional[str]) -> range:
+        low = bisect.bisect_left(self.dates, start_date) if start_date else 0
+        high = bisect.bisect_right(self.dates, end_date) if end_date else len(self.dates)
+        return range(low, high)
+
+
+class ResultReportIndex:
+    """
+    Reports over results -> samples -> patients.
+
+    A result belongs to the report of its sample's tenant and patient on the
+    day of its ``result_date``; results whose sample or patient no longer
+    exists are left out. Report ids follow the order in which reports first
+    appear in ``results.json`` (their lowest result id), so they stay stable
+    as new results arrive.
+
+    The index is rebuilt when the mtime/size of any of the three files
+    changes, or after ``invalidate`` (which the result routes call on
+    create/update/verify, so writes within one mtime tick are not missed).
+    """
+
+    FILENAMES = ('results.json', 'samples.json', 'patients.json')
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._partitions: Dict[object, _TenantReports] = {}
+        self._version: Optional[Tuple] = None
+        self._generation = 0
+
+    def _current_version(self) -> Tuple:
+        version = []
+        for filename in self.FILENAMES:
+            try:
+                stat = os.stat(os.path.join(DATA_DIR, filename))
+                version.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version) + (self._generation,)
+
+    def invalidate(self):
+        """Drop the cached reports; call after writing results"""
+        with self._lock:
+            self._generation += 1
+
+    def _ensure_fresh(self):
+        version = self._current_version()
+        if version != self._version:
+            self.rebuild(version)
+
+    def _load(self, filename: str) -> List[Dict]:
+        return read_data(filename) if os.path.exists(os.path.join(DATA_DIR, filename)) else []
+
+    def rebuild(self, version: Optional[Tuple] = None):
+        with self._lock:
+            version = version or self._current_version()
+            samples_by_id = {s.get('id'): s for s in self._load('samples.json')}
+            patients_by_id = {p.get('id'): p for p in self._load('patients.json')}
+
+            groups: Dict[Tuple, List[Dict]] = {}
+            for result in self._load('results.json'):
+                sample = samples_by_id.get(result.get('sample_id'))
+                if not sample or sample.get('patient_id') not in patients_by_id:
+                    continue
+                date = str(result.get('result_date') or '').split('T')[0]
+                groups.setdefault((sample.get('tenant_id'), sample['patient_id'], date), []).append(result)
+
+            by_tenant: Dict[object, List[Dict]] = {}
+            ordered = sorted(groups.items(), key=lambda group: min(r.get('id') or 0 for r in group[1]))
+            for report_id, ((tenant_id, patient_id, date), results) in enumerate(ordered, start=1):
+                by_tenant.setdefault(tenant_id, []).append(
+                    self._report(report_id, tenant_id, patients_by_id[patient_id], date, results)
+                )
+
+            self._partitions = {tenant_id: _TenantReports(reports) for tenant_id, reports in by_tenant.items()}
+            self._version = version
+
+    @staticmethod
+    def _report(report_id: int, tenant_id, patient: Dict, date: str, results: List[Dict]) -> Dict:
+        verified = sum(1 for r in results if r.get('status') == 'Verified')
+        created = [r.get('created_at') for r in results if r.get('created_at')]
+        updated = [r.get('updated_at') for r in results if r.get('updated_at')]
+        return {
+            'id': report_id,
+            'report_number': f"RPT{report_id:05d}",
+            'patient': {
+                'id': patient.get('id'),
+                'first_name': patient.get('first_name'),
+                'last_name': patient.get('last_name')
+            },
+            'report_date': date,
+            'test_count': len(results),
+            'verified_count': verified,
+            'status': 'Completed' if verified == len(results) else 'Pending',
+            'result_ids': [r.get('id') for r in results],
+            'sample_ids': sorted({r.get('sample_id') for r in results}),
+            'created_at': min(created) if created else None,
+            'updated_at': max(updated) if updated else None,
+            'tenant_id': tenant_id
+        }
+
+    def query(self, current_user: Dict, tenant_id: Optional[int] = None, patient_id=None,
+              start_date: Optional[str] = None, end_date: Optional[str] = None,
+              search: str = '') -> List[Dict]:
+        """Reports the user may see, newest first"""
+        tenant_ids = get_accessible_tenant_ids(current_user, tenant_id)
+        search = (search or '').lower()
+
+        with self._lock:
+            self._ensure_fresh()
+            partitions = [
+                partition for key, partition in self._partitions.items()
+                if tenant_ids is None or key in tenant_ids
+            ]
+
+        def matches(partition: _TenantReports) -> Iterable[Dict]:
+            for position in reversed(partition.between(start_date, end_date)):
+                report = partition.reports[position]
+                if patient_id is not None and str(report['patient']['id']) != str(patient_id):
+                    continue
+                if search and search not in partition.search_text[position]:
+                    continue
+                yield report
+
+        return list(heapq.merge(*(matches(p) for p in partitions),
+                                key=lambda r: (r['report_date'], r['id']), reverse=True))
+
+
+result_reports = ResultReportIndex()
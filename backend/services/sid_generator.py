@@ -10,6 +10,7 @@ import time
 import threading
 from datetime import datetime
 from typing import Optional, Dict, List, Tuple
+import json_codec
 
 class SIDGenerator:
     """
@@ -47,8 +48,7 @@ class SIDGenerator:
     def _save_sequences(self, sequences: Dict):
         """Save SID sequences to file"""
         sequences["last_updated"] = datetime.now().isoformat()
-        with open(self.sequence_file, 'w') as f:
-            json.dump(sequences, f, indent=2)
+        json_codec.dump_file(self.sequence_file, sequences)
     
     def _load_billing_data(self) -> List[Dict]:
         """Load existing billing data to check for conflicts"""
@@ -0,0 +1,261 @@
+"""
+Test Search Service
+Typeahead search over test master, Excel test data and test profiles, backed
+by per-source in-memory indexes rebuilt only when the source files change.
+"""
+
+import bisect
+import heapq
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from utils import read_data, DATA_DIR
+
+NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+# Rank tiers, best first
+MATCH_CODE = 0
+MATCH_PREFIX = 1
+MATCH_WORD_START = 2
+MATCH_SUBSTRING = 3
+MATCH_NAMES = {
+    MATCH_CODE: 'code',
+    MATCH_PREFIX: 'prefix',
+    MATCH_WORD_START: 'word_start',
+    MATCH_SUBSTRING: 'substring',
+}
+
+
+def normalize(text) -> str:
+    """Lower-case and collapse punctuation/whitespace to single spaces"""
+    return NON_ALNUM.sub(' ', str(text or '').lower()).strip()
+
+
+def normalize_code(code) -> str:
+    """Canonical form of an HMS/test code: ``'648.0'`` -> ``'648'``, ``'001687'`` -> ``'1687'``"""
+    code = str(code or '').strip().lower()
+    if code.endswith('.0'):
+        code = code[:-2]
+    if code.isdigit():
+        code = code.lstrip('0') or '0'
+    return code
+
+
+# Field mapping for every searchable source
+SOURCES = {
+    'test_master': {
+        'files': ['test_master.json'],
+        'name': 'testName',
+        'aliases': ['displayName', 'shortName'],
+        'codes': ['hmsCode', 'internationalCode'],
+        'department': 'department',
+        'price': 'test_price',
+    },
+    'excel': {
+        'files': ['excel_test_data.json'],
+        'name': 'test_name',
+        'aliases': ['short_name'],
+        'codes': ['test_code'],
+        'department': 'department',
+        'price': 'price',
+    },
+    'profiles': {
+        'files': ['profile_master.json', 'profile_data.json'],
+        'name': 'test_profile',
+        'aliases': [],
+        'codes': ['code', 'procedure_code'],
+        'department': None,
+        'price': 'test_price',
+    },
+}
+
+
+class _SourceIndex:
+    """Immutable index over one source, valid for one version of its files"""
+
+    def __init__(self, source: str, spec: Dict, items: List[Dict], version: Tuple):
+        self.source = source
+        self.version = version
+        self.entries: List[Dict] = []
+        self.by_code: Dict[str, List[int]] = {}
+        self.by_name: Dict[str, int] = {}
+        names: List[Tuple[str, int]] = []
+        words: List[Tuple[str, int]] = []
+        codes_sorted: List[Tuple[str, int]] = []
+
+        for item in items:
+            pos = len(self.entries)
+            name = item.get(spec['name']) or ''
+            search_names = [normalize(name)] + [normalize(item.get(a)) for a in spec['aliases']]
+            search_names = list(dict.fromkeys(n for n in search_names if n))
+            codes = [item.get(c) for c in spec['codes'] if item.get(c) not in (None, '')]
+            department = item.get(spec['department']) if spec['department'] else 'PROFILE'
+
+            self.entries.append({
+                'item': item,
+                'name': name,
+                'names': search_names,
+                'code': str(codes[0]) if codes else '',
+                'department': department or '',
+                'department_key': normalize(department),
+                'price': item.get(spec['price'], 0),
+            })
+
+            for code in codes:
+                self.by_code.setdefault(normalize_code(code), []).append(pos)
+                codes_sorted.append((str(code).strip().lower(), pos))
+            self.by_name.setdefault(str(name).strip().lower(), pos)
+            for search_name in search_names:
+                names.append((search_name, pos))
+                for word in search_name.split()[1:]:
+                    words.append((word, pos))
+
+        names.sort()
+        words.sort()
+        codes_sorted.sort()
+        self._names = names
+        self._words = words
+        self._codes = codes_sorted
+
+    @staticmethod
+    def _prefix_scan(sorted_pairs: List[Tuple[str, int]], prefix: str):
+        index = bisect.bisect_left(sorted_pairs, (prefix, -1))
+        while index < len(sorted_pairs) and sorted_pairs[index][0].startswith(prefix):
+            yield sorted_pairs[index][1]
+            index += 1
+
+    def match(self, query: str, raw_query: str, code_query: str) -> Dict[int, int]:
+        """Best rank tier per matching entry position"""
+        ranks: Dict[int, int] = {}
+        for pos in self.by_code.get(code_query, ()):
+            ranks[pos] = MATCH_CODE
+        for pos in self._prefix_scan(self._codes, raw_query):
+            ranks.setdefault(pos, MATCH_PREFIX)
+        for pos in self._prefix_scan(self._names, query):
+            ranks.setdefault(pos, MATCH_PREFIX)
+        for pos in self._prefix_scan(self._words, query):
+            ranks.setdefault(pos, MATCH_WORD_START)
+        for pos, entry in enumerate(self.entries):
+            if pos not in ranks and any(query in n for n in entry['names']):
+                ranks[pos] = MATCH_SUBSTRING
+        return ranks
+
+
+class TestSearchService:
+    """
+    Ranked typeahead search for billing test selection.
+
+    Each source is indexed once per version of its files (mtime/size), so
+    per-keystroke requests never re-read or re-scan the JSON. Results are
+    ranked exact code match > name/code prefix > word start > substring, then by
+    name length and name; department facets are counted over all matches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, _SourceIndex] = {}
+
+    @staticmethod
+    def _files_version(files: List[str]) -> Tuple:
+        version = []
+        for filename in files:
+            try:
+                stat = os.stat(os.path.join(DATA_DIR, filename))
+                version.append((stat.st_mtime, stat.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    def get_index(self, source: str) -> _SourceIndex:
+        """Index for a source, rebuilt if any of its files changed"""
+        spec = SOURCES[source]
+        version = self._files_version(spec['files'])
+        index = self._indexes.get(source)
+        if index is not None and index.version == version:
+            return index
+
+        with self._lock:
+            index = self._indexes.get(source)
+            if index is not None and index.version == version:
+                return index
+            items = []
+            for filename in spec['files']:
+                try:
+                    items.extend(read_data(filename))
+                except Exception as e:
+                    print(f"Warning: Failed to load {filename} for test search: {e}")
+            index = _SourceIndex(source, spec, items, version)
+            self._indexes[source] = index
+            return index
+
+    def search(self, query: str, sources: Optional[List[str]] = None, department: Optional[str] = None,
+               limit: Optional[int] = 20, offset: int = 0) -> Dict:
+        """
+        Search tests by name or code.
+
+        Returns ``{'total', 'items', 'facets'}`` where items are the ranked
+        matches from ``offset`` to ``offset + limit`` (all of them if limit is None).
+        """
+        normalized = normalize(query)
+        raw_query = str(query or '').strip().lower()
+        code_query = normalize_code(query)
+        department_key = normalize(department) if department else ''
+        sources = sources or list(SOURCES)
+
+        matches = []
+        department_facets: Dict[str, int] = {}
+        source_facets: Dict[str, int] = {}
+        for source in sources:
+            index = self.get_index(source)
+            if normalized:
+                ranks = index.match(normalized, raw_query, code_query)
+            else:
+                # No query: browse everything (optionally one department) by name
+                ranks = dict.fromkeys(range(len(index.entries)), MATCH_SUBSTRING)
+            for pos, rank in ranks.items():
+                entry = index.entries[pos]
+                department_facets[entry['department']] = department_facets.get(entry['department'], 0) + 1
+                if department_key and department_key not in entry['department_key']:
+                    continue
+                source_facets[source] = source_facets.get(source, 0) + 1
+                matches.append((rank, len(entry['name']), str(entry['name']).lower(), source, pos, entry))
+
+        if limit is None:
+            top = sorted(matches, key=lambda m: m[:5])
+        else:
+            top = heapq.nsmallest(offset + limit, matches, key=lambda m: m[:5])
+        items = [
+            {
+                'source': source,
+                'id': entry['item'].get('id'),
+                'name': entry['name'],
+                'code': entry['code'],
+                'department': entry['department'],
+                'price': entry['price'],
+                'match': MATCH_NAMES[rank],
+                'data': entry['item'],
+            }
+            for rank, _, _, source, _, entry in top[offset:]
+        ]
+        return {
+            'total': len(matches),
+            'items': items,
+            'facets': {'department': department_facets, 'source': source_facets},
+        }
+
+    def lookup_by_code(self, source: str, code) -> Optional[Dict]:
+        """Exact code lookup"""
+        index = self.get_index(source)
+        positions = index.by_code.get(normalize_code(code))
+        return index.entries[positions[0]]['item'] if positions else None
+
+    def lookup_by_name(self, source: str, name: str) -> Optional[Dict]:
+        """Exact, case-insensitive name lookup"""
+        index = self.get_index(source)
+        pos = index.by_name.get(str(name).strip().lower())
+        return index.entries[pos]['item'] if pos is not None else None
+
+
+test_search_service = TestSearchService()
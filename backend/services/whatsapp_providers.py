@@ -0,0 +1,142 @@
+"""
+WhatsApp Providers
+Provider interface used by the outbound WhatsApp delivery queue, with a
+WhatsApp Cloud API implementation and an offline simulated provider.
+"""
+
+import json
+import os
+import uuid
+from typing import Dict, Optional
+
+import requests
+
+
+class ProviderError(Exception):
+    """Base error raised by WhatsApp providers"""
+
+    #: Whether the delivery queue should retry the message
+    retryable = False
+
+
+class TransientProviderError(ProviderError):
+    """Temporary failure (timeouts, 429, 5xx) - the message will be retried"""
+
+    retryable = True
+
+
+class PermanentProviderError(ProviderError):
+    """Non-recoverable failure (bad number, bad credentials) - the message fails"""
+
+    retryable = False
+
+
+class WhatsAppProvider:
+    """Interface for WhatsApp message providers"""
+
+    name = 'base'
+
+    def send_text(self, config: Dict, recipient_number: str, body: str) -> str:
+        """
+        Send a text message.
+
+        Args:
+            config: Tenant WhatsApp configuration (whatsapp_config.json entry)
+            recipient_number: Formatted recipient number (country code, digits only)
+            body: Message text
+
+        Returns:
+            Provider message id
+
+        Raises:
+            TransientProviderError: if the send may succeed on retry
+            PermanentProviderError: if the send can never succeed
+        """
+        raise NotImplementedError
+
+
+class SimulatedProvider(WhatsAppProvider):
+    """Provider that accepts every message without network access"""
+
+    name = 'simulated'
+
+    def send_text(self, config: Dict, recipient_number: str, body: str) -> str:
+        return f"simulated-message-id-{uuid.uuid4().hex[:12]}"
+
+
+class CloudApiProvider(WhatsAppProvider):
+    """
+    WhatsApp Cloud API (Graph API) provider.
+
+    ``base_url`` can point to the local stub server
+    (``services/whatsapp_stub_server.py``) for testing.
+    """
+
+    name = 'cloud_api'
+    DEFAULT_BASE_URL = 'https://graph.facebook.com/v17.0'
+
+    def __init__(self, base_url: Optional[str] = None, timeout: float = 10.0):
+        self.base_url = (base_url or self.DEFAULT_BASE_URL).rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send_text(self, config: Dict, recipient_number: str, body: str) -> str:
+        base_url = (config.get('api_base_url') or self.base_url).rstrip('/')
+        try:
+            response = self.session.post(
+                f"{base_url}/{config.get('phone_number_id')}/messages",
+                headers={
+                    "Authorization": f"Bearer {config.get('api_key', '')}",
+                    "Content-Type": "application/json"
+                },
+                data=json.dumps({
+                    "messaging_product": "whatsapp",
+                    "to": recipient_number,
+                    "type": "text",
+                    "text": {"body": body}
+                }),
+                timeout=self.timeout
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise TransientProviderError(f"WhatsApp API unreachable: {e}")
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientProviderError(f"WhatsApp API returned {response.status_code}: {response.text[:200]}")
+        if response.status_code >= 400:
+            raise PermanentProviderError(f"WhatsApp API returned {response.status_code}: {response.text[:200]}")
+
+        try:
+            return response.json()['messages'][0]['id']
+        except (ValueError, KeyError, IndexError):
+            raise PermanentProviderError(f"Unexpected WhatsApp API response: {response.text[:200]}")
+
+
+PROVIDERS = {
+    SimulatedProvider.name: SimulatedProvider,
+    CloudApiProvider.name: CloudApiProvider,
+}
+
+_provider_instances: Dict[str, WhatsAppProvider] = {}
+
+
+def get_provider(config: Dict) -> WhatsAppProvider:
+    """
+    Resolve the provider for a tenant configuration.
+
+    The ``provider`` key of the config (or the ``WHATSAPP_PROVIDER`` environment
+    variable) selects the implementation; ``stub`` is the Cloud API provider
+    pointed at ``WHATSAPP_STUB_URL``. Defaults to the simulated provider.
+    """
+    name = os.environ.get('WHATSAPP_PROVIDER') or config.get('provider') or SimulatedProvider.name
+
+    if name not in _provider_instances:
+        if name == 'stub':
+            _provider_instances[name] = CloudApiProvider(
+                base_url=os.environ.get('WHATSAPP_STUB_URL', 'http://127.0.0.1:5055/v17.0')
+            )
+        elif name in PROVIDERS:
+            _provider_instances[name] = PROVIDERS[name]()
+        else:
+            raise PermanentProviderError(f"Unknown WhatsApp provider: {name}")
+
+    return _provider_instances[name]
@@ -0,0 +1,362 @@
+"""
+WhatsApp Delivery Queue
+Persisted outbound message queue with a worker pool, per-tenant rate limiting
+and exponential-backoff retries.
+"""
+
+import atexit
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+
+from utils import read_data, write_data
+from .whatsapp_providers import get_provider, ProviderError
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Simple token bucket; ``rate_per_minute`` tokens refill continuously up to ``burst``"""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = max(rate_per_minute, 1) / 60.0
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """Take a token; returns 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class WhatsAppDeliveryQueue:
+    """
+    Outbound WhatsApp delivery queue.
+
+    Messages are kept in memory and persisted to ``whatsapp_messages.json`` by
+    a write-behind flush, so enqueueing costs no file I/O on the request thread.
+    Undelivered messages (``pending``/``retrying``) are re-scheduled on startup.
+    A pool of worker threads takes due messages from a time-ordered heap,
+    applies the tenant's token bucket (``rate_limit_per_minute`` in the tenant
+    config) and hands the message to the configured provider; transient
+    failures are retried with exponential backoff up to ``max_attempts``.
+    """
+
+    MESSAGES_FILE = 'whatsapp_messages.json'
+    PENDING_STATUSES = ('pending', 'retrying')
+    CONFIG_TTL = 5.0
+
+    def __init__(self, workers: int = 4, max_attempts: int = 5, backoff_base: float = 2.0,
+                 backoff_max: float = 300.0, default_rate_per_minute: int = 60,
+                 flush_interval: float = 1.0):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_rate_per_minute = default_rate_per_minute
+        self.flush_interval = flush_interval
+
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._messages: Dict[int, Dict] = {}
+        self._next_id = 1
+        self._heap: List = []
+        self._sequence = itertools.count()
+        self._buckets: Dict[object, TokenBucket] = {}
+        self._dirty = False
+        self._started = False
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        self._configs: Optional[Dict] = None
+        self._configs_loaded_at = 0.0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Load persisted messages and start the workers (idempotent)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+            try:
+                messages = read_data(self.MESSAGES_FILE)
+            except Exception:
+                messages = []
+            for message in messages:
+                self._messages[message['id']] = message
+            if self._messages:
+                self._next_id = max(self._messages) + 1
+
+            for message in self._messages.values():
+                if message.get('status') in self.PENDING_STATUSES:
+                    self._schedule(message['id'], 0)
+
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run_worker, name=f"whatsapp-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        flusher = threading.Thread(target=self._run_flusher, name='whatsapp-flusher', daemon=True)
+        flusher.start()
+        self._threads.append(flusher)
+        atexit.register(self.flush)
+
+    def flush(self):
+        """Persist the message table if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            snapshot = [dict(m) for m in sorted(self._messages.values(), key=lambda m: m['id'])]
+        try:
+            write_data(self.MESSAGES_FILE, snapshot)
+        except Exception as e:
+            logger.error(f"Failed to persist WhatsApp messages: {e}")
+            with self._lock:
+                self._dirty = True
+
+    def _run_flusher(self):
+        while not self._stopping:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    # ------------------------------------------------------------------
+    # Enqueueing
+    # ------------------------------------------------------------------
+
+    def _schedule(self, message_id: int, delay: float):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._sequence), message_id))
+        self._wakeup.notify()
+
+    def enqueue(self, user_id, tenant_id, recipient_number: str, message_content: str,
+                message_type: str, order_id=None, billing_id=None, config: Optional[Dict] = None) -> Dict:
+        """Create a message record and schedule it; returns immediately"""
+        return self.enqueue_many([{
+            'user_id': user_id,
+            'tenant_id': tenant_id,
+            'recipient_number': recipient_number,
+            'message_content': message_content,
+            'message_type': message_type,
+            'order_id': order_id,
+            'billing_id': billing_id,
+        }], config=config)[0]
+
+    def enqueue_many(self, requests_data: List[Dict], config: Optional[Dict] = None) -> List[Dict]:
+        """
+        Enqueue several messages under one lock acquisition.
+
+        If ``config`` is given it is used to reject messages up front for tenants
+        without WhatsApp enabled (they are recorded as ``failed``).
+        """
+        self.start()
+        now = datetime.utcnow().isoformat()
+        created = []
+
+        with self._lock:
+            for data in requests_data:
+                message = {
+                    'id': self._next_id,
+                    'tenant_id': data.get('tenant_id'),
+                    'user_id': data.get('user_id'),
+                    'recipient_number': data.get('recipient_number'),
+                    'message_content': data.get('message_content'),
+                    'message_type': data.get('message_type'),
+                    'order_id': data.get('order_id'),
+                    'billing_id': data.get('billing_id'),
+                    'status': 'pending',
+                    'created_at': now,
+                    'sent_at': None,
+                    'delivered_at': None,
+                    'message_id': None,
+                    'error_message': None,
+                    'attempts': 0,
+                    'next_attempt_at': None
+                }
+                self._next_id += 1
+                self._messages[message['id']] = message
+
+                if config is not None and not config.get('is_enabled', False):
+                    message['status'] = 'failed'
+                    message['error_message'] = 'WhatsApp integration is not enabled for this tenant'
+                else:
+                    self._schedule(message['id'], 0)
+                created.append(dict(message))
+
+            self._dirty = True
+
+        return created
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def _bucket_for(self, tenant_id, config: Dict) -> TokenBucket:
+        rate = config.get('rate_limit_per_minute') or self.default_rate_per_minute
+        bucket = self._buckets.get(tenant_id)
+        if bucket is None or bucket.rate != max(rate, 1) / 60.0:
+            bucket = self._buckets[tenant_id] = TokenBucket(rate, burst=max(int(rate) // 6, 1))
+        return bucket
+
+    def _next_due(self) -> Optional[int]:
+        """Block until a message is due and pop it (None when stopping)"""
+        with self._lock:
+            while not self._stopping:
+                if self._heap:
+                    due_at, _, message_id = self._heap[0]
+                    wait = due_at - time.monotonic()
+                    if wait <= 0:
+                        heapq.heappop(self._heap)
+                        return message_id
+                    self._wakeup.wait(timeout=wait)
+                else:
+                    self._wakeup.wait()
+        return None
+
+    def _load_configs(self) -> Dict:
+        """Tenant configs by tenant id, re-read at most every few seconds"""
+        now = time.monotonic()
+        if self._configs is None or now - self._configs_loaded_at > self.CONFIG_TTL:
+            try:
+                self._configs = {c.get('tenant_id'): c for c in read_data('whatsapp_config.json')}
+            except Exception:
+                self._configs = {}
+            self._configs_loaded_at = now
+        return self._configs
+
+    def _run_worker(self):
+        while True:
+            message_id = self._next_due()
+            if message_id is None:
+                return
+            try:
+                self._deliver(message_id)
+            except Exception as e:
+                logger.error(f"WhatsApp worker error for message {message_id}: {e}")
+
+    def _deliver(self, message_id: int):
+        with self._lock:
+            message = self._messages.get(message_id)
+            if not message or message.get('status') not in self.PENDING_STATUSES:
+                return
+            tenant_id = message.get('tenant_id')
+
+        config = self._load_configs().get(tenant_id)
+        if not config or not config.get('is_enabled', False):
+            self._finish(message_id, 'failed', error_message='WhatsApp integration is not enabled for this tenant')
+            return
+
+        with self._lock:
+            wait = self._bucket_for(tenant_id, config).try_acquire()
+            if wait > 0:
+                # Rate limited: put it back without counting an attempt
+                self._schedule(message_id, wait)
+                return
+            message['attempts'] = message.get('attempts', 0) + 1
+            attempts = message['attempts']
+            recipient = message['recipient_number']
+            body = message['message_content']
+
+        try:
+            from whatsapp_service import WhatsAppService
+            provider = get_provider(config)
+            provider_message_id = provider.send_text(
+                config, WhatsAppService._format_phone_number(recipient), body
+            )
+        except ProviderError as e:
+            if e.retryable and attempts < self.max_attempts:
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+                delay *= random.uniform(0.8, 1.2)
+                with self._lock:
+                    message['status'] = 'retrying'
+                    message['error_message'] = str(e)
+                    message['next_attempt_at'] = datetime.utcfromtimestamp(time.time() + delay).isoformat()
+                    self._dirty = True
+                    self._schedule(message_id, delay)
+                logger.warning(f"WhatsApp message {message_id} attempt {attempts} failed, retrying in {delay:.1f}s: {e}")
+            else:
+                self._finish(message_id, 'failed', error_message=str(e))
+            return
+        except Exception as e:
+            self._finish(message_id, 'failed', error_message=str(e))
+            return
+
+        self._finish(message_id, 'sent', provider_message_id=provider_message_id)
+
+    def _finish(self, message_id: int, status: str, error_message: Optional[str] = None,
+                provider_message_id: Optional[str] = None):
+        with self._lock:
+            message = self._messages.get(message_id)
+            if not message:
+                return
+            message['status'] = status
+            message['next_attempt_at'] = None
+            if status == 'sent':
+                message['message_id'] = provider_message_id
+                message['sent_at'] = datetime.utcnow().isoformat()
+                message['error_message'] = None
+            else:
+                message['error_message'] = error_message
+            self._dirty = True
+
+    # ------------------------------------------------------------------
+    # Reads and updates
+    # ------------------------------------------------------------------
+
+    def get(self, message_id: int) -> Optional[Dict]:
+        """Get a copy of a message"""
+        self.start()
+        with self._lock:
+            message = self._messages.get(message_id)
+            return dict(message) if message else None
+
+    def list_messages(self) -> List[Dict]:
+        """Get copies of all messages"""
+        self.start()
+        with self._lock:
+            return [dict(m) for m in self._messages.values()]
+
+    def update_status(self, message_id: int, status: str, error_message: Optional[str] = None) -> Optional[Dict]:
+        """Update the status of a message (e.g. from delivery receipts)"""
+        self.start()
+        with self._lock:
+            message = self._messages.get(message_id)
+            if not message:
+                return None
+            message['status'] = status
+            if error_message:
+                message['error_message'] = error_message
+            if status == 'delivered':
+                message['delivered_at'] = datetime.utcnow().isoformat()
+            self._dirty = True
+            return dict(message)
+
+    def stats(self, tenant_id=None) -> Dict:
+        """Count messages per status, optionally for one tenant"""
+        self.start()
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for message in self._messages.values():
+                if tenant_id is not None and message.get('tenant_id') != tenant_id:
+                    continue
+                counts[message.get('status')] = counts.get(message.get('status'), 0) + 1
+            return {'by_status': counts, 'scheduled': len(self._heap)}
+
+
+delivery_queue = WhatsAppDeliveryQueue(
+    workers=int(os.environ.get('WHATSAPP_WORKERS', 4))
+)
@@ -0,0 +1,146 @@
+"""
+WhatsApp Stub Server
+Local HTTP server mimicking the WhatsApp Cloud API ``/messages`` endpoint so the
+delivery queue can be exercised end to end without a Meta account.
+
+Run standalone:
+    python -m services.whatsapp_stub_server --port 5055 --failure-rate 0.2
+
+then set ``"provider": "stub"`` in the tenant's WhatsApp config (or export
+``WHATSAPP_PROVIDER=stub``) and, if needed, ``WHATSAPP_STUB_URL``.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+
+class WhatsAppStubServer:
+    """
+    In-process Cloud API stand-in.
+
+    ``failure_rate`` makes a fraction of requests answer 503 (so retries can be
+    tested), ``latency`` adds a fixed delay per request. Accepted messages are
+    kept in ``received`` and can be listed with ``GET /messages``.
+    """
+
+    MESSAGES_PATH = re.compile(r'^/v[\d.]+/(?P<phone_number_id>[^/]+)/messages$')
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 5055,
+                 failure_rate: float = 0.0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.received: List[Dict] = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v17.0"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, payload: Dict):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/messages':
+                    with stub._lock:
+                        self._reply(200, {'messages': list(stub.received)})
+                else:
+                    self._reply(404, {'error': {'message': 'Not found'}})
+
+            def do_POST(self):
+                match = stub.MESSAGES_PATH.match(self.path)
+                if not match:
+                    self._reply(404, {'error': {'message': 'Not found'}})
+                    return
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self._reply(400, {'error': {'message': 'Invalid JSON'}})
+                    return
+
+                if not self.headers.get('Authorization', '').startswith('Bearer '):
+                    self._reply(401, {'error': {'message': 'Missing access token'}})
+                    return
+                if not str(payload.get('to', '')).isdigit():
+                    self._reply(400, {'error': {'message': 'Invalid recipient'}})
+                    return
+                if stub.failure_rate and random.random() < stub.failure_rate:
+                    self._reply(503, {'error': {'message': 'Simulated outage'}})
+                    return
+
+                message_id = f"wamid.stub-{uuid.uuid4().hex}"
+                with stub._lock:
+                    stub.received.append({
+                        'id': message_id,
+                        'phone_number_id': match.group('phone_number_id'),
+                        'to': payload.get('to'),
+                        'text': (payload.get('text') or {}).get('body'),
+                        'received_at': time.time()
+                    })
+                self._reply(200, {
+                    'messaging_product': 'whatsapp',
+                    'contacts': [{'input': payload.get('to'), 'wa_id': payload.get('to')}],
+                    'messages': [{'id': message_id}]
+                })
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'WhatsAppStubServer':
+        """Start serving on a background thread"""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='whatsapp-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local WhatsApp Cloud API stub')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = WhatsAppStubServer(args.host, args.port, args.failure_rate, args.latency).start()
+    print(f"WhatsApp stub listening at {server.base_url}")
+    print("Press Ctrl+C to stop the server")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
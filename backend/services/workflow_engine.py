@@ -5,7 +5,7 @@ Handles multi-step workflow management with configurable stages
 
 from datetime import datetime
 from typing import Dict, List, Optional, Any
-from utils import read_data, write_data
+from .workflow_store import workflow_store
 import uuid
 
 class WorkflowEngine:
@@ -134,23 +134,69 @@ class WorkflowEngine:
         }
         
         # Save workflow instance
-        workflows = read_data('workflow_instances.json')
-        workflows.append(workflow_instance)
-        write_data('workflow_instances.json', workflows)
+        return workflow_store.create(workflow_instance)
+    
+    @staticmethod
+    def create_workflow_instances(routing_ids: List[int], workflow_type: str = 'sample_routing',
+                                  user_id: int = None, initial_stage: str = None,
+                                  notes: str = '') -> List[Dict]:
+        """
+        Create workflow instances for many routings in a single log write,
+        optionally moving each straight to ``initial_stage``.
+        """
+        now = datetime.now().isoformat()
+        instances = []
+        transitions = []
+        for routing_id in routing_ids:
+            instance = {
+                'id': str(uuid.uuid4()),
+                'routing_id': routing_id,
+                'workflow_type': workflow_type,
+                'current_stage': 'initiated',
+                'created_at': now,
+                'created_by': user_id,
+                'updated_at': now,
+                'stage_history': [
+                    {
+                        'stage_id': 'initiated',
+                        'entered_at': now,
+                        'entered_by': user_id,
+                        'notes': 'Workflow initiated'
+                    }
+                ]
+            }
+            instances.append(instance)
+            if initial_stage:
+                if not WorkflowEngine.can_transition_to_stage('initiated', initial_stage, workflow_type):
+                    raise ValueError(f"Cannot transition from initiated to {initial_stage}")
+                transitions.append({
+                    'workflow_id': instance['id'],
+                    'stage_entry': WorkflowEngine._build_stage_entry(initial_stage, user_id, notes)
+                })
         
-        return workflow_instance
+        return workflow_store.create_many(instances, transitions)
+    
+    @staticmethod
+    def _build_stage_entry(target_stage_id: str, user_id: int = None, notes: str = '',
+                           metadata: Dict = None) -> Dict:
+        """Build a stage_history entry"""
+        return {
+            'stage_id': target_stage_id,
+            'entered_at': datetime.now().isoformat(),
+            'entered_by': user_id,
+            'notes': notes,
+            'metadata': metadata or {}
+        }
     
     @staticmethod
     def transition_stage(workflow_id: str, target_stage_id: str, user_id: int = None,
                         notes: str = '', metadata: Dict = None) -> Dict:
         """Transition workflow to a new stage"""
-        workflows = read_data('workflow_instances.json')
-        workflow_index = next((i for i, w in enumerate(workflows) if w['id'] == workflow_id), None)
+        workflow = workflow_store.get(workflow_id)
         
-        if workflow_index is None:
+        if workflow is None:
             raise ValueError(f"Workflow {workflow_id} not found")
         
-        workflow = workflows[workflow_index]
         current_stage = workflow['current_stage']
         
         # Check if transition is allowed
@@ -158,31 +204,68 @@ class WorkflowEngine:
                                                      workflow['workflow_type']):
             raise ValueError(f"Cannot transition from {current_stage} to {target_stage_id}")
         
-        # Update workflow
-        workflow['current_stage'] = target_stage_id
-        workflow['updated_at'] = datetime.now().isoformat()
+        # Append to the transition log and update the indexed instance
+        stage_entry = WorkflowEngine._build_stage_entry(target_stage_id, user_id, notes, metadata)
+        return workflow_store.append_transitions([
+            {'workflow_id': workflow_id, 'stage_entry': stage_entry}
+        ])[0]
+    
+    @staticmethod
+    def transition_many(transitions: List[Dict], user_id: int = None) -> List[Dict]:
+        """
+        Transition many workflows in one validated batch with a single log write.
         
-        # Add to stage history
-        stage_entry = {
-            'stage_id': target_stage_id,
-            'entered_at': datetime.now().isoformat(),
-            'entered_by': user_id,
-            'notes': notes,
-            'metadata': metadata or {}
-        }
-        workflow['stage_history'].append(stage_entry)
+        Each item has ``routing_id`` (or ``workflow_id``), ``target_stage_id``
+        and optional ``notes``/``metadata``. Returns one result per item:
+        ``{'routing_id', 'workflow_id', 'success', 'workflow' | 'error'}``.
+        Invalid items are reported and skipped; valid ones are still applied.
+        """
+        routing_ids = [t['routing_id'] for t in transitions if t.get('workflow_id') is None]
+        by_routing = workflow_store.get_many_by_routing_ids(routing_ids)
+        
+        results = []
+        pending = []
+        # Track stages inside the batch so repeated items chain correctly
+        batch_stage = {}
+        for item in transitions:
+            workflow = workflow_store.get(item['workflow_id']) if item.get('workflow_id') \
+                else by_routing.get(item.get('routing_id'))
+            result = {'routing_id': item.get('routing_id'), 'workflow_id': item.get('workflow_id'), 'success': False}
+            results.append(result)
+            
+            if not workflow:
+                result['error'] = 'Workflow not found'
+                continue
+            
+            result['workflow_id'] = workflow['id']
+            result['routing_id'] = workflow.get('routing_id')
+            current_stage = batch_stage.get(workflow['id'], workflow['current_stage'])
+            target_stage_id = item['target_stage_id']
+            if not WorkflowEngine.can_transition_to_stage(current_stage, target_stage_id,
+                                                         workflow['workflow_type']):
+                result['error'] = f"Cannot transition from {current_stage} to {target_stage_id}"
+                continue
+            
+            batch_stage[workflow['id']] = target_stage_id
+            pending.append((result, {
+                'workflow_id': workflow['id'],
+                'stage_entry': WorkflowEngine._build_stage_entry(
+                    target_stage_id, item.get('user_id', user_id),
+                    item.get('notes', ''), item.get('metadata')
+                )
+            }))
         
-        # Save updated workflow
-        workflows[workflow_index] = workflow
-        write_data('workflow_instances.json', workflows)
+        updated = workflow_store.append_transitions([t for _, t in pending])
+        for (result, _), workflow in zip(pending, updated):
+            result['success'] = True
+            result['workflow'] = workflow
         
-        return workflow
+        return results
     
     @staticmethod
     def get_workflow_by_routing_id(routing_id: int) -> Optional[Dict]:
         """Get workflow instance by routing ID"""
-        workflows = read_data('workflow_instances.json')
-        return next((w for w in workflows if w['routing_id'] == routing_id), None)
+        return workflow_store.get_by_routing_id(routing_id)
     
     @staticmethod
     def get_workflow_status(routing_id: int) -> Dict:
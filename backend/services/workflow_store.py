@@ -0,0 +1,250 @@
+"""
+Workflow Store for Sample Routing System
+In-memory workflow instances indexed by id and routing id, backed by an
+append-only transition log and periodic snapshots of workflow_instances.json
+"""
+
+import atexit
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from utils import read_data, write_data, DATA_DIR
+import json_codec
+
+
+class WorkflowStore:
+    """
+    Persistence layer for workflow instances.
+
+    Every create/transition is appended to ``workflow_transitions.jsonl`` (one
+    line per event, one append per batch) and applied to the in-memory
+    instances. ``workflow_instances.json`` is rewritten as a snapshot by a
+    background thread, and ``workflow_transitions.checkpoint.json`` records the
+    log offset the snapshot covers so startup only replays the log tail.
+    Each instance carries ``last_transition_seq`` which makes replay idempotent.
+    """
+
+    SNAPSHOT_FILE = 'workflow_instances.json'
+    LOG_FILE = 'workflow_transitions.jsonl'
+    CHECKPOINT_FILE = 'workflow_transitions.checkpoint.json'
+
+    def __init__(self, snapshot_interval: float = 2.0):
+        self.snapshot_interval = snapshot_interval
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._by_id: Dict[str, Dict] = {}
+        self._by_routing: Dict[object, str] = {}
+        self._seq = 0
+        self._log_offset = 0
+        self._dirty = False
+        self._worker = None
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(DATA_DIR, self.LOG_FILE)
+
+    # ------------------------------------------------------------------
+    # Loading, replay and snapshots
+    # ------------------------------------------------------------------
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+
+            try:
+                instances = read_data(self.SNAPSHOT_FILE)
+            except Exception:
+                instances = []
+            for instance in instances:
+                self._put(instance)
+                self._seq = max(self._seq, instance.get('last_transition_seq', 0))
+
+            checkpoint_offset = 0
+            try:
+                checkpoint = read_data(self.CHECKPOINT_FILE)
+                checkpoint_offset = checkpoint.get('log_offset', 0)
+            except Exception:
+                pass
+
+            self._replay(checkpoint_offset)
+            self._loaded = True
+            self._start_worker()
+
+    def _replay(self, offset: int):
+        """Apply log events written after the snapshot checkpoint"""
+        if not os.path.exists(self._log_path):
+            self._log_offset = 0
+            return
+
+        size = os.path.getsize(self._log_path)
+        if offset > size:
+            offset = 0  # log was replaced; fall back to a full replay
+
+        replayed = 0
+        with open(self._log_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    event = json_codec.loads(line)
+                except ValueError:
+                    continue
+                if self._apply(event):
+                    replayed += 1
+                self._seq = max(self._seq, event.get('seq', 0))
+            self._log_offset = f.tell()
+
+        if replayed:
+            self._dirty = True
+            print(f"Workflow store replayed {replayed} logged events")
+
+    def _put(self, instance: Dict):
+        self._by_id[instance['id']] = instance
+        self._by_routing[instance.get('routing_id')] = instance['id']
+
+    def _apply(self, event: Dict) -> bool:
+        """Apply a log event to the in-memory state; returns False if already applied"""
+        seq = event.get('seq', 0)
+        if event.get('event') == 'create':
+            existing = self._by_id.get(event['instance']['id'])
+            if existing and existing.get('last_transition_seq', 0) >= seq:
+                return False
+            instance = json_codec.loads(json_codec.dumps(event['instance']))
+            instance['last_transition_seq'] = seq
+            self._put(instance)
+            return True
+
+        instance = self._by_id.get(event.get('workflow_id'))
+        if not instance or instance.get('last_transition_seq', 0) >= seq:
+            return False
+        instance['current_stage'] = event['stage_entry']['stage_id']
+        instance['updated_at'] = event['stage_entry']['entered_at']
+        instance.setdefault('stage_history', []).append(event['stage_entry'])
+        instance['last_transition_seq'] = seq
+        return True
+
+    def _append_events(self, events: List[Dict]):
+        """Assign sequence numbers, append to the log in one write and apply"""
+        for event in events:
+            self._seq += 1
+            event['seq'] = self._seq
+
+        payload = b''.join(json_codec.dumps(event) + b'\n' for event in events)
+        with open(self._log_path, 'ab') as f:
+            f.write(payload)
+            self._log_offset = f.tell()
+
+        for event in events:
+            self._apply(event)
+        self._dirty = True
+
+    def snapshot(self):
+        """Write the instance snapshot and advance the log checkpoint"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            instances = [json_codec.loads(json_codec.dumps(i)) for i in self._by_id.values()]
+            log_offset = self._log_offset
+        try:
+            write_data(self.SNAPSHOT_FILE, instances)
+            write_data(self.CHECKPOINT_FILE, {'log_offset': log_offset, 'written_at': time.time()})
+        except Exception as e:
+            print(f"Warning: Failed to snapshot workflow instances: {e}")
+            with self._lock:
+                self._dirty = True
+
+    def _start_worker(self):
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run_worker, name='workflow-store', daemon=True)
+        self._worker.start()
+        atexit.register(self.snapshot)
+
+    def _run_worker(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            self.snapshot()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def create(self, instance: Dict) -> Dict:
+        """Persist a new workflow instance"""
+        self._ensure_loaded()
+        with self._lock:
+            self._append_events([{'event': 'create', 'instance': instance}])
+            return self._copy(self._by_id[instance['id']])
+
+    def create_many(self, instances: List[Dict], transitions: List[Dict] = None) -> List[Dict]:
+        """
+        Persist new workflow instances, plus optional initial transitions for
+        them, in a single log write. Returns copies of the final instances.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            events = [{'event': 'create', 'instance': instance} for instance in instances]
+            events.extend(
+                {'event': 'transition', 'workflow_id': t['workflow_id'], 'stage_entry': t['stage_entry']}
+                for t in (transitions or [])
+            )
+            if events:
+                self._append_events(events)
+            return [self._copy(self._by_id[instance['id']]) for instance in instances]
+
+    def append_transitions(self, transitions: List[Dict]) -> List[Dict]:
+        """
+        Persist already-validated transitions in a single log write.
+
+        Each item needs ``workflow_id`` and ``stage_entry`` (the stage_history
+        record). Returns copies of the updated instances in the same order.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            events = [
+                {'event': 'transition', 'workflow_id': t['workflow_id'], 'stage_entry': t['stage_entry']}
+                for t in transitions
+            ]
+            if events:
+                self._append_events(events)
+            return [self._copy(self._by_id[t['workflow_id']]) for t in transitions]
+
+    def get(self, workflow_id: str) -> Optional[Dict]:
+        """Get a copy of a workflow instance by id"""
+        self._ensure_loaded()
+        with self._lock:
+            instance = self._by_id.get(workflow_id)
+            return self._copy(instance) if instance else None
+
+    def get_by_routing_id(self, routing_id) -> Optional[Dict]:
+        """Get a copy of the workflow instance of a routing"""
+        self._ensure_loaded()
+        with self._lock:
+            workflow_id = self._by_routing.get(routing_id)
+            instance = self._by_id.get(workflow_id) if workflow_id else None
+            return self._copy(instance) if instance else None
+
+    def get_many_by_routing_ids(self, routing_ids: List) -> Dict:
+        """Get copies of workflow instances for many routings, keyed by routing id"""
+        self._ensure_loaded()
+        with self._lock:
+            result = {}
+            for routing_id in routing_ids:
+                workflow_id = self._by_routing.get(routing_id)
+                if workflow_id and workflow_id in self._by_id:
+                    result[routing_id] = self._copy(self._by_id[workflow_id])
+            return result
+
+    @staticmethod
+    def _copy(instance: Dict) -> Dict:
+        copied = dict(instance)
+        copied['stage_history'] = list(instance.get('stage_history', []))
+        return copied
+
+
+workflow_store = WorkflowStore()
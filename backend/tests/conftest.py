@@ -0,0 +1,54 @@
+"""
+Test fixtures.
+
+The backend keeps its state in JSON files under ``backend/data`` and resolves
+that directory from the module paths, so the suite runs against a throwaway
+copy of the backend: the copy is put first on ``sys.path`` and made the
+working directory before anything imports ``app`` or ``utils``.
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def backend_dir(tmp_path_factory):
+    """Working copy of the backend that the tests may write to"""
+    root = tmp_path_factory.mktemp('backend')
+    shutil.copytree(
+        BACKEND_DIR, root, dirs_exist_ok=True,
+        ignore=shutil.ignore_patterns('tests', 'logs', '__pycache__', '*.pdf')
+    )
+    cwd = os.getcwd()
+    sys.path.insert(0, str(root))
+    os.chdir(root)
+    yield root
+    os.chdir(cwd)
+    sys.path.remove(str(root))
+
+
+@pytest.fixture(scope='session')
+def app(backend_dir):
+    import app as app_module
+    app_module.app.config['TESTING'] = True
+    return app_module.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(backend_dir):
+    """Authorization headers for a user id from ``users.json``"""
+    from utils import generate_token
+
+    def headers(user_id=1):
+        return {'Authorization': f'Bearer {generate_token(user_id)}'}
+    return headers
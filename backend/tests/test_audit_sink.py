@@ -0,0 +1,55 @@
+"""Audit sink retention"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def make_sink(backend_dir, tmp_path):
+    from services.audit_sink import AuditSink
+    sinks = []
+
+    def make(**kwargs):
+        sink = AuditSink(str(tmp_path), 'events', ('user_id',), **kwargs)
+        sinks.append(sink)
+        return sink
+    yield make
+    for sink in sinks:
+        sink.close()
+
+
+def _write_days(sink, days, per_day=3):
+    """Write ``per_day`` events for each of the last ``days`` days, one segment per day"""
+    start = datetime.now() - timedelta(days=days - 1)
+    for day in range(days):
+        timestamp = (start + timedelta(days=day)).isoformat()
+        for user_id in range(per_day):
+            sink.append({'timestamp': timestamp, 'user_id': user_id})
+        sink.flush()
+
+
+def test_everything_is_kept_by_default(make_sink):
+    sink = make_sink()
+    _write_days(sink, 90)
+    assert len(sink.query()) == 270
+    assert len(sink._segments) == 90
+
+
+def test_max_entries_keeps_the_newest_events(make_sink):
+    sink = make_sink(max_entries=10)
+    _write_days(sink, 10)
+    events = sink.query()
+    # Whole segments are dropped when rotating, so at least max_entries events
+    # remain plus up to one segment on either side
+    assert 10 <= len(events) <= 15
+    assert sink.aggregate(filters={'user_id': 0})['total'] == len(events) // 3
+
+
+def test_max_age_days_drops_old_segments(make_sink):
+    sink = make_sink(max_age_days=5)
+    _write_days(sink, 10)
+    cutoff = (datetime.now() - timedelta(days=5)).isoformat()
+    events = sink.query()
+    assert events and all(e['timestamp'] >= cutoff[:10] for e in events)
+    assert len(events) >= 15
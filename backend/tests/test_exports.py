@@ -0,0 +1,21 @@
+"""Collection exports"""
+
+import pytest
+
+
+@pytest.mark.parametrize('collection', ['users', 'patients', 'background_jobs', 'audit_trail',
+                                        'billings_old_backup', 'samples'])
+def test_non_master_collections_are_not_exported(client, auth_headers, collection):
+    response = client.get(f'/api/exports/{collection}', headers=auth_headers(1))
+    assert response.status_code == 400
+
+
+def test_master_data_collection_is_exported(client, auth_headers):
+    response = client.get('/api/exports/departments?format=csv', headers=auth_headers(1))
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+
+
+def test_admin_category_export_uses_the_allowlist(client, auth_headers):
+    assert client.get('/api/admin/master-data/export/users', headers=auth_headers(1)).status_code == 400
+    assert client.get('/api/admin/master-data/export/departments', headers=auth_headers(1)).status_code == 200
@@ -0,0 +1,28 @@
+"""Formula compilation and evaluation"""
+
+import pytest
+
+
+@pytest.fixture
+def compile_expression(backend_dir):
+    from services.formula_engine import compile_expression
+    return compile_expression
+
+
+def test_round_with_digits(compile_expression):
+    evaluate, names = compile_expression('round(a / b, 2)')
+    assert names == {'a', 'b'}
+    assert evaluate({'a': 10, 'b': 3}) == 3.33
+
+
+def test_round_without_digits(compile_expression):
+    evaluate, _ = compile_expression('round(a)')
+    assert evaluate({'a': 2.6}) == 3.0
+
+
+def test_overflow_is_reported_in_strict_mode(compile_expression):
+    from services.formula_engine import FormulaError
+    evaluate, _ = compile_expression('a ** a ** a')
+    assert evaluate({'a': 99}) is None
+    with pytest.raises(FormulaError):
+        evaluate({'a': 99}, strict=True)
@@ -0,0 +1,25 @@
+"""Inventory low stock and forecasts"""
+
+
+def test_forecast_with_negligible_usage_has_no_stockout_date(backend_dir):
+    from services.inventory_ledger import inventory_ledger
+    _, error = inventory_ledger.post([{'item_id': 1, 'type': 'in', 'quantity': 1000000},
+                                      {'item_id': 1, 'type': 'out', 'quantity': 0.0001}])
+    assert error is None
+
+    forecast = next(f for f in inventory_ledger.forecast(30)[1] if f['item_id'] == 1)
+    assert forecast['days_to_stockout'] > 3000000
+    assert forecast['stockout_date'] is None
+
+
+def test_low_stock_is_limited_to_the_users_tenants(client, auth_headers):
+    from utils import read_data, write_data
+    inventory = read_data('inventory.json')
+    for item in inventory:
+        item['reorder_level'] = 10 ** 8
+    write_data('inventory.json', inventory)
+
+    admin = client.get('/api/inventory/low-stock', headers=auth_headers(1)).get_json()['items']
+    franchise = client.get('/api/inventory/low-stock', headers=auth_headers(5)).get_json()['items']
+    assert {item['tenant_id'] for item in admin} == {item['tenant_id'] for item in inventory}
+    assert franchise and all(item['tenant_id'] == 2 for item in franchise)
@@ -0,0 +1,23 @@
+"""Invoice PDF batch rendering"""
+
+import threading
+
+
+def test_batch_renders_in_a_spawned_pool_from_a_worker_thread(backend_dir, tmp_path, caplog):
+    from utils import read_data
+    from services.invoice_pdfs import InvoicePdfCache, load_invoice_documents
+
+    cache = InvoicePdfCache(str(tmp_path / 'invoice_pdfs'))
+    documents = load_invoice_documents(read_data('invoices.json')[:3])
+    outcome = {}
+
+    # Monthly runs render from background job threads
+    thread = threading.Thread(target=lambda: outcome.update(cache.render_batch(documents, workers=2)))
+    thread.start()
+    thread.join(timeout=120)
+
+    assert outcome['rendered'] == 3
+    assert 'rendering in-process' not in caplog.text
+    for document in documents:
+        with open(outcome['paths'][document['invoice']['id']], 'rb') as f:
+            assert f.read(4) == b'%PDF'
@@ -0,0 +1,50 @@
+"""Patient result history"""
+
+import json
+
+import pytest
+
+
+def _report(report_id, tenant_id, date, sid, result):
+    return {
+        'id': report_id,
+        'sid_number': sid,
+        'patient_id': 42,
+        'tenant_id': tenant_id,
+        'billing_date': date,
+        'test_items': [{'test_name': 'Haemoglobin', 'result': result, 'result_unit': 'g/dL'}]
+    }
+
+
+@pytest.fixture
+def history(backend_dir, tmp_path):
+    from services.patient_history import PatientResultHistory
+    reports = [
+        _report(1, 1, '2026-01-05', 'T1-001', '13.1'),
+        _report(2, 2, '2026-02-05', 'T2-001', '9.4'),
+        _report(3, 1, '2026-03-05', 'T1-002', '12.8'),
+    ]
+    path = tmp_path / 'reports.json'
+    path.write_text(json.dumps(reports))
+    history = PatientResultHistory()
+    history.FILENAME = str(path)
+    return history, reports
+
+
+def test_cumulative_table_keeps_to_the_given_tenants(history):
+    history, reports = history
+    table = history.cumulative_table(reports[2], 5, tenant_ids=[1])
+    assert [c['sid_number'] for c in table['columns']] == ['T1-001', 'T1-002']
+    assert table['rows'][0]['values'] == ['13.1', '12.8']
+
+
+def test_cumulative_table_covers_all_tenants_by_default(history):
+    history, reports = history
+    table = history.cumulative_table(reports[2], 5)
+    assert [c['sid_number'] for c in table['columns']] == ['T1-001', 'T2-001', 'T1-002']
+
+
+def test_patient_results_keep_to_the_given_tenants(history):
+    history, _ = history
+    results = history.patient_results(42, tenant_ids=[2])[0]['results']
+    assert [r['sid_number'] for r in results] == ['T2-001']
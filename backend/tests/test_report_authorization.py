@@ -0,0 +1,63 @@
+"""Bulk report authorization"""
+
+import json
+
+import pytest
+
+
+@pytest.fixture
+def service(backend_dir, tmp_path):
+    from services.billing_reports_service import BillingReportsService
+    reports = [
+        {'id': 1, 'sid_number': 'MYD001', 'tenant_id': 1, 'authorization_status': 'pending', 'revision': 1},
+        {'id': 2, 'sid_number': 'SKZ001', 'tenant_id': 2, 'authorization_status': 'pending', 'revision': 1},
+        {'id': 3, 'sid_number': 'SKZ002', 'tenant_id': 2, 'authorization_status': 'pending', 'revision': 1},
+    ]
+    (tmp_path / 'billing_reports.json').write_text(json.dumps(reports))
+    return BillingReportsService(data_dir=str(tmp_path))
+
+
+APPROVE = {'action': 'approve', 'authorizer_id': 5, 'authorizer_name': 'Franchise Admin'}
+
+
+def test_search_does_not_list_other_franchises(service):
+    updated, skipped = service.authorize_reports(None, {}, 2, 'franchise_admin', APPROVE)
+    assert sorted(r['id'] for r in updated) == [2, 3]
+    assert skipped == []
+
+
+def test_other_franchise_ids_are_denied_without_details(service):
+    updated, skipped = service.authorize_reports([1, 2], {'sid': 'SKZ'}, 2, 'franchise_admin', APPROVE)
+    assert [r['id'] for r in updated] == [2]
+    assert skipped == [{'id': 1, 'reason': 'Access denied'}]
+
+
+def test_report_writes_wait_for_the_file_lock_of_another_process(service):
+    import subprocess
+    import sys
+    import time
+    pytest.importorskip('fcntl')
+
+    lock_path = service.reports_file + '.lock'
+    holder = subprocess.Popen([sys.executable, '-c', (
+        "import fcntl, sys, time\n"
+        f"handle = open({lock_path!r}, 'a')\n"
+        "fcntl.flock(handle, fcntl.LOCK_EX)\n"
+        "print('locked', flush=True)\n"
+        "time.sleep(0.5)\n"
+    )], stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'locked'
+        started = time.monotonic()
+        updated, _ = service.authorize_reports([1], None, 1, 'admin', APPROVE)
+        assert time.monotonic() - started > 0.3
+        assert [r['id'] for r in updated] == [1]
+    finally:
+        holder.wait()
+
+
+def test_report_lock_is_reentrant(service):
+    from services.billing_reports_service import _locked_reports
+    with _locked_reports(service.reports_file):
+        updated, _ = service.authorize_reports([1], None, 1, 'admin', APPROVE)
+    assert [r['id'] for r in updated] == [1]
@@ -0,0 +1,51 @@
+"""Response compression"""
+
+import gzip
+
+import pytest
+
+
+@pytest.fixture
+def compressed_client(backend_dir):
+    from flask import Flask, Response, jsonify
+    from services.response_compression import ResponseCompressor
+
+    app = Flask(__name__)
+    ResponseCompressor(app, stream_threshold=64 * 1024)
+
+    @app.route('/report/<int:size>')
+    def report(size):
+        response = jsonify({'id': 7, 'notes': 'x' * size})
+        response.headers['ETag'] = '"7-3"'
+        return response
+
+    @app.route('/stream')
+    def stream():
+        response = Response((b'line\n' for _ in range(1000)), mimetype='text/plain')
+        response.set_etag('stream-1')
+        return response
+
+    return app.test_client()
+
+
+@pytest.mark.parametrize('size', [4096, 128 * 1024])
+def test_compressed_body_carries_a_weak_etag(compressed_client, size):
+    from services.billing_reports_service import parse_revision
+    for _ in range(2):  # the second response comes from the compressed-body cache
+        response = compressed_client.get(f'/report/{size}', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['ETag'] == 'W/"7-3"'
+        assert parse_revision(response.headers['ETag']) == 3
+        assert len(gzip.decompress(response.get_data())) > size
+
+
+def test_identity_body_keeps_its_strong_etag(compressed_client):
+    response = compressed_client.get('/report/4096', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'] == '"7-3"'
+
+
+def test_streamed_body_carries_a_weak_etag(compressed_client):
+    response = compressed_client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['ETag'] == 'W/"stream-1"'
+    assert gzip.decompress(response.get_data()) == b'line\n' * 1000
@@ -0,0 +1,15 @@
+"""Revenue rollups"""
+
+import pytest
+
+
+@pytest.mark.parametrize('query, status', [
+    ('period=daily&date_from=2025-01-01&date_to=2025-12-31', 200),
+    ('period=daily&date_from=2024-01-01&date_to=2025-12-31', 400),
+    ('period=monthly&date_from=2016-01-01&date_to=2025-12-31', 200),
+    ('period=monthly&date_from=1900-01-01&date_to=2025-12-31', 400),
+    ('period=daily&date_from=0001-01-01&date_to=9999-12-31', 400),
+])
+def test_rollup_span_is_limited(client, auth_headers, query, status):
+    response = client.get(f'/api/revenue/rollups?{query}', headers=auth_headers(1))
+    assert response.status_code == status, response.get_json()
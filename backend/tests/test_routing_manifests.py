@@ -0,0 +1,41 @@
+"""Routing manifest actions"""
+
+
+def _create_manifest(client, auth_headers, sample_ids):
+    response = client.post('/api/samples/routing/manifests', headers=auth_headers(1), json={
+        'to_tenant_id': 2,
+        'reason': 'Specialised testing',
+        'samples': [{'sample_id': sample_id} for sample_id in sample_ids]
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()
+
+
+def test_item_overrides_are_applied(client, auth_headers):
+    manifest = _create_manifest(client, auth_headers, [6, 8])
+    first, second = manifest['routing_ids']
+
+    response = client.post(f"/api/samples/routing/manifests/{manifest['id']}/approve",
+                           headers=auth_headers(5),
+                           json={'notes': 'Batch approved',
+                                 'items': [{'routing_id': first, 'notes': 'Approved with priority'}]})
+    assert response.status_code == 200, response.get_json()
+
+    routings = {r['id']: r for r in client.get(f"/api/samples/routing/manifests/{manifest['id']}",
+                                               headers=auth_headers(5)).get_json()['routings']}
+    assert routings[first]['approval_notes'] == 'Approved with priority'
+    assert routings[second]['approval_notes'] == 'Batch approved'
+
+
+def test_status_reflects_all_routings_on_the_manifest(client, auth_headers):
+    manifest = _create_manifest(client, auth_headers, [11, 13])
+    first, second = manifest['routing_ids']
+    url = f"/api/samples/routing/manifests/{manifest['id']}/approve"
+
+    response = client.post(url, headers=auth_headers(5), json={'routing_ids': [first]})
+    assert response.get_json()['manifest']['status'] == 'partially_approved'
+
+    # Approving the remaining routing on its own completes the manifest
+    response = client.post(url, headers=auth_headers(5), json={'routing_ids': [second]})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['manifest']['status'] == 'approved'
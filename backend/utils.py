@@ -4,6 +4,7 @@ import jwt
 import json
 import os
 from functools import wraps
+import json_codec
 
 # Configuration
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'avini-labs-jwt-secret-key-2024-secure')
@@ -14,13 +15,11 @@ DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 
 def read_data(filename):
     filepath = os.path.join(DATA_DIR, filename)
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    return json_codec.load_file(filepath)
 
 def write_data(filename, data):
     filepath = os.path.join(DATA_DIR, filename)
-    with open(filepath, 'w') as f:
-        json.dump(data, f, indent=2)
+    json_codec.dump_file(filepath, data)
 
 def transform_master_data(data, category):
     """
@@ -274,6 +273,37 @@ def filter_data_by_tenant(data, current_user, target_tenant_id=None):
         return []  # Access denied
     return [item for item in data if item.get('tenant_id') == user_tenant_id]
 
+def get_accessible_tenant_ids(current_user, target_tenant_id=None):
+    """
+    Tenant ids whose data the user may see, following the same rules as
+    filter_data_by_tenant.
+
+    Returns:
+        None for all tenants, otherwise a list of tenant ids (empty when the
+        requested target tenant is not accessible)
+    """
+    user_role = current_user.get('role')
+    user_tenant_id = current_user.get('tenant_id')
+
+    if user_role == 'admin':
+        return [target_tenant_id] if target_tenant_id else None
+
+    if user_role == 'hub_admin':
+        tenants = read_data('tenants.json')
+        user_tenant = next((t for t in tenants if t.get('id') == user_tenant_id), None)
+        if user_tenant and user_tenant.get('is_hub'):
+            # Hub admin sees all franchises and their own hub
+            franchise_tenant_ids = [t.get('id') for t in tenants if not t.get('is_hub')]
+            franchise_tenant_ids.append(user_tenant_id)
+            if target_tenant_id:
+                return [target_tenant_id] if target_tenant_id in franchise_tenant_ids else []
+            return franchise_tenant_ids
+
+    # Franchise admin and all other roles only see their own tenant
+    if target_tenant_id and target_tenant_id != user_tenant_id:
+        return []
+    return [user_tenant_id]
+
 def check_tenant_access(target_tenant_id, current_user):
     """
     Check if current user has access to the target tenant.
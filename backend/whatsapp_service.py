@@ -2,11 +2,10 @@
 WhatsApp API integration service for RSAVINI LIS.
 Handles sending messages via WhatsApp API and tracking message status.
 """
-import requests
-import json
 import logging
 from datetime import datetime
-from utils import read_data, write_data
+from utils import read_data
+from services.whatsapp_queue import delivery_queue
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +27,7 @@ class WhatsAppService:
     @staticmethod
     def send_message(user_id, tenant_id, recipient_number, message_content, message_type, order_id=None, billing_id=None):
         """
-        Send a WhatsApp message and log it in the database.
+        Queue a WhatsApp message for asynchronous delivery.
         
         Args:
             user_id: ID of the user sending the message
@@ -40,85 +39,42 @@ class WhatsAppService:
             billing_id: Optional billing ID reference
             
         Returns:
-            dict with the result
+            dict with the queued message record ('pending', or 'failed' if
+            WhatsApp is not enabled for the tenant)
         """
-        # Create message record
-        messages = read_data('whatsapp_messages.json')
-        message_id = len(messages) + 1
-        
-        message = {
-            'id': message_id,
-            'tenant_id': tenant_id,
-            'user_id': user_id,
-            'recipient_number': recipient_number,
-            'message_content': message_content,
-            'message_type': message_type,
-            'order_id': order_id,
-            'billing_id': billing_id,
-            'status': 'pending',
-            'created_at': datetime.utcnow().isoformat(),
-            'sent_at': None,
-            'delivered_at': None,
-            'message_id': None,
-            'error_message': None
-        }
-        
-        messages.append(message)
-        write_data('whatsapp_messages.json', messages)
-        
-        # Get WhatsApp configuration
+        # Queue the message; delivery, retries and rate limiting happen on the
+        # delivery queue's worker threads
         config = WhatsAppService.get_config(tenant_id)
-        if not config or not config.get('is_enabled', False):
-            message['status'] = 'failed'
-            message['error_message'] = 'WhatsApp integration is not enabled for this tenant'
-            # Update the message in the list
-            messages[-1] = message
-            write_data('whatsapp_messages.json', messages)
-            return message
+        return delivery_queue.enqueue(
+            user_id=user_id,
+            tenant_id=tenant_id,
+            recipient_number=recipient_number,
+            message_content=message_content,
+            message_type=message_type,
+            order_id=order_id,
+            billing_id=billing_id,
+            config=config or {}
+        )
+    
+    @staticmethod
+    def send_bulk(user_id, tenant_id, messages):
+        """
+        Queue many WhatsApp messages at once.
         
-        try:
-            # Format the phone number (remove spaces, ensure it starts with country code)
-            formatted_number = WhatsAppService._format_phone_number(recipient_number)
-            
-            # In a real implementation, this would call the WhatsApp API
-            # For now, we'll simulate a successful API call
-            
-            # Simulate API call
-            # In a real implementation, this would be:
-            # response = requests.post(
-            #     f"https://graph.facebook.com/v17.0/{config['phone_number_id']}/messages",
-            #     headers={
-            #         "Authorization": f"Bearer {config['api_key']}",
-            #         "Content-Type": "application/json"
-            #     },
-            #     data=json.dumps({
-            #         "messaging_product": "whatsapp",
-            #         "to": formatted_number,
-            #         "type": "text",
-            #         "text": {"body": message_content}
-            #     })
-            # )
-            # response_data = response.json()
-            
-            # Simulate successful response
-            message['status'] = 'sent'
-            message['message_id'] = f"simulated-message-id-{message['id']}"
-            message['sent_at'] = datetime.utcnow().isoformat()
-            
-            # Update the message in the list
-            messages[-1] = message
-            write_data('whatsapp_messages.json', messages)
-            
-            return message
+        Args:
+            user_id: ID of the user sending the messages
+            tenant_id: ID of the tenant
+            messages: List of dicts with recipient_number, message_content,
+                message_type and optional order_id/billing_id
             
-        except Exception as e:
-            logger.error(f"Error sending WhatsApp message: {str(e)}")
-            message['status'] = 'failed'
-            message['error_message'] = str(e)
-            # Update the message in the list
-            messages[-1] = message
-            write_data('whatsapp_messages.json', messages)
-            return message
+        Returns:
+            list of queued message records
+        """
+        config = WhatsAppService.get_config(tenant_id)
+        return delivery_queue.enqueue_many(
+            [dict(m, user_id=user_id, tenant_id=tenant_id) for m in messages],
+            config=config or {}
+        )
     
     @staticmethod
     def _format_phone_number(phone_number):
@@ -135,8 +91,7 @@ class WhatsAppService:
     @staticmethod
     def get_message_history(tenant_id, limit=100):
         """Get message history for a tenant."""
-        messages = read_data('whatsapp_messages.json')
-        tenant_messages = [msg for msg in messages if msg['tenant_id'] == tenant_id]
+        tenant_messages = [msg for msg in delivery_queue.list_messages() if msg['tenant_id'] == tenant_id]
         # Sort by created_at (newest first)
         tenant_messages.sort(key=lambda x: x['created_at'], reverse=True)
         return tenant_messages[:limit]
@@ -144,24 +99,12 @@ class WhatsAppService:
     @staticmethod
     def get_message(message_id):
         """Get a specific message by ID."""
-        messages = read_data('whatsapp_messages.json')
-        return next((msg for msg in messages if msg['id'] == message_id), None)
+        return delivery_queue.get(message_id)
     
     @staticmethod
     def update_message_status(message_id, status, error_message=None):
         """Update the status of a message."""
-        messages = read_data('whatsapp_messages.json')
-        for i, message in enumerate(messages):
-            if message['id'] == message_id:
-                message['status'] = status
-                if error_message:
-                    message['error_message'] = error_message
-                if status == 'delivered':
-                    message['delivered_at'] = datetime.utcnow().isoformat()
-                messages[i] = message
-                write_data('whatsapp_messages.json', messages)
-                return message
-        return None
+        return delivery_queue.update_status(message_id, status, error_message)
     
     @staticmethod
     def format_message_with_headers(user, tenant, patient_name, message_body):